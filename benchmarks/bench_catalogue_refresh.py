@@ -0,0 +1,128 @@
+"""
+Repeated intraday catalogue snapshots: full re-pull vs CatalogueCache refresh.
+
+Serves a synthetic card from FakeBetting with a per-request latency plus a
+per-market cost for full-projection payloads, and
+takes n snapshots, changing a few markets between them (a new market, a
+delayed race, a non-runner). Reports requests made, markets downloaded with
+the full projection (the heavy part of the catalogue weight) and wall time.
+
+It then times keeping the joined runner/price frame current across the same
+snapshots: rebuilding it with MorningPrice.merge every time vs
+MorningPrice.refresh_joined, with prices for every market and with one batch
+of markets per snapshot, and checks the incremental frame against the rebuild.
+At a day's size both are a few milliseconds of pandas call overhead, so the
+incremental frame is no faster; what it buys is that a batch of prices
+leaves the other runners' last prices in place.
+
+Usage:
+    python benchmarks/bench_catalogue_refresh.py --markets 120 --snapshots 10
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+import pandas as pd
+
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+
+from src.catalogue_cache import CatalogueCache
+from src.morning_price import MorningPrice
+from synthetic import FakeBetting, FakeTrading, market_books, market_catalogues
+
+
+def churn(betting, catalogues, snapshot):
+    """Small intraday changes: one new market, one delayed race, one non-runner."""
+    new = market_catalogues(1, seed=1000 + snapshot, start='2024-06-01 18:00')[0]
+    new.market_id = f'1.{990000000 + snapshot}'
+    betting.catalogues[new.market_id] = new
+    betting.books.update({b.market_id: b for b in market_books([new])})
+    catalogues[snapshot].market_start_time += pd.Timedelta(minutes=5)
+    betting.books[catalogues[-snapshot - 1].market_id].runners[0].status = 'REMOVED'
+
+
+def joined_frames(mp, n_markets, snapshots, batch_markets):
+    """Seconds spent keeping the joined frame current: (rebuild, incremental, incremental per batch)."""
+    catalogues = market_catalogues(n_markets)
+    betting = FakeBetting(catalogues)
+    trading = FakeTrading(betting=betting)
+    cache = CatalogueCache(None, ttl=pd.Timedelta(days=3650), evict_after=pd.Timedelta(days=3650))
+    seconds = [0.0, 0.0, 0.0]
+    joined = partial = None
+    for i in range(snapshots):
+        if i:
+            churn(betting, catalogues, i)
+        cache.refresh(trading, mp.start_time, mp.end_time)
+        market_ids = mp.market_id_list(cache.runners(mp.start_time, mp.end_time))
+        prices = mp.morning_price(mp.market_books(market_ids, trading, batched=True))
+        batch = market_ids[i * batch_markets % len(market_ids):][:batch_markets]
+        batch_prices = prices[prices['market_id'].isin(batch)] if i else prices
+
+        start = time.perf_counter()
+        rebuilt = mp.merge(cache.runners(mp.start_time, mp.end_time), prices)
+        seconds[0] += time.perf_counter() - start
+        start = time.perf_counter()
+        joined = mp.refresh_joined(joined, prices, cache)
+        seconds[1] += time.perf_counter() - start
+        start = time.perf_counter()
+        partial = mp.refresh_joined(partial, batch_prices, cache)
+        seconds[2] += time.perf_counter() - start
+
+    key = ['market_id', 'selection_id']
+    pd.testing.assert_frame_equal(joined.sort_index().astype(object),
+                                  rebuilt.set_index(key).sort_index().astype(object), check_index_type=False)
+    assert partial.index.sort_values().equals(joined.index.sort_values())
+    return seconds
+
+
+def run(snapshot_fn, n_markets, snapshots, latency, market_latency):
+    catalogues = market_catalogues(n_markets)
+    betting = FakeBetting(catalogues, latency=latency, market_latency=market_latency)
+    trading = FakeTrading(betting=betting)
+    start = time.perf_counter()
+    for i in range(snapshots):
+        if i:
+            churn(betting, catalogues, i)
+        snapshot_fn(trading)
+    return sum(betting.calls.values()), betting.full_markets, time.perf_counter() - start
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--markets', type=int, default=120)
+    parser.add_argument('--snapshots', type=int, default=10)
+    parser.add_argument('--latency', type=float, default=0.05, help='seconds per API request')
+    parser.add_argument('--batch-markets', type=int, default=10, help='markets priced per snapshot for the joined frame')
+    parser.add_argument('--market-latency', type=float, default=0.002,
+                        help='extra seconds per market downloaded with the full projection')
+    args = parser.parse_args()
+
+    # one market every 5 minutes from 12:00, so the window grows with --markets
+    start = pd.Timestamp('2024-06-01 11:00')
+    end = max(pd.Timestamp('2024-06-01 23:00'), start + pd.Timedelta(minutes=60 + 5 * args.markets))
+    mp = MorningPrice(start, end)
+    root = tempfile.mkdtemp()
+    caches = [CatalogueCache(os.path.join(root, f'catalogue{i}.parquet'),
+                             ttl=pd.Timedelta(days=3650), evict_after=pd.Timedelta(days=3650)) for i in range(2)]
+
+    results = [
+        ('full re-pull', run(lambda t: mp.market_runner(mp.markets(start, end, t)),
+                             args.markets, args.snapshots, args.latency, args.market_latency)),
+        ('cache, no removals', run(lambda t: caches[0].refresh(t, start, end, check_removals=False),
+                                   args.markets, args.snapshots, args.latency, args.market_latency)),
+        ('catalogue cache', run(lambda t: mp.cached_market_runner(t, caches[1]),
+                                args.markets, args.snapshots, args.latency, args.market_latency)),
+    ]
+    print(f'{args.snapshots} snapshots of {args.markets} markets, {args.latency * 1000:.0f}ms per request, '
+          f'{args.market_latency * 1000:.0f}ms per full market')
+    print(f"{'method':<20}{'requests':>10}{'full markets':>14}{'seconds':>10}")
+    for name, (requests, full_markets, seconds) in results:
+        print(f'{name:<20}{requests:>10}{full_markets:>14}{seconds:>10.3f}')
+
+    rebuild_s, incremental_s, batch_s = joined_frames(mp, args.markets, args.snapshots, args.batch_markets)
+    print(f"\n{'joined frame':<34}{'ms per snapshot':>16}")
+    print(f"{'merge rebuild':<34}{rebuild_s / args.snapshots * 1000:>16.2f}")
+    print(f"{'refresh_joined, all prices':<34}{incremental_s / args.snapshots * 1000:>16.2f}")
+    print(f"{f'refresh_joined, {args.batch_markets} markets priced':<34}{batch_s / args.snapshots * 1000:>16.2f}")
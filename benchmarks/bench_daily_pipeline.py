@@ -0,0 +1,116 @@
+"""
+Daily flow end to end against the fake trading client: notebook steps vs daily_pipeline.DailyPipeline.
+
+The morning snapshot is taken three ways on a card of synthetic markets with
+per-request latency: the notebook sequence (markets, market_runner,
+market_id_list, market_books one market at a time, morning_price, join), the
+same sequence with batched market_books, and DailyPipeline's overlapping
+stages. The last two run against a client that fails a share of book
+requests, which their retries absorb (the one-market-at-a-time loop has no
+retries, so it gets a reliable client).
+
+The pipeline then runs the rest of the race day on a simulated clock: the
+T-minus snapshots from its priority queue and the results fetches, checked
+against the number of runners and markets on the card.
+
+Usage:
+    python benchmarks/bench_daily_pipeline.py --markets 120 --latency 0.05 --failure-rate 0.05
+"""
+import argparse
+import asyncio
+import contextlib
+import io
+import logging
+import os
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+import pandas as pd
+
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+
+from src.daily_pipeline import DailyPipeline, SimulatedClock
+from src.functions import fetch_race_results
+from src.morning_price import MorningPrice
+from src.price_store import PriceStore
+from src.race_results import ResultsStore
+from synthetic import FakeBetting, FakeTrading, RecordedRaceCard, market_books, market_catalogues, race_results_for
+
+DAY = datetime(2024, 6, 1)
+
+
+def notebook_morning(trading, batched):
+    """The notebook sequence, one step after another."""
+    mp = MorningPrice(DAY, DAY + timedelta(days=1))
+    df1 = mp.market_runner(mp.markets(mp.start_time, mp.end_time, trading))
+    books = mp.market_books(mp.market_id_list(df1), trading, batched=batched)
+    df2 = mp.morning_price(books)
+    return mp.join(df1, df2, store=PriceStore(tempfile.mkdtemp()))
+
+
+def timed(fn):
+    start = time.perf_counter()
+    result = fn()
+    return result, time.perf_counter() - start
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--markets', type=int, default=120)
+    parser.add_argument('--latency', type=float, default=0.05, help='seconds per API request')
+    parser.add_argument('--failure-rate', type=float, default=0.05, help='share of failed book requests')
+    parser.add_argument('--max-workers', type=int, default=4)
+    parser.add_argument('--requests-per-second', type=float, default=5)
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.ERROR)
+
+    catalogues = market_catalogues(args.markets, start=f'{DAY:%Y-%m-%d} 12:00')
+    books = market_books(catalogues, depth=10)
+    race_card = RecordedRaceCard(race_results_for(catalogues), latency=args.latency)
+
+    # join and DailyPipeline write ../data/daily/<date>_data.csv relative to the working directory
+    root = tempfile.mkdtemp()
+    workdir = os.path.join(root, 'src')
+    os.makedirs(os.path.join(workdir, '..', 'data', 'daily'))
+    os.chdir(workdir)
+
+    with contextlib.redirect_stdout(io.StringIO()):
+        trading = FakeTrading(race_card, FakeBetting(catalogues, books, latency=args.latency))
+        notebook, notebook_s = timed(lambda: notebook_morning(trading, batched=False))
+        failing = FakeTrading(race_card, FakeBetting(catalogues, books, latency=args.latency,
+                                                     failure_rate=args.failure_rate))
+        _, batched_s = timed(lambda: notebook_morning(failing, batched=True))
+        ids = notebook['market_id'].unique().tolist()
+        results = fetch_race_results(ids, trading)
+
+    betting = FakeBetting(catalogues, books, latency=args.latency, failure_rate=args.failure_rate)
+    pipeline = DailyPipeline(FakeTrading(race_card, betting), store=PriceStore(os.path.join(root, 'prices')),
+                             results_store=ResultsStore(os.path.join(root, 'results')),
+                             max_workers=args.max_workers, requests_per_second=args.requests_per_second,
+                             clock=SimulatedClock(DAY + timedelta(hours=7)))
+    counts, day_s = timed(lambda: asyncio.run(pipeline.run_day(DAY.date())))
+
+    n_runners, n_snapshots = len(notebook), len(pipeline.snapshot_minutes)
+    stored = pipeline.store.read(columns=['market_id', 'selection_id', 'snapshot_time'])
+    assert counts['failed_batches'] == 0 and counts['failed_writes'] == 0, counts
+    assert len(stored) == n_runners * (1 + n_snapshots), (len(stored), n_runners)
+    assert stored.groupby(['market_id', 'selection_id']).size().eq(1 + n_snapshots).all()
+    assert counts['results_markets'] == args.markets and counts['results_rows'] == len(results), counts
+
+    print(f'{args.markets} markets, {n_runners:,} runners, {args.latency * 1000:.0f}ms per request, '
+          f'{args.failure_rate:.0%} of book requests failing')
+    print(f"{'morning snapshot':<36}{'seconds':>9}")
+    print(f"{'notebook, one market per request':<36}{notebook_s:>9.2f}")
+    print(f"{'notebook, batched market_books':<36}{batched_s:>9.2f}")
+    print(f"{'DailyPipeline':<36}{pipeline.timings['morning_s']:>9.2f}")
+    print()
+    print(f"race day on a simulated clock: {pipeline.timings['events_s']:.2f}s for {counts['snapshots']:,} "
+          f"T-minus market snapshots at {pipeline.snapshot_minutes} minutes and results for "
+          f"{counts['results_markets']} markets")
+    print(f'{len(stored):,} price rows stored in {stored["snapshot_time"].nunique()} snapshots, '
+          f"{counts['results_rows']:,} result rows, whole day {day_s:.2f}s")
+    print()
+    with pd.option_context('display.float_format', '{:.3f}'.format):
+        print(pipeline.stage_report().to_string(index=False))
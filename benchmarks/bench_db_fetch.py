@@ -0,0 +1,114 @@
+"""
+Peak RSS and wall time of reading a results table into pandas.
+
+Compares the original fetch_data path (dictionary cursor + fetchall + a
+DataFrame built from a list of dicts) with the chunked tuple path
+(iter_frames) and the preallocated single-frame path (fill_frame) from
+db_connection. Each method runs in a fresh process so its peak RSS is not
+polluted by the previous one; the 'baseline' row is the peak RSS of a process
+that only imports the modules. Uses an sqlite3 stand-in table.
+
+Usage:
+    python benchmarks/bench_db_fetch.py --rows 1000000
+"""
+import argparse
+import multiprocessing as mp
+import os
+import resource
+import sqlite3
+import sys
+import tempfile
+import time
+
+import numpy as np
+import pandas as pd
+
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+
+from src.db_connection import fill_frame, iter_frames
+
+QUERY = 'SELECT * FROM results'
+DTYPES = {'selection_id': 'int64', 'position': 'float64', 'bsp': 'float64', 'distance': 'float64'}
+
+
+def build_table(path, n_rows, seed=42):
+    rng = np.random.default_rng(seed)
+    df = pd.DataFrame({
+        'race_id': rng.integers(0, n_rows // 10 + 1, n_rows),
+        'market_id': ['1.%09d' % m for m in rng.integers(0, 10**9, n_rows)],
+        'selection_id': rng.integers(10**6, 10**8, n_rows),
+        'course_type': rng.choice(['FLAT', 'HURDLE', 'CHASE'], n_rows),
+        'distance': rng.uniform(1000, 4000, n_rows).round(0),
+        'position': rng.integers(1, 20, n_rows).astype(float),
+        'bsp': rng.uniform(1.2, 200, n_rows).round(2),
+    })
+    connection = sqlite3.connect(path)
+    df.to_sql('results', connection, index=False, if_exists='replace')
+    connection.close()
+
+
+def dict_path(connection):
+    connection.row_factory = lambda cursor, row: {d[0]: v for d, v in zip(cursor.description, row)}
+    cursor = connection.cursor()
+    cursor.execute(QUERY)
+    df = pd.DataFrame(cursor.fetchall())
+    return len(df)
+
+
+def chunked_path(connection):
+    cursor = connection.cursor()
+    cursor.execute(QUERY)
+    return sum(len(chunk) for chunk in iter_frames(cursor, chunk_size=50000, dtypes=DTYPES))
+
+
+def prealloc_path(connection):
+    cursor = connection.cursor()
+    n_rows = cursor.execute(f'SELECT COUNT(*) FROM ({QUERY})').fetchone()[0]
+    cursor.execute(QUERY)
+    return len(fill_frame(cursor, n_rows, chunk_size=50000, dtypes=DTYPES))
+
+
+def baseline(connection):
+    return 0
+
+
+METHODS = {'baseline': baseline, 'dict_fetchall': dict_path, 'chunked': chunked_path, 'preallocated': prealloc_path}
+
+
+def peak_rss_mb():
+    # VmHWM resets on exec, unlike ru_maxrss which Linux carries over from the parent
+    try:
+        with open('/proc/self/status') as f:
+            for line in f:
+                if line.startswith('VmHWM:'):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def run(method, path, queue):
+    connection = sqlite3.connect(path)
+    start = time.perf_counter()
+    rows = METHODS[method](connection)
+    elapsed = time.perf_counter() - start
+    queue.put((rows, elapsed, peak_rss_mb()))
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--rows', type=int, default=500000)
+    args = parser.parse_args()
+
+    path = os.path.join(tempfile.mkdtemp(), 'bench.db')
+    build_table(path, args.rows)
+
+    ctx = mp.get_context('spawn')
+    print(f"{'method':<16}{'rows':>10}{'seconds':>10}{'peak RSS MB':>14}")
+    for method in METHODS:
+        queue = ctx.Queue()
+        process = ctx.Process(target=run, args=(method, path, queue))
+        process.start()
+        rows, elapsed, rss_mb = queue.get()
+        process.join()
+        print(f'{method:<16}{rows:>10}{elapsed:>10.3f}{rss_mb:>14.1f}')
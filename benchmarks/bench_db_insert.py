@@ -0,0 +1,122 @@
+"""
+Rows/sec for writing a day's price snapshot to the database.
+
+Compares one INSERT + commit per row (what execute_query does) with the
+batched executemany path used by DatabaseConnector.save_data_frame, as a plain
+insert and as an upsert keyed on market_id/selection_id.
+
+Runs against an sqlite3 stand-in by default; set DB_HOST/DB_USER and pass
+--mysql <database> <password> to run against MySQL/MariaDB instead.
+
+Usage:
+    python benchmarks/bench_db_insert.py --rows 50000
+"""
+import argparse
+import os
+import sqlite3
+import sys
+import tempfile
+import time
+
+import numpy as np
+import pandas as pd
+
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+
+from src.db_connection import DatabaseConnector, bulk_insert, create_table_sql, insert_sql, _rows
+
+
+def snapshot_frame(n_rows, seed=42):
+    """Synthetic frame shaped like the output of MorningPrice.join."""
+    rng = np.random.default_rng(seed)
+    n_markets = -(-n_rows // 12)
+    return pd.DataFrame({
+        'market_id': ['1.%09d' % m for m in rng.permutation(n_markets).repeat(12)[:n_rows]],
+        'selection_id': np.tile(np.arange(12), n_markets)[:n_rows] + 10_000_000,
+        'market_start_time': pd.Timestamp('2024-06-01 12:00', tz='UTC')
+        + pd.to_timedelta(rng.integers(0, 600, n_rows), unit='min'),
+        'venue': rng.choice(['Ascot', 'Kempton', 'York', 'Ayr'], n_rows),
+        'horse_name': ['Horse %d' % i for i in range(n_rows)],
+        'status': 'ACTIVE',
+        'last_price_traded': rng.uniform(1.5, 50, n_rows).round(2),
+        'total_matched': rng.uniform(0, 1e5, n_rows).round(2),
+    })
+
+
+def time_it(fn):
+    start = time.perf_counter()
+    rows = fn()
+    return rows, time.perf_counter() - start
+
+
+def run_sqlite(df, batch_sizes):
+    results = []
+    path = os.path.join(tempfile.mkdtemp(), 'bench.db')
+    key = ['market_id', 'selection_id']
+
+    def fresh(keyed):
+        connection = sqlite3.connect(path)
+        connection.execute('DROP TABLE IF EXISTS prices')
+        connection.execute(create_table_sql(df, 'prices', key if keyed else None, dialect='sqlite'))
+        connection.commit()
+        return connection
+
+    connection = fresh(False)
+    sql = insert_sql(list(df.columns), 'prices', dialect='sqlite')
+
+    def row_by_row():
+        cursor = connection.cursor()
+        for row in _rows(df, 'sqlite'):
+            cursor.execute(sql, row)
+            connection.commit()
+        return len(df)
+
+    results.append(('row_by_row', None) + time_it(row_by_row))
+    connection.close()
+
+    for batch_size in batch_sizes:
+        connection = fresh(False)
+        results.append(('executemany', batch_size) + time_it(
+            lambda: bulk_insert(connection, df, 'prices', batch_size=batch_size, dialect='sqlite')))
+        connection.close()
+
+        connection = fresh(True)
+        bulk_insert(connection, df, 'prices', key, batch_size=batch_size, dialect='sqlite')
+        results.append(('upsert_existing', batch_size) + time_it(
+            lambda: bulk_insert(connection, df, 'prices', key, batch_size=batch_size, dialect='sqlite')))
+        connection.close()
+    return results
+
+
+def run_mysql(df, batch_sizes, database, password):
+    db = DatabaseConnector(database, password)
+    db.connect()
+    results = []
+    for batch_size in batch_sizes:
+        results.append(('executemany', batch_size) + time_it(
+            lambda: db.save_data_frame(df, 'bench_prices', if_exists='replace', batch_size=batch_size,
+                                       key_columns=['market_id', 'selection_id'])))
+        results.append(('upsert_existing', batch_size) + time_it(
+            lambda: db.save_data_frame(df, 'bench_prices', if_exists='upsert', batch_size=batch_size)))
+    results.append(('load_data_infile', None) + time_it(
+        lambda: db.save_data_frame(df, 'bench_prices', if_exists='replace', method='infile')))
+    db.disconnect()
+    return results
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--rows', type=int, default=20000)
+    parser.add_argument('--batch-sizes', type=int, nargs='+', default=[500, 5000])
+    parser.add_argument('--mysql', nargs=2, metavar=('DATABASE', 'PASSWORD'))
+    args = parser.parse_args()
+
+    df = snapshot_frame(args.rows)
+    if args.mysql:
+        results = run_mysql(df, args.batch_sizes, *args.mysql)
+    else:
+        results = run_sqlite(df, args.batch_sizes)
+
+    print(f"{'method':<18}{'batch':>8}{'rows':>10}{'seconds':>10}{'rows/sec':>12}")
+    for method, batch_size, rows, seconds in results:
+        print(f"{method:<18}{str(batch_size or '-'):>8}{rows:>10}{seconds:>10.3f}{rows / seconds:>12.0f}")
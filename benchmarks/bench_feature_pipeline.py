@@ -0,0 +1,72 @@
+"""
+Notebook feature preparation vs the compiled FeaturePipeline on a turf.csv-sized frame.
+
+The notebook path is mass_transformation + normalization from main.ipynb,
+which copies the frame and refits MinMaxScaler on every call. The pipeline
+path fits once and then only runs transform().
+
+Usage:
+    python benchmarks/bench_feature_pipeline.py --races 40000
+"""
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+
+from src.data_cleaning import DataCleaning
+from src.feature_pipeline import DEFAULT_FEATURES, DISTANCE_BINS, DISTANCE_LABELS, FeaturePipeline
+from synthetic import turf_frame
+
+
+def mass_transformation(data):
+    data['distance_bucket'] = pd.cut(data['Distance (y)'], bins=DISTANCE_BINS, labels=DISTANCE_LABELS)
+    data = data.rename(columns={'Weight (pounds)': 'weight'})
+    data['evening_morning_price'] = (data['Morning Price'] / data['Evening Price'])
+    data['breakfast_morning_price'] = (data['Morning Price'] / data['Breakfast Price'])
+    data[['Won P/L Before', ]] = data[['Won P/L Before']].map(pd.to_numeric)
+    data['SP Odds Decimal1'] = data['SP Odds Decimal']
+    return data
+
+
+def normalization(data):
+    normalized_df = DataCleaning.normalize_columns(data, DEFAULT_FEATURES)
+    df1 = normalized_df[DEFAULT_FEATURES]
+    return df1.fillna(0)
+
+
+def best_of(fn, repeat):
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = fn()
+        times.append(time.perf_counter() - start)
+    return min(times), result
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--races', type=int, default=40000)
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+
+    raw = turf_frame(args.races)
+    print(f'{len(raw)} rows, {raw.shape[1]} columns')
+
+    notebook_time, notebook_X = best_of(lambda: normalization(mass_transformation(raw.copy())).to_numpy(), args.repeat)
+
+    pipeline = FeaturePipeline().fit(raw.copy())
+    frames = [raw.copy() for _ in range(args.repeat)]
+    pipeline_time, pipeline_X = best_of(lambda: pipeline.transform(frames.pop()), args.repeat)
+    features_only = raw.copy()
+    FeaturePipeline().fit(features_only)
+    transform_only, _ = best_of(lambda: pipeline.transform(features_only, add=False), args.repeat)
+
+    print(f'notebook mass_transformation + normalization: {notebook_time:.3f}s')
+    print(f'pipeline add_features + transform:            {pipeline_time:.3f}s')
+    print(f'pipeline transform only:                      {transform_only:.3f}s')
+    print(f'max abs difference vs notebook: {np.abs(notebook_X - pipeline_X).max():.2e}')
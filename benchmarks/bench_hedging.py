@@ -0,0 +1,73 @@
+"""
+Time to re-hedge a whole card with hedging.hedge_book.
+
+Builds synthetic positions and a best-offer price table (the shape returned
+by Betfair.get_market_prices) for n markets and reports the cost per
+market of a full green-up pass, next to a loop calling
+functions.calculate_lay_stakes_multiple_runners once per market.
+
+Usage:
+    python benchmarks/bench_hedging.py --markets 2000
+"""
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+
+from src.functions import calculate_lay_stakes_multiple_runners
+from src.hedging import hedge_book
+
+
+def card(n_markets, runners=12, bets_per_market=4, seed=42):
+    rng = np.random.default_rng(seed)
+    market_ids = np.array(['1.%09d' % m for m in range(n_markets)])
+    back = np.round(rng.uniform(1.5, 30, (n_markets, runners)), 2)
+    prices = pd.DataFrame({
+        'marketId': market_ids.repeat(runners),
+        'selectionId': np.tile(np.arange(runners), n_markets) + 10_000_000,
+        'backPrice': back.ravel(),
+        'layPrice': np.round(back.ravel() * 1.02, 2),
+        'backSize': 100.0,
+        'laySize': 100.0,
+    })
+    n_bets = n_markets * bets_per_market
+    positions = pd.DataFrame({
+        'market_id': market_ids.repeat(bets_per_market),
+        'selection_id': rng.integers(0, runners, n_bets) + 10_000_000,
+        'side': rng.choice(['BACK', 'LAY'], n_bets),
+        'stake': np.round(rng.uniform(2, 50, n_bets), 2),
+        'price': np.round(rng.uniform(1.5, 30, n_bets), 2),
+    })
+    return positions, prices
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--markets', type=int, default=2000)
+    parser.add_argument('--repeat', type=int, default=20)
+    args = parser.parse_args()
+
+    positions, prices = card(args.markets)
+    hedge_book(positions, prices)
+
+    start = time.perf_counter()
+    for _ in range(args.repeat):
+        hedge_book(positions, prices)
+    vectorized = (time.perf_counter() - start) / args.repeat
+
+    grouped_positions = {m: list(zip(g['stake'], g['price'])) for m, g in positions.groupby('market_id')}
+    grouped_prices = {m: g['layPrice'].tolist() for m, g in prices.groupby('marketId')}
+    start = time.perf_counter()
+    for market_id, bets in grouped_positions.items():
+        calculate_lay_stakes_multiple_runners(bets, grouped_prices[market_id])
+    per_market_loop = time.perf_counter() - start
+
+    print(f'{args.markets} markets, {len(positions)} positions, {len(prices)} runners')
+    print(f'hedge_book              {vectorized * 1000:>8.2f} ms  {vectorized / args.markets * 1e6:>8.2f} us/market')
+    print(f'per-market python loop  {per_market_loop * 1000:>8.2f} ms  {per_market_loop / args.markets * 1e6:>8.2f} us/market'
+          '  (lay stakes only, no P&L)')
@@ -0,0 +1,144 @@
+"""
+Cold-start import cost of each entry point, measured with python -X importtime.
+
+Every entry point runs in a fresh interpreter with -X importtime. The report
+gives the total import time (the sum of the self times of every module
+imported), the wall time of the whole process including interpreter start,
+the heavy third-party packages that were loaded, and the third-party
+packages with the largest cumulative import time. The best of --repeats runs
+is kept, so the numbers are for a warm OS file cache.
+
+With --baseline the src tree of that git revision is extracted to a
+temporary directory and measured the same way, for a before/after table.
+
+Usage:
+    python benchmarks/bench_import_time.py
+    python benchmarks/bench_import_time.py --baseline HEAD~1 --repeats 5
+    python benchmarks/bench_import_time.py --top 5
+"""
+import argparse
+import os
+import subprocess
+import sys
+import tarfile
+import tempfile
+import time
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+
+# entry point -> interpreter arguments after -X importtime
+ENTRY_POINTS = {
+    'import src': ['-c', 'import src'],
+    'import src.functions': ['-c', 'import src.functions'],
+    'import src.betfair': ['-c', 'import src.betfair'],
+    'import src.morning_price': ['-c', 'import src.morning_price'],
+    'import src.market_fetcher': ['-c', 'import src.market_fetcher'],
+    'import src.market_stream': ['-c', 'import src.market_stream'],
+    'import src.race_results': ['-c', 'import src.race_results'],
+    'import src.training': ['-c', 'import src.training'],
+    'cli --help': ['-m', 'src.cli', '--help'],
+}
+
+HEAVY = ['pandas', 'numpy', 'pyarrow', 'sklearn', 'mlflow', 'betfairlightweight', 'requests', 'mysql']
+
+
+def parse_importtime(stderr):
+    """
+    Module timings from -X importtime output.
+
+    Returns:
+        list: (module, self_us, cumulative_us) per imported module
+    """
+    rows = []
+    for line in stderr.splitlines():
+        if not line.startswith('import time:') or 'self [us]' in line:
+            continue
+        self_us, cumulative_us, name = line[len('import time:'):].split('|')
+        rows.append((name.strip(), int(self_us), int(cumulative_us)))
+    return rows
+
+
+def measure(root, args):
+    """
+    One cold interpreter run of an entry point against the tree at root.
+
+    Returns:
+        dict: import_ms, wall_ms, heavy packages loaded and the third-party
+            packages as (package, cumulative_ms), slowest first; None if the
+            entry point failed
+    """
+    # src on the path as well, for baselines from before the package used relative imports
+    env = dict(os.environ, PYTHONPATH=os.pathsep.join([root, os.path.join(root, 'src')]))
+    start = time.perf_counter()
+    proc = subprocess.run([sys.executable, '-X', 'importtime', *args], cwd=root, env=env,
+                          capture_output=True, text=True)
+    wall_ms = (time.perf_counter() - start) * 1000
+    if proc.returncode != 0:
+        return None
+    rows = parse_importtime(proc.stderr)
+    own = {'src'} | {name[:-3] for name in os.listdir(os.path.join(root, 'src')) if name.endswith('.py')}
+    own |= sys.stdlib_module_names
+    packages = {}
+    for name, _, cumulative_us in rows:
+        package = name.split('.')[0]
+        if package not in own:
+            packages[package] = max(packages.get(package, 0), cumulative_us / 1000)
+    return {
+        'import_ms': sum(self_us for _, self_us, _ in rows) / 1000,
+        'wall_ms': wall_ms,
+        'heavy': [name for name in HEAVY if name in packages],
+        'top': sorted(packages.items(), key=lambda item: -item[1]),
+    }
+
+
+def best_of(root, args, repeats):
+    runs = [measure(root, args) for _ in range(repeats)]
+    if any(run is None for run in runs):
+        return None
+    return min(runs, key=lambda run: run['import_ms'])
+
+
+def extract_src(rev):
+    """Copy of the src tree at git revision rev in a temporary directory."""
+    root = tempfile.mkdtemp()
+    archive = os.path.join(root, 'src.tar')
+    subprocess.run(['git', 'archive', '-o', archive, rev, 'src'], cwd=ROOT, check=True)
+    with tarfile.open(archive) as tar:
+        tar.extractall(root, filter='data')
+    return root
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--repeats', type=int, default=3)
+    parser.add_argument('--baseline', help='git revision to compare against, e.g. HEAD~1')
+    parser.add_argument('--top', type=int, default=3, help='slowest packages listed per entry point')
+    parser.add_argument('-k', dest='keyword', help='only entry points containing this')
+    args = parser.parse_args()
+
+    baseline_root = extract_src(args.baseline) if args.baseline else None
+    names = [name for name in ENTRY_POINTS if not args.keyword or args.keyword in name]
+
+    header = f"{'entry point':<28}{'import ms':>10}{'wall ms':>10}"
+    if baseline_root:
+        header += f"{'baseline ms':>13}{'speedup':>9}"
+    print(header + '  heavy packages loaded')
+    details = []
+    for name in names:
+        result = best_of(ROOT, ENTRY_POINTS[name], args.repeats)
+        if result is None:
+            print(f'{name:<28}{"failed":>10}')
+            continue
+        line = f"{name:<28}{result['import_ms']:>10.1f}{result['wall_ms']:>10.1f}"
+        if baseline_root:
+            base = best_of(baseline_root, ENTRY_POINTS[name], args.repeats)
+            if base is None:
+                line += f"{'n/a':>13}{'':>9}"
+            else:
+                line += f"{base['import_ms']:>13.1f}{base['import_ms'] / result['import_ms']:>8.1f}x"
+        print(line + '  ' + (', '.join(result['heavy']) or '-'), flush=True)
+        details.append((name, result['top'][:args.top]))
+
+    print()
+    for name, top in details:
+        print(f'{name}: ' + ', '.join(f'{module} {ms:.0f}ms' for module, ms in top))
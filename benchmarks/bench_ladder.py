@@ -0,0 +1,96 @@
+"""
+Ladder analytics for a day of ex_all_offers books: per-level loops vs ladder.Ladders.
+
+Builds synthetic books with deep ladders on the tick grid and computes spread
+in ticks, overround, weight of money and VWAP/slippage at two stakes, once
+with a Python loop over every runner and level and once with Ladders.
+Checks the two agree, then reports time for packing the ladders and for the
+analytics.
+
+Usage:
+    python benchmarks/bench_ladder.py --markets 600 --depth 10
+"""
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+
+from src.ladder import TICKS, Ladders
+from synthetic import market_books, market_catalogues
+
+TICK_INDEX = {float(price): i for i, price in enumerate(TICKS)}
+
+
+def loop_vwap(ladder, stake):
+    remaining, cost, ticks = stake, 0.0, 0.0
+    for level in ladder:
+        take = min(remaining, level.size)
+        cost += take * level.price
+        ticks += take * TICK_INDEX[level.price]
+        remaining -= take
+        if remaining <= 1e-9:
+            return cost / stake, abs(ticks / stake - TICK_INDEX[ladder[0].price])
+    return np.nan, np.nan
+
+
+def loop_features(books, stakes, depth, wom_levels=3):
+    """One dict per runner, walking each ladder level by level."""
+    rows = []
+    for book in books:
+        back_book = sum(1 / r.ex.available_to_back[0].price for r in book.runners if r.ex.available_to_back)
+        lay_book = sum(1 / r.ex.available_to_lay[0].price for r in book.runners if r.ex.available_to_lay)
+        for runner in book.runners:
+            back, lay = runner.ex.available_to_back[:depth], runner.ex.available_to_lay[:depth]
+            back_wom = sum(level.size for level in back[:wom_levels])
+            lay_wom = sum(level.size for level in lay[:wom_levels])
+            row = {
+                'market_id': book.market_id,
+                'selection_id': runner.selection_id,
+                'spread_ticks': TICK_INDEX[lay[0].price] - TICK_INDEX[back[0].price] if back and lay else np.nan,
+                'back_overround': back_book,
+                'lay_overround': lay_book,
+                'wom_imbalance': (back_wom - lay_wom) / (back_wom + lay_wom) if back_wom + lay_wom else np.nan,
+            }
+            for stake in stakes:
+                row[f'back_vwap_{stake:g}'], row[f'back_slippage_{stake:g}'] = loop_vwap(back, stake)
+                row[f'lay_vwap_{stake:g}'], row[f'lay_slippage_{stake:g}'] = loop_vwap(lay, stake)
+            rows.append(row)
+    return pd.DataFrame(rows)
+
+
+def best_of(fn, repeats):
+    times = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        result = fn()
+        times.append(time.perf_counter() - start)
+    return result, min(times)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--markets', type=int, default=600)
+    parser.add_argument('--depth', type=int, default=10)
+    parser.add_argument('--repeats', type=int, default=3)
+    args = parser.parse_args()
+    stakes = (10, 500)
+
+    books = market_books(market_catalogues(args.markets), depth=args.depth)
+
+    loop, loop_s = best_of(lambda: loop_features(books, stakes, args.depth), args.repeats)
+    ladders, pack_s = best_of(lambda: Ladders.from_books(books, depth=args.depth), args.repeats)
+    features, analytics_s = best_of(lambda: ladders.features(stakes=stakes), args.repeats)
+
+    for col in loop.columns.drop(['market_id', 'selection_id']):
+        np.testing.assert_allclose(features[col].to_numpy(), loop[col].to_numpy(dtype=float), rtol=1e-9,
+                                   err_msg=col)
+
+    print(f'{args.markets} markets, {len(ladders):,} runners, {args.depth} levels per side, stakes {stakes}')
+    print(f'per-level loop            {loop_s:.4f}s')
+    print(f'Ladders.from_books        {pack_s:.4f}s')
+    print(f'Ladders.features          {analytics_s:.4f}s  ({analytics_s / len(ladders) * 1e6:.2f}us per runner)')
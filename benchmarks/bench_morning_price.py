@@ -0,0 +1,138 @@
+"""
+Parsing a day of ex_all_offers market books: list-of-dicts vs typed columns.
+
+Builds synthetic catalogues and EX_ALL_OFFERS style books for n markets and
+runs the old MorningPrice parsing (a dict per runner, inferred object dtypes,
+merge on market_id/selection_id) next to the current typed-column parsers and
+integer-key join. Checks both produce the same rows, then reports wall time,
+peak Python allocations and the memory of the resulting frames.
+
+Usage:
+    python benchmarks/bench_morning_price.py --markets 600 --depth 10
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+
+import numpy as np
+import pandas as pd
+
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+
+from src.morning_price import MorningPrice
+from synthetic import market_books, market_catalogues
+
+
+def legacy_market_runner(results):
+    """MorningPrice.market_runner before the typed-column parser."""
+    data = []
+    for market in results:
+        event = market.event
+        for runner in market.runners:
+            data.append({
+                'market_id': market.market_id,
+                'market_start_time': market.market_start_time,
+                'venue': event.venue if event else "Unknown Location",
+                'market_type': market.description.market_type,
+                'selection_id': runner.selection_id,
+                'horse_name': runner.runner_name,
+            })
+    return pd.DataFrame(data)
+
+
+def legacy_morning_price(market_books1):
+    """MorningPrice.morning_price before the typed-column parser (runner status overwrote market status)."""
+    data = []
+    for book_list in market_books1:
+        for market_book in book_list:
+            for runner in market_book.runners:
+                data.append({
+                    'market_id': market_book.market_id,
+                    'status': market_book.status,
+                    'total_matched': market_book.total_matched,
+                    'selection_id': runner.selection_id,
+                    'status': runner.status,
+                    'last_price_traded': runner.last_price_traded,
+                })
+    df2 = pd.DataFrame(data)
+    return df2[['market_id', 'selection_id', 'status', 'last_price_traded', 'total_matched']]
+
+
+def legacy_join(df1, df2):
+    df3 = df1.merge(df2, on=['market_id', 'selection_id'], how='left')
+    df3['market_id'] = df3['market_id'].astype(str)
+    df3['market_start_time'] = df3['market_start_time'].dt.tz_localize('UTC')
+    df3.to_csv('../data/daily/legacy_data.csv', index=False)
+    return df3
+
+
+def measure(fn, repeats):
+    """Best wall time over repeats, and the peak traced allocation of one run."""
+    times = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        result = fn()
+        times.append(time.perf_counter() - start)
+    tracemalloc.start()
+    fn()
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return result, min(times), peak / 1024 ** 2
+
+
+def frame_mb(df):
+    return df.memory_usage(deep=True).sum() / 1024 ** 2
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--markets', type=int, default=600)
+    parser.add_argument('--depth', type=int, default=10, help='ladder levels per side')
+    parser.add_argument('--batch', type=int, default=40, help='markets per list_market_book response')
+    parser.add_argument('--repeats', type=int, default=3)
+    args = parser.parse_args()
+
+    catalogues = market_catalogues(args.markets)
+    books = market_books(catalogues, depth=args.depth)
+    book_lists = [books[i:i + args.batch] for i in range(0, len(books), args.batch)]
+
+    mp = MorningPrice(None, None)
+    os.chdir(tempfile.mkdtemp())
+    os.makedirs('../data/daily', exist_ok=True)
+
+    def legacy():
+        return legacy_join(legacy_market_runner(catalogues), legacy_morning_price(book_lists))
+
+    def typed():
+        return mp.join(mp.market_runner(catalogues), mp.morning_price(book_lists))
+
+    old, old_s, old_peak = measure(legacy, args.repeats)
+    new, new_s, new_peak = measure(typed, args.repeats)
+
+    # same rows and values; the old 'status' column held the runner status
+    assert len(old) == len(new)
+    assert (old['market_id'].to_numpy() == new['market_id'].astype(str).to_numpy()).all()
+    assert (old['selection_id'].to_numpy() == new['selection_id'].to_numpy()).all()
+    assert (old['status'].to_numpy() == new['runner_status'].astype(object).to_numpy()).all()
+    assert (old['status'].to_numpy() == new['status'].astype(object).to_numpy()).all()
+    np.testing.assert_array_equal(old['last_price_traded'].to_numpy(dtype=float), new['last_price_traded'].to_numpy())
+    np.testing.assert_array_equal(old['total_matched'].to_numpy(dtype=float), new['total_matched'].to_numpy())
+
+    old_runners, old_prices = legacy_market_runner(catalogues), legacy_morning_price(book_lists)
+    new_runners, new_prices = mp.market_runner(catalogues), mp.morning_price(book_lists)
+    stages = [
+        ('market_runner', lambda: legacy_market_runner(catalogues), lambda: mp.market_runner(catalogues)),
+        ('morning_price', lambda: legacy_morning_price(book_lists), lambda: mp.morning_price(book_lists)),
+        ('join + csv', lambda: legacy_join(old_runners, old_prices), lambda: mp.join(new_runners, new_prices)),
+    ]
+    print(f'{args.markets} markets, {len(new):,} runners, ladder depth {args.depth}')
+    print(f"{'stage':<16}{'old s':>9}{'new s':>9}{'old MB':>9}{'new MB':>9}")
+    for name, old_fn, new_fn in stages:
+        old_df, old_stage_s, _ = measure(old_fn, args.repeats)
+        new_df, new_stage_s, _ = measure(new_fn, args.repeats)
+        print(f'{name:<16}{old_stage_s:>9.4f}{new_stage_s:>9.4f}{frame_mb(old_df):>9.2f}{frame_mb(new_df):>9.2f}')
+    print(f"{'end to end':<16}{old_s:>9.4f}{new_s:>9.4f}{frame_mb(old):>9.2f}{frame_mb(new):>9.2f}")
+    print(f'peak allocations: old {old_peak:.1f} MB, new {new_peak:.1f} MB')
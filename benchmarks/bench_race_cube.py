@@ -0,0 +1,140 @@
+"""
+Favourite and segment questions of short_priced_favs.ipynb: pandas on the runners vs race_cube.RaceCube.
+
+The notebook adds sp_rank, distance_bucket_yards and odds_on to the whole
+race history once, then answers each question with its own filter and
+groupby over every runner. The cube is built once and every question is a
+rollup over its cells. Both answers are checked against each other.
+
+The last --days race days are then fed to a cube of the earlier history one
+day at a time, as the daily results would arrive, and the result is checked
+against a cube built from the whole history in one go.
+
+Usage:
+    python benchmarks/bench_race_cube.py --races 50000 --days 20
+"""
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+
+from src.race_cube import DISTANCE_BINS, DISTANCE_LABELS, FEATURES, RaceCube
+from synthetic import turf_frame
+
+WON = 'Won (1=Won, 0=Lost)'
+BEATEN_FAVS = {'sp_rank': 1, 'won': 0}
+BEATEN_ODDS_ON = {'odds_band': 'odds-on', 'won': 0}
+
+
+def notebook_columns(df):
+    """The derived columns the notebook adds before its questions."""
+    df['sp_rank'] = df.groupby(['Race Date', 'Race Time', 'Course'])['BF Decimal SP'].rank(method='first')
+    df['distance_bucket_yards'] = pd.cut(df['Distance (y)'], bins=DISTANCE_BINS, labels=DISTANCE_LABELS)
+    df['odds_on'] = (df['BF Decimal SP'] < 2.0).astype(int)
+    return df
+
+
+def beaten_favs(df):
+    return df[(df[WON] == 0) & (df['sp_rank'] == 1)]
+
+
+def beaten_odds_on(df):
+    return df[(df[WON] == 0) & (df['odds_on'] == 1)]
+
+
+def favourite_roi(df):
+    favs = df[df['sp_rank'] == 1]
+    return (favs[WON] * favs['BF Decimal SP']).groupby(favs['Going']).sum() / favs.groupby('Going').size() - 1
+
+
+# question -> (pandas on the runners, the same answer from the cube)
+QUESTIONS = {
+    'favourite strike rate': (
+        lambda df: pd.Series([1 - len(beaten_favs(df)) / df.groupby(['Race Date', 'Race Time', 'Course']).ngroups]),
+        lambda cube: pd.Series([cube.total(where={'sp_rank': 1})['strike_rate']])),
+    'beaten favourites by Class': (
+        lambda df: beaten_favs(df)['Class'].value_counts(normalize=True),
+        lambda cube: cube.rollup('Class', where=BEATEN_FAVS)['share']),
+    'beaten favourites by Course': (
+        lambda df: beaten_favs(df)['Course'].value_counts(normalize=True),
+        lambda cube: cube.rollup('Course', where=BEATEN_FAVS)['share']),
+    'beaten favourites by Class + Course': (
+        lambda df: beaten_favs(df).groupby(['Class', 'Course']).size(),
+        lambda cube: cube.rollup(['Class', 'Course'], where=BEATEN_FAVS)['runners']),
+    'beaten odds-on count': (
+        lambda df: pd.Series([len(beaten_odds_on(df))]),
+        lambda cube: pd.Series([cube.total(where=BEATEN_ODDS_ON)['runners']])),
+    **{f'beaten odds-on mean {f}': (
+        lambda df, f=f: pd.Series([beaten_odds_on(df)[f].mean()]),
+        lambda cube, f=f: pd.Series([cube.total(where=BEATEN_ODDS_ON)[f'{f} mean']])) for f in FEATURES},
+    'beaten odds-on by Class': (
+        lambda df: beaten_odds_on(df)['Class'].value_counts(normalize=True),
+        lambda cube: cube.rollup('Class', where=BEATEN_ODDS_ON)['share']),
+    'beaten odds-on by distance': (
+        lambda df: beaten_odds_on(df)['distance_bucket_yards'].value_counts().loc[lambda s: s > 0],
+        lambda cube: cube.rollup('distance_bucket_yards', where=BEATEN_ODDS_ON)['runners']),
+    'beaten odds-on by Course': (
+        lambda df: beaten_odds_on(df)['Course'].value_counts(normalize=True),
+        lambda cube: cube.rollup('Course', where=BEATEN_ODDS_ON)['share']),
+    'favourite roi by Going': (
+        favourite_roi,
+        lambda cube: cube.rollup('Going', where={'sp_rank': 1})['roi']),
+}
+
+
+def timed(fn, repeats=3):
+    times = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        result = fn()
+        times.append(time.perf_counter() - start)
+    return result, min(times)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--races', type=int, default=50000)
+    parser.add_argument('--days', type=int, default=20, help='race days added one at a time')
+    args = parser.parse_args()
+
+    df = turf_frame(n_races=args.races)
+    print(f"{len(df):,} runners in {df.groupby(['Race Date', 'Race Time', 'Course']).ngroups:,} races")
+
+    runners, prepare_s = timed(lambda: notebook_columns(df.copy()), repeats=1)
+    cube = RaceCube()
+    start = time.perf_counter()
+    cube.update(df)
+    build_s = time.perf_counter() - start
+    print(f'notebook derived columns {prepare_s:.2f}s; cube build {build_s:.2f}s, {len(cube):,} cells')
+
+    print(f"\n{'question':<44}{'pandas ms':>11}{'cube ms':>9}")
+    pandas_total = cube_total = 0
+    for name, (on_runners, on_cube) in QUESTIONS.items():
+        expected, pandas_s = timed(lambda: on_runners(runners))
+        answer, cube_s = timed(lambda: on_cube(cube))
+        pd.testing.assert_series_equal(answer.reindex(expected.index).astype(float), expected.astype(float),
+                                       check_names=False, check_index_type=False, rtol=1e-9)
+        pandas_total += pandas_s
+        cube_total += cube_s
+        print(f'{name:<44}{pandas_s * 1000:>11.2f}{cube_s * 1000:>9.2f}')
+    print(f"{'all questions':<44}{pandas_total * 1000:>11.2f}{cube_total * 1000:>9.2f}")
+
+    days = sorted(df['Race Date'].unique())[-args.days:]
+    live = RaceCube()
+    live.update(df[df['Race Date'] < days[0]])
+    update_times = []
+    for day in days:
+        races = df[df['Race Date'] == day]
+        start = time.perf_counter()
+        added = live.update(races)
+        update_times.append(time.perf_counter() - start)
+        assert added == len(races) and live.update(races) == 0
+    by = ['Race Type', 'Course', 'Going', 'sp_rank']
+    pd.testing.assert_frame_equal(live.rollup(by).sort_index(), cube.rollup(by).sort_index(), rtol=1e-9)
+    print(f'\n{len(days)} race days added one at a time: {np.mean(update_times) * 1000:.1f}ms per day on average, '
+          f'{max(update_times) * 1000:.1f}ms at most; matches the cube built in one go')
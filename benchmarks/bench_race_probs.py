@@ -0,0 +1,97 @@
+"""
+Race-normalised probabilities over a multi-season history: groupby.apply vs race_probs.RaceProbabilities.
+
+Gives a synthetic race history a noisy market price (BF Decimal SP1) and a
+deliberately miscalibrated binary-classifier score (a differently noisy
+function of the true strength, squashed through a sigmoid), then:
+
+    - renormalises it per race with groupby.apply and with the reduceat
+      layer, checking they agree
+    - fits the temperature alone and the SP blend on the earlier seasons
+      and reports the out-of-sample log loss of the winners against the raw
+      renormalised score and the market alone
+    - passes the blended output straight to monte_carlo_batch and
+      profit_calculation
+
+Usage:
+    python benchmarks/bench_race_probs.py --races 50000
+"""
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+
+from src.functions import profit_calculation
+from src.monte_carlo import monte_carlo_batch
+from src.race_probs import RaceProbabilities
+from src.splitter import RACE_KEY
+from synthetic import turf_frame
+
+
+def groupby_softmax(df, col):
+    """The per-race loop this replaces."""
+    return df.groupby(RACE_KEY, sort=False, group_keys=False)[col].apply(lambda s: s / s.sum())
+
+
+def timed(fn, repeats=3):
+    times = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        result = fn()
+        times.append(time.perf_counter() - start)
+    return result, min(times)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--races', type=int, default=50000)
+    parser.add_argument('--ev-threshold', type=float, default=0.05)
+    args = parser.parse_args()
+
+    df = turf_frame(n_races=args.races)
+    # turf_frame's SP is the true strength; the market and the model each see it with their own noise
+    rng = np.random.default_rng(1)
+    strength = np.log(1 / df['BF Decimal SP'].to_numpy())
+    df['BF Decimal SP1'] = np.round(np.clip(df['BF Decimal SP'] * np.exp(rng.normal(0, 0.3, len(df))), 1.01, 1000), 2)
+    df['implied'] = 1 / df['BF Decimal SP1']
+    df['pred_prob'] = 1 / (1 + np.exp(-(0.6 * strength + 1.0 + rng.normal(0, 0.3, len(df)))))
+    train = df[df['Race Date'] < '2023-01-01']
+    test = df[df['Race Date'] >= '2023-01-01']
+    n_races = df.groupby(RACE_KEY).ngroups
+    print(f'{len(df):,} runners in {n_races:,} races, train {len(train):,} / test {len(test):,} runners')
+
+    legacy, legacy_s = timed(lambda: groupby_softmax(df, 'pred_prob'), repeats=1)
+    plain = RaceProbabilities(score_transform='log')
+    probs, predict_s = timed(lambda: plain.predict(df))
+    np.testing.assert_allclose(probs, legacy.reindex(df.index).to_numpy(), rtol=1e-12)
+    print(f'renormalise per race: groupby.apply {legacy_s:.3f}s, RaceProbabilities.predict {predict_s:.3f}s')
+
+    models = {
+        'raw score renormalised': plain,
+        'market only (1/SP)': RaceProbabilities(score_transform='log', score_col='implied'),
+        'temperature fitted': RaceProbabilities(score_transform='logit'),
+        'temperature + SP blend': RaceProbabilities(score_transform='logit', blend_sp=True),
+    }
+    print(f"\n{'model':<26}{'fit s':>8}{'iters':>7}{'coef':>18}{'test log loss':>15}{'winner prob':>13}")
+    for name, model in models.items():
+        fit_s = '-'
+        if name in ('temperature fitted', 'temperature + SP blend'):
+            fit_s = f'{timed(lambda: model.fit(train))[1]:.3f}'
+        scores = model.score(test)
+        coef = ' '.join(f'{c:.3f}' for c in model.coef_)
+        print(f"{name:<26}{fit_s:>8}{model.n_iter_:>7}{coef:>18}{scores['log_loss']:>15.4f}"
+              f"{scores['winner_prob']:>13.4f}")
+
+    blend = models['temperature + SP blend']
+    scored, transform_s = timed(lambda: blend.transform(test, ev_threshold=args.ev_threshold))
+    totals = scored.groupby(RACE_KEY)['win_prob'].sum()
+    assert np.allclose(totals, 1.0)
+    mc = monte_carlo_batch(scored, race_col=RACE_KEY, prob_col='win_prob', closed_form=True)
+    np.testing.assert_allclose(mc['mc_win_prob'], scored['win_prob'], rtol=1e-9)
+    print(f'\ntransform of the test seasons: {transform_s:.3f}s; '
+          f"{scored['model_preds'].sum():,} bets with ev > {args.ev_threshold}")
+    profit_calculation(scored)
@@ -0,0 +1,126 @@
+"""
+Race result ingestion throughput, offline against recorded get_race_result JSON.
+
+The recorded races in fixtures/race_results.json are replicated under fresh
+market ids to the requested size and served by RecordedRaceCard with a fixed
+per-call latency. Reports:
+    - flatten rows/sec: the old list-of-dicts loop vs flatten_results
+    - ingest rows/sec into a ResultsStore, serial vs concurrent chunks
+    - resume: a run with injected failures, then a rerun that fetches only
+      the missing markets
+
+Usage:
+    python benchmarks/bench_race_results.py --markets 5000 --latency 0.05
+"""
+import argparse
+import copy
+import json
+import logging
+import os
+import sys
+import tempfile
+import time
+
+import pandas as pd
+
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+
+from src.race_results import ResultsStore, flatten_results, ingest_race_results
+from synthetic import FakeTrading, RecordedRaceCard
+
+FIXTURE = os.path.join(os.path.dirname(__file__), 'fixtures', 'race_results.json')
+
+
+def legacy_flatten(data):
+    """The list-of-dicts loop fetch_race_results used before race_results.py."""
+    flat_data = []
+    for race in data:
+        for runner in race.get('runners', []):
+            for selection in runner.get('selections', []):
+                if selection['marketType'] == 'WIN' and 'bsp' in selection:
+                    flat_data.append({
+                        'race_id': race.get('raceId'),
+                        'country_code': race.get('course', {}).get('countryCode'),
+                        'race_title': race.get('raceTitle'),
+                        'race_class': race.get('raceClassification', {}).get('classification'),
+                        'distance': race.get('distance'),
+                        'course_type': race.get('course', {}).get('courseType'),
+                        'surface_type': race.get('course', {}).get('surfaceType'),
+                        'market_id': selection.get('marketId'),
+                        'horse_id': runner.get('horseId'),
+                        'saddle_cloth': runner.get('saddleCloth'),
+                        'isNonRunner': runner.get('isNonRunner'),
+                        'position': runner.get('position'),
+                        'selection_id': selection.get('selectionId'),
+                        'bsp': selection.get('bsp')
+                    })
+    return pd.DataFrame(flat_data)
+
+
+def replicate(races, n_markets):
+    """Copies of the recorded races under new market ids, one WIN market each."""
+    out = []
+    for i in range(n_markets):
+        race = copy.deepcopy(races[i % len(races)])
+        race['raceId'] = f'{race["raceId"]}.{i}'
+        for runner in race['runners']:
+            for selection in runner['selections']:
+                kind = 0 if selection['marketType'] == 'WIN' else 1
+                selection['marketId'] = f'1.{300000000 + 2 * i + kind}'
+        out.append(race)
+    return out
+
+
+def win_markets(races):
+    return [race['runners'][0]['selections'][0]['marketId'] for race in races]
+
+
+def timed(fn):
+    start = time.perf_counter()
+    result = fn()
+    return result, time.perf_counter() - start
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--markets', type=int, default=2000)
+    parser.add_argument('--chunk-size', type=int, default=50)
+    parser.add_argument('--latency', type=float, default=0.05, help='seconds per recorded API call')
+    parser.add_argument('--workers', type=int, default=8)
+    args = parser.parse_args()
+    # the resume run injects failures on purpose, keep its retry log quiet
+    logging.basicConfig(level=logging.CRITICAL)
+
+    with open(FIXTURE) as f:
+        recorded = json.load(f)
+    legacy = legacy_flatten(recorded)
+    columnar = flatten_results(recorded)
+    pd.testing.assert_frame_equal(columnar, legacy.astype(columnar.dtypes.to_dict()))
+
+    races = replicate(recorded, args.markets)
+    market_ids = win_markets(races)
+
+    legacy_df, legacy_s = timed(lambda: legacy_flatten(races))
+    columnar_df, columnar_s = timed(lambda: flatten_results(races))
+    print(f'{len(columnar_df):,} rows from {args.markets:,} markets')
+    print(f"{'flatten, list of dicts':<34}{legacy_s:>8.3f}s{len(legacy_df) / legacy_s:>12,.0f} rows/s")
+    print(f"{'flatten, columnar':<34}{columnar_s:>8.3f}s{len(columnar_df) / columnar_s:>12,.0f} rows/s")
+
+    for workers in (1, args.workers):
+        store = ResultsStore(tempfile.mkdtemp())
+        trading = FakeTrading(RecordedRaceCard(races, latency=args.latency))
+        stats = ingest_race_results(trading, market_ids, store, chunk_size=args.chunk_size, max_workers=workers,
+                                    requests_per_second=1000)
+        assert len(store.read()) == len(columnar_df)
+        print(f"{f'ingest, {workers} worker(s)':<34}{stats['elapsed_s']:>8.3f}s{stats['rows_per_s']:>12,.0f} rows/s")
+
+    store = ResultsStore(tempfile.mkdtemp())
+    flaky = FakeTrading(RecordedRaceCard(races, latency=args.latency, failure_rate=0.3, seed=1))
+    first = ingest_race_results(flaky, market_ids, store, chunk_size=args.chunk_size, max_workers=args.workers,
+                                requests_per_second=1000, max_retries=1)
+    trading = FakeTrading(RecordedRaceCard(races, latency=args.latency))
+    second = ingest_race_results(trading, market_ids, store, chunk_size=args.chunk_size, max_workers=args.workers,
+                                 requests_per_second=1000)
+    assert len(store.read()) == len(columnar_df)
+    print(f"resume: first run ingested {first['ingested']} and failed {first['failed']} markets; "
+          f"rerun skipped {second['skipped']}, fetched {second['ingested']} in {trading.race_card.calls} calls")
@@ -0,0 +1,61 @@
+"""
+Cost of generating train/test splits on a multi-season history.
+
+Compares one DataCleaning.split_data call as it was originally written
+(string race ids, two isin scans, copied frames) with grouped_split and with
+generating every GroupKFoldRaces and WalkForward fold from splitter.py.
+
+Usage:
+    python benchmarks/bench_splits.py --races 200000
+"""
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+from sklearn.model_selection import train_test_split
+
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+
+from src.splitter import GroupKFoldRaces, WalkForward, grouped_split, month_codes, race_codes
+from synthetic import turf_frame
+
+
+def string_id_split(df, date_col='Race Time', course_col='Course', test_size=0.2):
+    """The original DataCleaning.split_data, kept here as the baseline."""
+    df['race_id'] = df[date_col].astype(str) + '_' + df[course_col].astype(str)
+    unique_races = df['race_id'].unique()
+    train_races, test_races = train_test_split(unique_races, test_size=test_size, shuffle=True, random_state=42)
+    train_data = df[df['race_id'].isin(train_races)].drop(columns=['race_id'])
+    test_data = df[df['race_id'].isin(test_races)].drop(columns=['race_id'])
+    return train_data, test_data
+
+
+def time_it(fn):
+    start = time.perf_counter()
+    fn()
+    return time.perf_counter() - start
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--races', type=int, default=200000)
+    args = parser.parse_args()
+
+    df = turf_frame(n_races=args.races)
+    print(f'{len(df):,} rows, {args.races:,} races')
+
+    results = [
+        ('split_data (string ids)', time_it(lambda: string_id_split(df.copy()))),
+        ('grouped_split', time_it(lambda: grouped_split(df, race_cols=['Race Time', 'Course']))),
+        ('GroupKFoldRaces, 5 folds', time_it(lambda: list(GroupKFoldRaces(5).split(df)))),
+        ('WalkForward, all months', time_it(lambda: list(WalkForward(min_train_periods=12).split(df)))),
+    ]
+    codes, months = race_codes(df), month_codes(df['Race Date'])
+    results += [
+        ('GroupKFoldRaces, codes given', time_it(lambda: list(GroupKFoldRaces(5).split(df, groups=codes)))),
+        ('WalkForward, months given', time_it(lambda: list(WalkForward(min_train_periods=12).split(df, groups=months)))),
+    ]
+    for name, seconds in results:
+        print(f'{name:<32}{seconds:>8.3f}s')
@@ -0,0 +1,113 @@
+"""
+Per-race latency of the scoring service.
+
+By default trains a small logistic regression on synthetic turf data, saves it
+with its FeaturePipeline to a temp dir and scores one race per request, both
+directly through ScoringEngine and through the FastAPI app in-process.
+Pass --url to load test a running server instead (the model it serves must use
+the DEFAULT_FEATURES columns).
+
+Usage:
+    python benchmarks/load_test_scoring.py --requests 2000
+    python benchmarks/load_test_scoring.py --url http://127.0.0.1:8000
+"""
+import argparse
+import json
+import os
+import sys
+import tempfile
+import time
+import urllib.request
+
+import numpy as np
+import pandas as pd
+from sklearn.linear_model import LogisticRegression
+
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+
+from src.feature_pipeline import FeaturePipeline
+from synthetic import turf_frame
+
+
+def train_model(directory):
+    train = turf_frame(n_races=2000)
+    pipeline = FeaturePipeline()
+    X = pipeline.fit_transform(train)
+    model = LogisticRegression(max_iter=1000).fit(X, train['Won (1=Won, 0=Lost)'])
+    model_path = os.path.join(directory, 'bench_model.pkl')
+    pipeline.save_with_model(model, model_path)
+    return model_path
+
+
+def race_payloads(n_races, seed=7):
+    df = turf_frame(n_races=n_races, seed=seed)
+    df['race_id'] = df.groupby(['Race Date', 'Race Time', 'Course'], sort=False).ngroup().astype(str)
+    df['selection_id'] = np.arange(len(df)) + 10_000_000
+    df['price'] = df['BF Decimal SP']
+    columns = ['selection_id', 'price'] + FeaturePipeline().feature_columns
+    payloads = []
+    for race_id, race in df.groupby('race_id', sort=False):
+        runners = race[columns].astype(object).where(race[columns].notna(), None).to_dict('records')
+        payloads.append({'races': [{'race_id': race_id, 'runners': runners}]})
+    return payloads
+
+
+def summarise(name, latencies):
+    ms = np.array(latencies) * 1000
+    print(f'{name:<12}{len(ms):>8}{ms.mean():>10.2f}{np.percentile(ms, 50):>10.2f}'
+          f'{np.percentile(ms, 99):>10.2f}{ms.max():>10.2f}')
+
+
+def run(send, payloads, n_requests, warmup=50):
+    for payload in payloads[:warmup]:
+        send(payload)
+    latencies = []
+    for i in range(n_requests):
+        payload = payloads[i % len(payloads)]
+        start = time.perf_counter()
+        send(payload)
+        latencies.append(time.perf_counter() - start)
+    return latencies
+
+
+def post(url):
+    def send(payload):
+        request = urllib.request.Request(url + '/score', data=json.dumps(payload).encode(),
+                                         headers={'Content-Type': 'application/json'})
+        with urllib.request.urlopen(request) as response:
+            return response.read()
+    return send
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--requests', type=int, default=1000)
+    parser.add_argument('--sims', type=int, default=2000)
+    parser.add_argument('--url')
+    args = parser.parse_args()
+
+    payloads = race_payloads(500)
+    print(f"{'path':<12}{'races':>8}{'mean ms':>10}{'p50 ms':>10}{'p99 ms':>10}{'max ms':>10}")
+
+    if args.url:
+        summarise('http', run(post(args.url), payloads, args.requests))
+        with urllib.request.urlopen(args.url + '/metrics') as response:
+            print('server metrics:', json.loads(response.read()))
+    else:
+        from fastapi.testclient import TestClient
+        from src.scoring_service import ScoringEngine, create_app
+
+        model_path = train_model(tempfile.mkdtemp())
+        engine = ScoringEngine.from_path(model_path, n_sims=args.sims)
+
+        def score_frame(payload):
+            race = payload['races'][0]
+            return engine.score(pd.DataFrame(race['runners']).assign(race_id=race['race_id']))
+
+        summarise('frame', run(score_frame, payloads, args.requests))
+        summarise('engine', run(lambda p: engine.score_races([(r['race_id'], r['runners']) for r in p['races']]),
+                                payloads, args.requests))
+
+        with TestClient(create_app(model_path, n_sims=args.sims)) as client:
+            summarise('app', run(lambda p: client.post('/score', json=p).raise_for_status(), payloads, args.requests))
+            print('server metrics:', client.get('/metrics').json())
@@ -0,0 +1,296 @@
+"""
+Offline benchmark suite for the hot paths of the pipeline.
+
+Every case builds its input from the synthetic generators (turf.csv-shaped
+race frames, Betfair-shaped catalogues/books and race result JSON) at a size
+controlled by --scale, then times the function under test over several
+repeats. Each run is appended to a JSON history together with the git commit
+and machine details, and compared with the previous run at the same scale so
+regressions show up between commits.
+
+Cases:
+    monte_carlo_sim          functions.monte_carlo_sim over a card of races
+    profit_calculation       functions.profit_calculation on a season of predictions
+    split_data               DataCleaning.split_data
+    normalize_columns        DataCleaning.normalize_columns
+    replace_nan              DataCleaning.replace_nan
+    market_runner            MorningPrice.market_runner on a day of catalogues
+    morning_price            MorningPrice.morning_price on a day of ex_all_offers books
+    join                     MorningPrice.join (including the daily CSV write)
+    fetch_race_results       race_results.flatten_results, the flattening behind fetch_race_results
+
+Usage:
+    python benchmarks/run_benchmarks.py                      # all cases, scale 1
+    python benchmarks/run_benchmarks.py --scale 5 --repeats 7
+    python benchmarks/run_benchmarks.py -k morning --no-save
+    python benchmarks/run_benchmarks.py --threshold 0.2 --fail-on-regression
+"""
+import argparse
+import contextlib
+import io
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+
+import numpy as np
+import pandas as pd
+
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+
+from synthetic import market_books, market_catalogues, race_result_json, turf_frame
+
+HISTORY = os.path.join(os.path.dirname(__file__), 'results', 'history.json')
+
+FEATURE_COLUMNS = ['PFR', 'HA Career Speed Rating', 'LTO Speed Rating', "Today's Going PRB", 'DSLR',
+                   'PRC Last Run', 'Main', 'OR', 'Weight (pounds)']
+NAN_COLUMNS = ['LTO Speed Rating Rank', 'PFR Rank', 'HA Career Speed Rating Rank', 'Evening Price']
+
+CASES = {}
+
+
+def case(name):
+    """
+    Register a benchmark case.
+
+    The decorated function takes the scale factor and returns (fn, rows):
+    a zero-argument callable to time and the number of rows it processes.
+    """
+    def decorator(setup):
+        CASES[name] = setup
+        return setup
+    return decorator
+
+
+def _races(scale):
+    return turf_frame(n_races=int(20000 * scale))
+
+
+@case('monte_carlo_sim')
+def _monte_carlo_sim(scale):
+    from src.functions import monte_carlo_sim
+
+    df = turf_frame(n_races=int(50 * scale), seed=7)
+    df['pred_prob'] = 1 / df['BF Decimal SP']
+    df['BF Decimal SP1'] = df['BF Decimal SP']
+    races = [race for _, race in df.groupby(['Race Date', 'Race Time', 'Course'], sort=False)]
+    return (lambda: [monte_carlo_sim(race, n_sims=10000) for race in races]), len(df)
+
+
+@case('profit_calculation')
+def _profit_calculation(scale):
+    from src.functions import profit_calculation
+
+    df = _races(scale)
+    df['BF Decimal SP1'] = df['BF Decimal SP']
+    df['model_preds'] = (np.random.default_rng(0).random(len(df)) < 0.2).astype(int)
+
+    def run():
+        # profit_calculation reports by printing
+        with contextlib.redirect_stdout(io.StringIO()):
+            profit_calculation(df)
+    return run, len(df)
+
+
+@case('split_data')
+def _split_data(scale):
+    from src.data_cleaning import DataCleaning
+
+    df = _races(scale)
+    return (lambda: DataCleaning.split_data(df)), len(df)
+
+
+@case('normalize_columns')
+def _normalize_columns(scale):
+    from src.data_cleaning import DataCleaning
+
+    df = _races(scale)
+    return (lambda: DataCleaning.normalize_columns(df, FEATURE_COLUMNS)), len(df)
+
+
+@case('replace_nan')
+def _replace_nan(scale):
+    from src.data_cleaning import DataCleaning
+
+    df = _races(scale)
+    return (lambda: DataCleaning.replace_nan(df, NAN_COLUMNS)), len(df)
+
+
+def _card(scale):
+    catalogues = market_catalogues(int(600 * scale))
+    books = market_books(catalogues, depth=10)
+    return catalogues, [books[i:i + 40] for i in range(0, len(books), 40)]
+
+
+@case('market_runner')
+def _market_runner(scale):
+    from src.morning_price import MorningPrice
+
+    catalogues, _ = _card(scale)
+    mp = MorningPrice(None, None)
+    return (lambda: mp.market_runner(catalogues)), sum(len(m.runners) for m in catalogues)
+
+
+@case('morning_price')
+def _morning_price(scale):
+    from src.morning_price import MorningPrice
+
+    _, book_lists = _card(scale)
+    mp = MorningPrice(None, None)
+    return (lambda: mp.morning_price(book_lists)), sum(len(b.runners) for books in book_lists for b in books)
+
+
+@case('join')
+def _join(scale):
+    from src.morning_price import MorningPrice
+
+    catalogues, book_lists = _card(scale)
+    mp = MorningPrice(None, None)
+    df1, df2 = mp.market_runner(catalogues), mp.morning_price(book_lists)
+    # join writes ../data/daily/<date>_data.csv relative to the working directory
+    workdir = os.path.join(tempfile.mkdtemp(), 'src')
+    os.makedirs(os.path.join(workdir, '..', 'data', 'daily'))
+
+    def run():
+        cwd = os.getcwd()
+        os.chdir(workdir)
+        try:
+            mp.join(df1, df2)
+        finally:
+            os.chdir(cwd)
+    return run, len(df1)
+
+
+@case('fetch_race_results')
+def _fetch_race_results(scale):
+    # the flattening fetch_race_results runs on the fetched JSON; the requests
+    # themselves sit behind a 5/s rate limiter and are covered by bench_race_results.py
+    from src.race_results import flatten_results
+
+    races = race_result_json(n_races=int(2000 * scale))
+    n_rows = sum(1 for race in races for runner in race['runners'] for sel in runner['selections']
+                 if sel['marketType'] == 'WIN' and 'bsp' in sel)
+    return (lambda: flatten_results(races)), n_rows
+
+
+def time_case(fn, repeats, warmup=1):
+    """
+    Returns:
+        dict: min, median and mean seconds over repeats, after warmup calls
+    """
+    for _ in range(warmup):
+        fn()
+    times = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        fn()
+        times.append(time.perf_counter() - start)
+    times = np.array(times)
+    return {'min_s': float(times.min()), 'median_s': float(np.median(times)), 'mean_s': float(times.mean()),
+            'repeats': repeats}
+
+
+def git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__)), check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def load_history(path):
+    if not os.path.exists(path):
+        return []
+    with open(path) as f:
+        return json.load(f)
+
+
+def save_history(path, history):
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    with open(path + '.tmp', 'w') as f:
+        json.dump(history, f, indent=2)
+    os.replace(path + '.tmp', path)
+
+
+def previous_run(history, scale):
+    """Most recent recorded run at the same scale, or None."""
+    for run in reversed(history):
+        if run.get('scale') == scale:
+            return run
+    return None
+
+
+def compare(results, baseline, threshold):
+    """
+    Median time of each case against the baseline run.
+
+    Returns:
+        pd.DataFrame: one row per case with median_s, baseline_s, change and
+            a regression flag where the slowdown exceeds threshold
+    """
+    rows = []
+    for name, result in results.items():
+        base = (baseline or {}).get('results', {}).get(name)
+        base_s = base['median_s'] if base else np.nan
+        change = result['median_s'] / base_s - 1 if base else np.nan
+        rows.append({'case': name, 'rows': result['rows'], 'median_s': result['median_s'],
+                     'rows_per_s': result['rows_per_s'], 'baseline_s': base_s, 'change': change,
+                     'regression': bool(base) and change > threshold})
+    return pd.DataFrame(rows)
+
+
+def run_suite(names, scale=1.0, repeats=5):
+    """
+    Build and time the named cases.
+
+    Returns:
+        dict: case name -> timings plus rows and rows_per_s
+    """
+    results = {}
+    for name in names:
+        fn, rows = CASES[name](scale)
+        result = time_case(fn, repeats)
+        result['rows'] = int(rows)
+        result['rows_per_s'] = rows / result['median_s'] if result['median_s'] > 0 else None
+        results[name] = result
+        print(f"{name:<22}{result['median_s']:>10.4f}s  {rows:>10,} rows", flush=True)
+    return results
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('-k', dest='keyword', help='only run cases whose name contains this')
+    parser.add_argument('--scale', type=float, default=1.0, help='multiplies the size of every synthetic input')
+    parser.add_argument('--repeats', type=int, default=5)
+    parser.add_argument('--history', default=HISTORY, help='JSON file the run is appended to')
+    parser.add_argument('--no-save', action='store_true', help='compare with history without recording this run')
+    parser.add_argument('--threshold', type=float, default=0.2, help='slowdown flagged as a regression')
+    parser.add_argument('--fail-on-regression', action='store_true', help='exit 1 if any case regressed')
+    args = parser.parse_args()
+
+    names = [name for name in CASES if not args.keyword or args.keyword in name]
+    results = run_suite(names, args.scale, args.repeats)
+
+    history = load_history(args.history)
+    report = compare(results, previous_run(history, args.scale), args.threshold)
+    print()
+    with pd.option_context('display.width', 120, 'display.float_format', '{:.4f}'.format):
+        print(report.to_string(index=False))
+
+    if not args.no_save:
+        history.append({
+            'timestamp': pd.Timestamp.now(tz='UTC').isoformat(),
+            'commit': git_commit(),
+            'python': platform.python_version(),
+            'machine': platform.platform(),
+            'cpus': os.cpu_count(),
+            'scale': args.scale,
+            'results': results,
+        })
+        save_history(args.history, history)
+
+    if args.fail_on_regression and report['regression'].any():
+        sys.exit(1)
@@ -0,0 +1,342 @@
+"""
+Synthetic data generators for running benchmarks without network or data files.
+"""
+import time
+from types import SimpleNamespace
+
+import numpy as np
+import pandas as pd
+
+COURSES = ['Ascot', 'Kempton', 'York', 'Ayr', 'Newmarket', 'Goodwood', 'Doncaster', 'Lingfield',
+           'Wolverhampton', 'Chelmsford City', 'Haydock', 'Sandown', 'Epsom', 'Newcastle', 'Musselburgh']
+GOINGS = ['Firm', 'Good To Firm', 'Good', 'Good To Soft', 'Soft', 'Heavy', 'Standard']
+RACE_TYPES = ['Flat', 'All Weather', 'Hurdle', 'Chase']
+RANK_COLUMNS = ['LTO Speed Rating Rank', 'PFR Rank', 'Main Rank', 'HA Career Speed Rating Rank',
+                'UR1 Rank', 'Main+Stats Rank', 'Weight Rank', 'Pace Rating Rank', 'Tissue Rating Rank', 'OR Rank']
+
+
+def turf_frame(n_races=20000, min_field=5, max_field=16, seed=42):
+    """
+    Frame shaped like ../data/turf.csv: one row per runner, races grouped by
+    Race Date / Race Time / Course, exactly one winner per race.
+
+    Args:
+        n_races (int): number of races
+        min_field (int): smallest field size
+        max_field (int): largest field size
+        seed (int): random seed
+
+    Returns:
+        pd.DataFrame: synthetic race history
+    """
+    rng = np.random.default_rng(seed)
+    sizes = rng.integers(min_field, max_field + 1, n_races)
+    n = int(sizes.sum())
+    race = np.repeat(np.arange(n_races), sizes)
+    starts = np.concatenate(([0], np.cumsum(sizes)[:-1]))
+    position_in_race = np.arange(n) - starts[race]
+
+    race_start = pd.Timestamp('2019-01-01 12:00') + pd.to_timedelta(
+        np.sort(rng.integers(0, 5 * 365 * 24 * 12, n_races)) * 5, unit='min')
+    course = rng.choice(COURSES, n_races)
+
+    # SP from a random strength per runner, normalised to a ~115% book per race
+    strength = rng.gamma(1.5, 1.0, n)
+    totals = np.bincount(race, weights=strength)
+    true_prob = strength / totals[race]
+    sp = np.round(np.clip(1 / (true_prob * 1.15), 1.01, 1000), 2)
+    winner = starts + np.array([rng.choice(s, p=true_prob[b:b + s]) for b, s in zip(starts, sizes)])
+    won = np.zeros(n, dtype=np.int64)
+    won[winner] = 1
+
+    df = pd.DataFrame({
+        'Race Date': race_start.strftime('%Y-%m-%d')[race],
+        'Race Time': race_start.strftime('%Y-%m-%d %H:%M')[race],
+        'Course': course[race],
+        'Distance (y)': rng.choice(np.arange(1000, 4001, 110), n_races)[race],
+        'Race Type': rng.choice(RACE_TYPES, n_races)[race],
+        'Going': rng.choice(GOINGS, n_races)[race],
+        'Class': rng.integers(1, 8, n_races)[race],
+        'Horse': ['Horse %d' % i for i in range(n)],
+        'Racecard No.': position_in_race + 1,
+        'Weight (pounds)': rng.integers(112, 168, n),
+        'Won (1=Won, 0=Lost)': won,
+        'BF Decimal SP': sp,
+        'SP Odds Decimal': np.round(sp * rng.uniform(0.8, 1.0, n), 2),
+        'Morning Price': np.round(sp * rng.uniform(0.7, 1.4, n), 2),
+        'Evening Price': np.round(sp * rng.uniform(0.7, 1.4, n), 2),
+        'Breakfast Price': np.round(sp * rng.uniform(0.7, 1.4, n), 2),
+        'Won P/L Before': np.round(rng.normal(0, 10, n), 2).astype(str),
+        "Today's Class Wins": rng.poisson(0.5, n),
+        "Today's Going Wins": rng.poisson(0.7, n),
+        'PFR': rng.uniform(0, 100, n),
+        'HA Career Speed Rating': rng.uniform(0, 100, n),
+        'LTO Speed Rating': rng.uniform(0, 100, n),
+        "Today's Going PRB": rng.uniform(0, 1, n),
+        'DSLR': rng.integers(5, 400, n),
+        'PRC Last Run': rng.uniform(0, 100, n),
+        'Main': rng.uniform(0, 100, n),
+        'OR': rng.integers(40, 120, n),
+    })
+    for col in RANK_COLUMNS:
+        df[col] = (position_in_race + rng.integers(0, 3, n)) % sizes[race] + 1
+
+    # sprinkle missing values like the real export
+    for col in ['LTO Speed Rating Rank', 'PFR Rank', 'HA Career Speed Rating Rank', 'Evening Price']:
+        df.loc[rng.random(n) < 0.05, col] = np.nan
+    df['Position'] = np.where(won == 1, 1, rng.integers(2, 20, n))
+    return df
+
+
+def race_result_json(n_races=100, min_field=5, max_field=16, seed=42, first_market=230000000):
+    """
+    Races in the shape returned by trading.race_card.get_race_result, each
+    with a WIN and a PLACE selection per runner and the odd non-runner.
+
+    Args:
+        n_races (int): number of races
+        min_field (int): smallest field size
+        max_field (int): largest field size
+        seed (int): random seed
+        first_market (int): numeric part of the first WIN market id
+
+    Returns:
+        list: race dicts
+    """
+    rng = np.random.default_rng(seed)
+    races = []
+    for r in range(n_races):
+        win_market, place_market = f'1.{first_market + 2 * r}', f'1.{first_market + 2 * r + 1}'
+        n = int(rng.integers(min_field, max_field + 1))
+        non_runner = rng.random(n) < 0.05
+        finish = rng.permutation(n) + 1
+        runners = []
+        for i in range(n):
+            selection_id = int(rng.integers(1_000_000, 60_000_000))
+            bsp = round(float(rng.uniform(1.5, 60)), 2)
+            runner = {
+                'horseId': f'{rng.integers(1_000_000, 3_000_000)}',
+                'saddleCloth': str(i + 1),
+                'isNonRunner': bool(non_runner[i]),
+                'selections': [
+                    {'marketType': 'WIN', 'marketId': win_market, 'selectionId': selection_id, 'bsp': bsp},
+                    {'marketType': 'PLACE', 'marketId': place_market, 'selectionId': selection_id,
+                     'bsp': round(1 + (bsp - 1) / 4, 2)},
+                ],
+            }
+            if not non_runner[i]:
+                runner['position'] = int(finish[i])
+            else:
+                for selection in runner['selections']:
+                    del selection['bsp']
+            runners.append(runner)
+        races.append({
+            'raceId': f'{win_market}.{r}',
+            'raceTitle': f'Race {r} Handicap',
+            'raceClassification': {'classification': f'Class {rng.integers(1, 8)}'},
+            'distance': int(rng.choice(np.arange(1000, 4001, 110))),
+            'course': {'countryCode': 'GB', 'name': str(rng.choice(COURSES)),
+                       'courseType': str(rng.choice(['Flat', 'Jumps'])),
+                       'surfaceType': str(rng.choice(['Turf', 'Polytrack', 'Tapeta']))},
+            'runners': runners,
+        })
+    return races
+
+
+class RecordedRaceCard:
+    """
+    Offline stand-in for trading.race_card serving recorded get_race_result JSON.
+
+    Args:
+        races (list): recorded race dicts
+        latency (float): seconds to sleep per call, to mimic the network
+        failure_rate (float): probability a call raises, to exercise retries
+        seed (int): random seed for failures
+    """
+    def __init__(self, races, latency=0.0, failure_rate=0.0, seed=0):
+        self.by_market = {}
+        for race in races:
+            for runner in race['runners']:
+                for selection in runner['selections']:
+                    self.by_market.setdefault(selection['marketId'], race)
+        self.latency = latency
+        self.failure_rate = failure_rate
+        self.rng = np.random.default_rng(seed)
+        self.calls = 0
+
+    def get_race_result(self, market_ids, **kwargs):
+        self.calls += 1
+        if self.latency:
+            time.sleep(self.latency)
+        if self.failure_rate and self.rng.random() < self.failure_rate:
+            raise ConnectionError('recorded race card: injected failure')
+        races = {id(race): race for race in (self.by_market.get(m) for m in market_ids) if race is not None}
+        return list(races.values())
+
+
+def market_catalogues(n_markets=60, min_field=5, max_field=16, start='2024-06-01 12:00', seed=42):
+    """
+    Objects shaped like betfairlightweight MarketCatalogue with the full
+    projection used by MorningPrice.markets, one WIN market every 5 minutes.
+
+    Returns:
+        list: SimpleNamespace market catalogues
+    """
+    rng = np.random.default_rng(seed)
+    start = pd.Timestamp(start)
+    catalogues = []
+    for m in range(n_markets):
+        venue = str(rng.choice(COURSES))
+        runners = [SimpleNamespace(selection_id=int(s), runner_name=f'Horse {m}-{i}', handicap=0.0, sort_priority=i + 1)
+                   for i, s in enumerate(1_000_000 + rng.choice(59_000_000, rng.integers(min_field, max_field + 1),
+                                                                replace=False))]
+        catalogues.append(SimpleNamespace(
+            market_id=f'1.{220000000 + m}',
+            market_name=f'{rng.integers(5, 16)}f Hcap',
+            market_start_time=(start + pd.Timedelta(minutes=5 * m)).to_pydatetime(),
+            total_matched=float(rng.uniform(0, 1e5)),
+            event=SimpleNamespace(id=str(30000000 + m // 8), name=f'{venue} 1st Jun', venue=venue, country_code='GB'),
+            event_type=SimpleNamespace(id='7', name='Horse Racing'),
+            competition=None,
+            description=SimpleNamespace(market_type='WIN', betting_type='ODDS', turn_in_play_enabled=True),
+            runners=runners,
+        ))
+    return catalogues
+
+
+def market_books(catalogues, depth=3, removed_rate=0.03, seed=42):
+    """
+    Objects shaped like betfairlightweight MarketBook for the given catalogues,
+    with EX_ALL_OFFERS style ladders of real PriceSize objects on the tick grid.
+
+    Returns:
+        list: SimpleNamespace market books
+    """
+    from betfairlightweight.resources.bettingresources import PriceSize
+    from src.ladder import TICKS
+
+    rng = np.random.default_rng(seed)
+    books = []
+    for market in catalogues:
+        runners = []
+        for runner in market.runners:
+            removed = rng.random() < removed_rate
+            # best back between 1.5 and 40 on the tick grid, levels one or two ticks apart
+            best = int(rng.integers(50, 270))
+            spread = int(rng.integers(1, 3))
+            back_ticks = best - np.cumsum(rng.integers(1, 3, depth)) + 1
+            lay_ticks = best + spread + np.cumsum(rng.integers(1, 3, depth)) - 1
+            best_back = float(TICKS[best])
+            back = [] if removed else [PriceSize(float(TICKS[t]), round(float(rng.uniform(2, 500)), 2))
+                                       for t in back_ticks if t >= 0]
+            lay = [] if removed else [PriceSize(float(TICKS[t]), round(float(rng.uniform(2, 500)), 2))
+                                      for t in lay_ticks if t < len(TICKS)]
+            runners.append(SimpleNamespace(
+                selection_id=runner.selection_id,
+                status='REMOVED' if removed else 'ACTIVE',
+                last_price_traded=None if removed else best_back,
+                total_matched=0.0 if removed else float(rng.uniform(0, 1e4)),
+                ex=SimpleNamespace(available_to_back=back, available_to_lay=lay, traded_volume=[]),
+            ))
+        books.append(SimpleNamespace(market_id=market.market_id, status='OPEN', inplay=False,
+                                     total_matched=float(sum(r.total_matched for r in runners)), runners=runners))
+    return books
+
+
+def race_results_for(catalogues, seed=42):
+    """
+    get_race_result style races for the WIN markets of market_catalogues(),
+    so results can be fetched for the same market and selection ids.
+
+    Returns:
+        list: race dicts
+    """
+    rng = np.random.default_rng(seed)
+    races = []
+    for r, market in enumerate(catalogues):
+        finish = rng.permutation(len(market.runners)) + 1
+        runners = [{
+            'horseId': f'{rng.integers(1_000_000, 3_000_000)}',
+            'saddleCloth': str(i + 1),
+            'isNonRunner': False,
+            'position': int(finish[i]),
+            'selections': [{'marketType': 'WIN', 'marketId': market.market_id, 'selectionId': runner.selection_id,
+                            'bsp': round(float(rng.uniform(1.5, 60)), 2)}],
+        } for i, runner in enumerate(market.runners)]
+        races.append({
+            'raceId': f'{market.market_id}.{r}',
+            'raceTitle': market.market_name,
+            'raceClassification': {'classification': f'Class {rng.integers(1, 8)}'},
+            'distance': int(rng.choice(np.arange(1000, 4001, 110))),
+            'course': {'countryCode': 'GB', 'name': market.event.venue, 'courseType': 'Flat',
+                       'surfaceType': 'Turf'},
+            'runners': runners,
+        })
+    return races
+
+
+class FakeBetting:
+    """
+    Offline stand-in for trading.betting serving synthetic catalogues and books.
+
+    Honours the marketIds and marketStartTime parts of a market_filter and
+    returns only start times for a MARKET_START_TIME-only projection. Counts
+    requests and the markets returned with a full projection.
+
+    Args:
+        catalogues (list): market_catalogues() output
+        books (list): market_books() output, generated from catalogues if None
+        latency (float): seconds to sleep per request
+        market_latency (float): extra seconds per market returned with the
+            full projection, standing in for the larger payload
+        failure_rate (float): probability a list_market_book call raises, to exercise retries
+        seed (int): random seed for failures
+    """
+    def __init__(self, catalogues, books=None, latency=0.0, market_latency=0.0, failure_rate=0.0, seed=0):
+        self.catalogues = {m.market_id: m for m in catalogues}
+        self.books = {b.market_id: b for b in (books if books is not None else market_books(catalogues))}
+        self.latency = latency
+        self.market_latency = market_latency
+        self.failure_rate = failure_rate
+        self.rng = np.random.default_rng(seed)
+        self.calls = {'list_market_catalogue': 0, 'list_market_book': 0}
+        self.full_markets = 0
+
+    def list_market_catalogue(self, filter=None, market_projection=None, max_results=1, **kwargs):
+        self.calls['list_market_catalogue'] += 1
+        if self.latency:
+            time.sleep(self.latency)
+        filter = filter or {}
+        markets = list(self.catalogues.values())
+        if 'marketIds' in filter:
+            markets = [self.catalogues[m] for m in filter['marketIds'] if m in self.catalogues]
+        window = filter.get('marketStartTime')
+        if window:
+            lo = pd.Timestamp(window['from']).tz_localize(None) if 'from' in window else None
+            hi = pd.Timestamp(window['to']).tz_localize(None) if 'to' in window else None
+            markets = [m for m in markets
+                       if (lo is None or m.market_start_time >= lo) and (hi is None or m.market_start_time <= hi)]
+        markets = markets[:max_results]
+        if set(market_projection or ()) <= {'MARKET_START_TIME'}:
+            return [SimpleNamespace(market_id=m.market_id, market_name=m.market_name,
+                                    market_start_time=m.market_start_time, total_matched=m.total_matched)
+                    for m in markets]
+        self.full_markets += len(markets)
+        if self.market_latency:
+            time.sleep(self.market_latency * len(markets))
+        return markets
+
+    def list_market_book(self, market_ids, price_projection=None, **kwargs):
+        self.calls['list_market_book'] += 1
+        if self.latency:
+            time.sleep(self.latency)
+        if self.failure_rate and self.rng.random() < self.failure_rate:
+            raise ConnectionError('fake betting: injected failure')
+        return [self.books[m] for m in market_ids if m in self.books]
+
+
+class FakeTrading:
+    """Minimal trading client exposing recorded or synthetic endpoints."""
+    def __init__(self, race_card=None, betting=None):
+        self.race_card = race_card
+        self.betting = betting
@@ -0,0 +1,32 @@
+"""
+Horse racing pipeline modules as a lazily loaded package.
+
+The modules import each other relatively (e.g. `from .market_fetcher import
+chunked`) and each one is exposed as an attribute that is only imported on
+first access, so `import src` costs nothing beyond the standard library:
+
+    import src
+    src.functions.calculate_lay_stakes_multiple_runners(bets, odds)
+    from src import morning_price, race_results
+    from src.race_cube import RaceCube
+
+Notebooks and benchmarks put the repository root on sys.path and import
+through the package. The daily jobs have a command line entry point:
+
+    python -m src.cli --help
+"""
+import importlib
+import pkgutil
+
+__all__ = sorted(module.name for module in pkgutil.iter_modules(__path__) if not module.name.startswith('_'))
+
+
+def __getattr__(name):
+    if name not in __all__:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    # importing a submodule also binds it on the package, so this runs once per name
+    return importlib.import_module(f'.{name}', __name__)
+
+
+def __dir__():
+    return sorted(set(globals()) | set(__all__))
@@ -0,0 +1,217 @@
+import glob
+import json
+import os
+from datetime import datetime, timedelta
+from itertools import product
+
+import numpy as np
+import pandas as pd
+
+from .market_stream import LadderCache, _open_recording
+
+
+def load_daily_snapshots(directory='../data/daily'):
+    """
+    Load the daily CSVs written by MorningPrice.join into one frame.
+
+    Args:
+        directory (str): folder holding <date>_data.csv files
+
+    Returns:
+        pd.DataFrame: all snapshots with a 'snapshot_date' column
+    """
+    frames = []
+    for path in sorted(glob.glob(os.path.join(directory, '*_data.csv'))):
+        df = pd.read_csv(path, parse_dates=['market_start_time'])
+        df['snapshot_date'] = os.path.basename(path).split('_')[0]
+        frames.append(df)
+    if not frames:
+        return pd.DataFrame()
+    return pd.concat(frames, ignore_index=True)
+
+
+def stream_prices_before_off(file_path, minutes_before=5):
+    """
+    Level-1 prices of every market in a recorded stream file as they stood
+    `minutes_before` minutes before the scheduled off.
+
+    Args:
+        file_path (str): recorded stream file (see market_stream.replay)
+        minutes_before (float): how long before marketTime to take the snapshot
+
+    Returns:
+        pd.DataFrame: marketId, selectionId, backPrice, backSize, layPrice, laySize
+            for each market that reached its cutoff in the recording
+    """
+    cache = LadderCache(depth=1)
+    cutoffs = {}
+    captured = {}
+    offset = timedelta(minutes=minutes_before)
+
+    with _open_recording(file_path) as f:
+        for line in f:
+            if not line.strip():
+                continue
+            message = json.loads(line)
+            publish_time = message.get('pt', 0)
+            for mc in message.get('mc', []):
+                market_id = mc['id']
+                definition = mc.get('marketDefinition')
+                if definition and 'marketTime' in definition and market_id not in cutoffs:
+                    market_time = datetime.fromisoformat(definition['marketTime'].replace('Z', '+00:00'))
+                    cutoffs[market_id] = (market_time - offset).timestamp() * 1000
+                # capture the book before the first update at or after the cutoff
+                if market_id not in captured and market_id in cutoffs and publish_time >= cutoffs[market_id]:
+                    captured[market_id] = cache.best_offer_rows(market_id) or []
+            cache.on_message(message)
+
+    rows = [row for market_rows in captured.values() for row in market_rows]
+    return pd.DataFrame(rows, columns=['marketId', 'selectionId', 'backPrice', 'backSize', 'layPrice', 'laySize'])
+
+
+def _stakes(side, staking, price, prob, stake, bank, kelly_fraction):
+    """Backer's stake for every runner under the given staking rule."""
+    if staking == 'level':
+        return np.full(len(price), float(stake))
+    if staking == 'kelly':
+        with np.errstate(divide='ignore', invalid='ignore'):
+            if side == 'back':
+                fraction = (prob * price - 1) / (price - 1)
+                stakes = bank * kelly_fraction * fraction
+            else:
+                # laying at price is backing "not win" at odds 1 / (price - 1)
+                fraction = 1 - prob * price
+                liability = bank * kelly_fraction * fraction
+                stakes = liability / (price - 1)
+        return np.nan_to_num(np.clip(stakes, 0, None))
+    raise ValueError(f'Unknown staking rule: {staking}')
+
+
+def backtest(df, thresholds, price_cols=('BF Decimal SP1',), sides=('back',), rules=('prob',),
+             staking=('level',), stake=1, bank=100, kelly_fraction=0.25, commission=0.05,
+             prob_col='pred_prob', won_col='Won (1=Won, 0=Lost)',
+             race_cols=('Race Date', 'Race Time', 'Course'), return_equity=False, block_size=16):
+    """
+    Evaluate back/lay strategies over every race and parameter combination at once.
+
+    Each combination of price column, side, selection rule and staking rule is
+    evaluated for all thresholds with broadcast (thresholds x runners) arrays.
+    P&L is netted per race before commission, as the exchange charges it on net
+    market winnings, and the running P&L and drawdown are cumulative sums over
+    races in chronological order.
+
+    Selection rules:
+        'prob': bet when the model probability >= threshold (back) or
+            <= threshold (lay), as with the 0.53 cut-off in main.ipynb
+        'value': bet when the edge is above threshold, where the back edge is
+            prob * price - 1 and the lay edge is 1 - prob * price
+
+    Args:
+        df (pd.DataFrame): one row per runner with model probabilities, results
+            and one or more price columns
+        thresholds (list): threshold values to sweep
+        price_cols (tuple): price columns to bet at, e.g. SP, 'Morning Price' or
+            a T-minus price merged from stream_prices_before_off. Defaults to
+            'BF Decimal SP1', the raw SP the notebooks keep next to the
+            normalised 'BF Decimal SP'
+        sides (tuple): 'back' and/or 'lay'
+        rules (tuple): 'prob' and/or 'value'
+        staking (tuple): 'level' (fixed backer's stake) and/or 'kelly'
+        stake (float): level stake
+        bank (float): bank used for kelly sizing
+        kelly_fraction (float): fraction of full kelly to stake
+        commission (float): exchange commission on net race winnings
+        prob_col (str): column with the model win probability
+        won_col (str): column with 1 for the winner, 0 otherwise
+        race_cols (tuple): columns identifying a race, in chronological sort order
+        return_equity (bool): also return the running P&L per strategy
+        block_size (int): thresholds evaluated per broadcast block
+
+    Returns:
+        pd.DataFrame: one row per strategy with bets, winners, staked, pnl, roi,
+            strike_rate and max_drawdown; with return_equity a tuple of
+            (summary, equity) where equity is a (strategies x races) array
+
+    Example usage:
+        summary = backtest(test_data, thresholds=np.arange(0.4, 0.7, 0.01))
+    """
+    race_cols = list(race_cols)
+    if df.empty:
+        raise ValueError('Cannot backtest an empty frame')
+    for side in sides:
+        if side not in ('back', 'lay'):
+            raise ValueError(f"Unknown side: {side!r}, expected 'back' or 'lay'")
+    ordered = df.sort_values(race_cols, kind='stable')
+    codes = ordered.groupby(race_cols, sort=False).ngroup().to_numpy()
+    race_starts = np.flatnonzero(np.r_[True, codes[1:] != codes[:-1]])
+
+    prob = ordered[prob_col].to_numpy(dtype=np.float64)
+    won = ordered[won_col].to_numpy() == 1
+    thresholds = np.asarray(thresholds, dtype=np.float64)
+
+    summaries = []
+    curves = []
+    for price_col, side, rule, stake_rule in product(price_cols, sides, rules, staking):
+        price = ordered[price_col].to_numpy(dtype=np.float64)
+        valid = np.isfinite(price) & (price > 1) & np.isfinite(prob)
+
+        if rule == 'prob':
+            score = prob
+        elif rule == 'value':
+            score = prob * price - 1 if side == 'back' else 1 - prob * price
+        else:
+            raise ValueError(f'Unknown selection rule: {rule}')
+
+        stakes = _stakes(side, stake_rule, price, prob, stake, bank, kelly_fraction)
+        valid &= stakes > 0
+        if side == 'back':
+            outcome = np.where(won, stakes * (price - 1), -stakes)
+            risked = stakes
+            successful = won
+        else:
+            outcome = np.where(won, -stakes * (price - 1), stakes)
+            risked = stakes * (price - 1)
+            successful = ~won
+        outcome = np.nan_to_num(outcome)
+        risked = np.nan_to_num(risked)
+
+        # thresholds are processed in blocks so memory stays at block x runners
+        for lo in range(0, len(thresholds), block_size):
+            block = thresholds[lo:lo + block_size]
+            if rule == 'prob' and side == 'lay':
+                bets = (score[None, :] <= block[:, None]) & valid
+            else:
+                bets = (score[None, :] >= block[:, None]) & valid
+
+            race_pnl = np.add.reduceat(np.where(bets, outcome, 0.0), race_starts, axis=1)
+            race_pnl = np.where(race_pnl > 0, race_pnl * (1 - commission), race_pnl)
+
+            equity = np.cumsum(race_pnl, axis=1)
+            drawdown = np.maximum.accumulate(np.maximum(equity, 0), axis=1) - equity
+
+            n_bets = bets.sum(axis=1)
+            winners = (bets & successful).sum(axis=1)
+            staked = np.where(bets, risked, 0.0).sum(axis=1)
+            pnl = equity[:, -1]
+
+            summaries.append(pd.DataFrame({
+                'price_col': price_col,
+                'side': side,
+                'rule': rule,
+                'staking': stake_rule,
+                'threshold': block,
+                'bets': n_bets,
+                'winners': winners,
+                'staked': staked,
+                'pnl': pnl,
+                'roi': np.divide(pnl, staked, out=np.zeros_like(pnl), where=staked > 0),
+                'strike_rate': np.divide(winners, n_bets, out=np.zeros(len(block)), where=n_bets > 0),
+                'max_drawdown': drawdown.max(axis=1),
+            }))
+            if return_equity:
+                curves.append(equity)
+
+    summary = pd.concat(summaries, ignore_index=True)
+    if return_equity:
+        return summary, np.vstack(curves)
+    return summary
@@ -1,7 +1,16 @@
-import betfairlightweight
-import pandas as pd
 import logging
 
+from .lazy import lazy_import
+from .market_fetcher import fetch_market_books
+from .profiling import count_api, profiled
+
+betfairlightweight = lazy_import('betfairlightweight')
+pd = lazy_import('pandas')
+
+# catalogue cache columns mapped onto the list_market_horse frame
+CACHE_COLUMNS = {'market_id': 'marketId', 'market_name': 'marketName', 'event_name': 'event',
+                 'selection_id': 'selectionId', 'horse_name': 'runnerName', 'market_start_time': 'marketStartTime'}
+
 class Betfair:
     def __init__(self, username, password, app_key, interactive_login=True):
         self.username = username
@@ -20,16 +29,30 @@ class Betfair:
         except Exception as e:
             raise Exception(f"Error during Betfair connection: {str(e)}")
 
+    @profiled('betfair.account_balance')
     def account_balance(self):
         try:
+            count_api()
             account_funds = self.client.get_account_funds()
             return account_funds.available_to_bet_balance
         except Exception as e:
             logging.error(f'Failed to retrieve account balance: {e}')
             return 0
 
-    def list_market_horse(self, start_time, end_time):
+    @profiled('betfair.list_market_horse', rows=len)
+    def list_market_horse(self, start_time, end_time, cache=None):
+        """
+        Runners of GB WIN horse racing markets starting in the window.
+
+        With a catalogue_cache.CatalogueCache only new or changed markets are
+        downloaded and non-runners are left out.
+        """
         try:
+            if cache is not None:
+                cache.refresh(self.client, start_time, end_time)
+                df = cache.select(start_time, end_time)
+                return df.rename(columns=CACHE_COLUMNS)[list(CACHE_COLUMNS.values())].reset_index(drop=True)
+
             market_filter = betfairlightweight.filters.market_filter(
                 event_type_ids=['7'],
                 market_countries=['GB'],
@@ -37,6 +60,7 @@ class Betfair:
                 market_start_time={'from': start_time, 'to': end_time}
             )
 
+            count_api()
             market_catalogues = self.client.betting.list_market_catalogue(
                 filter=market_filter,
                 market_projection=[
@@ -57,41 +81,45 @@ class Betfair:
                         'marketId': market.market_id,
                         'marketName': market.market_name,
                         'event': market.event.name,
-                        'runnerid': runner.selection_id,
+                        'selectionId': runner.selection_id,
                         'runnerName': runner.runner_name,
                         'marketStartTime': market.market_start_time
                     })
 
-            df = pd.DataFrame(data)
-            df.to_csv('test1.csv', index=False)
+            return pd.DataFrame(data)
 
         except Exception as e:
             logging.error(f'Failed to list market: {e}')
             return pd.DataFrame()
 
+    @staticmethod
+    def best_offer_rows(market_book):
+        """Level-1 back/lay rows for every runner in a market book."""
+        extracted_data = []
+        for runner in market_book.runners:
+            first_back_offer = runner.ex.available_to_back[0] if runner.ex.available_to_back else {'price': None, 'size': None}
+            first_lay_offer = runner.ex.available_to_lay[0] if runner.ex.available_to_lay else {'price': None, 'size': None}
+
+            extracted_data.append({
+                'marketId': market_book.market_id,
+                'selectionId': runner.selection_id,
+                'backPrice': first_back_offer['price'],
+                'backSize': first_back_offer['size'],
+                'layPrice': first_lay_offer['price'],
+                'laySize': first_lay_offer['size']
+            })
+        return extracted_data
+
+    @profiled('betfair.get_market_price_data')
     def get_market_price_data(self, market_id):
         try:
+            count_api()
             price_data = self.client.betting.list_market_book(
                 market_ids=[market_id],
                 price_projection=betfairlightweight.filters.price_projection(price_data=['EX_BEST_OFFERS'])
             )
             if price_data:
-                market_book = price_data[0]
-                extracted_data = []
-
-                for runner in market_book.runners:
-                    first_back_offer = runner.ex.available_to_back[0] if runner.ex.available_to_back else {'price': None, 'size': None}
-                    first_lay_offer = runner.ex.available_to_lay[0] if runner.ex.available_to_lay else {'price': None, 'size': None}
-
-                    extracted_data.append({
-                        'marketId': market_id,
-                        'selectionId': runner.selection_id,
-                        'backPrice': first_back_offer['price'],
-                        'backSize': first_back_offer['size'],
-                        'layPrice': first_lay_offer['price'],
-                        'laySize': first_lay_offer['size']
-                    })
-                return extracted_data
+                return self.best_offer_rows(price_data[0])
             else:
                 logging.warning(f'No price data available for market {market_id}')
                 return None
@@ -99,23 +127,42 @@ class Betfair:
             logging.error(f'Failed to get market price data: {e}')
             return None
 
-    def join_market_and_price(self, start_time, end_time):
+    @profiled('betfair.get_market_prices', rows=len)
+    def get_market_prices(self, market_ids, max_workers=4, requests_per_second=10):
+        """
+        Best back/lay prices for many markets at once.
+
+        Market ids are packed into weight-limited EX_BEST_OFFERS batches (40
+        markets per request) and fetched concurrently.
+
+        Returns:
+            pd.DataFrame: one row per runner with the same columns as get_market_price_data
+        """
+        market_books, stats = fetch_market_books(
+            self.client, market_ids,
+            price_data=('EX_BEST_OFFERS',),
+            max_workers=max_workers,
+            requests_per_second=requests_per_second,
+        )
+        logging.info(f'Fetched prices: {stats}')
+
+        rows = [row for books in market_books for book in books for row in self.best_offer_rows(book)]
+        return pd.DataFrame(rows, columns=['marketId', 'selectionId', 'backPrice', 'backSize', 'layPrice', 'laySize'])
+
+    def join_market_and_price(self, start_time, end_time, max_workers=4):
         market_data = self.list_market_horse(start_time, end_time)
 
         if market_data is not None and not market_data.empty:
             unique_market_ids = market_data['marketId'].unique().tolist()
 
-            all_price_data = []
-            for market_id in unique_market_ids:
-                price_data = self.get_market_price_data(market_id)
-
-                if price_data:
-                    all_price_data.extend(price_data)
+            price_df = self.get_market_prices(unique_market_ids, max_workers=max_workers)
 
-            if all_price_data:
-                price_df = pd.DataFrame(all_price_data)
-                combined_df = pd.merge(market_data, price_df, on='marketId')
+            if not price_df.empty:
+                combined_df = pd.merge(market_data, price_df, on=['marketId', 'selectionId'], how='left')
                 return combined_df
+            else:
+                logging.warning('No price data available.')
+                return market_data
         else:
             logging.warning('No market data available.')
             return None
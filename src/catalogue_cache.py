@@ -0,0 +1,265 @@
+"""
+Locally persisted market catalogue with incremental intraday refresh.
+
+The first refresh downloads the full catalogue (runner descriptions, event,
+market description) once. Later refreshes only:
+    - probe the window with a MARKET_START_TIME-only catalogue request, which
+      returns market ids and start times at minimal weight
+    - fetch full projections for markets that are new or whose cached entry
+      is older than the TTL
+    - move start times of delayed markets in place
+    - pick up non-runners from price-less market books (weight 2 per market)
+    - evict markets that left the window or started long ago
+Only the rows of affected markets are touched; the runner frame is indexed on
+(market_id, selection_id) and persisted to Parquet between runs. The markets a
+refresh changed or evicted are kept on the cache, so MorningPrice.refresh_joined
+can update a joined snapshot in place instead of rebuilding it.
+
+Example usage:
+    cache = CatalogueCache('../data/catalogue.parquet')
+    stats = cache.refresh(trading, start_time, end_time)
+    df1 = cache.runners(start_time, end_time)   # same columns as MorningPrice.market_runner
+"""
+import logging
+import os
+import time
+from datetime import timedelta
+
+import numpy as np
+
+from .lazy import lazy_import
+from .market_fetcher import chunked, fetch_market_books
+from .profiling import count_api, profiled
+
+betfairlightweight = lazy_import('betfairlightweight')
+pd = lazy_import('pandas')
+
+FULL_PROJECTION = ['RUNNER_DESCRIPTION', 'RUNNER_METADATA', 'COMPETITION', 'EVENT', 'EVENT_TYPE',
+                   'MARKET_DESCRIPTION', 'MARKET_START_TIME']
+PROBE_PROJECTION = ['MARKET_START_TIME']
+
+COLUMNS = ['market_id', 'selection_id', 'market_name', 'market_start_time', 'venue', 'event_name',
+           'market_type', 'horse_name', 'runner_status', 'fetched_at']
+
+MARKET_RUNNER_COLUMNS = ['market_id', 'market_start_time', 'venue', 'market_type', 'selection_id', 'horse_name']
+
+
+def _utc(value):
+    ts = pd.Timestamp(value)
+    return ts.tz_localize('UTC') if ts.tzinfo is None else ts.tz_convert('UTC')
+
+
+def catalogue_frame(catalogues, fetched_at):
+    """
+    Runner rows for full-projection MarketCatalogue objects, built column by column.
+
+    Args:
+        catalogues (list): MarketCatalogue objects
+        fetched_at (pd.Timestamp): when they were downloaded
+
+    Returns:
+        pd.DataFrame: COLUMNS, indexed by (market_id, selection_id)
+    """
+    counts = [len(market.runners) for market in catalogues]
+    market_cols = {
+        'market_id': [m.market_id for m in catalogues],
+        'market_name': [m.market_name for m in catalogues],
+        'market_start_time': [m.market_start_time for m in catalogues],
+        'venue': [m.event.venue if m.event else 'Unknown Location' for m in catalogues],
+        'event_name': [m.event.name if m.event else None for m in catalogues],
+        'market_type': [m.description.market_type if m.description else None for m in catalogues],
+    }
+    df = pd.DataFrame({col: np.repeat(np.array(values, dtype=object), counts) for col, values in market_cols.items()})
+    df['selection_id'] = np.fromiter((r.selection_id for m in catalogues for r in m.runners),
+                                     dtype=np.int64, count=sum(counts))
+    df['horse_name'] = [r.runner_name for m in catalogues for r in m.runners]
+    df['runner_status'] = 'ACTIVE'
+    df['fetched_at'] = fetched_at
+    df['market_start_time'] = pd.to_datetime(df['market_start_time'], utc=True)
+    return df[COLUMNS].set_index(['market_id', 'selection_id'])
+
+
+class CatalogueCache:
+    """
+    Market catalogue cache with TTL, eviction and Parquet persistence.
+
+    Args:
+        path (str): Parquet file the cache is persisted to, None to keep it in memory
+        ttl (timedelta): age after which a cached market is downloaded again
+        evict_after (timedelta): drop markets that started longer ago than this
+        chunk_size (int): markets per full-projection catalogue request
+        market_filter (dict): extra market_filter arguments, defaults to GB horse racing WIN markets
+    """
+    def __init__(self, path='../data/catalogue.parquet', ttl=timedelta(hours=6), evict_after=timedelta(hours=12),
+                 chunk_size=100, market_filter=None):
+        self.path = path
+        self.ttl = pd.Timedelta(ttl)
+        self.evict_after = pd.Timedelta(evict_after)
+        self.chunk_size = chunk_size
+        self.market_filter = market_filter or {'event_type_ids': ['7'], 'market_countries': ['GB'],
+                                               'market_type_codes': ['WIN']}
+        self.frame = pd.DataFrame(columns=COLUMNS).set_index(['market_id', 'selection_id'])
+        self.last_refresh = {}
+        # markets whose runner rows the last refresh added, replaced, moved or
+        # marked removed, and markets it dropped
+        self.changed_markets = pd.Index([], name='market_id')
+        self.evicted_markets = pd.Index([], name='market_id')
+        if path and os.path.exists(path):
+            self.load()
+
+    def load(self):
+        self.frame = pd.read_parquet(self.path)
+
+    def save(self):
+        if self.path:
+            os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+            self.frame.to_parquet(self.path + '.tmp')
+            os.replace(self.path + '.tmp', self.path)
+
+    def _catalogue(self, trading, projection, start_time=None, end_time=None, market_ids=None):
+        kwargs = dict(self.market_filter)
+        if market_ids is not None:
+            kwargs['market_ids'] = list(market_ids)
+        else:
+            kwargs['market_start_time'] = {'from': _utc(start_time).isoformat(), 'to': _utc(end_time).isoformat()}
+        count_api()
+        return trading.betting.list_market_catalogue(
+            filter=betfairlightweight.filters.market_filter(**kwargs),
+            market_projection=projection,
+            max_results=1000,
+        )
+
+    def _evict(self, market_ids):
+        if len(market_ids):
+            self.frame = self.frame.drop(index=list(market_ids), level='market_id')
+
+    @profiled('catalogue_cache.refresh')
+    def refresh(self, trading, start_time, end_time, check_removals=True, max_workers=4):
+        """
+        Bring the cache up to date for markets starting in [start_time, end_time].
+
+        Args:
+            trading (betfairlightweight.APIClient): logged in client
+            start_time (datetime): window start
+            end_time (datetime): window end
+            check_removals (bool): fetch price-less market books to mark non-runners
+            max_workers (int): concurrent market book requests for the removal check
+
+        Returns:
+            dict: counts of probed/new/refetched/moved/evicted markets, removed
+                runners, API requests made and elapsed seconds
+        """
+        start = time.perf_counter()
+        now = pd.Timestamp.now(tz='UTC')
+        requests = 1
+        probe = self._catalogue(trading, PROBE_PROJECTION, start_time, end_time)
+        live = pd.Series({m.market_id: m.market_start_time for m in probe}, dtype=object)
+        live = pd.to_datetime(live, utc=True) if len(live) else pd.Series(dtype='datetime64[ns, UTC]')
+
+        cached = self.frame.groupby(level='market_id', sort=False).agg(
+            market_start_time=('market_start_time', 'first'), fetched_at=('fetched_at', 'first'))
+
+        # markets in the window that no longer appear, or that started long ago
+        window = cached[(cached['market_start_time'] >= _utc(start_time)) & (cached['market_start_time'] <= _utc(end_time))]
+        gone = window.index.difference(live.index)
+        stale = cached.index[cached['market_start_time'] < now - self.evict_after]
+        evicted = gone.union(stale)
+        self._evict(evicted)
+
+        expired = cached.index[cached['fetched_at'] < now - self.ttl].intersection(live.index).difference(evicted)
+        new = live.index.difference(cached.index)
+        to_fetch = new.union(expired)
+        if len(expired):
+            self._evict(expired)
+        frames = []
+        for chunk in chunked(list(to_fetch), self.chunk_size):
+            frames.append(catalogue_frame(self._catalogue(trading, FULL_PROJECTION, market_ids=chunk), now))
+            requests += 1
+        if frames:
+            self.frame = pd.concat([self.frame] + frames) if len(self.frame) else pd.concat(frames)
+
+        # delayed races: update start time in place
+        kept = live.index.intersection(cached.index).difference(to_fetch)
+        moved = kept[(cached.loc[kept, 'market_start_time'] != live[kept]).to_numpy()]
+        if len(moved):
+            rows = self.frame.index.get_level_values('market_id').isin(moved)
+            self.frame.loc[rows, 'market_start_time'] = live.reindex(
+                self.frame.index.get_level_values('market_id')[rows]).to_numpy()
+
+        removed = 0
+        removed_markets = pd.Index([])
+        if check_removals and len(live):
+            removed, removed_markets, n_requests = self._mark_removed(trading, list(live.index), max_workers)
+            requests += n_requests
+        self.changed_markets = to_fetch.union(moved).union(removed_markets).rename('market_id')
+        self.evicted_markets = evicted.difference(to_fetch).rename('market_id')
+
+        if len(evicted) or len(to_fetch) or len(moved) or removed:
+            self.save()
+        self.last_refresh = {
+            'probed': len(live), 'new': len(new), 'refetched': len(expired), 'moved': len(moved),
+            'evicted': len(evicted), 'removed_runners': removed, 'requests': requests,
+            'elapsed_s': round(time.perf_counter() - start, 4),
+        }
+        logging.info(f'Catalogue refresh: {self.last_refresh}')
+        return self.last_refresh
+
+    def _mark_removed(self, trading, market_ids, max_workers):
+        """
+        Set runner_status to REMOVED for non-runners in the given markets.
+
+        Returns:
+            tuple: (runners newly marked, their markets, market book requests made)
+        """
+        batches, stats = fetch_market_books(trading, market_ids, price_data=(), max_workers=max_workers)
+        removed_keys = [(book.market_id, runner.selection_id)
+                        for batch in batches for book in batch for runner in book.runners
+                        if runner.status == 'REMOVED']
+        index = pd.MultiIndex.from_tuples(removed_keys, names=self.frame.index.names) if removed_keys else None
+        newly = pd.MultiIndex.from_arrays([[], []], names=self.frame.index.names)
+        if index is not None:
+            index = index.intersection(self.frame.index)
+            newly = index[(self.frame.loc[index, 'runner_status'] != 'REMOVED').to_numpy()]
+            self.frame.loc[newly, 'runner_status'] = 'REMOVED'
+        return len(newly), newly.get_level_values('market_id').unique(), stats['batches']
+
+    def select(self, start_time=None, end_time=None, include_removed=False, market_ids=None):
+        """
+        Cached runner rows for markets starting in the window.
+
+        Args:
+            start_time (datetime): window start, None for no bound
+            end_time (datetime): window end, None for no bound
+            include_removed (bool): keep non-runners (with runner_status REMOVED)
+            market_ids (list): only these markets, None for all
+
+        Returns:
+            pd.DataFrame: all COLUMNS, start times in UTC
+        """
+        df = self.frame
+        if market_ids is not None:
+            markets = df.index.levels[0]
+            df = df[np.isin(df.index.codes[0], markets.get_indexer(markets.intersection(market_ids)))]
+        mask = np.ones(len(df), dtype=bool)
+        if start_time is not None:
+            mask &= (df['market_start_time'] >= _utc(start_time)).to_numpy()
+        if end_time is not None:
+            mask &= (df['market_start_time'] <= _utc(end_time)).to_numpy()
+        if not include_removed:
+            mask &= (df['runner_status'] != 'REMOVED').to_numpy()
+        return df[mask].reset_index()
+
+    def runners(self, start_time=None, end_time=None, include_removed=False, market_ids=None):
+        """
+        Cached runners in the window, shaped like MorningPrice.market_runner.
+        See select for the arguments.
+
+        Returns:
+            pd.DataFrame: market_id, market_start_time, venue, market_type,
+                selection_id, horse_name (plus runner_status if include_removed)
+        """
+        df = self.select(start_time, end_time, include_removed, market_ids)
+        # market_runner returns naive UTC start times, as the API objects carry them
+        df['market_start_time'] = df['market_start_time'].dt.tz_localize(None)
+        columns = MARKET_RUNNER_COLUMNS + (['runner_status'] if include_removed else [])
+        return df[columns]
@@ -0,0 +1,204 @@
+"""
+Command line entry point for the daily jobs.
+
+Each job imports what it needs only when it runs, so `--help` and argument
+errors return without loading pandas, betfairlightweight or mlflow. Paths
+given on the command line are relative to the current directory and default
+to the repository's data directory.
+
+Betfair credentials are read from BETFAIR_USERNAME, BETFAIR_PASSWORD and
+BETFAIR_APP_KEY.
+
+Example usage (from the repository root):
+    python -m src.cli morning-prices --store data/prices --cache data/catalogue.parquet
+    python -m src.cli race-results --date 2024-05-01
+    python -m src.cli import-prices
+    python -m src.cli fit-pipeline models/rf_model.pkl data/turf.csv
+    python -m src.cli race-cube data/turf.csv --by Class Going
+    python -m src.cli --profile data/profile.json morning-prices --batched
+    python -m src.cli daemon --at 07:00 --store data/prices
+"""
+import argparse
+import datetime as dt
+import logging
+import os
+
+SRC_DIR = os.path.dirname(os.path.abspath(__file__))
+DATA_DIR = os.path.join(os.path.dirname(SRC_DIR), 'data')
+DAILY_DIR = os.path.join(DATA_DIR, 'daily')
+
+
+def _day(value):
+    return dt.datetime.strptime(value, '%Y-%m-%d').date()
+
+
+def betfair_login(interactive_login=True):
+    """Betfair session from the BETFAIR_* environment variables."""
+    from .betfair import Betfair
+
+    missing = [name for name in ('BETFAIR_USERNAME', 'BETFAIR_PASSWORD', 'BETFAIR_APP_KEY') if not os.getenv(name)]
+    if missing:
+        raise SystemExit(f"Missing environment variables: {', '.join(missing)}")
+    return Betfair(os.getenv('BETFAIR_USERNAME'), os.getenv('BETFAIR_PASSWORD'), os.getenv('BETFAIR_APP_KEY'),
+                   interactive_login=interactive_login)
+
+
+def morning_prices(args):
+    """Catalogue, ex_all_offers books and the joined daily CSV for a day of GB WIN markets."""
+    from .morning_price import MorningPrice
+
+    start_time = dt.datetime.combine(args.date, dt.time())
+    end_time = start_time + dt.timedelta(days=1)
+    trading = betfair_login().client
+    mp = MorningPrice(start_time, end_time)
+
+    if args.cache:
+        from .catalogue_cache import CatalogueCache
+        df1 = mp.cached_market_runner(trading, CatalogueCache(args.cache))
+    else:
+        df1 = mp.market_runner(mp.markets(start_time, end_time, trading))
+    books = mp.market_books(mp.market_id_list(df1), trading, batched=args.batched)
+    df2 = mp.morning_price(books)
+
+    store = None
+    if args.store:
+        from .price_store import PriceStore
+        store = PriceStore(args.store)
+    df3 = mp.join(df1, df2, store=store, daily_dir=DAILY_DIR)
+    print(f'{len(df3)} runners in {df3["market_id"].nunique()} markets')
+
+
+def race_results(args):
+    """Ingest results for a day's markets (from its daily CSV) or an explicit list of market ids."""
+    import pandas as pd
+    from .race_results import ResultsStore, ingest_race_results
+
+    if args.market_ids_file:
+        with open(args.market_ids_file) as f:
+            market_ids = [line.strip() for line in f if line.strip()]
+    else:
+        daily = os.path.join(DAILY_DIR, f'{args.date:%Y-%m-%d}_data.csv')
+        market_ids = pd.read_csv(daily, usecols=['market_id'], dtype=str)['market_id'].drop_duplicates().to_list()
+
+    trading = betfair_login().client
+    trading.race_card.login()
+    stats = ingest_race_results(trading, market_ids, ResultsStore(args.store), max_workers=args.max_workers)
+    print(stats)
+
+
+def daemon(args):
+    """Morning snapshot, T-minus snapshots and results every day, or once with --once."""
+    import asyncio
+    from .daily_pipeline import DailyPipeline
+    from .price_store import PriceStore
+    from .race_results import ResultsStore
+
+    trading = betfair_login().client
+    trading.race_card.login()
+    pipeline = DailyPipeline(trading, store=PriceStore(args.store), results_store=ResultsStore(args.results_store),
+                             snapshot_minutes=args.snapshot_minutes, max_workers=args.max_workers,
+                             daily_dir=DAILY_DIR)
+    if args.once:
+        print(asyncio.run(pipeline.run_day()))
+        print(pipeline.stage_report().to_string(index=False))
+    else:
+        pipeline.run_forever(at=args.at)
+
+
+def balance(args):
+    print(betfair_login().account_balance())
+
+
+def import_prices(args):
+    from .price_store import PriceStore
+
+    print(f'{PriceStore(args.store).import_csvs(args.pattern)} rows written to {args.store}')
+
+
+def fit_pipeline(args):
+    from .scoring_service import fit_pipeline
+
+    fit_pipeline(args.model_path, args.csv_path)
+
+
+def race_cube(args):
+    """Add the new races of a turf.csv-shaped CSV to the aggregate cube and show the favourites by a dimension."""
+    import pandas as pd
+    from .race_cube import RaceCube
+
+    cube = RaceCube.load(args.cube) if os.path.exists(os.path.join(args.cube, 'cube.json')) else RaceCube()
+    added = cube.update(pd.read_csv(args.csv_path, low_memory=False))
+    cube.save(args.cube)
+    print(f'{added} runners added, {len(cube)} cells')
+    print(cube.rollup(args.by, where={'sp_rank': 1}).to_string())
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(prog='python -m src.cli', description='Daily horse racing jobs')
+    parser.add_argument('--profile', help='profile the job and write the stage timings to this JSON file')
+    parser.add_argument('-v', '--verbose', action='store_true', help='log at INFO level')
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    p = commands.add_parser('morning-prices', help=morning_prices.__doc__)
+    p.add_argument('--date', type=_day, default=dt.date.today(), help='race day, YYYY-MM-DD (default today)')
+    p.add_argument('--cache', help='catalogue cache Parquet file, refreshed incrementally')
+    p.add_argument('--store', help='price store directory the snapshot is also appended to')
+    p.add_argument('--batched', action='store_true', help='weight-packed, rate-limited book requests')
+    p.set_defaults(func=morning_prices)
+
+    p = commands.add_parser('race-results', help=race_results.__doc__)
+    p.add_argument('--date', type=_day, default=dt.date.today() - dt.timedelta(days=1),
+                   help='race day whose daily CSV lists the markets (default yesterday)')
+    p.add_argument('--market-ids-file', help='file with one market id per line, instead of --date')
+    p.add_argument('--store', default=os.path.join(DATA_DIR, 'results'), help='results store directory')
+    p.add_argument('--max-workers', type=int, default=4)
+    p.set_defaults(func=race_results)
+
+    p = commands.add_parser('daemon', help=daemon.__doc__)
+    p.add_argument('--at', default='07:00', help='local time the morning run starts each day')
+    p.add_argument('--once', action='store_true', help="run today's pipeline now and exit")
+    p.add_argument('--snapshot-minutes', type=lambda value: tuple(int(m) for m in value.split(',')),
+                   default=(60, 30, 10, 5, 1), help='comma-separated minutes before the off to snapshot prices')
+    p.add_argument('--store', default=os.path.join(DATA_DIR, 'prices'), help='price store directory')
+    p.add_argument('--results-store', default=os.path.join(DATA_DIR, 'results'), help='results store directory')
+    p.add_argument('--max-workers', type=int, default=4)
+    p.set_defaults(func=daemon)
+
+    p = commands.add_parser('balance', help='available to bet balance')
+    p.set_defaults(func=balance)
+
+    p = commands.add_parser('import-prices', help='import daily CSV snapshots into the price store')
+    p.add_argument('--pattern', default=os.path.join(DAILY_DIR, '*_data.csv'))
+    p.add_argument('--store', default=os.path.join(DATA_DIR, 'prices'))
+    p.set_defaults(func=import_prices)
+
+    p = commands.add_parser('fit-pipeline', help='fit and save a FeaturePipeline for a pickled model')
+    p.add_argument('model_path')
+    p.add_argument('csv_path')
+    p.set_defaults(func=fit_pipeline)
+
+    p = commands.add_parser('race-cube', help=race_cube.__doc__)
+    p.add_argument('csv_path', help='race history or a day of results in the shape of turf.csv')
+    p.add_argument('--cube', default=os.path.join(DATA_DIR, 'cube'), help='cube directory, created if missing')
+    p.add_argument('--by', nargs='+', default=['Class'], help='dimensions to break the favourites down by')
+    p.set_defaults(func=race_cube)
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    logging.basicConfig(level=logging.INFO if args.verbose else logging.WARNING)
+
+    if args.profile:
+        from . import profiling
+        profiling.enable()
+        with profiling.stage(args.command):
+            args.func(args)
+        profiling.to_json(args.profile)
+        print(profiling.report().to_string())
+    else:
+        args.func(args)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,390 @@
+"""
+Scheduled daemon running the daily MorningPrice and race results flow.
+
+The notebook flow (markets -> market_runner -> market_id_list ->
+market_books -> morning_price -> join, then fetch_race_results after racing)
+runs here as a DAG of asyncio stages joined by bounded queues. The blocking
+API calls, parsing and writes go to a thread pool, so the stages overlap:
+
+    catalogue       one list_market_catalogue call
+    runners         market_runner over chunks of parse_chunk markets
+    books           list_market_book in weight-packed, rate-limited batches
+    prices, merge   morning_price and MorningPrice.merge per batch
+    write           PriceStore and/or database append, one writer task
+
+Book requests for the first chunk of markets go out while later chunks are
+still being parsed, and each batch is written by a single writer task while
+the next batches are in flight. Every stage is retried with exponential
+backoff (STAGE_RETRIES); a book batch that still fails is logged and
+dropped, like fetch_market_books does.
+
+After the morning run every market gets T-minus events on a priority queue
+ordered by due time: a price snapshot N minutes before market_start_time for
+each N in snapshot_minutes, and a results fetch results_delay after the
+start. Events that fall due together are batched into shared requests.
+
+Example usage:
+    pipeline = DailyPipeline(trading, store=PriceStore('../data/prices'),
+                             results_store=ResultsStore('../data/results'))
+    asyncio.run(pipeline.run_day())        # today, until the last result
+    pipeline.run_forever(at='07:00')       # daemon: every day at 07:00 via schedule
+
+Offline, against a fake client and a simulated clock:
+    pipeline = DailyPipeline(FakeTrading(race_card, betting), clock=SimulatedClock('2024-06-01 07:00'))
+"""
+import asyncio
+import heapq
+import logging
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta, timezone
+
+from .functions import fetch_race_results
+from .lazy import lazy_import
+from .market_fetcher import TokenBucket, batch_size_for, chunked
+from .morning_price import MorningPrice
+from .profiling import bind, count_api
+
+betfairlightweight = lazy_import('betfairlightweight')
+pd = lazy_import('pandas')
+
+PRICE_DATA = ('EX_ALL_OFFERS',)
+
+# retries after the first attempt, per stage
+STAGE_RETRIES = {'catalogue': 3, 'runners': 0, 'books': 3, 'prices': 0, 'merge': 0, 'write': 3, 'csv': 1,
+                 'results': 3}
+
+SNAPSHOT_MINUTES = (60, 30, 10, 5, 1)
+
+
+def utc_now():
+    """Naive UTC now, comparable with betfairlightweight market_start_time."""
+    return datetime.now(timezone.utc).replace(tzinfo=None)
+
+
+class Clock:
+    """Wall clock in naive UTC."""
+    def now(self):
+        return utc_now()
+
+    async def sleep_until(self, when, pending=()):
+        """Sleep until when; pending tasks carry on in the background."""
+        delay = (when - self.now()).total_seconds()
+        if delay > 0:
+            await asyncio.sleep(delay)
+
+
+class SimulatedClock(Clock):
+    """
+    Clock that jumps straight to each wake-up time, so a race day of
+    T-minus snapshots runs in seconds against a fake client. Pending work is
+    finished before the jump, as if it took no simulated time.
+
+    Args:
+        start (datetime): naive UTC start time
+    """
+    def __init__(self, start):
+        self.time = pd.Timestamp(start).to_pydatetime()
+
+    def now(self):
+        return self.time
+
+    async def sleep_until(self, when, pending=()):
+        if pending:
+            await asyncio.wait(pending)
+        self.time = max(self.time, when)
+
+
+class DailyPipeline:
+    """
+    Morning price snapshot, T-minus snapshots and results for one race day at a time.
+
+    Args:
+        trading (betfairlightweight.APIClient): logged in client, or any object
+            exposing betting.list_market_catalogue/list_market_book and
+            race_card.get_race_result
+        store (PriceStore): Parquet dataset every snapshot is appended to
+        db (DatabaseConnector): connected database every snapshot is appended to
+        table_name (str): table for db
+        results_store (ResultsStore): destination for ingest_race_results; without
+            one results are fetched with fetch_race_results and kept on self.results
+        snapshot_minutes (tuple): minutes before each start to snapshot prices again
+        results_delay (timedelta): time after the start before fetching the result
+        parse_chunk (int): catalogue markets per market_runner call
+        max_workers (int): concurrent book requests
+        requests_per_second (float): shared rate limit on book requests
+        retries (dict): stage name -> retries, overriding STAGE_RETRIES
+        backoff (float): base delay in seconds for exponential backoff
+        save_csv (bool): also write the morning snapshot to daily_dir, as join does
+        daily_dir (str): directory of the <date>_data.csv snapshots
+        clock (Clock): time source, SimulatedClock for offline runs
+    """
+    def __init__(self, trading, store=None, db=None, table_name='morning_prices', results_store=None,
+                 snapshot_minutes=SNAPSHOT_MINUTES, results_delay=timedelta(minutes=30), parse_chunk=50,
+                 max_workers=4, requests_per_second=5, retries=None, backoff=0.5, save_csv=True, daily_dir='../data/daily',
+                 clock=None):
+        self.trading = trading
+        self.store = store
+        self.db = db
+        self.table_name = table_name
+        self.results_store = results_store
+        self.snapshot_minutes = tuple(snapshot_minutes)
+        self.results_delay = results_delay
+        self.parse_chunk = parse_chunk
+        self.max_workers = max_workers
+        self.retries = {**STAGE_RETRIES, **(retries or {})}
+        self.backoff = backoff
+        self.save_csv = save_csv
+        self.daily_dir = daily_dir
+        self.clock = clock or Clock()
+
+        self.mp = MorningPrice(None, None)
+        self.bucket = TokenBucket(requests_per_second)
+        self.batch_size = batch_size_for(PRICE_DATA)
+        self.price_projection = betfairlightweight.filters.price_projection(
+            price_data=betfairlightweight.filters.price_data(ex_all_offers=True))
+        self.reset()
+
+    def reset(self):
+        """Clear the state of the previous day."""
+        self.runners = None
+        self.results = []
+        self.queue = []
+        self._seq = 0
+        self.stage_stats = {}
+        self.timings = {}
+        self.counts = dict.fromkeys(['markets', 'runners', 'snapshots', 'failed_batches', 'rows_written',
+                                     'failed_writes', 'results_markets', 'results_rows'], 0)
+
+    async def _stage(self, name, fn, *args):
+        """Run fn(*args) on the thread pool, retrying with exponential backoff; raises after the last attempt."""
+        retries = self.retries.get(name, 0)
+        stats = self.stage_stats.setdefault(name, {'calls': 0, 'failures': 0, 'seconds': 0.0})
+        loop = asyncio.get_running_loop()
+        for attempt in range(retries + 1):
+            start = time.perf_counter()
+            try:
+                return await loop.run_in_executor(self.executor, bind(fn), *args)
+            except Exception as e:
+                error = e
+            finally:
+                stats['calls'] += 1
+                stats['seconds'] += time.perf_counter() - start
+            stats['failures'] += 1
+            if attempt == retries:
+                raise error
+            delay = self.backoff * 2 ** attempt
+            logging.warning(f'{name} failed ({error}), retry {attempt + 1}/{retries} in {delay:.2f}s')
+            await asyncio.sleep(delay)
+
+    def _list_books(self, market_ids):
+        self.bucket.acquire()
+        count_api()
+        return self.trading.betting.list_market_book(market_ids=market_ids, price_projection=self.price_projection)
+
+    def _write(self, df3, snapshot_time):
+        """Rows written, summed over the store and the database; len(df3) with neither."""
+        if self.store is None and self.db is None:
+            return len(df3)
+        written = 0
+        if self.store is not None:
+            written += self.store.append(df3, snapshot_time=snapshot_time)
+        if self.db is not None:
+            written += self.db.save_data_frame(df3, self.table_name, if_exists='append') or 0
+        return written
+
+    async def _writer(self):
+        """Single consumer of the write queue, so writes never overlap each other."""
+        while (item := await self.write_queue.get()) is not None:
+            df3, snapshot_time = item
+            try:
+                self.counts['rows_written'] += await self._stage('write', self._write, df3, snapshot_time)
+            except Exception as e:
+                self.counts['failed_writes'] += len(df3)
+                logging.error(f'Dropped {len(df3)} rows after failed writes: {e}')
+            self.write_queue.task_done()
+
+    async def _snapshot(self, df1, market_ids):
+        """
+        Fetch, parse and merge the books of one batch of markets and queue the write.
+
+        Returns:
+            pd.DataFrame: the merged rows, None if the batch failed
+        """
+        try:
+            books = await self._stage('books', self._list_books, market_ids)
+        except Exception as e:
+            self.counts['failed_batches'] += 1
+            logging.error(f'list_market_book for {len(market_ids)} markets starting {market_ids[0]} failed: {e}')
+            return None
+        snapshot_time = self.clock.now()
+        df2 = await self._stage('prices', self.mp.morning_price, [books])
+        df3 = await self._stage('merge', self.mp.merge, df1[df1['market_id'].isin(market_ids)], df2)
+        await self.write_queue.put((df3, snapshot_time))
+        return df3
+
+    async def run_morning(self, start_time, end_time):
+        """
+        Catalogue, books and merged prices for markets starting between start_time and end_time.
+
+        Returns:
+            pd.DataFrame: the join output for every batch that was fetched
+        """
+        catalogues = list(await self._stage('catalogue', self.mp.markets, start_time, end_time, self.trading))
+        batches = asyncio.Queue(maxsize=2 * self.max_workers)
+        runner_frames, frames = [], []
+
+        async def parse():
+            try:
+                for chunk in chunked(catalogues, self.parse_chunk):
+                    df1 = await self._stage('runners', self.mp.market_runner, chunk)
+                    runner_frames.append(df1)
+                    for batch in chunked(self.mp.market_id_list(df1), self.batch_size):
+                        await batches.put((df1, batch))
+            finally:
+                for _ in range(self.max_workers):
+                    await batches.put(None)
+
+        async def fetch():
+            while (item := await batches.get()) is not None:
+                df3 = await self._snapshot(*item)
+                if df3 is not None:
+                    frames.append(df3)
+
+        await asyncio.gather(parse(), *(fetch() for _ in range(self.max_workers)))
+        if not runner_frames:
+            logging.warning(f'No markets between {start_time} and {end_time}')
+            return None
+
+        self.runners = pd.concat(runner_frames, ignore_index=True)
+        self.counts['markets'] += len(catalogues)
+        self.counts['runners'] += len(self.runners)
+        df = pd.concat(frames, ignore_index=True) if frames else None
+        if df is not None and self.save_csv:
+            await self._stage('csv', self.mp.save_daily, df, self.daily_dir)
+        return df
+
+    def push(self, due, kind, market_id):
+        """Add a 'snapshot' or 'results' event for market_id to the queue."""
+        heapq.heappush(self.queue, (due, self._seq, kind, market_id))
+        self._seq += 1
+
+    def schedule_events(self, runners):
+        """
+        Queue the T-minus snapshots and the results fetch of every market in runners.
+        Snapshots already due are skipped.
+        """
+        now = self.clock.now()
+        starts = runners.drop_duplicates('market_id')
+        for market_id, start in zip(starts['market_id'], pd.to_datetime(starts['market_start_time'])):
+            start = start.to_pydatetime()
+            for minutes in self.snapshot_minutes:
+                due = start - timedelta(minutes=minutes)
+                if due > now:
+                    self.push(due, 'snapshot', market_id)
+            self.push(start + self.results_delay, 'results', market_id)
+
+    async def _snapshot_markets(self, market_ids):
+        self.counts['snapshots'] += len(market_ids)
+        await asyncio.gather(*(self._snapshot(self.runners, batch) for batch in chunked(market_ids, self.batch_size)))
+
+    async def _results(self, market_ids):
+        try:
+            if self.results_store is not None:
+                from .race_results import ingest_race_results
+                stats = await self._stage('results', ingest_race_results, self.trading, market_ids, self.results_store)
+                rows = stats['rows']
+            else:
+                df = await self._stage('results', fetch_race_results, market_ids, self.trading)
+                self.results.append(df)
+                rows = len(df)
+        except Exception as e:
+            logging.error(f'Results for {len(market_ids)} markets failed: {e}')
+            return
+        self.counts['results_markets'] += len(market_ids)
+        self.counts['results_rows'] += rows
+
+    async def run_events(self):
+        """Work through the event queue in due order until it is empty."""
+        tasks = set()
+        while self.queue:
+            await self.clock.sleep_until(self.queue[0][0], tasks)
+            now = self.clock.now()
+            due = {'snapshot': [], 'results': []}
+            while self.queue and self.queue[0][0] <= now:
+                _, _, kind, market_id = heapq.heappop(self.queue)
+                due[kind].append(market_id)
+            # long fetches must not hold up the next due event
+            if due['snapshot']:
+                tasks.add(asyncio.create_task(self._snapshot_markets(list(dict.fromkeys(due['snapshot'])))))
+            if due['results']:
+                tasks.add(asyncio.create_task(self._results(list(dict.fromkeys(due['results'])))))
+            tasks = {task for task in tasks if not task.done()}
+        await asyncio.gather(*tasks)
+
+    async def run_day(self, day=None):
+        """
+        Morning snapshot for day, then its T-minus snapshots and results.
+
+        Args:
+            day (date): race day, defaults to today on the pipeline's clock
+
+        Returns:
+            dict: counts of markets, runners, snapshots, failed batches, rows
+                written (summed over the store and the database) and results ingested
+        """
+        self.reset()
+        day = day or self.clock.now().date()
+        start_time = datetime.combine(day, datetime.min.time())
+        self.executor = ThreadPoolExecutor(max_workers=self.max_workers + 2)
+        self.write_queue = asyncio.Queue(maxsize=4 * self.max_workers)
+        writer = asyncio.create_task(self._writer())
+        try:
+            start = time.perf_counter()
+            await self.run_morning(start_time, start_time + timedelta(days=1))
+            await self.write_queue.join()
+            self.timings['morning_s'] = time.perf_counter() - start
+            if self.runners is not None:
+                start = time.perf_counter()
+                self.schedule_events(self.runners)
+                await self.run_events()
+                await self.write_queue.join()
+                self.timings['events_s'] = time.perf_counter() - start
+        finally:
+            await self.write_queue.put(None)
+            await writer
+            self.executor.shutdown(wait=True)
+        logging.info(f'Finished {day}: {self.counts}')
+        return self.counts
+
+    def stage_report(self):
+        """
+        Returns:
+            pd.DataFrame: calls, failures, seconds and mean_ms per stage
+        """
+        df = pd.DataFrame.from_dict(self.stage_stats, orient='index')
+        df.index.name = 'stage'
+        df['mean_ms'] = df['seconds'] / df['calls'].clip(lower=1) * 1000
+        return df.reset_index()
+
+    def run_forever(self, at='07:00', poll=30):
+        """
+        Run run_day every day at the given local time, blocking forever.
+
+        Args:
+            at (str): HH:MM the morning run starts
+            poll (float): seconds between schedule checks
+        """
+        import schedule
+
+        def job():
+            try:
+                asyncio.run(self.run_day(self.clock.now().date()))
+            except Exception:
+                logging.exception('Daily pipeline failed')
+
+        schedule.every().day.at(at).do(job)
+        logging.info(f'Daily pipeline scheduled at {at}')
+        while True:
+            schedule.run_pending()
+            time.sleep(poll)
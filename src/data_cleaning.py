@@ -1,5 +1,6 @@
 from sklearn.preprocessing import MinMaxScaler, StandardScaler
-from sklearn.model_selection import train_test_split
+
+from .splitter import grouped_split
 
 class DataCleaning:
     @staticmethod
@@ -27,6 +28,8 @@ class DataCleaning:
         """
         Split a dataframe whilst ensuring no leakage between races.
 
+        See splitter.py for index-based splits, grouped K-fold and walk-forward validation.
+
         Parameters:
         df (pd.DataFrame): input dataframe
         date_col (str): column name for the date of the race
@@ -39,23 +42,11 @@ class DataCleaning:
         Example Usage:
         train_data, test_data = split_data(df=df)
         """
-        # Create a unique identifier for each race
-        df['race_id'] = df[date_col].astype(str) + '_' + df[course_col].astype(str)
-        
-        # Get unique races
-        unique_races = df['race_id'].unique()
-        
-        # Split the races into train and test sets
-        train_races, test_races = train_test_split(unique_races, test_size=test_size, shuffle=True, random_state=42)
-        
-        # Split the dataframe based on the race ids
-        train_data = df[df['race_id'].isin(train_races)]
-        test_data = df[df['race_id'].isin(test_races)]
-        
-        # Drop the temporary 'race_id' column
-        train_data = train_data.drop(columns=['race_id'])
-        test_data = test_data.drop(columns=['race_id'])
-        
+        # races are split by integer code, leaving df untouched
+        train_idx, test_idx = grouped_split(df, race_cols=[date_col, course_col], test_size=test_size)
+        train_data = df.iloc[train_idx]
+        test_data = df.iloc[test_idx]
+
         return train_data, test_data
 
     # Example usage
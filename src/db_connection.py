@@ -1,24 +1,258 @@
 import mysql.connector
+from mysql.connector import pooling
 import os
+import tempfile
+from contextlib import contextmanager
+import numpy as np
 import pandas as pd
 
+from .profiling import count_api, profiled
+
+# SQL column types used when a table is created from a DataFrame
+SQL_TYPES = {
+    'mysql': {'i': 'BIGINT', 'u': 'BIGINT', 'f': 'DOUBLE', 'b': 'TINYINT(1)', 'M': 'DATETIME(6)', 'O': 'VARCHAR(255)'},
+    'sqlite': {'i': 'INTEGER', 'u': 'INTEGER', 'f': 'REAL', 'b': 'INTEGER', 'M': 'TEXT', 'O': 'TEXT'},
+}
+
+def quote(name, dialect='mysql'):
+    """Quote an identifier such as 'Won (1=Won, 0=Lost)' for the given dialect."""
+    if dialect == 'mysql':
+        return '`' + name.replace('`', '``') + '`'
+    return '"' + name.replace('"', '""') + '"'
+
+def create_table_sql(df, table_name, key_columns=None, dialect='mysql'):
+    """
+    CREATE TABLE IF NOT EXISTS statement for a DataFrame.
+
+    Args:
+        df (pd.DataFrame): frame whose dtypes define the columns
+        table_name (str): table to create
+        key_columns (list): columns forming the primary key, used for upserts
+        dialect (str): 'mysql' or 'sqlite'
+
+    Returns:
+        str: DDL statement
+    """
+    types = SQL_TYPES[dialect]
+    columns = []
+    for name, dtype in df.dtypes.items():
+        sql_type = types.get(dtype.kind, types['O'])
+        if dialect == 'mysql' and key_columns and name in key_columns and sql_type == types['O']:
+            sql_type = 'VARCHAR(64)'
+        columns.append(f'{quote(name, dialect)} {sql_type}')
+    if key_columns:
+        columns.append('PRIMARY KEY (' + ', '.join(quote(c, dialect) for c in key_columns) + ')')
+    return f'CREATE TABLE IF NOT EXISTS {quote(table_name, dialect)} (' + ', '.join(columns) + ')'
+
+def insert_sql(columns, table_name, key_columns=None, dialect='mysql'):
+    """
+    Parameterised INSERT statement, with upsert semantics when key_columns is given.
+
+    Args:
+        columns (list): columns being inserted
+        table_name (str): target table
+        key_columns (list): unique key columns, e.g. ['market_id', 'selection_id']
+        dialect (str): 'mysql' or 'sqlite'
+
+    Returns:
+        str: SQL statement for executemany
+    """
+    marker = '%s' if dialect == 'mysql' else '?'
+    names = ', '.join(quote(c, dialect) for c in columns)
+    sql = f'INSERT INTO {quote(table_name, dialect)} ({names}) VALUES ({", ".join([marker] * len(columns))})'
+    if key_columns:
+        updates = [c for c in columns if c not in key_columns]
+        if dialect == 'mysql' and updates:
+            sql += ' ON DUPLICATE KEY UPDATE ' + ', '.join(f'{quote(c)}=VALUES({quote(c)})' for c in updates)
+        elif dialect == 'mysql':
+            # only key columns: keep the existing row, as DO NOTHING does for sqlite
+            sql += f' ON DUPLICATE KEY UPDATE {quote(key_columns[0])}={quote(key_columns[0])}'
+        elif updates:
+            sql += (' ON CONFLICT (' + ', '.join(quote(c, dialect) for c in key_columns) + ') DO UPDATE SET '
+                    + ', '.join(f'{quote(c, dialect)}=excluded.{quote(c, dialect)}' for c in updates))
+        else:
+            sql += ' ON CONFLICT DO NOTHING'
+    return sql
+
+def has_unique_key(connection, table_name, key_columns):
+    """
+    Whether a MySQL table has a primary key or unique index on exactly key_columns.
+
+    Upserts rely on it: without one ON DUPLICATE KEY UPDATE never fires and
+    every snapshot is appended again.
+
+    Args:
+        connection: mysql.connector connection
+        table_name (str): table in the connection's database
+        key_columns (list): columns the upsert is keyed on
+
+    Returns:
+        bool: True if such an index exists or the table does not exist yet
+            (create_table_sql then creates it with the primary key)
+    """
+    cursor = connection.cursor()
+    try:
+        cursor.execute('SELECT COUNT(*) FROM information_schema.TABLES '
+                       'WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = %s', (table_name,))
+        if not cursor.fetchall()[0][0]:
+            return True
+        cursor.execute('SELECT INDEX_NAME, COLUMN_NAME FROM information_schema.STATISTICS '
+                       'WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = %s AND NON_UNIQUE = 0', (table_name,))
+        indexes = {}
+        for index_name, column in cursor.fetchall():
+            indexes.setdefault(index_name, set()).add(column.lower())
+    finally:
+        cursor.close()
+    return {c.lower() for c in key_columns} in indexes.values()
+
+def _rows(df, dialect='mysql'):
+    """Convert a frame to a list of tuples of plain Python values, NaN as None."""
+    columns = []
+    for name, col in df.items():
+        missing = col.isna().to_numpy()
+        if col.dtype.kind == 'M':
+            if col.dt.tz is not None:
+                col = col.dt.tz_convert('UTC').dt.tz_localize(None)
+            if dialect == 'sqlite':
+                values = col.dt.strftime('%Y-%m-%d %H:%M:%S.%f').to_numpy(dtype=object)
+            else:
+                values = np.array(col.dt.to_pydatetime(), dtype=object)
+        else:
+            # tolist() turns numpy scalars into the int/float/str drivers expect
+            values = np.array(col.tolist(), dtype=object)
+        values[missing] = None
+        columns.append(values)
+    return list(zip(*columns))
+
+def bulk_insert(connection, df, table_name, key_columns=None, batch_size=5000, dialect='mysql'):
+    """
+    Insert (or upsert) a DataFrame with executemany, one transaction per batch.
+
+    Args:
+        connection: DB-API connection (mysql.connector or sqlite3)
+        df (pd.DataFrame): rows to write
+        table_name (str): existing target table
+        key_columns (list): unique key columns; rows with an existing key are updated
+        batch_size (int): rows per executemany call and per commit
+        dialect (str): 'mysql' or 'sqlite'
+
+    Returns:
+        int: number of rows written
+    """
+    sql = insert_sql(list(df.columns), table_name, key_columns, dialect)
+    cursor = connection.cursor()
+    written = 0
+    try:
+        for start in range(0, len(df), batch_size):
+            batch = _rows(df.iloc[start:start + batch_size], dialect)
+            count_api()
+            try:
+                cursor.executemany(sql, batch)
+                connection.commit()
+            except Exception:
+                connection.rollback()
+                raise
+            written += len(batch)
+    finally:
+        cursor.close()
+    return written
+
+def frame_from_rows(rows, columns, dtypes=None):
+    """
+    Build a DataFrame column by column from tuple rows and cursor column names,
+    without the per-row dicts of a dictionary cursor.
+
+    Args:
+        rows (list): tuples as returned by cursor.fetchmany
+        columns (list): column names from cursor.description
+        dtypes (dict): optional explicit dtype per column
+
+    Returns:
+        pd.DataFrame: frame for the rows
+    """
+    dtypes = dtypes or {}
+    values = list(zip(*rows)) if rows else [()] * len(columns)
+    return pd.DataFrame({
+        name: pd.Series(col, dtype=dtypes.get(name))
+        for name, col in zip(columns, values)
+    })
+
+def iter_frames(cursor, chunk_size=50000, dtypes=None):
+    """Yield DataFrames of up to chunk_size rows from an executed cursor."""
+    columns = [d[0] for d in cursor.description]
+    while True:
+        rows = cursor.fetchmany(chunk_size)
+        if not rows:
+            break
+        yield frame_from_rows(rows, columns, dtypes)
+
+def fill_frame(cursor, n_rows, chunk_size=50000, dtypes=None):
+    """
+    Read an executed cursor into preallocated column arrays.
+
+    Only one chunk of tuples is alive at a time; columns with an explicit NumPy
+    dtype are written straight into typed arrays, the rest into object arrays
+    that are type-inferred at the end. If more than n_rows rows arrive the
+    arrays are grown, so a stale count costs a copy rather than an error.
+
+    Args:
+        cursor: executed DB-API cursor
+        n_rows (int): expected number of rows, e.g. from COUNT(*)
+        chunk_size (int): rows per fetchmany call
+        dtypes (dict): optional explicit NumPy dtype per column. Integer
+            columns must not contain NULLs; use a float dtype if they can
+
+    Returns:
+        pd.DataFrame: the full result
+    """
+    dtypes = dtypes or {}
+    columns = [d[0] for d in cursor.description]
+    arrays = [np.empty(n_rows, dtype=dtypes.get(name, object)) for name in columns]
+
+    position = 0
+    while True:
+        rows = cursor.fetchmany(chunk_size)
+        if not rows:
+            break
+        end = position + len(rows)
+        if end > len(arrays[0]):
+            size = max(end, 2 * len(arrays[0]))
+            arrays = [np.concatenate([array[:position], np.empty(size - position, dtype=array.dtype)])
+                      for array in arrays]
+        for array, values in zip(arrays, zip(*rows)):
+            array[position:end] = values
+        position = end
+
+    frame = pd.DataFrame({name: array[:position] for name, array in zip(columns, arrays)}, copy=False)
+    untyped = [name for name in columns if name not in dtypes]
+    if untyped:
+        frame[untyped] = frame[untyped].infer_objects()
+    return frame
+
 class DatabaseConnector:
-    def __init__(self, database_name, password):
+    def __init__(self, database_name, password, pool_size=5, pool_name='horse_trading'):
         self.host = os.getenv('DB_HOST')
         self.user = os.getenv('DB_USER')
         #self.password = os.getenv('DB_PASSWORD')
         self.password = password
         self.database = database_name
+        self.pool_size = pool_size
+        self.pool_name = pool_name
+        self.pool = None
         self.connection = None
 
     def connect(self):
         try:
-            self.connection = mysql.connector.connect(
+            self.pool = pooling.MySQLConnectionPool(
+                pool_name=self.pool_name,
+                pool_size=self.pool_size,
                 host=self.host,
                 user=self.user,
                 password=self.password,
-                database=self.database
+                database=self.database,
+                allow_local_infile=True
             )
+            self.connection = self.pool.get_connection()
             if self.connection.is_connected():
                 print('Connected to the database')
         except Exception as e:
@@ -27,12 +261,21 @@ class DatabaseConnector:
     def disconnect(self):
         try:
             if self.connection.is_connected():
-                self.connection.close()
+                self.connection.close()  # returns the connection to the pool
                 print('Disconnected from the database')
         except Exception as e:
             print(f'Error disconnectiong from the database: {str(e)}')
 
+    @contextmanager
+    def pooled_connection(self):
+        """Borrow a connection from the pool for the duration of a with block."""
+        connection = self.pool.get_connection()
+        try:
+            yield connection
+        finally:
+            connection.close()
 
+    @profiled('db.execute_query')
     def execute_query(self, query, data=None):
         if self.connection is None or not self.connection.is_connected():
             print('Database connection is not established')
@@ -49,6 +292,32 @@ class DatabaseConnector:
         except Exception as e:
             print(f'Error executing the query: {str(e)}')
 
+    @profiled('db.execute_many', rows=int)
+    def execute_many(self, query, rows, batch_size=5000):
+        """
+        Execute a parameterised statement for many rows, committing once per batch
+        instead of once per statement.
+        """
+        if self.pool is None:
+            print('Database connection is not established')
+            return 0
+
+        written = 0
+        try:
+            with self.pooled_connection() as connection:
+                cursor = connection.cursor()
+                for start in range(0, len(rows), batch_size):
+                    batch = rows[start:start + batch_size]
+                    count_api()
+                    cursor.executemany(query, batch)
+                    connection.commit()
+                    written += len(batch)
+                cursor.close()
+        except Exception as e:
+            print(f'Error executing the query: {str(e)}')
+        return written
+
+    @profiled('db.fetch_data', rows=len)
     def fetch_data(self, query, data = None):
         if self.connection is None or not self.connection.is_connected():
             print('Database connection is not established')
@@ -74,20 +343,179 @@ class DatabaseConnector:
             print(f"Error fetching data from the database: {str(e)}")
             return None
         
-    def save_data_frame(self, df, table_name, if_exists='replace', dtype_map=None, cursor=None):
-        if self.connection is None or not self.connection.is_connected():
+    def fetch_chunks(self, query, data=None, chunk_size=50000, dtypes=None):
+        """
+        Stream a query result as DataFrames of up to chunk_size rows.
+
+        Uses an unbuffered cursor so rows are pulled from the server as they are
+        consumed, and builds each chunk from tuples plus column metadata.
+
+        Parameters:
+        query (str): SQL query
+        data (tuple): optional query parameters
+        chunk_size (int): rows per yielded DataFrame
+        dtypes (dict): optional explicit dtype per column
+
+        Returns:
+        generator: pandas.DataFrame chunks
+
+        Example Usage:
+        > for chunk in db.fetch_chunks('SELECT * FROM results', chunk_size=100000):
+        >     process(chunk)
+        """
+        if self.pool is None:
             print('Database connection is not established')
             return
 
+        with self.pooled_connection() as connection:
+            cursor = connection.cursor(buffered=False)
+            try:
+                if data:
+                    cursor.execute(query, data)
+                else:
+                    cursor.execute(query)
+                yield from iter_frames(cursor, chunk_size, dtypes)
+            except Exception as e:
+                print(f"Error fetching data from the database: {str(e)}")
+            finally:
+                if connection.unread_result:
+                    connection.consume_results()
+                cursor.close()
+
+    @profiled('db.fetch_frame', rows=len)
+    def fetch_frame(self, query, data=None, dtypes=None, chunk_size=50000):
+        """
+        Fetch a query result into a single DataFrame with preallocated columns.
+
+        The row count is taken with COUNT(*) first, then rows are streamed from
+        an unbuffered cursor into typed arrays (see fill_frame). Both statements
+        run in one read-only consistent-snapshot transaction, so rows written
+        in between cannot make the count stale.
+
+        Parameters:
+        query (str): SQL query
+        data (tuple): optional query parameters
+        dtypes (dict): optional explicit NumPy dtype per column
+        chunk_size (int): rows per fetchmany call
+
+        Returns:
+        pandas.DataFrame: query result, or None on error
+        """
+        if self.pool is None:
+            print('Database connection is not established')
+            return None
+
+        try:
+            with self.pooled_connection() as connection:
+                connection.start_transaction(consistent_snapshot=True, isolation_level='REPEATABLE READ',
+                                             readonly=True)
+                try:
+                    cursor = connection.cursor(buffered=False)
+                    cursor.execute(f'SELECT COUNT(*) FROM ({query}) AS counted', data or ())
+                    n_rows = cursor.fetchall()[0][0]
+
+                    cursor.execute(query, data or ())
+                    df = fill_frame(cursor, n_rows, chunk_size, dtypes)
+                    cursor.close()
+                finally:
+                    connection.rollback()
+                return df
+        except Exception as e:
+            print(f"Error fetching data from the database: {str(e)}")
+            return None
+
+    def _load_data_infile(self, connection, df, table_name, replace=False):
+        """
+        Write df with LOAD DATA LOCAL INFILE, which needs local_infile enabled on the server.
+
+        With replace, rows with an existing key replace the stored row. Without
+        it the load uses IGNORE: those rows are skipped, reported here and left
+        out of the returned count.
+
+        Returns:
+            int: rows loaded
+        """
+        with tempfile.NamedTemporaryFile('w', suffix='.csv', delete=False) as f:
+            df.to_csv(f, index=False, header=False, na_rep='\\N', date_format='%Y-%m-%d %H:%M:%S.%f')
+            path = f.name
+        try:
+            cursor = connection.cursor()
+            cursor.execute(
+                f"LOAD DATA LOCAL INFILE %s {'REPLACE' if replace else 'IGNORE'} INTO TABLE {quote(table_name)} "
+                "FIELDS TERMINATED BY ',' OPTIONALLY ENCLOSED BY '\"' LINES TERMINATED BY '\\n' "
+                '(' + ', '.join(quote(c) for c in df.columns) + ')',
+                (path,)
+            )
+            # affected rows: inserted ones, or two per replaced row with REPLACE
+            loaded = len(df) if replace else cursor.rowcount
+            connection.commit()
+            cursor.close()
+        finally:
+            os.remove(path)
+        if loaded < len(df):
+            print(f'LOAD DATA skipped {len(df) - loaded} of {len(df)} rows whose key already exists in {table_name}')
+        return loaded
+
+    @profiled('db.save_data_frame', rows=int)
+    def save_data_frame(self, df, table_name, if_exists='replace', dtype_map=None, cursor=None,
+                        key_columns=None, batch_size=5000, method='executemany'):
+        """
+        Bulk write a DataFrame to a table.
+
+        Parameters:
+        df (pd.DataFrame): rows to write
+        table_name (str): target table, created from the frame's dtypes if missing
+        if_exists (str): 'replace' drops and recreates the table, 'append' inserts,
+            'upsert' inserts or updates rows keyed on key_columns
+        dtype_map (dict): optional column dtype casts applied before writing
+        key_columns (list): unique key for 'upsert', defaults to market_id/selection_id.
+            An existing table must have a primary key or unique index on exactly
+            these columns, otherwise ValueError is raised. With any if_exists it
+            is also the primary key of a table the call creates
+        batch_size (int): rows per executemany call, each batch is one transaction
+        method (str): 'executemany' or 'infile' for LOAD DATA LOCAL INFILE. An
+            'append' by infile skips rows whose key already exists, where
+            executemany fails the batch
+
+        Returns:
+        int: number of rows written, not counting rows an infile append skipped
+
+        Example Usage:
+        > db.save_data_frame(df, 'morning_prices', if_exists='upsert')
+        """
+        if self.pool is None:
+            print('Database connection is not established')
+            return 0
+
+        if if_exists == 'upsert':
+            key_columns = key_columns or ['market_id', 'selection_id']
+            with self.pooled_connection() as connection:
+                if not has_unique_key(connection, table_name, key_columns):
+                    raise ValueError(f'Cannot upsert into {table_name}: it has no primary key or unique index '
+                                     f'on {key_columns}; add one or use if_exists="append"')
+
         try:
             # Convert data types if a mapping is provided
             if dtype_map:
                 df = df.astype(dtype_map)
 
-            # Use the to_sql method to save the DataFrame to the database table
-            df.to_sql(name=table_name, con=self.connection, if_exists=if_exists, index=False, dtype=dtype_map)
+            with self.pooled_connection() as connection:
+                cursor = connection.cursor()
+                if if_exists == 'replace':
+                    cursor.execute(f'DROP TABLE IF EXISTS {quote(table_name)}')
+                cursor.execute(create_table_sql(df, table_name, key_columns))
+                connection.commit()
+                cursor.close()
+
+                if method == 'infile':
+                    written = self._load_data_infile(connection, df, table_name, replace=if_exists == 'upsert')
+                else:
+                    upsert_key = key_columns if if_exists == 'upsert' else None
+                    written = bulk_insert(connection, df, table_name, upsert_key, batch_size)
 
             print(f'DataFrame successfully saved to table {table_name}')
+            return written
 
         except Exception as e:
             print(f'Error saving DataFrame to table {table_name}: {e}')
+            return 0
@@ -0,0 +1,219 @@
+import os
+import pickle
+
+import numpy as np
+import pandas as pd
+from sklearn.preprocessing import MinMaxScaler
+
+DISTANCE_BINS = [800, 1000, 1200, 1400, 1600, 1800, 2000, 2200, 2400, 2600,
+                 2800, 3000, 3200, 3400, 3600, 3800, 4000]
+
+DISTANCE_LABELS = ['800-1000', '1000-1200', '1200-1400', '1400-1600', '1600-1800', '1800-2000',
+                   '2000-2200', '2200-2400', '2400-2600', '2600-2800', '2800-3000',
+                   '3000-3200', '3200-3400', '3400-3600', '3600-3800', '3800-4000']
+
+RENAMES = {'Weight (pounds)': 'weight'}
+
+RACE_COLUMNS = ['Race Date', 'Race Time', 'Course']
+
+# the feature set used by normalization() in main.ipynb and the saved models
+DEFAULT_FEATURES = ['BF Decimal SP', 'LTO Speed Rating Rank', 'PFR Rank', 'Main Rank',
+                    'HA Career Speed Rating Rank', "Today's Class Wins", "Today's Going Wins"]
+
+
+def distance_bucket(distance):
+    """
+    Bucket race distances in yards into the 200y bands used across the notebooks.
+
+    Equivalent to pd.cut(distance, bins=DISTANCE_BINS, labels=DISTANCE_LABELS)
+    but computed with one searchsorted over the bin edges.
+
+    Args:
+        distance (pd.Series): distance in yards
+
+    Returns:
+        pd.Categorical: bucket label, NaN outside 800-4000y
+    """
+    values = distance.to_numpy(dtype=np.float64)
+    codes = np.searchsorted(DISTANCE_BINS, values, side='left') - 1
+    # pd.cut bins are right-closed, so 800 itself and anything above 4000 fall outside
+    codes[(values <= DISTANCE_BINS[0]) | (values > DISTANCE_BINS[-1]) | np.isnan(values)] = -1
+    return pd.Categorical.from_codes(codes, categories=DISTANCE_LABELS, ordered=True)
+
+
+def add_features(df, race_cols=RACE_COLUMNS):
+    """
+    Add the derived columns from the notebooks' mass_transformation in place.
+
+    Only transforms whose source columns exist are applied: distance bucket,
+    weight rename, evening/breakfast morning price ratios, numeric
+    'Won P/L Before', 'SP Odds Decimal1' and the per-race SP rank.
+
+    Args:
+        df (pd.DataFrame): raw proform/turf frame, modified in place
+        race_cols (list): columns identifying a race for the SP rank
+
+    Returns:
+        pd.DataFrame: the same frame, for chaining
+    """
+    if 'Distance (y)' in df.columns:
+        df['distance_bucket'] = distance_bucket(df['Distance (y)'])
+
+    renames = {k: v for k, v in RENAMES.items() if k in df.columns}
+    if renames:
+        df.rename(columns=renames, inplace=True)
+
+    if {'Morning Price', 'Evening Price'} <= set(df.columns):
+        df['evening_morning_price'] = df['Morning Price'].to_numpy(dtype=np.float64) / df['Evening Price'].to_numpy(dtype=np.float64)
+    if {'Morning Price', 'Breakfast Price'} <= set(df.columns):
+        df['breakfast_morning_price'] = df['Morning Price'].to_numpy(dtype=np.float64) / df['Breakfast Price'].to_numpy(dtype=np.float64)
+
+    if 'Won P/L Before' in df.columns and df['Won P/L Before'].dtype == object:
+        df['Won P/L Before'] = pd.to_numeric(df['Won P/L Before'], errors='coerce')
+
+    if 'SP Odds Decimal' in df.columns:
+        df['SP Odds Decimal1'] = df['SP Odds Decimal']
+
+    if 'BF Decimal SP' in df.columns and set(race_cols) <= set(df.columns):
+        df['sp_rank'] = df.groupby(race_cols, sort=False)['BF Decimal SP'].rank(method='first')
+
+    return df
+
+
+class FeaturePipeline:
+    """
+    Feature transforms declared once, fitted once and reused at inference.
+
+    fit() learns the MinMaxScaler ranges on training data; transform() then
+    builds the model matrix column by column into one preallocated float64
+    array, applies the stored scaling in place and fills NaNs, so live data
+    is never refitted and the input frame is never copied.
+
+    Args:
+        feature_columns (list): model input columns, in model order
+        scale_columns (list): columns to min-max scale, defaults to all features
+        fill_value (float): value used for missing features after scaling
+
+    Example usage:
+        pipeline = FeaturePipeline()
+        X_train = pipeline.fit_transform(train_data)
+        pipeline.save_with_model(model, '../models/rf_model.pkl')
+
+        model, pipeline = FeaturePipeline.load_with_model('../models/rf_model.pkl')
+        y_probs = model.predict_proba(pipeline.transform(live_data))[:, 1]
+    """
+    def __init__(self, feature_columns=DEFAULT_FEATURES, scale_columns=None, fill_value=0):
+        self.feature_columns = list(feature_columns)
+        self.scale_columns = list(self.feature_columns if scale_columns is None else scale_columns)
+        self.fill_value = fill_value
+        self.scaler = None
+        self._scale = None
+        self._offset = None
+
+    def _matrix(self, df):
+        X = np.empty((len(df), len(self.feature_columns)), dtype=np.float64)
+        for j, col in enumerate(self.feature_columns):
+            X[:, j] = pd.to_numeric(df[col], errors='coerce').to_numpy(dtype=np.float64, na_value=np.nan)
+        return X
+
+    def fit(self, df, add=True):
+        """
+        Fit the scaler on training data.
+
+        Args:
+            df (pd.DataFrame): training frame
+            add (bool): run add_features on df first (in place)
+
+        Returns:
+            FeaturePipeline: self
+        """
+        if add:
+            add_features(df)
+        X = self._matrix(df)
+        self.scaler = MinMaxScaler().fit(X)
+
+        # per-column affine transform, identity for unscaled columns
+        scaled = np.isin(self.feature_columns, self.scale_columns)
+        self._scale = np.where(scaled, self.scaler.scale_, 1.0)
+        self._offset = np.where(scaled, self.scaler.min_, 0.0)
+        return self
+
+    def transform(self, df, add=True):
+        """
+        Build the model input matrix.
+
+        Args:
+            df (pd.DataFrame): frame to score
+            add (bool): run add_features on df first (in place)
+
+        Returns:
+            np.ndarray: C-contiguous float64 array of shape (rows, features)
+                ready for predict_proba
+        """
+        if self.scaler is None:
+            raise ValueError('FeaturePipeline must be fitted before transform')
+        if add:
+            add_features(df)
+        return self._scale_in_place(self._matrix(df))
+
+    def transform_records(self, records):
+        """
+        Build the model input matrix straight from a list of row dicts.
+
+        Skips DataFrame construction, which dominates the cost for the handful
+        of runners in a single race. Rows must already carry the feature
+        columns; missing keys and None are treated as NaN.
+
+        Args:
+            records (list): one dict per row
+
+        Returns:
+            np.ndarray: C-contiguous float64 array of shape (rows, features)
+        """
+        if self.scaler is None:
+            raise ValueError('FeaturePipeline must be fitted before transform')
+        X = np.array([[record.get(col) for col in self.feature_columns] for record in records],
+                     dtype=np.float64).reshape(len(records), len(self.feature_columns))
+        return self._scale_in_place(X)
+
+    def _scale_in_place(self, X):
+        X *= self._scale
+        X += self._offset
+        np.nan_to_num(X, copy=False, nan=self.fill_value)
+        return X
+
+    def fit_transform(self, df, add=True):
+        return self.fit(df, add=add).transform(df, add=False)
+
+    def save(self, path):
+        with open(path, 'wb') as f:
+            pickle.dump(self, f)
+
+    @staticmethod
+    def load(path):
+        with open(path, 'rb') as f:
+            return pickle.load(f)
+
+    @staticmethod
+    def pipeline_path(model_path):
+        """Path of the pipeline stored next to a model, e.g. rf_model_pipeline.pkl."""
+        root, ext = os.path.splitext(model_path)
+        return f'{root}_pipeline{ext or ".pkl"}'
+
+    def save_with_model(self, model, model_path):
+        """Pickle the model to model_path and this pipeline next to it."""
+        with open(model_path, 'wb') as f:
+            pickle.dump(model, f)
+        self.save(self.pipeline_path(model_path))
+
+    @classmethod
+    def load_with_model(cls, model_path):
+        """
+        Load a pickled model and the pipeline saved alongside it.
+
+        Returns:
+            tuple: (model, pipeline)
+        """
+        with open(model_path, 'rb') as f:
+            model = pickle.load(f)
+        return model, cls.load(cls.pipeline_path(model_path))
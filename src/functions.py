@@ -1,5 +1,12 @@
-from sklearn.metrics import accuracy_score, precision_score, recall_score, f1_score, roc_auc_score, confusion_matrix
-import mlflow
+import numpy as np
+
+from .lazy import lazy_import
+from .market_fetcher import chunked
+
+# heavy imports deferred to first use, so helpers like
+# calculate_lay_stakes_multiple_runners import in milliseconds
+metrics = lazy_import('sklearn.metrics')
+mlflow = lazy_import('mlflow')
 
 def log_metrics_to_mlflow(accuracy, precision, recall, f1, roc_auc):
     """Logs classification metrics to MLflow."""
@@ -11,20 +18,18 @@ def log_metrics_to_mlflow(accuracy, precision, recall, f1, roc_auc):
 
 def eval_classification_model(test_target, predictions):
     # Evaluate the model
-    accuracy = accuracy_score(test_target, predictions)
-    precision = precision_score(test_target, predictions)
-    recall = recall_score(test_target, predictions)
-    f1 = f1_score(test_target, predictions)
-    roc_auc = roc_auc_score(test_target, predictions)
-    conf_matrix = confusion_matrix(test_target, predictions)
+    accuracy = metrics.accuracy_score(test_target, predictions)
+    precision = metrics.precision_score(test_target, predictions)
+    recall = metrics.recall_score(test_target, predictions)
+    f1 = metrics.f1_score(test_target, predictions)
+    roc_auc = metrics.roc_auc_score(test_target, predictions)
+    conf_matrix = metrics.confusion_matrix(test_target, predictions)
     # [[True Negatives, False Positives], 
     #    [False Negatives, True Positives]]
 
     return accuracy, precision, recall, f1, roc_auc, conf_matrix
 
-def print_metrics(test_target, predictions):
-    accuracy, precision, recall, f1, roc_auc, conf_matrix = eval_classification_model(test_target, predictions)
-    
+def print_metric_values(accuracy, precision, recall, f1, roc_auc, conf_matrix):
     print(f"\nConfusion Matrix: \n{conf_matrix}")
     print(f"Accuracy: {accuracy}")
     print(f'Precision: {precision}')
@@ -32,38 +37,75 @@ def print_metrics(test_target, predictions):
     print(f'F1 score: {f1}')
     print(f'ROC AUC score: {roc_auc}')
 
+def print_metrics(test_target, predictions):
+    print_metric_values(*eval_classification_model(test_target, predictions))
+
 def eval_print_log(test_target, predictions):
     accuracy, precision, recall, f1, roc_auc, conf_matrix = eval_classification_model(test_target, predictions)
 
-    print_metrics(accuracy, precision, recall, f1, roc_auc, conf_matrix)
+    print_metric_values(accuracy, precision, recall, f1, roc_auc, conf_matrix)
 
     log_metrics_to_mlflow(accuracy, precision, recall, f1, roc_auc)
 
-def get_best_model():
-    runs = mlflow.search_runs() # fetch all runs
-    best_run = runs.loc[runs['metrics.roc_auc'].idxmax()]
+def best_run(metric='roc_auc', experiment_names=None, filter_string=''):
+    """
+    The tracked run with the highest value of metric.
+
+    Args:
+        metric (str): metric to rank runs by, higher is better
+        experiment_names (list): experiments to search, defaults to the active one
+        filter_string (str): extra MLflow search filter, e.g. "tags.mlflow.parentRunId = '<id>'"
 
-    best_model_uri = f'runs:/{best_run.run_id}/mlruns'
-    return best_model_uri
+    Returns:
+        pd.Series: the best run's row from mlflow.search_runs
+    """
+    column = f'metrics.{metric}'
+    runs = mlflow.search_runs(experiment_names=experiment_names, filter_string=filter_string)
+    if runs.empty or column not in runs.columns or runs[column].isna().all():
+        raise ValueError(f"No runs with metric '{metric}' found")
+    return runs.loc[runs[column].idxmax()]
+
+def get_best_model(metric='roc_auc', artifact_path='model', experiment_names=None, filter_string=''):
+    """
+    Model URI of the best run, ready for mlflow.sklearn.load_model.
+
+    Args:
+        metric (str): metric to rank runs by, higher is better
+        artifact_path (str): path the model was logged under in the run
+        experiment_names (list): experiments to search, defaults to the active one
+        filter_string (str): extra MLflow search filter
+
+    Returns:
+        str: runs:/<run_id>/<artifact_path>
+    """
+    run = best_run(metric, experiment_names, filter_string)
+    return f'runs:/{run.run_id}/{artifact_path}'
 
 def profit_calculation(df, stake = 1):
     """
     Calculate ROI, total returns from the model predictions.
 
+    A winning bet returns (SP - 1) * stake and a losing bet loses the stake,
+    so the return per pound is the same whatever the stake.
+
     Args:
         df (pd.Dataframe): A dataframe that has a column holding the model predictions
         stake (int): The amount staked for each bet
 
     Returns:
         print() 
+
+    For sweeping thresholds, lay bets, other prices or staking rules use
+    backtest.backtest.
     """
     # Filter rows where model_preds == 1
     bets = df[df['model_preds'] == 1].copy()
 
     # Calculate returns
-    bets['Return'] = bets.apply(
-        lambda row: (row['BF Decimal SP1'] - 1) * stake if row['Won (1=Won, 0=Lost)'] == 1 else -1,
-        axis=1
+    bets['Return'] = np.where(
+        bets['Won (1=Won, 0=Lost)'] == 1,
+        (bets['BF Decimal SP1'] - 1) * stake,
+        -stake
     )
 
     # Total return
@@ -92,6 +134,9 @@ def calculate_lay_stakes_multiple_runners(accepted_bets, other_horse_odds, profi
     Calculate lay stakes for remaining horses to balance the book
     when accepting multiple bets.
 
+    For positions keyed by market and selection id across many markets at
+    once, see hedging.hedge_book.
+
     Args:
         accepted_bets (list of tuples): a list of tuples where each tuple contains (stake, odds)
             for accepted bets.
@@ -119,55 +164,40 @@ def calculate_lay_stakes_multiple_runners(accepted_bets, other_horse_odds, profi
 
     return lay_stakes
 
-def fetch_race_results(market_ids, trading):
-    try:
-        data = trading.race_card.get_race_result(market_ids=market_ids)
-    except Exception as e:
-        print(f"An error occurred: {e}")
-        data = []
-
-    # Process and display the data
-    flat_data = []
-
-    for race in data:
-        for runner in race.get('runners', []):
-            for selection in runner.get('selections', []):
-                if selection['marketType'] == 'WIN' and 'bsp' in selection:
-                    flat_data.append({
-                        'race_id': race.get('raceId'),
-                        'country_code': race.get('course', {}).get('countryCode'),
-                        'race_title': race.get('raceTitle'),
-                        'race_class': race.get('raceClassification', {}).get('classification'),
-                        'distance': race.get('distance'),
-                        'course_type': race.get('course', {}).get('courseType'),
-                        'surface_type': race.get('course', {}).get('surfaceType'),
-                        'market_id': selection.get('marketId'),
-                        'horse_id': runner.get('horseId'),
-                        'saddle_cloth': runner.get('saddleCloth'),
-                        'isNonRunner': runner.get('isNonRunner'),
-                        'position': runner.get('position'),
-                        'selection_id': selection.get('selectionId'),
-                        'bsp': selection.get('bsp')
-                    })
-
-    return pd.DataFrame(flat_data)
+def fetch_race_results(market_ids, trading, chunk_size=50, max_workers=4):
+    """
+    Race results for market_ids, one row per WIN selection with a BSP.
+
+    Ids are fetched in chunks concurrently with retry; failed chunks are
+    logged and left out. For resumable backfills into a results store use
+    race_results.ingest_race_results.
+    """
+    # pulls in pandas and pyarrow, which the other helpers here never need
+    from .race_results import fetch_result_chunks, flatten_results
+
+    chunks = {}
+    for chunk, data, _ in fetch_result_chunks(trading, market_ids, chunk_size=chunk_size, max_workers=max_workers):
+        if data is not None:
+            chunks[chunk[0]] = data
+    # as_completed order is arbitrary, keep the order of market_ids
+    data = [race for chunk in chunked(list(market_ids), chunk_size) for race in chunks.get(chunk[0], [])]
+    return flatten_results(data)
 
 def monte_carlo_sim(df_race, n_sims = 10000, seed = 42):
     """
     df_race: df one race, each row represents a horse
     Returns: df with simulated win prob's and expected value of SP bets
-    
+
+    For a whole card or season use monte_carlo.monte_carlo_batch, which
+    simulates every race in one pass.
     """
     rng = np.random.default_rng(seed)
     n_horses = len(df_race)
-    win_counts = np.zeros(n_horses)
-
-    for _ in range(n_sims):
-        winner = rng.choice(
-            df_race.index,
-            p=df_race['pred_prob']/df_race['pred_prob'].sum()
-        )
-        win_counts[winner] += 1
+
+    # draw every simulated winner at once instead of one rng.choice per sim
+    p = df_race['pred_prob'].to_numpy(dtype=float)
+    winners = rng.choice(n_horses, size=n_sims, p=p / p.sum())
+    win_counts = np.bincount(winners, minlength=n_horses)
 
     df_out = df_race.copy()
     df_out['mc_win_prob'] = win_counts / n_sims
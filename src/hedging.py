@@ -0,0 +1,202 @@
+"""
+Vectorized book balancing and green-up across every open market at once.
+
+Positions and live prices are aligned on (market_id, selection_id) and each
+market's book reduces to two numbers per runner:
+
+    payout[i]  = sum(back stake * price) - sum(lay stake * price) on runner i
+    float[m]   = sum(lay stakes) - sum(back stakes) in market m
+
+so the P&L if runner i wins is payout[i] + float[m]. Laying h at price L on
+runner i moves payout[i] by -h * L and float[m] by +h (backing is the mirror
+image), so the stake that greens runner i is payout[i] / L. Every step is a
+hash lookup, a bincount or a reduceat over market-sorted rows.
+
+Example usage:
+    runners, markets = hedge_book(positions, bf.get_market_prices(market_ids), commission=0.05)
+    orders = runners[runners['hedge_stake'] >= 2]
+"""
+import numpy as np
+import pandas as pd
+
+def _signs(side):
+    side = side.to_numpy()
+    back = side == 'BACK'
+    if not (back | (side == 'LAY')).all():
+        side = np.char.upper(side.astype(str))
+        back = side == 'BACK'
+        if not (back | (side == 'LAY')).all():
+            raise ValueError("position side must be 'BACK' or 'LAY'")
+    return np.where(back, 1.0, -1.0)
+
+
+def _after_commission(pnl, commission):
+    """Betfair charges commission on net market winnings only."""
+    return np.where(pnl > 0, pnl * (1 - commission), pnl)
+
+
+def _runners(positions, prices):
+    """
+    One row per (market, selection), sorted by market, with payout and stake float.
+
+    Rows are matched on an int64 key built from the factorized market id and
+    the selection id, so aligning positions with prices is a hash lookup
+    rather than a merge on strings.
+    """
+    pos_codes, market_ids = pd.factorize(positions['market_id'])
+    pos_keys = (pos_codes.astype(np.int64) << 32) | positions['selection_id'].to_numpy(dtype=np.int64)
+
+    if prices is None:
+        keys = np.empty(0, dtype=np.int64)
+        back_price = lay_price = np.empty(0)
+    else:
+        # only markets with an open position need hedging
+        price_codes = pd.Index(market_ids).get_indexer(prices['marketId'])
+        held = price_codes >= 0
+        keys = (price_codes[held].astype(np.int64) << 32) | prices['selectionId'].to_numpy(dtype=np.int64)[held]
+        back_price = prices['backPrice'].to_numpy(dtype=np.float64, na_value=np.nan)[held]
+        lay_price = prices['layPrice'].to_numpy(dtype=np.float64, na_value=np.nan)[held]
+        # a runner listed more than once (e.g. a market fetched in two batches)
+        # keeps its best prices: the highest back and the lowest lay
+        inverse, unique_keys = pd.factorize(keys)
+        if len(unique_keys) < len(keys):
+            best_back = np.full(len(unique_keys), np.nan)
+            best_lay = np.full(len(unique_keys), np.nan)
+            np.fmax.at(best_back, inverse, back_price)
+            np.fmin.at(best_lay, inverse, lay_price)
+            keys, back_price, lay_price = unique_keys, best_back, best_lay
+
+    # positions on runners missing from the price table get a row without prices
+    rows = pd.Index(keys).get_indexer(pos_keys)
+    missing = pd.unique(pos_keys[rows < 0])
+    if len(missing):
+        keys = np.concatenate((keys, missing))
+        back_price = np.concatenate((back_price, np.full(len(missing), np.nan)))
+        lay_price = np.concatenate((lay_price, np.full(len(missing), np.nan)))
+        rows = pd.Index(keys).get_indexer(pos_keys)
+
+    sign = _signs(positions['side'])
+    stake = positions['stake'].to_numpy(dtype=np.float64)
+    payout = np.bincount(rows, weights=sign * stake * positions['price'].to_numpy(dtype=np.float64),
+                         minlength=len(keys))
+    stake_float = np.bincount(rows, weights=-sign * stake, minlength=len(keys))
+
+    codes = (keys >> 32).astype(np.intp)
+    order = np.argsort(codes, kind='stable')
+    runners = pd.DataFrame({
+        'market_id': market_ids[codes[order]],
+        'selection_id': (keys[order] & 0xFFFFFFFF),
+        'back_price': back_price[order],
+        'lay_price': lay_price[order],
+        'payout': payout[order],
+        'stake_float': stake_float[order],
+    })
+    return runners, codes[order], market_ids
+
+
+def _reduce(ufunc, values, starts):
+    """Per-market reduction over market-sorted rows."""
+    return ufunc.reduceat(values, starts) if len(values) else np.empty(0)
+
+
+def _book(positions, prices, commission):
+    """Runners with win_pnl plus the per-market pieces the hedge needs."""
+    runners, codes, market_ids = _runners(positions, prices)
+    n_markets = len(market_ids)
+    stake_float = np.bincount(codes, weights=runners['stake_float'].to_numpy(), minlength=n_markets)
+    runners['win_pnl'] = _after_commission(runners['payout'].to_numpy() + stake_float[codes], commission)
+
+    sizes = np.bincount(codes, minlength=n_markets)
+    starts = np.concatenate(([0], np.cumsum(sizes)[:-1]))
+    win_pnl = runners['win_pnl'].to_numpy()
+    worst = _reduce(np.minimum, win_pnl, starts)
+    best = _reduce(np.maximum, win_pnl, starts)
+    if prices is None:
+        # without a price table the other runners are unknown, so include
+        # the outcome where a runner with no position wins
+        field_pnl = _after_commission(stake_float, commission)
+        worst, best = np.minimum(worst, field_pnl), np.maximum(best, field_pnl)
+    markets = pd.DataFrame({
+        'market_id': market_ids,
+        'worst_case': worst,
+        'best_case': best,
+        'liability': np.maximum(-worst, 0.0),
+    })
+    return runners, markets, codes, starts, stake_float
+
+
+def selection_pnl(positions, prices=None, commission=0.0):
+    """
+    P&L of the current positions for every possible winner.
+
+    Args:
+        positions (pd.DataFrame): market_id, selection_id, side ('BACK'/'LAY'),
+            stake and price of each matched bet
+        prices (pd.DataFrame): optional price table as returned by
+            get_market_price_data; adds runners without a position so every
+            outcome of the market is covered
+        commission (float): commission rate on net market winnings
+
+    Returns:
+        tuple: (runners, markets) where runners has win_pnl per selection and
+            markets has worst_case, best_case and liability per market
+    """
+    runners, markets, _, _, _ = _book(positions, prices, commission)
+    return runners, markets
+
+
+def hedge_book(positions, prices, commission=0.05, round_stakes=True):
+    """
+    Green-up stakes that equalise P&L across every runner of every market.
+
+    Runners with a positive payout are laid at the best lay price, those with
+    a negative payout are backed at the best back price. Runners without a
+    usable price are left unhedged and their market flagged.
+
+    Args:
+        positions (pd.DataFrame): market_id, selection_id, side ('BACK'/'LAY'),
+            stake and price of each matched bet
+        prices (pd.DataFrame): price table as returned by get_market_price_data
+            or get_market_prices (marketId, selectionId, backPrice, layPrice)
+        commission (float): commission rate on net market winnings
+        round_stakes (bool): round hedge stakes to the penny before computing
+            the resulting P&L
+
+    Returns:
+        tuple: (runners, markets)
+            runners: market_id, selection_id, back_price, lay_price, payout,
+                win_pnl, hedge_side, hedge_price, hedge_stake, hedged_win_pnl
+            markets: market_id, worst_case, best_case, liability, green_pnl,
+                fully_hedged
+    """
+    runners, markets, codes, starts, stake_float = _book(positions, prices, commission)
+    n_markets = len(markets)
+    payout = runners['payout'].to_numpy()
+
+    back_price = runners['back_price'].to_numpy(dtype=np.float64, na_value=np.nan)
+    lay_price = runners['lay_price'].to_numpy(dtype=np.float64, na_value=np.nan)
+    lay = payout > 0
+    hedge_price = np.where(lay, lay_price, back_price)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        hedge_stake = np.abs(payout) / hedge_price
+    hedge_stake[payout == 0] = 0.0
+    unhedged = ~np.isfinite(hedge_stake) | (hedge_price <= 1)
+    hedge_stake[unhedged] = 0.0
+    if round_stakes:
+        hedge_stake = np.round(hedge_stake, 2)
+
+    # a lay of h at L: payout -= h * L, float += h; a back is the mirror image
+    sign = np.where(lay, 1.0, -1.0)
+    hedged_payout = payout - sign * hedge_stake * np.nan_to_num(hedge_price)
+    hedged_float = stake_float + np.bincount(codes, weights=sign * hedge_stake, minlength=n_markets)
+    hedged_win_pnl = _after_commission(hedged_payout + hedged_float[codes], commission)
+
+    runners['hedge_side'] = pd.Categorical.from_codes(np.where(hedge_stake > 0, lay.astype(np.int8), -1),
+                                                      categories=['BACK', 'LAY'])
+    runners['hedge_price'] = np.where(hedge_stake > 0, hedge_price, np.nan)
+    runners['hedge_stake'] = hedge_stake
+    runners['hedged_win_pnl'] = hedged_win_pnl
+
+    markets['green_pnl'] = _reduce(np.minimum, hedged_win_pnl, starts)
+    markets['fully_hedged'] = np.bincount(codes, weights=unhedged & (payout != 0), minlength=n_markets) == 0
+    return runners, markets
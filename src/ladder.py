@@ -0,0 +1,240 @@
+"""
+Full-depth ladder analytics on the Betfair tick grid.
+
+Every runner's available-to-back and available-to-lay ladders are packed
+into fixed-size (n_runners, depth) arrays, best price first, with NaN padding
+past the last offered level. Prices are also stored as indices on the Betfair
+tick grid, so distances between prices are integer tick counts. All the
+analytics are array operations over every runner at once:
+
+    - VWAP to a target stake, and the slippage from the best price in ticks
+    - back/lay spread in ticks
+    - book overround per market on the best back and best lay prices
+    - weight-of-money imbalance over the top levels
+
+Example usage:
+    ladders = Ladders.from_books(market_books, depth=10)
+    features = ladders.features(stakes=(10, 100))
+    ladders.vwap('back', 50)
+"""
+from operator import attrgetter
+
+import numpy as np
+
+from .lazy import lazy_import
+
+pd = lazy_import('pandas')
+
+# (from, to, increment) bands of the Betfair price ladder
+TICK_BANDS = [(1.01, 2, 0.01), (2, 3, 0.02), (3, 4, 0.05), (4, 6, 0.1), (6, 10, 0.2), (10, 20, 0.5),
+              (20, 30, 1), (30, 50, 2), (50, 100, 5), (100, 1000, 10)]
+
+TICKS = np.round(np.concatenate(
+    [lo + step * np.arange(round((hi - lo) / step)) for lo, hi, step in TICK_BANDS] + [[1000.0]]), 2)
+
+_PRICE = attrgetter('price')
+_SIZE = attrgetter('size')
+
+
+def price_to_tick(prices):
+    """
+    Index on the tick grid of each price, -1 for NaN. Off-grid prices map to
+    the next tick up.
+
+    Args:
+        prices (np.ndarray): prices of any shape
+
+    Returns:
+        np.ndarray: int16 tick indices of the same shape
+    """
+    prices = np.asarray(prices, dtype=np.float64)
+    ticks = np.searchsorted(TICKS, prices - 1e-9).astype(np.int16)
+    ticks[np.isnan(prices)] = -1
+    return np.minimum(ticks, len(TICKS) - 1, out=ticks, where=ticks >= 0)
+
+
+def tick_to_price(ticks):
+    """Price of each tick index, NaN for -1."""
+    ticks = np.asarray(ticks)
+    return np.where(ticks >= 0, TICKS[np.clip(ticks, 0, len(TICKS) - 1)], np.nan)
+
+
+def _pack(ladders, depth):
+    """
+    Scatter a list of [PriceSize, ...] ladders into (n, depth) price and size arrays.
+
+    The levels are flattened once with a comprehension and written with a
+    single fancy-indexed assignment per array.
+    """
+    n = len(ladders)
+    counts = np.fromiter((min(len(ladder), depth) for ladder in ladders), dtype=np.int64, count=n)
+    total = int(counts.sum())
+    levels = [level for ladder in ladders for level in ladder[:depth]]
+    flat_price = np.fromiter(map(_PRICE, levels), dtype=np.float64, count=total)
+    flat_size = np.fromiter(map(_SIZE, levels), dtype=np.float64, count=total)
+
+    rows = np.repeat(np.arange(n), counts)
+    cols = np.arange(total) - np.repeat(np.cumsum(counts) - counts, counts)
+    prices = np.full((n, depth), np.nan)
+    sizes = np.full((n, depth), np.nan)
+    prices[rows, cols] = flat_price
+    sizes[rows, cols] = flat_size
+    return prices, sizes
+
+
+class Ladders:
+    """
+    Back and lay ladders of many runners as fixed-size arrays.
+
+    Args:
+        market_id (np.ndarray): market id of each runner row
+        selection_id (np.ndarray): int64 selection id of each row
+        back_price, back_size (np.ndarray): (n, depth) available to back, best (highest) price first
+        lay_price, lay_size (np.ndarray): (n, depth) available to lay, best (lowest) price first
+    """
+    def __init__(self, market_id, selection_id, back_price, back_size, lay_price, lay_size):
+        self.market_id = np.asarray(market_id, dtype=object)
+        self.selection_id = np.asarray(selection_id, dtype=np.int64)
+        self.back_price = back_price
+        self.back_size = back_size
+        self.lay_price = lay_price
+        self.lay_size = lay_size
+        self.back_tick = price_to_tick(back_price)
+        self.lay_tick = price_to_tick(lay_price)
+        self.market_codes, self.market_ids = pd.factorize(self.market_id)
+
+    @classmethod
+    def from_books(cls, market_books, depth=10):
+        """
+        Ladders from ex_all_offers (or ex_best_offers) MarketBook objects.
+
+        Args:
+            market_books (list): MarketBook objects, or lists of them as
+                returned by MorningPrice.market_books
+            depth (int): levels kept per side
+
+        Returns:
+            Ladders: one row per runner
+        """
+        books = [book for item in market_books for book in (item if isinstance(item, list) else [item])]
+        runners = [(book.market_id, runner) for book in books for runner in book.runners]
+        back = [runner.ex.available_to_back if runner.ex else [] for _, runner in runners]
+        lay = [runner.ex.available_to_lay if runner.ex else [] for _, runner in runners]
+        back_price, back_size = _pack(back, depth)
+        lay_price, lay_size = _pack(lay, depth)
+        return cls([market_id for market_id, _ in runners],
+                   np.fromiter((runner.selection_id for _, runner in runners), dtype=np.int64, count=len(runners)),
+                   back_price, back_size, lay_price, lay_size)
+
+    @classmethod
+    def from_ladder_cache(cls, cache):
+        """Ladders over the rows of a market_stream.LadderCache, sharing its level arrays."""
+        n = len(cache.keys)
+        return cls([key[0] for key in cache.keys], [key[1] for key in cache.keys],
+                   cache.back_price[:n], cache.back_size[:n], cache.lay_price[:n], cache.lay_size[:n])
+
+    def __len__(self):
+        return len(self.selection_id)
+
+    def _side(self, side):
+        if side == 'back':
+            return self.back_price, self.back_size, self.back_tick
+        if side == 'lay':
+            return self.lay_price, self.lay_size, self.lay_tick
+        raise ValueError("side must be 'back' or 'lay'")
+
+    def vwap(self, side, stake):
+        """
+        Average price of filling stake against the ladder, walking from the best level.
+
+        Backing takes the available-to-back ladder, laying the available-to-lay
+        ladder; sizes are backer's stakes on both sides.
+
+        Args:
+            side (str): 'back' or 'lay'
+            stake (float): stake to fill
+
+        Returns:
+            tuple: (vwap, filled, slippage_ticks) arrays per runner. vwap and
+                slippage are NaN where the visible ladder cannot fill the
+                whole stake; slippage is the size-weighted tick distance from
+                the best price.
+        """
+        prices, sizes, ticks = self._side(side)
+        sizes = np.nan_to_num(sizes)
+        before = np.cumsum(sizes, axis=1) - sizes
+        take = np.clip(stake - before, 0.0, sizes)
+        filled = take.sum(axis=1)
+        complete = filled >= stake - 1e-9
+        with np.errstate(invalid='ignore', divide='ignore'):
+            vwap = np.nansum(take * prices, axis=1) / filled
+            mean_tick = (take * ticks).sum(axis=1) / filled
+        slippage = np.abs(mean_tick - ticks[:, 0])
+        vwap[~complete] = np.nan
+        slippage[~complete] = np.nan
+        return vwap, filled, slippage
+
+    def spread_ticks(self):
+        """Ticks between best back and best lay, NaN when either side is empty."""
+        back, lay = self.back_tick[:, 0], self.lay_tick[:, 0]
+        return np.where((back >= 0) & (lay >= 0), lay.astype(np.float64) - back, np.nan)
+
+    def overround(self, side='back'):
+        """
+        Book percentage per market: the sum of 1 / best price over its runners.
+
+        Returns:
+            np.ndarray: one value per runner row (its market's overround), NaN
+                for markets with no prices on that side
+        """
+        prices, _, _ = self._side(side)
+        implied = 1.0 / prices[:, 0]
+        n_markets = len(self.market_ids)
+        book = np.bincount(self.market_codes, weights=np.nan_to_num(implied), minlength=n_markets)
+        priced = np.bincount(self.market_codes, weights=~np.isnan(implied), minlength=n_markets)
+        book[priced == 0] = np.nan
+        return book[self.market_codes]
+
+    def wom_imbalance(self, levels=3):
+        """
+        Weight-of-money imbalance over the top levels: (back - lay) / (back + lay)
+        of the offered sizes, in [-1, 1], NaN for an empty ladder.
+        """
+        back = np.nansum(self.back_size[:, :levels], axis=1)
+        lay = np.nansum(self.lay_size[:, :levels], axis=1)
+        total = back + lay
+        with np.errstate(invalid='ignore', divide='ignore'):
+            return np.where(total > 0, (back - lay) / total, np.nan)
+
+    def features(self, stakes=(10, 100), wom_levels=3):
+        """
+        Per-runner ladder features and execution-cost estimates.
+
+        Args:
+            stakes (tuple): target stakes for VWAP and slippage columns
+            wom_levels (int): levels used for the weight-of-money imbalance
+
+        Returns:
+            pd.DataFrame: market_id, selection_id, best_back, best_lay,
+                spread_ticks, back_overround, lay_overround, wom_imbalance,
+                back_depth, lay_depth and back/lay _vwap_<stake> and
+                _slippage_<stake> columns
+        """
+        df = pd.DataFrame({
+            'market_id': self.market_id,
+            'selection_id': self.selection_id,
+            'best_back': self.back_price[:, 0],
+            'best_lay': self.lay_price[:, 0],
+            'spread_ticks': self.spread_ticks(),
+            'back_overround': self.overround('back'),
+            'lay_overround': self.overround('lay'),
+            'wom_imbalance': self.wom_imbalance(wom_levels),
+            'back_depth': np.nansum(self.back_size, axis=1),
+            'lay_depth': np.nansum(self.lay_size, axis=1),
+        })
+        for stake in stakes:
+            for side in ('back', 'lay'):
+                vwap, _, slippage = self.vwap(side, stake)
+                df[f'{side}_vwap_{stake:g}'] = vwap
+                df[f'{side}_slippage_{stake:g}'] = slippage
+        return df
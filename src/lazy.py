@@ -0,0 +1,66 @@
+"""
+Deferred imports for heavy dependencies.
+
+lazy_import returns a stand-in module that performs the real import on first
+attribute access, so modules can name mlflow, sklearn, pandas or
+betfairlightweight at the top as usual while a script that never touches
+them does not pay for loading them. Looked-up attributes are cached on the
+stand-in, so hot loops pay the indirection once per name.
+
+Example usage:
+    from .lazy import lazy_import
+    mlflow = lazy_import('mlflow')
+
+    mlflow.log_metric('roc_auc', 0.71)  # mlflow is imported here
+"""
+import importlib
+import sys
+import types
+
+
+class LazyModule(types.ModuleType):
+    """
+    Module stand-in that imports the named module on first attribute access.
+
+    Args:
+        name (str): dotted module name, e.g. 'sklearn.metrics'
+    """
+    def __init__(self, name):
+        super().__init__(name)
+        self.__dict__['_module'] = None
+
+    def _load(self):
+        module = self.__dict__['_module']
+        if module is None:
+            module = importlib.import_module(self.__name__)
+            self.__dict__['_module'] = module
+        return module
+
+    def __getattr__(self, attr):
+        value = getattr(self._load(), attr)
+        self.__dict__[attr] = value
+        return value
+
+    def __dir__(self):
+        return dir(self._load())
+
+    def __repr__(self):
+        state = 'loaded' if self.__dict__['_module'] is not None else 'not loaded'
+        return f"<lazy module '{self.__name__}' ({state})>"
+
+
+def lazy_import(name):
+    """
+    Module named name, imported on first use.
+
+    Returns the real module straight away if it has already been imported.
+
+    Args:
+        name (str): dotted module name
+
+    Returns:
+        module: the module, or a LazyModule standing in for it
+    """
+    if name in sys.modules:
+        return sys.modules[name]
+    return LazyModule(name)
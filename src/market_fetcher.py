@@ -0,0 +1,185 @@
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+from .lazy import lazy_import
+from .profiling import bind, count_api
+
+betfairlightweight = lazy_import('betfairlightweight')
+
+# Betfair caps each listMarketBook request at a total weight of 200, where the
+# weight is (sum of the price projection weights) * (number of markets).
+MAX_REQUEST_WEIGHT = 200
+
+PRICE_DATA_WEIGHTS = {
+    'NONE': 2,
+    'SP_AVAILABLE': 3,
+    'SP_TRADED': 7,
+    'EX_BEST_OFFERS': 5,
+    'EX_ALL_OFFERS': 17,
+    'EX_TRADED': 17,
+}
+
+
+def projection_weight(price_data):
+    """
+    Request weight of a single market for the given price data projection.
+
+    Args:
+        price_data (list): price data names, e.g. ['EX_ALL_OFFERS']
+
+    Returns:
+        int: weight charged per market
+    """
+    if not price_data:
+        return PRICE_DATA_WEIGHTS['NONE']
+    return sum(PRICE_DATA_WEIGHTS.get(name, PRICE_DATA_WEIGHTS['EX_ALL_OFFERS']) for name in price_data)
+
+
+def batch_size_for(price_data):
+    """Largest number of markets per request allowed by the weight limit."""
+    return max(1, MAX_REQUEST_WEIGHT // projection_weight(price_data))
+
+
+def chunked(items, size):
+    """Split a list into consecutive chunks of at most size items."""
+    return [items[i:i + size] for i in range(0, len(items), size)]
+
+
+class TokenBucket:
+    """
+    Thread-safe token bucket used to cap the request rate across workers.
+
+    Args:
+        rate (float): tokens added per second
+        capacity (int): maximum burst size
+    """
+    def __init__(self, rate, capacity=None):
+        self.rate = float(rate)
+        self.capacity = float(capacity if capacity is not None else max(1, rate))
+        self.tokens = self.capacity
+        self.last = time.monotonic()
+        self.lock = threading.Lock()
+
+    def acquire(self):
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.last) * self.rate)
+                self.last = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                wait = (1 - self.tokens) / self.rate
+            time.sleep(wait)
+
+
+def latency_summary(latencies, n_markets, n_failed, elapsed):
+    """
+    Summarise per-batch latencies.
+
+    Args:
+        latencies (list): seconds taken by each successful batch
+        n_markets (int): number of markets requested
+        n_failed (int): number of batches that failed after all retries
+        elapsed (float): wall time of the whole fetch in seconds
+
+    Returns:
+        dict: batch counts and latency percentiles in milliseconds
+    """
+    stats = {
+        'markets': n_markets,
+        'batches': len(latencies) + n_failed,
+        'failed_batches': n_failed,
+        'elapsed_s': round(elapsed, 4),
+    }
+    if latencies:
+        ms = np.asarray(latencies) * 1000
+        stats.update({
+            'latency_min_ms': round(float(ms.min()), 2),
+            'latency_mean_ms': round(float(ms.mean()), 2),
+            'latency_p50_ms': round(float(np.percentile(ms, 50)), 2),
+            'latency_p95_ms': round(float(np.percentile(ms, 95)), 2),
+            'latency_max_ms': round(float(ms.max()), 2),
+        })
+    return stats
+
+
+def call_with_retry(request, bucket, max_retries=3, backoff=0.5, description='request'):
+    """
+    Run one rate-limited API call, retrying with exponential backoff.
+
+    Args:
+        request (callable): makes the call and returns its result
+        bucket (TokenBucket): shared rate limiter, one token per attempt
+        max_retries (int): attempts before giving up
+        backoff (float): base delay for exponential backoff between retries
+        description (str): what is being fetched, for the log
+
+    Returns:
+        tuple: (result, seconds) of the successful attempt, or (None, None)
+    """
+    for attempt in range(max_retries):
+        bucket.acquire()
+        count_api()
+        start = time.perf_counter()
+        try:
+            return request(), time.perf_counter() - start
+        except Exception as e:
+            logging.warning(f'{description} failed (attempt {attempt + 1}): {e}')
+            if attempt + 1 < max_retries:
+                time.sleep(backoff * 2 ** attempt)
+    logging.error(f'Giving up on {description} after {max_retries} attempts')
+    return None, None
+
+
+def fetch_market_books(trading, market_ids, price_data=('EX_ALL_OFFERS',), max_workers=4,
+                       requests_per_second=5, max_retries=3, backoff=0.5, batch_size=None):
+    """
+    Fetch market books in weight-limited batches from a bounded thread pool.
+
+    Args:
+        trading (betfairlightweight.APIClient): logged in client, or any object
+            exposing betting.list_market_book
+        market_ids (list): market ids to fetch
+        price_data (tuple): price data projection names
+        max_workers (int): number of concurrent requests
+        requests_per_second (float): shared rate limit across all workers
+        max_retries (int): attempts per batch before giving up on it
+        backoff (float): base delay for exponential backoff between retries
+        batch_size (int): markets per request, defaults to the largest batch the
+            weight limit allows for price_data
+
+    Returns:
+        tuple: (market_books, stats) where market_books is a list with one list
+            of MarketBook objects per batch, in market_ids order, and stats is
+            the latency_summary of the fetch
+
+    Example usage:
+        books, stats = fetch_market_books(trading, market_ids, max_workers=8)
+    """
+    price_data = list(price_data)
+    batches = chunked(list(market_ids), batch_size or batch_size_for(price_data))
+    price_projection = betfairlightweight.filters.price_projection(
+        price_data=betfairlightweight.filters.price_data(**{name.lower(): True for name in price_data})
+    )
+    bucket = TokenBucket(requests_per_second)
+
+    def fetch(batch):
+        return call_with_retry(
+            lambda: trading.betting.list_market_book(market_ids=batch, price_projection=price_projection),
+            bucket, max_retries, backoff, f'list_market_book for {len(batch)} markets starting {batch[0]}')
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        results = list(executor.map(bind(fetch), batches))
+    elapsed = time.perf_counter() - start
+
+    market_books = [books for books, _ in results if books is not None]
+    latencies = [latency for books, latency in results if books is not None]
+    n_failed = len(results) - len(market_books)
+
+    return market_books, latency_summary(latencies, len(market_ids), n_failed, elapsed)
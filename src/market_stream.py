@@ -0,0 +1,391 @@
+import bz2
+import functools
+import gzip
+import json
+import logging
+import threading
+import time
+
+import numpy as np
+
+from .lazy import lazy_import
+
+betfairlightweight = lazy_import('betfairlightweight')
+pd = lazy_import('pandas')
+
+
+class LadderCache:
+    """
+    Compact in-memory order book for streamed market data.
+
+    Every (market_id, selection_id) pair owns one row of a set of preallocated
+    NumPy arrays holding the top `depth` back/lay levels, last traded price and
+    traded volume. A dict maps the pair to its row so lookups are O(1), and
+    market change deltas are written straight into the arrays. A runner whose
+    status becomes REMOVED is evicted: the last row is moved into its place,
+    so the arrays stay dense and only live runners are kept.
+
+    Args:
+        depth (int): number of ladder levels kept per side
+        capacity (int): initial number of runner rows, grown as needed
+    """
+    def __init__(self, depth=3, capacity=1024):
+        self.depth = depth
+        self.index = {}
+        self.keys = []
+        self.market_rows = {}
+        self.market_status = {}
+        self.runner_status = {}
+        self.publish_time = {}
+        self.updates_processed = 0
+        # price -> size maps for price-point ladders (atb/atl), keyed by (row, side)
+        self._price_ladders = {}
+        self._allocate(capacity)
+
+    def _allocate(self, capacity):
+        self.back_price = np.full((capacity, self.depth), np.nan)
+        self.back_size = np.full((capacity, self.depth), np.nan)
+        self.lay_price = np.full((capacity, self.depth), np.nan)
+        self.lay_size = np.full((capacity, self.depth), np.nan)
+        self.ltp = np.full(capacity, np.nan)
+        self.tv = np.full(capacity, np.nan)
+
+    def _arrays(self):
+        return self.back_price, self.back_size, self.lay_price, self.lay_size, self.ltp, self.tv
+
+    def _grow(self):
+        n = len(self.ltp)
+        old = self._arrays()
+        self._allocate(n * 2)
+        for new, prev in zip(self._arrays(), old):
+            new[:n] = prev
+
+    def _row(self, market_id, selection_id):
+        key = (market_id, selection_id)
+        row = self.index.get(key)
+        if row is None:
+            row = len(self.keys)
+            if row == len(self.ltp):
+                self._grow()
+            self.index[key] = row
+            self.keys.append(key)
+            self.market_rows.setdefault(market_id, []).append(row)
+        return row
+
+    def _evict(self, market_id, selection_id):
+        """Drop a runner's row, moving the last row into its place."""
+        row = self.index.pop((market_id, selection_id), None)
+        if row is None:
+            return
+        self.market_rows[market_id].remove(row)
+        self._price_ladders.pop((row, 'atb'), None)
+        self._price_ladders.pop((row, 'atl'), None)
+        last = len(self.keys) - 1
+        if row != last:
+            moved = self.keys[last]
+            for array in self._arrays():
+                array[row] = array[last]
+            self.keys[row] = moved
+            self.index[moved] = row
+            rows = self.market_rows[moved[0]]
+            rows[rows.index(last)] = row
+            for side in ('atb', 'atl'):
+                ladder = self._price_ladders.pop((last, side), None)
+                if ladder is not None:
+                    self._price_ladders[(row, side)] = ladder
+        self.keys.pop()
+        for array in self._arrays():
+            array[last] = np.nan
+
+    def _clear_market(self, market_id):
+        for row in self.market_rows.get(market_id, []):
+            self.back_price[row] = self.back_size[row] = np.nan
+            self.lay_price[row] = self.lay_size[row] = np.nan
+            self.ltp[row] = self.tv[row] = np.nan
+            self._price_ladders.pop((row, 'atb'), None)
+            self._price_ladders.pop((row, 'atl'), None)
+
+    def _apply_levels(self, prices, sizes, row, levels):
+        # level-based ladder (batb/batl): [[level, price, size], ...], size 0 removes the level
+        for level, price, size in levels:
+            if level < self.depth:
+                if size == 0:
+                    prices[row, level] = sizes[row, level] = np.nan
+                else:
+                    prices[row, level] = price
+                    sizes[row, level] = size
+
+    def _apply_price_points(self, prices, sizes, row, side, updates):
+        # price-point ladder (atb/atl): [[price, size], ...], size 0 removes the price
+        ladder = self._price_ladders.setdefault((row, side), {})
+        for price, size in updates:
+            if size == 0:
+                ladder.pop(price, None)
+            else:
+                ladder[price] = size
+        best = sorted(ladder, reverse=(side == 'atb'))[:self.depth]
+        prices[row] = sizes[row] = np.nan
+        prices[row, :len(best)] = best
+        sizes[row, :len(best)] = [ladder[p] for p in best]
+
+    def apply(self, market_change, publish_time=None):
+        """
+        Apply one market change ('mc' element of a stream message) to the cache.
+
+        Args:
+            market_change (dict): market change with 'id' and optional 'img',
+                'marketDefinition' and 'rc' runner changes
+            publish_time (int): message publish time in epoch milliseconds
+        """
+        market_id = market_change['id']
+        if market_change.get('img'):
+            self._clear_market(market_id)
+
+        definition = market_change.get('marketDefinition')
+        if definition:
+            self.market_status[market_id] = definition.get('status')
+            for runner in definition.get('runners', []):
+                status = runner.get('status')
+                self.runner_status[(market_id, runner['id'])] = status
+                if status == 'REMOVED':
+                    self._evict(market_id, runner['id'])
+                else:
+                    self._row(market_id, runner['id'])
+
+        for rc in market_change.get('rc', []):
+            # non-runners stay out of the cache; their status is kept as a tombstone
+            if self.runner_status.get((market_id, rc['id'])) == 'REMOVED':
+                continue
+            row = self._row(market_id, rc['id'])
+            if 'batb' in rc:
+                self._apply_levels(self.back_price, self.back_size, row, rc['batb'])
+            if 'batl' in rc:
+                self._apply_levels(self.lay_price, self.lay_size, row, rc['batl'])
+            if 'atb' in rc:
+                self._apply_price_points(self.back_price, self.back_size, row, 'atb', rc['atb'])
+            if 'atl' in rc:
+                self._apply_price_points(self.lay_price, self.lay_size, row, 'atl', rc['atl'])
+            if 'ltp' in rc:
+                self.ltp[row] = rc['ltp']
+            if 'tv' in rc:
+                self.tv[row] = rc['tv']
+
+        if publish_time is not None:
+            self.publish_time[market_id] = publish_time
+        self.updates_processed += 1
+
+    def on_message(self, message):
+        """Apply every market change in a decoded 'mcm' stream message."""
+        if message.get('op') != 'mcm':
+            return
+        for market_change in message.get('mc', []):
+            self.apply(market_change, message.get('pt'))
+
+    @staticmethod
+    def _value(x):
+        return None if np.isnan(x) else float(x)
+
+    def best_offer(self, market_id, selection_id):
+        """
+        Level-1 prices for one runner.
+
+        Returns:
+            tuple: (backPrice, backSize, layPrice, laySize), None for empty sides,
+                or None if the runner is not in the cache
+        """
+        row = self.index.get((market_id, selection_id))
+        if row is None:
+            return None
+        return (self._value(self.back_price[row, 0]), self._value(self.back_size[row, 0]),
+                self._value(self.lay_price[row, 0]), self._value(self.lay_size[row, 0]))
+
+    def best_offer_rows(self, market_id):
+        """
+        Level-1 rows for a market in the same format as Betfair.get_market_price_data.
+
+        Returns:
+            list: one dict per runner, or None if the market is not in the cache
+        """
+        rows = self.market_rows.get(market_id)
+        if rows is None:
+            return None
+        extracted_data = []
+        for row in rows:
+            back_price, back_size, lay_price, lay_size = self.best_offer(*self.keys[row])
+            extracted_data.append({
+                'marketId': market_id,
+                'selectionId': self.keys[row][1],
+                'backPrice': back_price,
+                'backSize': back_size,
+                'layPrice': lay_price,
+                'laySize': lay_size
+            })
+        return extracted_data
+
+    def snapshot(self):
+        """
+        Level-1 prices for every cached runner as a DataFrame.
+
+        Returns:
+            pd.DataFrame: columns marketId, selectionId, status, backPrice,
+                backSize, layPrice, laySize, ltp, tv
+        """
+        n = len(self.keys)
+        market_ids = [key[0] for key in self.keys]
+        selection_ids = [key[1] for key in self.keys]
+        return pd.DataFrame({
+            'marketId': market_ids,
+            'selectionId': np.asarray(selection_ids, dtype=np.int64),
+            'status': [self.runner_status.get(key) for key in self.keys],
+            'backPrice': self.back_price[:n, 0],
+            'backSize': self.back_size[:n, 0],
+            'layPrice': self.lay_price[:n, 0],
+            'laySize': self.lay_size[:n, 0],
+            'ltp': self.ltp[:n],
+            'tv': self.tv[:n],
+        })
+
+
+@functools.lru_cache(maxsize=None)
+def _listener_class():
+    """
+    LadderListener, defined on first use: it subclasses betfairlightweight's
+    BaseListener, and importing that up front would load betfairlightweight
+    for every importer of this module, backtest included.
+    """
+    from betfairlightweight.streaming import BaseListener
+
+    class LadderListener(BaseListener):
+        """
+        Stream listener that feeds raw market change messages into a LadderCache.
+
+        The recording is line buffered, so every message is on disk as soon as it
+        is written and a crash loses at most the line being written. Use the
+        listener as a context manager, or call close(), to close the file.
+
+        Args:
+            cache (LadderCache): cache to update
+            record_path (str): optional file to append every raw message to, for replay
+
+        Example usage:
+            with LadderListener(cache, record_path='../data/stream.jsonl') as listener:
+                stream = trading.streaming.create_stream(listener=listener)
+                ...
+        """
+        def __init__(self, cache, record_path=None, max_latency=None):
+            super().__init__(max_latency=max_latency)
+            self.cache = cache
+            self.record_file = open(record_path, 'a', buffering=1) if record_path else None
+
+        def __enter__(self):
+            return self
+
+        def __exit__(self, *exc):
+            self.close()
+            return False
+
+        def on_data(self, raw_data):
+            if self.record_file:
+                self.record_file.write(raw_data + '\n')
+
+            message = json.loads(raw_data)
+            op = message.get('op')
+            if op == 'mcm':
+                self.cache.on_message(message)
+            elif op == 'connection':
+                self.connection_id = message.get('connectionId')
+            elif op == 'status':
+                self.status = message.get('statusCode')
+                if self.status == 'FAILURE':
+                    logging.error(f"Stream failure: {message.get('errorCode')} {message.get('errorMessage')}")
+                    return False
+
+        def close(self):
+            if self.record_file:
+                self.record_file.close()
+                self.record_file = None
+
+    LadderListener.__qualname__ = 'LadderListener'
+    return LadderListener
+
+
+def __getattr__(name):
+    if name == 'LadderListener':
+        return _listener_class()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
+def start_market_stream(trading, cache, market_ids=None, record_path=None, conflate_ms=None):
+    """
+    Subscribe to GB horse racing WIN markets and keep cache up to date in a background thread.
+
+    Args:
+        trading (betfairlightweight.APIClient): logged in client
+        cache (LadderCache): cache to update
+        market_ids (list): restrict the subscription to these markets
+        record_path (str): optional file to record raw messages to
+        conflate_ms (int): optional conflation interval
+
+    Returns:
+        tuple: (stream, thread); call stream.stop() to end the subscription,
+            then stream.listener.close() to close the recording
+
+    Example usage:
+        cache = LadderCache()
+        stream, thread = start_market_stream(trading, cache)
+        cache.best_offer_rows(market_id)
+    """
+    listener = _listener_class()(cache, record_path=record_path)
+    stream = trading.streaming.create_stream(listener=listener)
+
+    if market_ids:
+        market_filter = betfairlightweight.filters.streaming_market_filter(market_ids=market_ids)
+    else:
+        market_filter = betfairlightweight.filters.streaming_market_filter(
+            event_type_ids=['7'], country_codes=['GB'], market_types=['WIN']
+        )
+    market_data_filter = betfairlightweight.filters.streaming_market_data_filter(
+        fields=['EX_BEST_OFFERS', 'EX_LTP', 'EX_TRADED_VOL', 'EX_MARKET_DEF'],
+        ladder_levels=cache.depth,
+    )
+    stream.subscribe_to_markets(market_filter=market_filter, market_data_filter=market_data_filter,
+                                conflate_ms=conflate_ms)
+
+    thread = threading.Thread(target=stream.start, name='market-stream', daemon=True)
+    thread.start()
+    return stream, thread
+
+
+def _open_recording(file_path):
+    if file_path.endswith('.bz2'):
+        return bz2.open(file_path, 'rt')
+    if file_path.endswith('.gz'):
+        return gzip.open(file_path, 'rt')
+    return open(file_path, 'r')
+
+
+def replay(file_path, cache):
+    """
+    Feed a recorded stream file (one JSON message per line, plain, .gz or .bz2)
+    through the cache, e.g. Betfair historic data or a LadderListener recording.
+
+    Args:
+        file_path (str): path to the recording
+        cache (LadderCache): cache to update
+
+    Returns:
+        dict: messages processed, elapsed seconds and messages per second
+    """
+    n_messages = 0
+    start = time.perf_counter()
+    with _open_recording(file_path) as f:
+        for line in f:
+            if line.strip():
+                cache.on_message(json.loads(line))
+                n_messages += 1
+    elapsed = time.perf_counter() - start
+    return {
+        'messages': n_messages,
+        'elapsed_s': round(elapsed, 4),
+        'messages_per_s': round(n_messages / elapsed, 1) if elapsed > 0 else None,
+    }
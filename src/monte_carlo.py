@@ -0,0 +1,297 @@
+import numpy as np
+import pandas as pd
+
+
+def _race_layout(df, race_col, prob_col):
+    """
+    Order the runners of every race contiguously and normalise their probabilities.
+
+    Args:
+        df (pd.DataFrame): runners for one or more races
+        race_col (str): column identifying the race, raises ValueError if any is missing
+        prob_col (str): column holding the (unnormalised) model probabilities
+
+    Returns:
+        tuple: (order, codes, starts, sizes, probs) where order maps the sorted
+            position back to the row position in df, codes is the race code for
+            each sorted row, starts/sizes describe each race block and probs are
+            the per-race normalised probabilities in sorted order
+    """
+    # groupby drops missing keys, which would leave those rows without a race
+    # code and break the bincounts below
+    missing = df[race_col].isna()
+    missing = int((missing.any(axis=1) if missing.ndim > 1 else missing).sum())
+    if missing:
+        raise ValueError(f'{missing} rows have a missing {race_col}; drop or fill them first')
+    race_codes = df.groupby(race_col, sort=False).ngroup().to_numpy()
+    order = np.argsort(race_codes, kind='stable')
+    codes = race_codes[order]
+
+    n_races = int(codes[-1]) + 1 if len(codes) else 0
+    sizes = np.bincount(codes, minlength=n_races)
+    starts = np.concatenate(([0], np.cumsum(sizes)[:-1]))
+
+    probs = df[prob_col].to_numpy(dtype=np.float64)[order]
+    probs = np.where(np.isfinite(probs) & (probs > 0), probs, 0.0)
+    totals = np.bincount(codes, weights=probs, minlength=n_races)
+
+    # races with no usable probability mass are treated as a uniform field
+    empty = totals[codes] <= 0
+    probs[empty] = 1.0
+    totals = np.bincount(codes, weights=probs, minlength=n_races)
+
+    return order, codes, starts, sizes, probs / totals[codes]
+
+
+def simulate_winners(probs, starts, sizes, n_sims=10000, seed=42, chunk_size=2000):
+    """
+    Win frequencies for races laid out contiguously, as returned by _race_layout.
+
+    Args:
+        probs (np.ndarray): per-race normalised probabilities, races contiguous
+        starts (np.ndarray): first position of each race
+        sizes (np.ndarray): number of runners in each race
+        n_sims (int): number of simulations per race
+        seed (int): seed for the random generator
+        chunk_size (int): number of simulations drawn per batch
+
+    Returns:
+        np.ndarray: fraction of simulations won by each runner
+    """
+    rng = np.random.default_rng(seed)
+    n_races = len(sizes)
+    cdf = np.cumsum(probs)
+    ends = starts + sizes - 1
+    race_index = np.arange(n_races)
+    win_counts = np.zeros(len(probs), dtype=np.int64)
+
+    done = 0
+    while done < n_sims:
+        batch = min(chunk_size, n_sims - done)
+        targets = race_index + rng.random((batch, n_races))
+        winners = np.searchsorted(cdf, targets, side='right')
+        # floating point drift in the cumulative sum can push a draw over
+        # the race boundary, so keep every winner inside its own race
+        winners = np.clip(winners, starts, ends)
+        win_counts += np.bincount(winners.ravel(), minlength=len(probs))
+        done += batch
+
+    return win_counts / n_sims
+
+
+def monte_carlo_batch(df, n_sims=10000, seed=42, race_col='race_id', prob_col='pred_prob',
+                      sp_col='BF Decimal SP1', closed_form=False, chunk_size=2000):
+    """
+    Simulate the winner of every race in df at once.
+
+    All races are drawn together by inverse-CDF sampling: the normalised
+    probabilities of each race sum to one, so a single cumulative sum over the
+    whole card places race r on the interval [r, r + 1) and one searchsorted
+    call resolves every (race, simulation) draw. Simulations are processed in
+    chunks of chunk_size to bound memory on a full season.
+
+    Args:
+        df (pd.DataFrame): runners for one or more races, one row per horse
+        n_sims (int): number of simulations per race
+        seed (int): seed for the random generator, results are reproducible
+        race_col (str): column identifying the race
+        prob_col (str): column holding the model probabilities
+        sp_col (str): column holding the decimal SP used for the expected value; the
+            notebooks keep the raw price in 'BF Decimal SP1' and normalise 'BF Decimal SP'
+        closed_form (bool): skip the simulation and return the normalised
+            probabilities, which is what the simulation converges to
+        chunk_size (int): number of simulations drawn per batch
+
+    Returns:
+        pd.DataFrame: copy of df with 'mc_win_prob' and 'ev' columns added
+
+    Example usage:
+        results = monte_carlo_batch(df_test, n_sims=5000)
+    """
+    df_out = df.copy()
+    if df_out.empty:
+        df_out['mc_win_prob'] = pd.Series(dtype=np.float64)
+        df_out['ev'] = pd.Series(dtype=np.float64)
+        return df_out
+
+    order, codes, starts, sizes, probs = _race_layout(df, race_col, prob_col)
+    win_prob = probs if closed_form else simulate_winners(probs, starts, sizes, n_sims, seed, chunk_size)
+
+    mc_win_prob = np.empty(len(probs))
+    mc_win_prob[order] = win_prob
+
+    df_out['mc_win_prob'] = mc_win_prob
+    df_out['ev'] = df_out[sp_col] * df_out['mc_win_prob'] - 1
+    return df_out
+
+
+def standard_place_terms(field_size):
+    """
+    Number of paid places under standard each-way terms.
+
+    Args:
+        field_size (np.ndarray): number of runners in each race
+
+    Returns:
+        np.ndarray: places paid for each race (1 means win only)
+    """
+    field_size = np.asarray(field_size)
+    return np.select([field_size < 5, field_size < 8], [1, 2], default=3)
+
+
+def simulate_finishing_order(df, n_sims=10000, seed=42, race_col='race_id', prob_col='pred_prob',
+                             places=None, forecast=True, tricast=True, chunk_size=500, max_cells=4_000_000):
+    """
+    Simulate complete finishing orders for every race in df at once.
+
+    Orders are sampled from the Plackett-Luce (Harville) model with the
+    Gumbel-top-k trick: adding Gumbel noise to log(p) and sorting gives a draw
+    of the full finishing order. Races are padded into a (race, runner)
+    matrix so each chunk of simulations is a single vectorised sort. A long
+    history is simulated in blocks of whole races, and the chunk shrunk if
+    needed, so the working arrays never exceed max_cells
+    (simulations x races x largest field) elements whatever the number of races.
+
+    Args:
+        df (pd.DataFrame): runners for one or more races, one row per horse
+        n_sims (int): number of simulations per race
+        seed (int): seed for the random generator, results are reproducible
+        race_col (str or list): column(s) identifying the race
+        prob_col (str): column holding the model win probabilities
+        places (int or callable): places paid; an int applies to every race,
+            a callable receives the array of field sizes and returns places per
+            race. Defaults to standard_place_terms
+        forecast (bool): also return straight forecast probability matrices
+        tricast (bool): also return tricast probability matrices
+        chunk_size (int): number of simulations drawn per batch
+        max_cells (int): cap on simulations x races x largest field per
+            batch; each working array holds that many 8 byte elements
+
+    Returns:
+        tuple: (df_out, forecasts, tricasts) where df_out is a copy of df with
+            'mc_win_prob', 'place_prob' and 'places' columns added, forecasts
+            maps race id (a tuple of the race_col values when race_col is a
+            list) to an (n, n) array of P(i first, j second) and tricasts
+            maps race id to an (n, n, n) array of P(i, j, k in that order).
+            Matrix axes follow the order runners appear in df for that race.
+
+    Example usage:
+        df_out, forecasts, tricasts = simulate_finishing_order(card, n_sims=10000)
+    """
+    df_out = df.copy()
+    if df_out.empty:
+        for col in ['mc_win_prob', 'place_prob']:
+            df_out[col] = pd.Series(dtype=np.float64)
+        df_out['places'] = pd.Series(dtype=np.int64)
+        return df_out, {}, {}
+
+    order, codes, starts, sizes, probs = _race_layout(df, race_col, prob_col)
+    n_races = len(sizes)
+    n_rows = len(probs)
+    max_field = int(sizes.max())
+    position = np.arange(n_rows) - starts[codes]
+
+    if places is None:
+        places = standard_place_terms
+    race_places = places(sizes) if callable(places) else np.full(n_races, places)
+    race_places = np.minimum(np.asarray(race_places, dtype=np.int64), sizes)
+
+    forecast = forecast and max_field >= 2
+    tricast = tricast and max_field >= 3
+
+    # only the top k finishers are ever needed
+    k = int(min(max_field, max(race_places.max(), 3 if tricast else 2 if forecast else 1)))
+
+    # zero-probability runners stay finite so they always sort ahead of padding
+    log_p = np.full((n_races, max_field), -np.inf)
+    log_p[codes, position] = np.log(np.maximum(probs, np.finfo(np.float64).tiny))
+
+    # every race gets its own slice of a flat counter for forecasts/tricasts
+    race_ids = df[race_col].to_numpy()[order][starts]
+    if race_ids.ndim > 1:
+        race_ids = list(map(tuple, race_ids))
+    fc_base = np.concatenate(([0], np.cumsum(sizes ** 2)[:-1]))
+    tc_base = np.concatenate(([0], np.cumsum(sizes ** 3)[:-1]))
+    fc_counts = np.zeros(int((sizes ** 2).sum()), dtype=np.int64) if forecast else None
+    tc_counts = np.zeros(int((sizes ** 3).sum()), dtype=np.int64) if tricast else None
+
+    win_counts = np.zeros(n_rows, dtype=np.int64)
+    place_counts = np.zeros(n_rows, dtype=np.int64)
+
+    rank = np.arange(k)
+    place_mask = rank[None, :] < race_places[:, None]
+    has_second = sizes >= 2
+    has_third = sizes >= 3
+    ends = starts + sizes
+    fc_ends = fc_base + sizes ** 2
+    tc_ends = tc_base + sizes ** 3
+
+    # whole races per block and simulations per chunk, within max_cells
+    block_races = max(1, min(n_races, max_cells // (chunk_size * max_field)))
+    chunk_size = max(1, min(chunk_size, max_cells // (block_races * max_field)))
+
+    rng = np.random.default_rng(seed)
+    for r0 in range(0, n_races, block_races):
+        block = slice(r0, min(r0 + block_races, n_races))
+        first_row, last_row = starts[block.start], ends[block.stop - 1]
+        block_starts = starts[block] - first_row
+        block_sizes = sizes[block]
+        block_log_p = log_p[block]
+        block_place_mask = place_mask[block]
+        n_block_rows = last_row - first_row
+        block_wins = win_counts[first_row:last_row]
+        block_places = place_counts[first_row:last_row]
+        if forecast:
+            block_fc = fc_counts[fc_base[block.start]:fc_ends[block.stop - 1]]
+            block_fc_base = fc_base[block] - fc_base[block.start]
+            block_second = has_second[block]
+        if tricast:
+            block_tc = tc_counts[tc_base[block.start]:tc_ends[block.stop - 1]]
+            block_tc_base = tc_base[block] - tc_base[block.start]
+            block_third = has_third[block]
+
+        done = 0
+        while done < n_sims:
+            batch = min(chunk_size, n_sims - done)
+            keys = block_log_p - np.log(-np.log(rng.random((batch,) + block_log_p.shape)))
+            if k < max_field:
+                top = np.argpartition(-keys, k - 1, axis=2)[:, :, :k]
+                top_keys = np.take_along_axis(keys, top, axis=2)
+                top = np.take_along_axis(top, np.argsort(-top_keys, axis=2), axis=2)
+            else:
+                top = np.argsort(-keys, axis=2)
+
+            rows = block_starts[None, :, None] + top
+            block_wins += np.bincount(rows[:, :, 0].ravel(), minlength=n_block_rows)
+            block_places += np.bincount(rows[np.broadcast_to(block_place_mask, rows.shape)],
+                                        minlength=n_block_rows)
+
+            if forecast:
+                fc = block_fc_base + top[:, :, 0] * block_sizes + top[:, :, 1]
+                block_fc += np.bincount(fc[:, block_second].ravel(), minlength=len(block_fc))
+            if tricast:
+                tc = block_tc_base + (top[:, :, 0] * block_sizes + top[:, :, 1]) * block_sizes + top[:, :, 2]
+                block_tc += np.bincount(tc[:, block_third].ravel(), minlength=len(block_tc))
+            done += batch
+
+    mc_win_prob = np.empty(n_rows)
+    place_prob = np.empty(n_rows)
+    mc_win_prob[order] = win_counts / n_sims
+    place_prob[order] = place_counts / n_sims
+
+    df_out['mc_win_prob'] = mc_win_prob
+    df_out['place_prob'] = place_prob
+    row_places = np.empty(n_rows, dtype=np.int64)
+    row_places[order] = race_places[codes]
+    df_out['places'] = row_places
+
+    forecasts = {}
+    tricasts = {}
+    for r, race_id in enumerate(race_ids):
+        n = int(sizes[r])
+        if forecast and n >= 2:
+            forecasts[race_id] = fc_counts[fc_base[r]:fc_base[r] + n ** 2].reshape(n, n) / n_sims
+        if tricast and n >= 3:
+            tricasts[race_id] = tc_counts[tc_base[r]:tc_base[r] + n ** 3].reshape(n, n, n) / n_sims
+
+    return df_out, forecasts, tricasts
@@ -1,17 +1,57 @@
-import os
-import requests
-import json
-import pandas as pd
-import betfairlightweight
-from betfairlightweight import filters
-from datetime import datetime, timedelta
+from datetime import datetime
 import time
+import logging
+import os
+
+import numpy as np
+
+from .ladder import Ladders
+from .lazy import lazy_import
+from .market_fetcher import fetch_market_books
+from .profiling import count_api, profiled
+
+betfairlightweight = lazy_import('betfairlightweight')
+pd = lazy_import('pandas')
+
+MARKET_STATUSES = ['INACTIVE', 'OPEN', 'SUSPENDED', 'CLOSED']
+
+RUNNER_STATUSES = ['ACTIVE', 'WINNER', 'LOSER', 'PLACED', 'REMOVED_VACANT', 'REMOVED', 'HIDDEN']
+
+
+def _categorical(values, categories):
+    """Categorical over the known categories, extended with any unexpected values."""
+    categories = list(categories) + [v for v in dict.fromkeys(values) if v is not None and v not in categories]
+    return pd.Categorical(values, categories=categories)
+
+
+def _take(series, rows):
+    """Values of series at rows, missing where rows is -1, keeping the dtype where possible."""
+    values = series.array if isinstance(series.dtype, pd.api.extensions.ExtensionDtype) else series.to_numpy()
+    return pd.api.extensions.take(values, rows, allow_fill=True)
+
+
+def _price_rows(codes, market_ids, selection_ids, df2):
+    """
+    Row of df2 for each runner, -1 where it has no price.
+
+    Runners are given as codes into market_ids plus selection ids and looked
+    up on an int64 (market code, selection id) key: a hash lookup per runner
+    instead of a merge on strings. Prices for other markets are ignored and a
+    market fetched twice keeps its latest book.
+    """
+    keys1 = (codes.astype(np.int64) << 32) | np.asarray(selection_ids, dtype=np.int64)
+    price_codes = pd.Index(market_ids).get_indexer(df2['market_id'])
+    keys2 = (price_codes.astype(np.int64) << 32) | df2['selection_id'].to_numpy(dtype=np.int64)
+    keep = np.flatnonzero((price_codes >= 0) & ~pd.Index(keys2).duplicated(keep='last'))
+    rows = pd.Index(keys2[keep]).get_indexer(keys1)
+    return np.where(rows >= 0, keep[np.maximum(rows, 0)], -1) if len(keep) else rows
 
 class MorningPrice:
     def __init__(self, start_time, end_time):
         self.start_time = start_time
         self.end_time = end_time
     
+    @profiled('markets', rows=len)
     def markets(self, start_time, end_time, trading):
         # Define filter for horse racing markets
         market_filter = betfairlightweight.filters.market_filter(
@@ -23,6 +63,7 @@ class MorningPrice:
         )
 
         # Request market catalogue for all horse races on the date
+        count_api()
         results = trading.betting.list_market_catalogue(
             filter=market_filter,
             market_projection=["RUNNER_DESCRIPTION", 
@@ -37,53 +78,92 @@ class MorningPrice:
 
         return results
     
+    @profiled('market_runner', rows=len)
     def market_runner(self, results):
-        # Initialize an empty list to store market and runner details
-        data = []
+        """
+        One row per runner of each catalogue market.
 
-        # Iterate over each market in the market catalogue
+        Columns are written straight into preallocated arrays: selection_id is
+        int64 and the market level columns are stored once per market and
+        repeated, with market_id, venue and market_type as categoricals.
+        """
+        counts = np.fromiter((len(market.runners) for market in results), dtype=np.int64, count=len(results))
+        n_rows = int(counts.sum())
+
+        selection_id = np.empty(n_rows, dtype=np.int64)
+        horse_name = np.empty(n_rows, dtype=object)
+        i = 0
         for market in results:
-            market_id = market.market_id
-            market_name = market.market_name
-            market_start_time = market.market_start_time
-            market_type = market.description.market_type
-
-            # Extract the location/venue of the race
-            event = market.event
-            race_location = event.venue if event else "Unknown Location"
-            
-            # Iterate over each runner in the market
             for runner in market.runners:
-                runner_id = runner.selection_id
-                runner_name = runner.runner_name
-                
-                # Append a dictionary with all relevant data to the list
-                data.append({
-                    'market_id': market_id,
-                    'market_start_time': market_start_time,
-                    'venue': race_location,
-                    'market_type': market_type,
-                    'selection_id': runner_id,
-                    'horse_name': runner_name,
-                })
-
-        # Convert the list of dictionaries to a pandas DataFrame
-        df1 = pd.DataFrame(data)
-        
+                selection_id[i] = runner.selection_id
+                horse_name[i] = runner.runner_name
+                i += 1
+
+        market_codes = np.repeat(np.arange(len(results)), counts)
+        market_ids = [market.market_id for market in results]
+        venues = [market.event.venue if market.event else "Unknown Location" for market in results]
+        market_types = [market.description.market_type for market in results]
+        start_times = pd.to_datetime([market.market_start_time for market in results])
+
+        df1 = pd.DataFrame({
+            'market_id': pd.Categorical(market_ids).take(market_codes),
+            'market_start_time': start_times.take(market_codes),
+            'venue': pd.Categorical(venues).take(market_codes),
+            'market_type': pd.Categorical(market_types).take(market_codes),
+            'selection_id': selection_id,
+            'horse_name': horse_name,
+        })
+
         return df1
     
+    @profiled('cached_market_runner', rows=len)
+    def cached_market_runner(self, trading, cache):
+        """
+        market_runner output served from a catalogue_cache.CatalogueCache.
+
+        Only new or changed markets are downloaded with the full projection and
+        non-runners are dropped, so repeated intraday snapshots skip the full
+        catalogue pull of markets() + market_runner().
+        """
+        cache.refresh(trading, self.start_time, self.end_time)
+        return cache.runners(self.start_time, self.end_time)
+
     def market_id_list(self, df1):
         market_id_list = df1['market_id'].drop_duplicates().to_list()
 
         return market_id_list
     
-    def market_books(self, market_id_list, trading):
+    @profiled('market_books', rows=lambda books: sum(len(b) for b in books))
+    def market_books(self, market_id_list, trading, batched=False, max_workers=4, requests_per_second=5):
+        """
+        Fetch ex_all_offers market books for the given market ids.
+
+        By default one market is requested per call with a fixed delay. With
+        batched=True the ids are packed into the largest batches the API weight
+        limit allows and fetched from a thread pool behind a token-bucket rate
+        limiter, with retries. Per-batch latency stats are stored on
+        self.fetch_stats.
+
+        Returns:
+            list: one list of MarketBook objects per request, as expected by morning_price
+        """
+        if batched:
+            market_books, self.fetch_stats = fetch_market_books(
+                trading, market_id_list,
+                price_data=('EX_ALL_OFFERS',),
+                max_workers=max_workers,
+                requests_per_second=requests_per_second,
+            )
+            logging.info(f'Fetched market books: {self.fetch_stats}')
+            return market_books
+
         # Define a delay between requests
         delay = 0.05  # Delay in seconds
 
         # Loop through market IDs and fetch data with a delay
         market_books = []
         for market_id in market_id_list:
+            count_api()
             market_book = trading.betting.list_market_book(
                 market_ids=[market_id],
                 price_projection=betfairlightweight.filters.price_projection(
@@ -97,56 +177,163 @@ class MorningPrice:
 
         return market_books
     
+    @profiled('morning_price', rows=len)
     def morning_price(self, market_books1):
-        data = []
-
-        # Iterate over each list of MarketBook objects
-        for book_list in market_books1:
-            # Iterate over each MarketBook object in the current list
-            for market_book in book_list:
-                market_id = market_book.market_id
-                status = market_book.status
-                total_matched = market_book.total_matched
-
-                # Iterate over each runner in the market
-                for runner in market_book.runners:
-                    runner_id = runner.selection_id
-                    runner_status = runner.status
-                    last_price_traded = runner.last_price_traded
-                    runner_total_matched = runner.total_matched
-                    
-                    # Append a dictionary with all relevant data to the list
-                    data.append({
-                        'market_id': market_id,
-                        'status': status,
-                        'total_matched': total_matched,
-                        'selection_id': runner_id,
-                        'status': runner_status,
-                        'last_price_traded': last_price_traded,
-                    })
-
-
-
-        # Convert the list of dictionaries into a DataFrame
-        df2 = pd.DataFrame(data)
-
-        df2 = df2[['market_id', 'selection_id', 'status', 'last_price_traded', 'total_matched']]
+        """
+        One row per runner of each market book.
+
+        The runner count is known up front, so every column is a preallocated
+        typed array: int64 selection ids, float64 prices (NaN when nothing has
+        traded) and categorical market/runner statuses. Market level values
+        are stored once per book and repeated.
+
+        Returns:
+            pd.DataFrame: market_id, selection_id, status, market_status,
+                runner_status, last_price_traded, total_matched (of the market);
+                status is the runner status, as in the daily CSVs written
+                before market_status/runner_status were split out
+        """
+        books = [market_book for book_list in market_books1 for market_book in book_list]
+        counts = np.fromiter((len(book.runners) for book in books), dtype=np.int64, count=len(books))
+        n_rows = int(counts.sum())
+
+        selection_id = np.empty(n_rows, dtype=np.int64)
+        last_price_traded = np.empty(n_rows, dtype=np.float64)
+        runner_status = np.empty(n_rows, dtype=np.int8)
+        runner_categories = {status: code for code, status in enumerate(RUNNER_STATUSES)}
+
+        i = 0
+        for book in books:
+            for runner in book.runners:
+                selection_id[i] = runner.selection_id
+                ltp = runner.last_price_traded
+                last_price_traded[i] = np.nan if ltp is None else ltp
+                status = runner.status
+                runner_status[i] = -1 if status is None else runner_categories.setdefault(status, len(runner_categories))
+                i += 1
+
+        market_codes = np.repeat(np.arange(len(books)), counts)
+        market_status = _categorical([book.status for book in books], MARKET_STATUSES)
+        total_matched = np.array([np.nan if book.total_matched is None else book.total_matched for book in books],
+                                 dtype=np.float64)
+
+        runner_status = pd.Categorical.from_codes(runner_status, categories=list(runner_categories))
+        df2 = pd.DataFrame({
+            'market_id': pd.Categorical([book.market_id for book in books]).take(market_codes),
+            'selection_id': selection_id,
+            'status': runner_status,
+            'market_status': market_status.take(market_codes),
+            'runner_status': runner_status,
+            'last_price_traded': last_price_traded,
+            'total_matched': total_matched[market_codes],
+        })
         return df2
     
-    def join(self, df1, df2):
+    @profiled('ladder_features', rows=len)
+    def ladder_features(self, market_books1, stakes=(10, 100), depth=10):
+        """
+        Depth features from the full ex_all_offers ladders of market_books().
+
+        Returns:
+            pd.DataFrame: one row per runner with spread in ticks, overround,
+                weight-of-money imbalance and VWAP/slippage per stake, see
+                ladder.Ladders.features
+        """
+        return Ladders.from_books(market_books1, depth=depth).features(stakes=stakes)
+
+    @profiled('join', rows=len)
+    def join(self, df1, df2, store=None, daily_dir='../data/daily'):
+        """
+        Join runners to prices and write the day's CSV to daily_dir.
 
-        df3 = df1.merge(df2, on = ['market_id', 'selection_id'], how = 'left')
+        If a price_store.PriceStore is passed the snapshot is also appended to
+        its partitioned Parquet dataset.
+        """
+        df3 = self.merge(df1, df2)
+        self.save_daily(df3, daily_dir)
 
-        df3['market_id'] = df3['market_id'].astype(str)
+        if store is not None:
+            store.append(df3)
+
+        return df3
+
+    def merge(self, df1, df2):
+        """
+        Left join of market_runner rows to morning_price rows on
+        (market_id, selection_id), with market_start_time localised to UTC.
+        """
+        codes, market_ids = pd.factorize(df1['market_id'])
+        rows = _price_rows(codes, market_ids, df1['selection_id'], df2)
+
+        df3 = df1.reset_index(drop=True)
+        for col in df2.columns.difference(['market_id', 'selection_id'], sort=False):
+            df3[col] = _take(df2[col], rows)
 
         df3['market_start_time'] = df3['market_start_time'].dt.tz_localize('UTC')
 
         # df3['market_start_time'] = df3['market_start_time'].dt.tz_convert('Europe/London')
 
+        return df3
+
+    @profiled('refresh_joined', rows=len)
+    def refresh_joined(self, joined, df2, cache):
+        """
+        Bring a joined snapshot up to date after cache.refresh, touching only what changed.
+
+        Catalogue rows are rebuilt only for the markets the refresh added,
+        refetched, moved or saw a non-runner in (cache.changed_markets), and
+        dropped for the markets it evicted; every other row is kept as is.
+        Price columns are overwritten only for the runners in df2, so df2 may
+        cover just the markets whose books were fetched this time and the
+        other runners keep their last price, which a merge would lose.
 
+        Args:
+            joined (pd.DataFrame): previous result, None to build from scratch
+            df2 (pd.DataFrame): morning_price output for this snapshot
+            cache (catalogue_cache.CatalogueCache): cache that was just refreshed
+
+        Returns:
+            pd.DataFrame: merge columns indexed by (market_id, selection_id);
+                reset_index() gives the frame join would have returned
+        """
+        key = ['market_id', 'selection_id']
+        if joined is None:
+            df1 = cache.runners(self.start_time, self.end_time)
+            return self.merge(df1, df2).set_index(key)
+
+        out = joined
+        touched = cache.changed_markets.union(cache.evicted_markets)
+        if len(touched):
+            markets = out.index.levels[0]
+            out = out[~np.isin(out.index.codes[0], markets.get_indexer(markets.intersection(touched)))]
+        fresh = cache.runners(self.start_time, self.end_time, market_ids=cache.changed_markets)
+        if len(fresh):
+            fresh['market_start_time'] = fresh['market_start_time'].dt.tz_localize('UTC')
+            fresh = fresh.set_index(key)
+            for col in out.columns.difference(fresh.columns, sort=False):
+                fresh[col] = pd.Series(None, index=fresh.index, dtype=out[col].dtype)
+            out = pd.concat([out, fresh[out.columns]])
+        else:
+            out = out.copy()
+
+        # only the priced runners are written, column by column
+        rows = _price_rows(out.index.codes[0], out.index.levels[0], out.index.get_level_values(1), df2)
+        found = np.flatnonzero(rows >= 0)
+        for col in df2.columns.difference(key, sort=False):
+            if col not in out.columns:
+                out[col] = _take(df2[col], np.full(len(out), -1))
+            new = _take(df2[col], rows[found])
+            if isinstance(out[col].dtype, pd.CategoricalDtype):
+                missing = pd.Index(pd.unique(np.asarray(new, dtype=object))).dropna().difference(
+                    out[col].cat.categories)
+                if len(missing):
+                    out[col] = out[col].cat.add_categories(missing)
+            out.iloc[found, out.columns.get_loc(col)] = new
+        return out
+
+    def save_daily(self, df3, directory='../data/daily'):
+        """Write the joined frame to <directory>/<today>_data.csv."""
         current_date = datetime.now().strftime('%Y-%m-%d')
         file_name = f"{current_date}_data.csv"
 
-        df3.to_csv('../data/daily/' + file_name, index=False)
-
-        return df3
\ No newline at end of file
+        df3.to_csv(os.path.join(directory, file_name), index=False)
\ No newline at end of file
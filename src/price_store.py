@@ -0,0 +1,241 @@
+import glob
+import os
+import uuid
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.dataset as ds
+
+# Columns written by MorningPrice.join and the dtypes they are stored with
+SNAPSHOT_DTYPES = {
+    'market_id': 'string',
+    'venue': 'category',
+    'market_type': 'category',
+    'selection_id': 'int64',
+    'horse_name': 'category',
+    'status': 'category',
+    'market_status': 'category',
+    'runner_status': 'category',
+    'last_price_traded': 'float64',
+    'total_matched': 'float64',
+}
+
+# Betfair.list_market_horse catalogue columns mapped onto the snapshot schema
+CATALOGUE_COLUMNS = {
+    'marketId': 'market_id',
+    'event': 'venue',
+    'selectionId': 'selection_id',
+    'runnerid': 'selection_id',
+    'runnerName': 'horse_name',
+    'marketStartTime': 'market_start_time',
+}
+
+CATEGORICAL_COLUMNS = [col for col, dtype in SNAPSHOT_DTYPES.items() if dtype == 'category']
+
+PARTITIONING = ds.partitioning(pa.schema([('date', pa.string()), ('venue', pa.string())]), flavor='hive')
+
+# Every fragment is written with, and the dataset is read through, this one
+# schema, so a column missing from some snapshots is null there rather than
+# dropped from the whole dataset; categoricals are stored as plain strings
+SCHEMA = pa.schema(
+    [(col, pa.int64() if dtype == 'int64' else pa.float64() if dtype == 'float64' else pa.string())
+     for col, dtype in SNAPSHOT_DTYPES.items()]
+    + [('market_start_time', pa.timestamp('ns', tz='UTC')),
+       ('snapshot_time', pa.timestamp('ns', tz='UTC')),
+       ('date', pa.string())]
+)
+
+
+def _to_utc(series):
+    series = pd.to_datetime(series)
+    if series.dt.tz is None:
+        return series.dt.tz_localize('UTC')
+    return series.dt.tz_convert('UTC')
+
+
+class PriceStore:
+    """
+    Append-only Parquet dataset of price snapshots, partitioned by race date and venue.
+
+    Layout: <root>/date=YYYY-MM-DD/venue=<venue>/<uuid>-<n>.parquet
+
+    Reads go through pyarrow.dataset, so filters on date/venue only open the
+    matching partitions and only the requested columns are decoded.
+
+    Args:
+        root (str): dataset directory
+    """
+    def __init__(self, root='../data/prices'):
+        self.root = root
+
+    @staticmethod
+    def normalise(df, snapshot_time=None):
+        """
+        Cast a snapshot frame to the stored dtypes and add the partition columns.
+
+        Every SCHEMA column is emitted, in SCHEMA order; columns the frame does
+        not have are filled with nulls.
+
+        Args:
+            df (pd.DataFrame): output of MorningPrice.join or Betfair.list_market_horse
+            snapshot_time (datetime): when the snapshot was taken, defaults to now
+
+        Returns:
+            pd.DataFrame: normalised copy
+        """
+        df = df.rename(columns={k: v for k, v in CATALOGUE_COLUMNS.items() if k in df.columns})
+        df = df.loc[:, ~df.columns.duplicated()]
+        if 'runner_status' not in df.columns and 'status' in df.columns:
+            # older daily CSVs only have status, which held the runner status
+            df = df.assign(runner_status=df['status'])
+
+        out = pd.DataFrame(index=df.index)
+        for col, dtype in SNAPSHOT_DTYPES.items():
+            if col not in df.columns:
+                out[col] = pd.Series(None, index=df.index, dtype='Int64' if dtype == 'int64' else dtype)
+            elif col == 'market_id':
+                out[col] = df[col].astype(str)
+            else:
+                out[col] = df[col].astype(dtype)
+
+        out['market_start_time'] = _to_utc(df['market_start_time'])
+        if 'snapshot_time' in df.columns:
+            out['snapshot_time'] = _to_utc(df['snapshot_time'])
+        else:
+            ts = pd.Timestamp(snapshot_time) if snapshot_time is not None else pd.Timestamp.now(tz='UTC')
+            out['snapshot_time'] = ts.tz_localize('UTC') if ts.tzinfo is None else ts.tz_convert('UTC')
+
+        out['date'] = out['market_start_time'].dt.strftime('%Y-%m-%d')
+        out['venue'] = out['venue'].astype(str) if 'venue' in df.columns else 'Unknown Location'
+        return out[SCHEMA.names].reset_index(drop=True)
+
+    def append(self, df, snapshot_time=None):
+        """
+        Append a snapshot to the dataset.
+
+        Args:
+            df (pd.DataFrame): output of MorningPrice.join or Betfair.list_market_horse
+            snapshot_time (datetime): when the snapshot was taken, defaults to now
+
+        Returns:
+            int: number of rows written
+        """
+        if df is None or df.empty:
+            return 0
+        df = self.normalise(df, snapshot_time)
+        for col in CATEGORICAL_COLUMNS:
+            df[col] = df[col].astype(object)
+        table = pa.Table.from_pandas(df, schema=SCHEMA, preserve_index=False)
+        ds.write_dataset(
+            table, self.root,
+            format='parquet',
+            partitioning=PARTITIONING,
+            basename_template=f'{uuid.uuid4().hex}-{{i}}.parquet',
+            existing_data_behavior='overwrite_or_ignore',
+        )
+        return table.num_rows
+
+    def dataset(self):
+        """The stored snapshots as a pyarrow dataset with the full SCHEMA, whatever the fragments hold."""
+        return ds.dataset(self.root, schema=SCHEMA, format='parquet', partitioning=PARTITIONING)
+
+    def read(self, columns=None, start_date=None, end_date=None, venues=None, filter=None):
+        """
+        Read snapshots with partition pruning and column projection.
+
+        Args:
+            columns (list): columns to load, defaults to all
+            start_date (str): first race date to include, 'YYYY-MM-DD'
+            end_date (str): last race date to include, 'YYYY-MM-DD'
+            venues (list): venues to include
+            filter (pyarrow.dataset.Expression): extra row filter, e.g.
+                ds.field('last_price_traded') < 2
+
+        Returns:
+            pd.DataFrame: matching rows with categorical venue/horse/status
+
+        Example usage:
+            store = PriceStore()
+            df = store.read(columns=['selection_id', 'last_price_traded'],
+                            start_date='2024-01-01', venues=['Kempton'])
+        """
+        if not os.path.isdir(self.root):
+            return pd.DataFrame(columns=columns)
+
+        expression = None
+        conditions = []
+        if start_date:
+            conditions.append(ds.field('date') >= start_date)
+        if end_date:
+            conditions.append(ds.field('date') <= end_date)
+        if venues:
+            conditions.append(ds.field('venue').isin(list(venues)))
+        if filter is not None:
+            conditions.append(filter)
+        for condition in conditions:
+            expression = condition if expression is None else expression & condition
+
+        df = self.dataset().to_table(columns=columns, filter=expression).to_pandas()
+        for col in CATEGORICAL_COLUMNS:
+            if col in df.columns:
+                df[col] = df[col].astype('category')
+        return df
+
+    def import_csvs(self, pattern='../data/daily/*_data.csv'):
+        """
+        One-shot import of existing CSV snapshots (MorningPrice daily files or
+        a Betfair.list_market_horse dump such as test1.csv).
+
+        The snapshot time of a daily file is taken from its <date>_data.csv name.
+
+        Args:
+            pattern (str): glob matching the CSVs to import
+
+        Returns:
+            int: number of rows written
+        """
+        written = 0
+        for path in sorted(glob.glob(pattern)):
+            df = pd.read_csv(path)
+            name = os.path.basename(path).split('_')[0]
+            try:
+                snapshot_time = pd.Timestamp(name).tz_localize('UTC')
+            except ValueError:
+                snapshot_time = pd.Timestamp(os.path.getmtime(path), unit='s', tz='UTC')
+            written += self.append(df, snapshot_time=snapshot_time)
+        return written
+
+
+def import_race_history(csv_path='../data/turf.csv', root='../data/turf', date_col='Race Date', course_col='Course'):
+    """
+    Convert a race history CSV such as turf.csv into a Parquet dataset
+    partitioned by year and course, so later analyses skip the CSV parse.
+
+    Args:
+        csv_path (str): race history CSV
+        root (str): output dataset directory
+        date_col (str): column holding the race date
+        course_col (str): column holding the course
+
+    Returns:
+        int: number of rows written
+
+    Example usage:
+        import_race_history()
+        df = ds.dataset('../data/turf', partitioning='hive').to_table(
+            filter=ds.field('Course') == 'Ascot').to_pandas()
+    """
+    df = pd.read_csv(csv_path, low_memory=False)
+    df['year'] = pd.to_datetime(df[date_col], dayfirst=True, errors='coerce').dt.year.fillna(0).astype('int32')
+    df[course_col] = df[course_col].astype(str)
+    for col in df.columns[df.dtypes == object]:
+        if col != course_col and df[col].nunique() < len(df) // 2:
+            df[col] = df[col].astype('category')
+
+    ds.write_dataset(
+        pa.Table.from_pandas(df, preserve_index=False), root,
+        format='parquet',
+        partitioning=ds.partitioning(pa.schema([('year', pa.int32()), (course_col, pa.string())]), flavor='hive'),
+        existing_data_behavior='delete_matching',
+    )
+    return len(df)
@@ -0,0 +1,309 @@
+"""
+Opt-in timing and resource instrumentation for the data pipeline.
+
+Stages are marked with the @profiled decorator or the stage() context
+manager. Each stage records calls, wall time, API calls, rows processed and
+peak memory, aggregated by its nesting path (e.g. 'morning_run/market_books').
+
+Disabled by default. A disabled decorator costs one attribute check per call
+and stage() hands back a shared no-op context, so the hooks can stay in the
+production code. Enable with profiling.enable() or HORSE_PROFILE=1 in the
+environment (HORSE_PROFILE=memory also traces Python allocations with
+tracemalloc, which slows the run down noticeably).
+
+Example usage:
+    from src import profiling
+    profiling.enable()
+    with profiling.stage('morning_run'):
+        ...
+    profiling.to_json('../data/profile.json')
+    profiling.log_to_mlflow()
+    profiling.report()
+"""
+import functools
+import json
+import os
+import re
+import resource
+import sys
+import threading
+import time
+import tracemalloc
+
+from .lazy import lazy_import
+
+pd = lazy_import('pandas')
+
+METRICS = ['calls', 'wall_s', 'api_calls', 'rows', 'peak_mem_mb', 'max_rss_mb']
+
+
+def _max_rss_mb():
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # kilobytes on Linux, bytes on macOS
+    return rss / (1024 ** 2 if sys.platform == 'darwin' else 1024)
+
+
+class _Frame:
+    __slots__ = ('path', 'start', 'api_calls', 'rows', 'mem_start', 'mem_peak')
+
+    def __init__(self, path):
+        self.path = path
+        self.api_calls = 0
+        self.rows = 0
+        self.mem_start = 0
+        self.mem_peak = 0
+        self.start = time.perf_counter()
+
+
+class Profiler:
+    """
+    Collects per-stage metrics. Use the module-level functions, which act on
+    the shared PROFILER instance.
+
+    Open stages are kept per thread, so concurrent stages never nest inside
+    each other; a function handed to a worker thread through bind() nests its
+    stages under the stage that submitted it. Only the aggregated records are
+    shared, behind a lock.
+    """
+    def __init__(self):
+        self.enabled = False
+        self.track_memory = False
+        self.records = {}
+        self._local = threading.local()
+        self._lock = threading.Lock()
+
+    @property
+    def _stack(self):
+        """Open frames of the calling thread, innermost last."""
+        stack = getattr(self._local, 'stack', None)
+        if stack is None:
+            stack = self._local.stack = []
+        return stack
+
+    def _innermost(self):
+        """Innermost open frame of the calling thread, else the frame it was bound to."""
+        stack = self._stack
+        return stack[-1] if stack else getattr(self._local, 'parent', None)
+
+    def enable(self, track_memory=False):
+        self.track_memory = track_memory
+        if track_memory and not tracemalloc.is_tracing():
+            tracemalloc.start()
+        self.enabled = True
+
+    def disable(self):
+        self.enabled = False
+        if self.track_memory and tracemalloc.is_tracing():
+            tracemalloc.stop()
+        self.track_memory = False
+
+    def reset(self):
+        with self._lock:
+            self.records = {}
+            self._local = threading.local()
+
+    def push(self, name):
+        parent = self._innermost()
+        frame = _Frame(f'{parent.path}/{name}' if parent is not None else name)
+        if self.track_memory:
+            with self._lock:
+                current, peak = tracemalloc.get_traced_memory()
+                if parent is not None:
+                    parent.mem_peak = max(parent.mem_peak, peak)
+                tracemalloc.reset_peak()
+                frame.mem_start = frame.mem_peak = current
+        self._stack.append(frame)
+        return frame
+
+    def pop(self, frame):
+        wall = time.perf_counter() - frame.start
+        stack = self._stack
+        if frame in stack:
+            stack.remove(frame)
+        parent = self._innermost()
+        with self._lock:
+            if self.track_memory:
+                frame.mem_peak = max(frame.mem_peak, tracemalloc.get_traced_memory()[1])
+                if parent is not None:
+                    parent.mem_peak = max(parent.mem_peak, frame.mem_peak)
+
+            record = self.records.setdefault(frame.path, dict.fromkeys(METRICS, 0))
+            record['calls'] += 1
+            record['wall_s'] += wall
+            record['api_calls'] += frame.api_calls
+            record['rows'] += frame.rows
+            if self.track_memory:
+                record['peak_mem_mb'] = max(record['peak_mem_mb'], (frame.mem_peak - frame.mem_start) / 1024 ** 2)
+            record['max_rss_mb'] = max(record['max_rss_mb'], _max_rss_mb())
+
+    def add(self, api_calls=0, rows=0):
+        frame = self._innermost()
+        if frame is not None:
+            # a bound parent frame is shared with the workers counting into it
+            with self._lock:
+                frame.api_calls += api_calls
+                frame.rows += rows
+
+    def bind(self, func):
+        """
+        func wrapped to run, on any thread, as if inside the calling thread's
+        innermost open stage: its stages nest under that stage and its
+        count_api/count_rows are attributed to it.
+        """
+        parent = self._innermost()
+        if parent is None:
+            return func
+
+        @functools.wraps(func)
+        def bound(*args, **kwargs):
+            previous = getattr(self._local, 'parent', None)
+            self._local.parent = parent
+            try:
+                return func(*args, **kwargs)
+            finally:
+                self._local.parent = previous
+        return bound
+
+
+PROFILER = Profiler()
+
+_env = os.getenv('HORSE_PROFILE', '').lower()
+if _env and _env not in ('0', 'false', 'no'):
+    PROFILER.enable(track_memory=_env == 'memory')
+
+
+class _Stage:
+    __slots__ = ('name', 'frame')
+
+    def __init__(self, name):
+        self.name = name
+
+    def __enter__(self):
+        self.frame = PROFILER.push(self.name)
+        return self
+
+    def __exit__(self, *exc):
+        PROFILER.pop(self.frame)
+        return False
+
+
+class _NullStage:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+_NULL_STAGE = _NullStage()
+
+
+def enable(track_memory=False):
+    """Start collecting; track_memory traces allocations with tracemalloc."""
+    PROFILER.enable(track_memory)
+
+
+def disable():
+    PROFILER.disable()
+
+
+def reset():
+    """Drop everything recorded so far."""
+    PROFILER.reset()
+
+
+def stage(name):
+    """Context manager timing the enclosed block as stage name."""
+    return _Stage(name) if PROFILER.enabled else _NULL_STAGE
+
+
+def bind(func):
+    """
+    func wrapped to run in the current stage when called from another
+    thread, e.g. executor.map(profiling.bind(fetch), batches). Returns func
+    itself when profiling is off or no stage is open.
+    """
+    return PROFILER.bind(func) if PROFILER.enabled else func
+
+
+def profiled(name=None, rows=None):
+    """
+    Decorator recording each call of a function as a stage.
+
+    Args:
+        name (str): stage name, defaults to the function's qualified name
+        rows (callable): maps the return value to the number of rows it
+            produced, e.g. len
+    """
+    def decorator(func):
+        stage_name = name or func.__qualname__
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if not PROFILER.enabled:
+                return func(*args, **kwargs)
+            frame = PROFILER.push(stage_name)
+            try:
+                result = func(*args, **kwargs)
+                if rows is not None and result is not None:
+                    frame.rows += rows(result)
+                return result
+            finally:
+                PROFILER.pop(frame)
+        return wrapper
+    return decorator
+
+
+def count_api(n=1):
+    """Attribute n API calls to the innermost open stage."""
+    if PROFILER.enabled:
+        PROFILER.add(api_calls=n)
+
+
+def count_rows(n):
+    """Attribute n processed rows to the innermost open stage."""
+    if PROFILER.enabled:
+        PROFILER.add(rows=n)
+
+
+def report():
+    """
+    Returns:
+        pd.DataFrame: one row per stage path with calls, wall_s, mean_ms,
+            api_calls, rows, rows_per_s, peak_mem_mb and max_rss_mb
+    """
+    df = pd.DataFrame.from_dict(PROFILER.records, orient='index', columns=METRICS)
+    df.index.name = 'stage'
+    df['mean_ms'] = df['wall_s'] / df['calls'].clip(lower=1) * 1000
+    df['rows_per_s'] = df['rows'] / df['wall_s'].where(df['wall_s'] > 0)
+    return df.reset_index()
+
+
+def to_json(path):
+    with open(path, 'w') as f:
+        json.dump({'created': pd.Timestamp.now(tz='UTC').isoformat(),
+                   'stages': report().to_dict(orient='records')}, f, indent=2, default=float)
+
+
+def to_csv(path):
+    report().to_csv(path, index=False)
+
+
+def log_to_mlflow(prefix='profile'):
+    """
+    Log every stage metric to the active MLflow run as <prefix>.<stage>.<metric>,
+    plus the full report as a JSON artifact.
+    """
+    import mlflow
+
+    metrics = {}
+    for row in report().to_dict(orient='records'):
+        key = re.sub(r'[^\w\-. /]', '_', row['stage'])
+        for metric in METRICS + ['rows_per_s']:
+            value = row[metric]
+            if value == value:
+                metrics[f'{prefix}.{key}.{metric}'] = float(value)
+    mlflow.log_metrics(metrics)
+    mlflow.log_dict({'stages': report().to_dict(orient='records')}, f'{prefix}.json')
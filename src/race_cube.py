@@ -0,0 +1,319 @@
+"""
+Pre-aggregated cube of the race history for favourite and segment analysis.
+
+Every runner is assigned to a cell of race type x Class x Course x distance
+bucket x going x SP rank x odds band x won, and each cell holds the runner
+count, the wins, the returns of a £1 level stake at SP and the sums and
+counts of a few features. Slices and rollups then sum the occupied cells
+with np.bincount instead of rescanning, re-ranking and re-filtering the
+runners.
+
+New results are folded in with update: races already in the cube are
+skipped, so the same day's file can be passed again as more races finish.
+Races must arrive complete, as SP ranks are taken within the race.
+
+Example usage:
+    cube = RaceCube()
+    cube.update(pd.read_csv('../data/turf.csv'))
+    cube.total(where={'sp_rank': 1})                               # favourites' strike rate and roi
+    cube.rollup('Class', where={'sp_rank': 1, 'won': 0})           # beaten favourites by Class
+    cube.rollup(['Class', 'Course'], where={'sp_rank': 1, 'won': 0})
+    cube.total(where={'odds_band': 'odds-on', 'won': 0})           # mean DSLR etc. of beaten odds-on runners
+    cube.update(todays_results)                                    # later in the day
+    cube.save('../data/cube')
+"""
+import json
+import os
+
+import numpy as np
+import pandas as pd
+
+from .splitter import RACE_KEY, race_codes
+
+# distance buckets of short_priced_favs.ipynb
+DISTANCE_BINS = [800, 1000, 1200, 1400, 1600, 1800, 2000, 2200, 2400, 2600, 2800, 3000, 3200, 3400, 3600, 3800, 4000]
+DISTANCE_LABELS = [f'{low}-{high}' for low, high in zip(DISTANCE_BINS[:-1], DISTANCE_BINS[1:])]
+
+# decimal SP bands, lower bound inclusive
+ODDS_BINS = [1, 2, 3, 5, 10, np.inf]
+ODDS_LABELS = ['odds-on', '2-3', '3-5', '5-10', '10+']
+
+DIMENSIONS = ['Race Type', 'Class', 'Course', 'distance_bucket_yards', 'Going', 'sp_rank', 'odds_band', 'won']
+FEATURES = ['DSLR', 'Pace Rating Rank', 'PRC Last Run', 'Main', 'Tissue Rating Rank']
+
+SP_COL = 'BF Decimal SP'
+WON_COL = 'Won (1=Won, 0=Lost)'
+
+
+def sp_ranks(df, race_cols=RACE_KEY, sp_col=SP_COL):
+    """
+    SP rank of every runner within its race, as groupby(race_cols)[sp_col].rank(method='first').
+
+    Args:
+        df (pd.DataFrame): runners, one row per horse
+        race_cols (list): columns identifying a race
+        sp_col (str): decimal SP
+
+    Returns:
+        np.ndarray: 1 for the favourite, NaN where the SP is missing
+    """
+    codes = race_codes(df, race_cols)
+    sp = df[sp_col].to_numpy(dtype=np.float64)
+    n = len(df)
+    # NaN prices sort last within their race, ties keep row order
+    order = np.lexsort((np.arange(n), sp, codes))
+    sorted_codes = codes[order]
+    starts = np.flatnonzero(np.r_[True, sorted_codes[1:] != sorted_codes[:-1]]) if n else np.empty(0, np.int64)
+    ranks = np.empty(n)
+    ranks[order] = np.arange(n) - np.repeat(starts, np.diff(np.r_[starts, n])) + 1
+    ranks[np.isnan(sp)] = np.nan
+    return ranks
+
+
+def add_dimensions(df, race_cols=RACE_KEY, sp_col=SP_COL, won_col=WON_COL, max_rank=6):
+    """
+    Copy of df with the derived cube dimensions.
+
+    Args:
+        df (pd.DataFrame): runners in the shape of turf.csv
+        race_cols (list): columns identifying a race
+        sp_col (str): decimal SP
+        won_col (str): 1 for the winner
+        max_rank (int): SP ranks from max_rank down are pooled into max_rank
+
+    Returns:
+        pd.DataFrame: copy with sp_rank, distance_bucket_yards, odds_band and won
+    """
+    df_out = df.copy()
+    df_out['sp_rank'] = np.minimum(sp_ranks(df, race_cols, sp_col), max_rank)
+    df_out['distance_bucket_yards'] = pd.cut(df['Distance (y)'], bins=DISTANCE_BINS,
+                                             labels=DISTANCE_LABELS).astype(object)
+    df_out['odds_band'] = pd.cut(df[sp_col], bins=ODDS_BINS, labels=ODDS_LABELS, right=False).astype(object)
+    df_out['won'] = df[won_col]
+    return df_out
+
+
+def _factorize(vocab, values):
+    """
+    Codes of values against the labels in vocab, new labels appended in order
+    of appearance. All missing values (None, NaN) share one label.
+
+    Returns:
+        tuple: (codes, extended vocab)
+    """
+    codes, labels = pd.factorize(np.concatenate([vocab.to_numpy(), np.asarray(values, dtype=object)]),
+                                 use_na_sentinel=False)
+    return codes[len(vocab):], pd.Index(labels, dtype=object)
+
+
+def _groups(codes, sizes):
+    """
+    Group the rows of codes by their labels.
+
+    Returns:
+        tuple: (inverse, first) the group of every row and a row of each group
+    """
+    try:
+        keys, n_keys = np.ravel_multi_index(tuple(codes.T), tuple(sizes)), int(np.prod(sizes))
+    except ValueError:
+        # more cells than fit in an int64
+        keys = np.unique(codes, axis=0, return_inverse=True)[1].ravel()
+        n_keys = len(codes)
+    if n_keys > max(4 * len(keys), 1 << 16):
+        _, first, inverse = np.unique(keys, return_index=True, return_inverse=True)
+        return inverse, first
+    # dense key space: a presence table instead of a sort
+    present = np.zeros(n_keys, dtype=bool)
+    present[keys] = True
+    inverse = (np.cumsum(present) - 1)[keys]
+    # the rows of a group share their codes, so any of them will do
+    first = np.empty(int(present.sum()), dtype=np.int64)
+    first[inverse] = np.arange(len(keys))
+    return inverse, first
+
+
+class RaceCube:
+    """
+    Sparse cube of runner counts, wins, SP returns and feature sums.
+
+    Only occupied cells are stored: codes holds the label code of every
+    dimension per cell (the position of the label in vocab[dimension]) and
+    values one row per measure with a column per cell.
+
+    Args:
+        dimensions (list): cube axes; turf.csv columns or the ones added by add_dimensions
+        features (list): numeric columns whose means are kept
+        race_cols (list): columns identifying a race
+        sp_col (str): decimal SP, for the ranks, odds bands and returns
+        won_col (str): 1 for the winner
+        max_rank (int): SP ranks from max_rank down are pooled into max_rank
+    """
+    def __init__(self, dimensions=DIMENSIONS, features=FEATURES, race_cols=RACE_KEY, sp_col=SP_COL,
+                 won_col=WON_COL, max_rank=6):
+        self.dimensions = list(dimensions)
+        self.features = list(features)
+        self.race_cols = list(race_cols)
+        self.sp_col = sp_col
+        self.won_col = won_col
+        self.max_rank = max_rank
+        self.measures = ['runners', 'wins', 'returns'] + [f'{f} sum' for f in self.features] + \
+            [f'{f} count' for f in self.features]
+        self.vocab = {dim: pd.Index([], dtype=object) for dim in self.dimensions}
+        self.codes = np.empty((0, len(self.dimensions)), dtype=np.int64)
+        self.values = np.empty((len(self.measures), 0))
+        self.races = set()
+
+    def __len__(self):
+        return len(self.codes)
+
+    def _encode(self, dim, values):
+        """Label codes of values, extending the dimension's vocabulary with new labels."""
+        codes, self.vocab[dim] = _factorize(self.vocab[dim], values)
+        return codes
+
+    def _compact(self):
+        """Merge cells with the same labels."""
+        inverse, first = _groups(self.codes, [len(self.vocab[dim]) for dim in self.dimensions])
+        self.values = np.vstack([np.bincount(inverse, weights=row, minlength=len(first)) for row in self.values])
+        # column-major, so each dimension's codes are contiguous for _mask and rollup
+        self.codes = np.asfortranarray(self.codes[first])
+
+    def update(self, df):
+        """
+        Add the races of df that are not in the cube yet.
+
+        Args:
+            df (pd.DataFrame): complete races in the shape of turf.csv
+
+        Returns:
+            int: number of runners added
+        """
+        if df.empty:
+            return 0
+        races = pd.MultiIndex.from_frame(df[self.race_cols])
+        unique = races.unique()
+        fresh = [race for race in unique if race not in self.races]
+        if not fresh:
+            return 0
+        if len(fresh) < len(unique):
+            df = df[races.isin(fresh)]
+        self.races.update(fresh)
+
+        df = add_dimensions(df, self.race_cols, self.sp_col, self.won_col, self.max_rank)
+        won = (df[self.won_col].to_numpy() == 1).astype(np.float64)
+        sp = np.nan_to_num(df[self.sp_col].to_numpy(dtype=np.float64))
+        features = df[self.features].to_numpy(dtype=np.float64)
+        values = np.vstack([np.ones(len(df)), won, won * sp, np.nan_to_num(features).T, ~np.isnan(features).T])
+        codes = np.column_stack([self._encode(dim, df[dim].to_numpy()) for dim in self.dimensions])
+
+        self.codes = np.vstack([self.codes, codes])
+        self.values = np.hstack([self.values, values])
+        self._compact()
+        return len(df)
+
+    def _mask(self, where):
+        mask = np.ones(len(self.codes), dtype=bool)
+        for dim, value in (where or {}).items():
+            if dim not in self.vocab:
+                raise ValueError(f'{dim!r} is not a cube dimension, expected one of {self.dimensions}')
+            labels = list(value) if isinstance(value, (list, tuple, set, np.ndarray)) else [value]
+            codes, _ = _factorize(self.vocab[dim], labels)
+            keep = np.zeros(len(self.vocab[dim]), dtype=bool)
+            keep[codes[codes < len(keep)]] = True
+            mask &= keep[self.codes[:, self.dimensions.index(dim)]]
+        return mask
+
+    def rollup(self, by=(), where=None):
+        """
+        Measures summed over every cell matching where, grouped by the dimensions in by.
+
+        Args:
+            by (str or list): dimensions to group by; empty for a single total row
+            where (dict): dimension -> label or list of labels to keep, e.g.
+                {'sp_rank': 1, 'won': 0, 'Going': ['Soft', 'Heavy']}
+
+        Returns:
+            pd.DataFrame: per group, largest first: runners, share (of the
+                runners matching where), wins, strike_rate, returns (of a £1
+                level stake at SP), roi and the mean of every feature
+        """
+        by = [by] if isinstance(by, str) else list(by)
+        for dim in by:
+            if dim not in self.vocab:
+                raise ValueError(f'{dim!r} is not a cube dimension, expected one of {self.dimensions}')
+        if by:
+            cols = [self.dimensions.index(dim) for dim in by]
+            inverse, first = _groups(self.codes[:, cols], [len(self.vocab[dim]) for dim in by])
+        else:
+            inverse, first = np.zeros(len(self.codes), dtype=np.int64), np.zeros(1, dtype=np.int64)
+        cells = np.flatnonzero(self._mask(where)) if where else slice(None)
+        inverse, values = inverse[cells], self.values[:, cells]
+        sums = np.vstack([np.bincount(inverse, weights=row, minlength=len(first)) for row in values])
+
+        if by:
+            matched = sums[0] > 0
+            sums, first = sums[:, matched], first[matched]
+            labels = [self.vocab[dim][self.codes[first, col]] for dim, col in zip(by, cols)]
+            index = pd.MultiIndex.from_arrays(labels, names=by) if len(by) > 1 else pd.Index(labels[0], name=by[0])
+        else:
+            index = pd.RangeIndex(1)
+        runners, wins, returns = sums[0], sums[1], sums[2]
+        n = len(self.features)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            out = {'runners': runners.astype(np.int64), 'share': runners / runners.sum(),
+                   'wins': wins.astype(np.int64), 'strike_rate': wins / runners, 'returns': returns,
+                   'roi': returns / runners - 1}
+            out.update({f'{f} mean': sums[3 + j] / sums[3 + n + j] for j, f in enumerate(self.features)})
+        order = np.argsort(-runners, kind='stable')
+        return pd.DataFrame(out, index=index).iloc[order]
+
+    def total(self, where=None):
+        """
+        Returns:
+            pd.Series: the rollup measures of every runner matching where
+        """
+        return self.rollup(where=where).iloc[0]
+
+    def cells(self):
+        """
+        Returns:
+            pd.DataFrame: one row per occupied cell with its labels and raw measures
+        """
+        df = pd.DataFrame({dim: self.vocab[dim][self.codes[:, j]] for j, dim in enumerate(self.dimensions)})
+        for j, name in enumerate(self.measures):
+            df[name] = self.values[j]
+        return df
+
+    def save(self, path):
+        """
+        Write the cube to the directory path: cells.parquet, races.parquet and cube.json.
+        """
+        os.makedirs(path, exist_ok=True)
+        races = pd.DataFrame(list(self.races), columns=self.race_cols)
+        for name, df in (('cells', self.cells()), ('races', races)):
+            file_path = os.path.join(path, f'{name}.parquet')
+            df.to_parquet(file_path + '.tmp', index=False)
+            os.replace(file_path + '.tmp', file_path)
+        config = {'dimensions': self.dimensions, 'features': self.features, 'race_cols': self.race_cols,
+                  'sp_col': self.sp_col, 'won_col': self.won_col, 'max_rank': self.max_rank}
+        with open(os.path.join(path, 'cube.json.tmp'), 'w') as f:
+            json.dump(config, f)
+        os.replace(os.path.join(path, 'cube.json.tmp'), os.path.join(path, 'cube.json'))
+
+    @classmethod
+    def load(cls, path):
+        """
+        Read a cube written by save.
+
+        Returns:
+            RaceCube: the cube, ready for further updates
+        """
+        with open(os.path.join(path, 'cube.json')) as f:
+            cube = cls(**json.load(f))
+        cells = pd.read_parquet(os.path.join(path, 'cells.parquet'))
+        races = pd.read_parquet(os.path.join(path, 'races.parquet'))
+        cube.codes = np.asfortranarray(np.column_stack([cube._encode(dim, cells[dim].to_numpy())
+                                                        for dim in cube.dimensions]), dtype=np.int64)
+        cube.values = np.ascontiguousarray(cells[cube.measures].to_numpy(dtype=np.float64).T)
+        cube.races = set(races.itertuples(index=False, name=None))
+        return cube
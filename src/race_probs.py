@@ -0,0 +1,263 @@
+"""
+Race-normalised win probabilities from per-runner model scores.
+
+Binary classifiers score each runner on its own, so their outputs do not sum
+to one within a race and are not calibrated against the market. This layer
+turns per-runner scores into win probabilities with a conditional logit, a
+softmax within each race:
+
+    p_i = exp(a * s_i + b * m_i) / sum over the race of exp(a * s_j + b * m_j)
+
+s is the transformed model score and, with blend_sp, m = log(1 / SP) is the
+market's implied probability (the per-race normalisation to a 100% book is a
+constant within the race and cancels). a is the inverse temperature of the
+model and b the weight of the market, both fitted by maximising the
+likelihood of the historical winners. With a = 1, b = 0 and the 'log'
+score transform it is the plain p / sum(p) renormalisation used by
+monte_carlo_batch.
+
+Rows are sorted by race code once and every per-race quantity (max, sum,
+expectation) is a ufunc.reduceat over the sorted blocks, so a whole history
+is scored in one pass without groupby.apply. Fitting is a few Newton steps
+of the same operations.
+
+SP is only known at the off. For bets struck earlier, pass a price available
+at the time (e.g. 'Morning Price' or a T-minus snapshot) as sp_col.
+
+Example usage:
+    rp = RaceProbabilities(score_transform='logit', blend_sp=True).fit(train_data)
+    test_data = rp.transform(test_data, ev_threshold=0.05)   # win_prob, ev, model_preds
+    profit_calculation(test_data)
+    monte_carlo_batch(test_data, prob_col='win_prob', race_col=RACE_KEY, closed_form=True)
+"""
+import numpy as np
+
+from .splitter import RACE_KEY, race_codes
+
+TRANSFORMS = ('log', 'logit', 'none')
+
+_EPS = 1e-12
+
+
+def _segments(codes):
+    """
+    Stable sort order for race codes, the start of each race block and the
+    block index of every sorted row.
+
+    Returns:
+        tuple: (order, starts, race)
+    """
+    order = np.argsort(codes, kind='stable')
+    sorted_codes = codes[order]
+    starts = np.flatnonzero(np.r_[True, sorted_codes[1:] != sorted_codes[:-1]]) if len(codes) else \
+        np.empty(0, dtype=np.int64)
+    race = np.repeat(np.arange(len(starts)), np.diff(np.r_[starts, len(codes)]))
+    return order, starts, race
+
+
+def _fill_missing(values, starts, race):
+    """Non-finite values take the lowest value in their race, or 0 if the race has none."""
+    values = np.where(np.isfinite(values), values, np.nan)
+    missing = np.isnan(values)
+    if missing.any():
+        race_min = np.nan_to_num(np.fmin.reduceat(values, starts), nan=0.0)
+        values[missing] = race_min[race[missing]]
+    return values
+
+
+def segment_softmax(z, starts, race):
+    """
+    Softmax of z within each race block.
+
+    Args:
+        z (np.ndarray): utilities sorted by race
+        starts (np.ndarray): first row of each race block
+        race (np.ndarray): block index of each row
+
+    Returns:
+        np.ndarray: probabilities summing to one within each race
+    """
+    e = np.exp(z - np.maximum.reduceat(z, starts)[race])
+    return e / np.add.reduceat(e, starts)[race]
+
+
+class RaceProbabilities:
+    """
+    Conditional-logit win probabilities per race, optionally blended with the market.
+
+    Args:
+        score_transform (str): how scores enter the logit: 'log' for probabilities
+            (a = 1 is plain renormalisation), 'logit' for the probabilities of
+            a binary classifier (log-odds), 'none' for raw scores such as
+            decision_function output
+        blend_sp (bool): add log(1 / SP) as a second term with its own weight
+        score_col (str): column with the model score per runner
+        sp_col (str): decimal price for the blend and the ev column; the notebooks
+            keep the raw price in 'BF Decimal SP1' after normalising 'BF Decimal SP'
+        won_col (str): 1 for the winner; dead heats share the race's weight
+        race_cols (list): columns identifying a race
+        temperature (float): initial model temperature, 1 / a
+        sp_weight (float): initial market weight b
+        max_iter (int): Newton iterations in fit
+        tol (float): stop when the largest gradient component per race is below this
+
+    Attributes:
+        coef_ (np.ndarray): (a,) or (a, b); fit starts from the initial values and replaces them
+        temperature_ (float): 1 / a
+        n_iter_ (int): Newton iterations used by fit
+        log_loss_ (float): mean negative log-likelihood of the winners after fit
+    """
+    def __init__(self, score_transform='logit', blend_sp=False, score_col='pred_prob', sp_col='BF Decimal SP1',
+                 won_col='Won (1=Won, 0=Lost)', race_cols=RACE_KEY, temperature=1.0, sp_weight=0.0,
+                 max_iter=50, tol=1e-8):
+        if score_transform not in TRANSFORMS:
+            raise ValueError(f'score_transform must be one of {TRANSFORMS}')
+        self.score_transform = score_transform
+        self.blend_sp = blend_sp
+        self.score_col = score_col
+        self.sp_col = sp_col
+        self.won_col = won_col
+        self.race_cols = list(race_cols)
+        self.max_iter = max_iter
+        self.tol = tol
+        self.temperature = temperature
+        self.sp_weight = sp_weight
+        self.coef_ = self._initial_coef()
+        self.n_iter_ = 0
+        self.log_loss_ = None
+
+    def _initial_coef(self):
+        return np.array([1.0 / self.temperature, self.sp_weight] if self.blend_sp else [1.0 / self.temperature])
+
+    @property
+    def temperature_(self):
+        return 1.0 / self.coef_[0]
+
+    def _scores(self, df):
+        scores = df[self.score_col].to_numpy(dtype=np.float64)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            if self.score_transform == 'log':
+                return np.log(scores)
+            if self.score_transform == 'logit':
+                scores = np.clip(scores, _EPS, 1 - _EPS)
+                return np.log(scores) - np.log1p(-scores)
+        return scores
+
+    def _layout(self, df):
+        """Race blocks and the (n, k) feature matrix, in race-sorted order."""
+        order, starts, race = _segments(race_codes(df, self.race_cols))
+        columns = [_fill_missing(self._scores(df)[order], starts, race)]
+        if self.blend_sp:
+            sp = df[self.sp_col].to_numpy(dtype=np.float64)[order]
+            with np.errstate(divide='ignore', invalid='ignore'):
+                columns.append(_fill_missing(np.where(sp > 1, -np.log(sp), np.nan), starts, race))
+        return order, starts, race, np.column_stack(columns)
+
+    def _winner_weights(self, df, order, starts, race):
+        won = (df[self.won_col].to_numpy()[order] == 1).astype(np.float64)
+        per_race = np.add.reduceat(won, starts)
+        with np.errstate(invalid='ignore', divide='ignore'):
+            return np.where(per_race[race] > 0, won / per_race[race], 0.0), per_race > 0
+
+    def fit(self, df):
+        """
+        Fit the temperature (and market weight) by maximum likelihood of the winners.
+
+        Races without a recorded winner are ignored. The log-likelihood is
+        concave in the coefficients, so Newton's method with step halving
+        converges in a handful of passes.
+
+        Args:
+            df (pd.DataFrame): historical runners with scores, prices and results
+
+        Returns:
+            RaceProbabilities: self
+        """
+        if df.empty:
+            raise ValueError('Cannot fit on an empty frame')
+        order, starts, race, X = self._layout(df)
+        w, has_winner = self._winner_weights(df, order, starts, race)
+        n_races = int(has_winner.sum())
+        if n_races == 0:
+            raise ValueError(f'No winners in {self.won_col}')
+        races_w = has_winner.astype(np.float64)
+        observed = (w[:, None] * X).sum(axis=0)
+
+        def nll(coef):
+            p = segment_softmax(X @ coef, starts, race)
+            return -np.sum(w * np.log(np.maximum(p, 1e-300))), p
+
+        coef = self._initial_coef()
+        loss, p = nll(coef)
+        for self.n_iter_ in range(1, self.max_iter + 1):
+            expected = np.add.reduceat(p[:, None] * X, starts)
+            grad = (races_w[:, None] * expected).sum(axis=0) - observed
+            if np.max(np.abs(grad)) / n_races < self.tol:
+                break
+            second = np.add.reduceat(p[:, None, None] * X[:, :, None] * X[:, None, :], starts)
+            hessian = np.einsum('r,rij->ij', races_w, second - expected[:, :, None] * expected[:, None, :])
+            step = np.linalg.lstsq(hessian, grad, rcond=None)[0]
+            t = 1.0
+            while True:
+                new_loss, new_p = nll(coef - t * step)
+                if new_loss <= loss or t < 1e-8:
+                    break
+                t /= 2
+            coef, loss, p = coef - t * step, new_loss, new_p
+
+        self.coef_ = coef
+        self.log_loss_ = loss / n_races
+        return self
+
+    def predict(self, df):
+        """
+        Returns:
+            np.ndarray: win probability of every row of df, summing to one per race
+        """
+        if df.empty:
+            return np.empty(0)
+        order, starts, race, X = self._layout(df)
+        probs = np.empty(len(df))
+        probs[order] = segment_softmax(X @ self.coef_, starts, race)
+        return probs
+
+    def transform(self, df, prob_col='win_prob', ev_col='ev', ev_threshold=None):
+        """
+        Copy of df with the win probabilities and the expected value of a back bet at sp_col.
+
+        Args:
+            df (pd.DataFrame): runners to score
+            prob_col (str): column for the win probability
+            ev_col (str): column for prob * price - 1
+            ev_threshold (float): also add model_preds = ev > ev_threshold, the
+                column profit_calculation bets on
+
+        Returns:
+            pd.DataFrame: copy of df with the added columns
+        """
+        df_out = df.copy()
+        df_out[prob_col] = self.predict(df)
+        df_out[ev_col] = df_out[self.sp_col] * df_out[prob_col] - 1
+        if ev_threshold is not None:
+            df_out['model_preds'] = (df_out[ev_col] > ev_threshold).astype(int)
+        return df_out
+
+    def score(self, df):
+        """
+        Out-of-sample fit on races with a recorded winner; raises ValueError if there are none.
+
+        Returns:
+            dict: log_loss (mean negative log-probability of the winner),
+                winner_prob (mean probability given to the winner) and races
+        """
+        order, starts, race, X = self._layout(df)
+        w, has_winner = self._winner_weights(df, order, starts, race)
+        n_races = int(has_winner.sum())
+        if n_races == 0:
+            raise ValueError(f'No winners in {self.won_col}')
+        p = segment_softmax(X @ self.coef_, starts, race)
+        return {
+            'log_loss': float(-np.sum(w * np.log(np.maximum(p, 1e-300))) / n_races),
+            'winner_prob': float(np.sum(w * p) / n_races),
+            'races': n_races,
+        }
@@ -0,0 +1,254 @@
+"""
+Bulk race result ingestion from the Betfair race card API.
+
+Market ids are split into chunks and fetched concurrently with retry. Each
+response is flattened straight into column arrays, and every chunk is written
+to a Parquet results store as it arrives. A checkpoint of completed market ids
+lets a season backfill stop and resume without refetching.
+
+Example usage:
+    trading.race_card.login()
+    store = ResultsStore('../data/results')
+    stats = ingest_race_results(trading, season_market_ids, store, max_workers=8)
+    results = store.read(columns=['market_id', 'selection_id', 'bsp', 'position'])
+"""
+import json
+import logging
+import os
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.dataset as ds
+import pyarrow.parquet as pq
+
+from .market_fetcher import TokenBucket, call_with_retry, chunked
+from .profiling import bind
+
+# race level fields: column -> path into the race dict
+RACE_FIELDS = {
+    'race_id': ('raceId',),
+    'country_code': ('course', 'countryCode'),
+    'race_title': ('raceTitle',),
+    'race_class': ('raceClassification', 'classification'),
+    'distance': ('distance',),
+    'course_type': ('course', 'courseType'),
+    'surface_type': ('course', 'surfaceType'),
+}
+
+# runner level fields: column -> key in the runner dict
+RUNNER_FIELDS = {
+    'horse_id': 'horseId',
+    'saddle_cloth': 'saddleCloth',
+    'isNonRunner': 'isNonRunner',
+    'position': 'position',
+}
+
+# column order of the frame fetch_race_results has always returned
+RESULT_COLUMNS = ['race_id', 'country_code', 'race_title', 'race_class', 'distance', 'course_type',
+                  'surface_type', 'market_id', 'horse_id', 'saddle_cloth', 'isNonRunner', 'position',
+                  'selection_id', 'bsp']
+
+STRING_COLUMNS = ['race_id', 'country_code', 'race_title', 'race_class', 'course_type', 'surface_type',
+                  'market_id', 'horse_id', 'saddle_cloth']
+
+
+def _get(race, path):
+    value = race
+    for key in path:
+        value = value.get(key) if isinstance(value, dict) else None
+    return value
+
+
+def flatten_results(data):
+    """
+    Flatten get_race_result JSON into one row per WIN selection with a BSP.
+
+    Values are appended straight into per-column lists and race fields are
+    stored once per race and expanded with np.repeat, so no per-row dict is
+    built.
+
+    Args:
+        data (list): races as returned by trading.race_card.get_race_result
+
+    Returns:
+        pd.DataFrame: RESULT_COLUMNS with float64 distance/position/bsp,
+            Int64 selection_id, boolean isNonRunner and string ids
+    """
+    race_values = {col: [] for col in RACE_FIELDS}
+    runner_values = {col: [] for col in RUNNER_FIELDS}
+    market_id, selection_id, bsp = [], [], []
+    counts = []
+
+    for race in data or ():
+        n = 0
+        for runner in race.get('runners') or ():
+            for selection in runner.get('selections') or ():
+                if selection.get('marketType') == 'WIN' and 'bsp' in selection:
+                    market_id.append(selection.get('marketId'))
+                    selection_id.append(selection.get('selectionId'))
+                    bsp.append(selection.get('bsp'))
+                    for col, key in RUNNER_FIELDS.items():
+                        runner_values[col].append(runner.get(key))
+                    n += 1
+        if n:
+            counts.append(n)
+            for col, path in RACE_FIELDS.items():
+                race_values[col].append(_get(race, path))
+
+    columns = {col: np.repeat(np.array(values, dtype=object), counts) for col, values in race_values.items()}
+    columns.update(runner_values)
+    columns.update({'market_id': market_id, 'selection_id': selection_id, 'bsp': bsp})
+
+    df = pd.DataFrame({col: columns[col] for col in RESULT_COLUMNS})
+    for col in ('distance', 'position', 'bsp'):
+        df[col] = pd.to_numeric(df[col], errors='coerce').astype('float64')
+    df['selection_id'] = pd.to_numeric(df['selection_id'], errors='coerce').astype('Int64')
+    df['isNonRunner'] = df['isNonRunner'].astype('boolean')
+    for col in STRING_COLUMNS:
+        df[col] = df[col].astype('string')
+    return df
+
+
+class ResultsStore:
+    """
+    Parquet dataset of race results with a checkpoint of ingested market ids.
+
+    Layout: <root>/part-<uuid>.parquet plus <root>/_checkpoint.json. Each part
+    is written to a temporary name and renamed into place before its market
+    ids are checkpointed, so an interrupted run never leaves a half-written
+    part behind and never records a market whose rows were not stored.
+
+    Args:
+        root (str): dataset directory
+    """
+    def __init__(self, root='../data/results'):
+        self.root = root
+        self.checkpoint_path = os.path.join(root, '_checkpoint.json')
+        self._completed = None
+
+    def completed(self):
+        """Set of market ids already ingested."""
+        if self._completed is None:
+            self._completed = set()
+            if os.path.exists(self.checkpoint_path):
+                with open(self.checkpoint_path) as f:
+                    self._completed = set(json.load(f)['market_ids'])
+        return self._completed
+
+    def mark_completed(self, market_ids):
+        completed = self.completed()
+        completed.update(market_ids)
+        tmp_path = self.checkpoint_path + '.tmp'
+        with open(tmp_path, 'w') as f:
+            json.dump({'market_ids': sorted(completed), 'updated': pd.Timestamp.now(tz='UTC').isoformat()}, f)
+        os.replace(tmp_path, self.checkpoint_path)
+
+    def write(self, df):
+        """
+        Write one chunk of results as a new part file.
+
+        Returns:
+            int: number of rows written
+        """
+        os.makedirs(self.root, exist_ok=True)
+        if df.empty:
+            return 0
+        path = os.path.join(self.root, f'part-{uuid.uuid4().hex}.parquet')
+        pq.write_table(pa.Table.from_pandas(df, preserve_index=False), path + '.tmp')
+        os.replace(path + '.tmp', path)
+        return len(df)
+
+    def read(self, columns=None, filter=None):
+        """
+        Read stored results with column projection and an optional row filter.
+
+        Args:
+            columns (list): columns to load, defaults to all
+            filter (pyarrow.dataset.Expression): e.g. ds.field('bsp') < 3
+
+        Returns:
+            pd.DataFrame: matching rows
+        """
+        if not os.path.isdir(self.root):
+            return pd.DataFrame(columns=columns or RESULT_COLUMNS)
+        dataset = ds.dataset(self.root, format='parquet', exclude_invalid_files=True)
+        return dataset.to_table(columns=columns, filter=filter).to_pandas()
+
+
+def fetch_result_chunks(trading, market_ids, chunk_size=50, max_workers=4, requests_per_second=5,
+                        max_retries=3, backoff=0.5):
+    """
+    Fetch race results for chunks of market ids concurrently.
+
+    Args:
+        trading (betfairlightweight.APIClient): client with a logged in race_card
+        market_ids (list): market ids to fetch
+        chunk_size (int): market ids per get_race_result call
+        max_workers (int): concurrent requests
+        requests_per_second (float): shared rate limit across workers
+        max_retries (int): attempts per chunk
+        backoff (float): base delay for exponential backoff
+
+    Yields:
+        tuple: (chunk, data, seconds) as each chunk completes; data is None if
+            the chunk failed after all retries
+    """
+    bucket = TokenBucket(requests_per_second)
+
+    def fetch(chunk):
+        return call_with_retry(lambda: trading.race_card.get_race_result(market_ids=chunk),
+                               bucket, max_retries, backoff, f'get_race_result for {len(chunk)} markets')
+
+    fetch = bind(fetch)
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        futures = {executor.submit(fetch, chunk): chunk for chunk in chunked(list(market_ids), chunk_size)}
+        for future in as_completed(futures):
+            data, seconds = future.result()
+            yield futures[future], data, seconds
+
+
+def ingest_race_results(trading, market_ids, store, chunk_size=50, max_workers=4, requests_per_second=5,
+                        max_retries=3, backoff=0.5):
+    """
+    Fetch, flatten and store results for market_ids, skipping those already
+    checkpointed in store. Failed chunks are left out of the checkpoint, so
+    running again retries exactly the missing markets.
+
+    Args:
+        trading (betfairlightweight.APIClient): client with a logged in race_card
+        market_ids (list): market ids to ingest
+        store (ResultsStore): destination
+        chunk_size (int): market ids per get_race_result call
+        max_workers (int): concurrent requests
+        requests_per_second (float): shared rate limit across workers
+        max_retries (int): attempts per chunk
+        backoff (float): base delay for exponential backoff
+
+    Returns:
+        dict: markets requested/skipped/ingested/failed, rows written, elapsed
+            seconds and rows per second
+    """
+    done = store.completed()
+    todo = list(dict.fromkeys(m for m in market_ids if m not in done))
+    stats = {'markets': len(market_ids), 'skipped': len(market_ids) - len(todo), 'ingested': 0,
+             'failed': 0, 'rows': 0}
+
+    start = time.perf_counter()
+    for chunk, data, _ in fetch_result_chunks(trading, todo, chunk_size, max_workers, requests_per_second,
+                                              max_retries, backoff):
+        if data is None:
+            stats['failed'] += len(chunk)
+            continue
+        stats['rows'] += store.write(flatten_results(data))
+        store.mark_completed(chunk)
+        stats['ingested'] += len(chunk)
+    stats['elapsed_s'] = round(time.perf_counter() - start, 4)
+    stats['rows_per_s'] = round(stats['rows'] / stats['elapsed_s'], 1) if stats['elapsed_s'] else None
+
+    if stats['failed']:
+        logging.warning(f"{stats['failed']} markets failed, run again to retry them")
+    return stats
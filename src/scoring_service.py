@@ -0,0 +1,256 @@
+"""
+Long-running local scoring service for the pickled models.
+
+Loads a model and the FeaturePipeline saved alongside it once at startup,
+then scores micro-batches of runner rows per race.
+
+Run from the repository root with:
+    MODEL_PATH=models/rf_model.pkl uvicorn src.scoring_service:app --port 8000
+
+Fit and save a pipeline for a model pickled without one:
+    python -m src.scoring_service fit-pipeline models/logistic_regression_model.pkl data/turf.csv
+"""
+import logging
+import os
+import pickle
+import sys
+import time
+from collections import deque
+from contextlib import asynccontextmanager
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+import pandas as pd
+from fastapi import FastAPI, HTTPException
+from pydantic import BaseModel
+
+from .feature_pipeline import FeaturePipeline
+from .monte_carlo import monte_carlo_batch, simulate_winners
+from .splitter import grouped_split
+
+DEFAULT_MODEL_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'models',
+                                  'logistic_regression_model.pkl')
+
+
+class LatencyTracker:
+    """Rolling window of request latencies with percentile summaries."""
+    def __init__(self, window=10000):
+        self.samples = deque(maxlen=window)
+        self.count = 0
+
+    def record(self, seconds):
+        self.samples.append(seconds)
+        self.count += 1
+
+    def summary(self):
+        if not self.samples:
+            return {'requests': self.count}
+        ms = np.fromiter(self.samples, dtype=np.float64) * 1000
+        return {
+            'requests': self.count,
+            'window': len(ms),
+            'mean_ms': round(float(ms.mean()), 3),
+            'p50_ms': round(float(np.percentile(ms, 50)), 3),
+            'p99_ms': round(float(np.percentile(ms, 99)), 3),
+            'max_ms': round(float(ms.max()), 3),
+        }
+
+
+class ScoringEngine:
+    """
+    Scores runner rows with a fitted model and pipeline.
+
+    Args:
+        model: fitted classifier with predict_proba
+        pipeline (FeaturePipeline): fitted pipeline matching the model
+        n_sims (int): Monte Carlo simulations per race, 0 for closed form
+        price_col (str): runner field holding the decimal price used for EV
+    """
+    def __init__(self, model, pipeline, n_sims=2000, price_col='price'):
+        self.model = model
+        self.pipeline = pipeline
+        self.n_sims = n_sims
+        self.price_col = price_col
+        self.latency = LatencyTracker()
+
+    @classmethod
+    def from_path(cls, model_path, **kwargs):
+        pipeline_path = FeaturePipeline.pipeline_path(model_path)
+        if not os.path.exists(pipeline_path):
+            raise FileNotFoundError(
+                f'No fitted pipeline at {pipeline_path}. Save one with FeaturePipeline.save_with_model '
+                f'or run: python -m src.scoring_service fit-pipeline {model_path} <training csv>'
+            )
+        model, pipeline = FeaturePipeline.load_with_model(model_path)
+        return cls(model, pipeline, **kwargs)
+
+    def score(self, runners, race_col='race_id'):
+        """
+        Score a DataFrame of runners for one or more races.
+
+        Args:
+            runners (pd.DataFrame): one row per runner with race_col, the model
+                feature columns (or the raw columns add_features derives them
+                from) and optionally price_col
+            race_col (str): column identifying the race
+
+        Returns:
+            pd.DataFrame: copy of runners with mc_win_prob and ev added;
+                model_prob is also written to runners in place
+        """
+        start = time.perf_counter()
+        missing = [c for c in self.pipeline.feature_columns if c not in runners.columns]
+        X = self.pipeline.transform(runners, add=bool(missing))
+        runners['model_prob'] = self.model.predict_proba(X)[:, 1]
+        if self.price_col not in runners.columns:
+            runners[self.price_col] = np.nan
+        scored = monte_carlo_batch(runners, n_sims=max(self.n_sims, 1), race_col=race_col, prob_col='model_prob',
+                                   sp_col=self.price_col, closed_form=self.n_sims == 0)
+        self.latency.record(time.perf_counter() - start)
+        return scored
+
+    def score_races(self, races):
+        """
+        Score micro-batches of runner rows without building a DataFrame.
+
+        Runners arrive grouped by race, so the race layout is known up front
+        and the feature matrix, normalisation and simulation are plain array ops.
+
+        Args:
+            races (list): (race_id, runners) pairs, runners a list of dicts
+                holding the model feature columns, optionally selection_id and
+                price_col
+
+        Returns:
+            list: one dict per runner with race_id, selection_id, model_prob,
+                win_prob (normalised within the race), mc_win_prob and ev
+        """
+        start = time.perf_counter()
+        runners = [runner for _, race_runners in races for runner in race_runners]
+        if not runners:
+            return []
+        sizes = np.array([len(race_runners) for _, race_runners in races])
+        races = [race for race, size in zip(races, sizes) if size]
+        sizes = sizes[sizes > 0]
+        starts = np.concatenate(([0], np.cumsum(sizes)[:-1]))
+        codes = np.repeat(np.arange(len(sizes)), sizes)
+
+        model_prob = self.model.predict_proba(self.pipeline.transform_records(runners))[:, 1]
+        probs = np.where(np.isfinite(model_prob) & (model_prob > 0), model_prob, 0.0)
+        totals = np.bincount(codes, weights=probs)
+        # races with no usable probability mass are treated as a uniform field
+        probs[totals[codes] <= 0] = 1.0
+        win_prob = probs / np.bincount(codes, weights=probs)[codes]
+
+        if self.n_sims:
+            mc_win_prob = simulate_winners(win_prob, starts, sizes, self.n_sims)
+        else:
+            mc_win_prob = win_prob
+        price = np.array([runner.get(self.price_col) for runner in runners], dtype=np.float64)
+        ev = price * mc_win_prob - 1
+
+        race_ids = np.repeat([race_id for race_id, _ in races], sizes)
+        results = [
+            {'race_id': race_id, 'selection_id': runner.get('selection_id'), 'model_prob': float(m),
+             'win_prob': float(w), 'mc_win_prob': float(mc), 'ev': None if np.isnan(e) else float(e)}
+            for race_id, runner, m, w, mc, e in zip(race_ids.tolist(), runners, model_prob, win_prob, mc_win_prob, ev)
+        ]
+        self.latency.record(time.perf_counter() - start)
+        return results
+
+
+class Race(BaseModel):
+    race_id: str
+    runners: List[Dict[str, Any]]
+
+
+class ScoreRequest(BaseModel):
+    races: List[Race]
+
+
+class RunnerScore(BaseModel):
+    race_id: str
+    selection_id: Optional[int] = None
+    model_prob: float
+    win_prob: float
+    mc_win_prob: float
+    ev: Optional[float] = None
+
+
+def create_app(model_path=None, n_sims=None):
+    """
+    Build the FastAPI app; the model and pipeline are loaded once in the lifespan hook.
+
+    Args:
+        model_path (str): model pickle, defaults to $MODEL_PATH
+        n_sims (int): Monte Carlo simulations per race, defaults to $MC_SIMS or 2000
+    """
+    model_path = model_path or os.getenv('MODEL_PATH', DEFAULT_MODEL_PATH)
+    n_sims = int(os.getenv('MC_SIMS', 2000)) if n_sims is None else n_sims
+    state = {}
+
+    @asynccontextmanager
+    async def lifespan(app):
+        state['engine'] = ScoringEngine.from_path(model_path, n_sims=n_sims)
+        logging.info(f'Loaded model and pipeline from {model_path}')
+        yield
+        state.clear()
+
+    app = FastAPI(title='horse_trading scoring', lifespan=lifespan)
+
+    @app.get('/health')
+    def health():
+        return {'status': 'ok', 'model_path': model_path}
+
+    @app.get('/metrics')
+    def metrics():
+        return state['engine'].latency.summary()
+
+    # sync handler: scoring is CPU bound, so FastAPI runs it in its threadpool
+    @app.post('/score', response_model=List[RunnerScore])
+    def score(request: ScoreRequest):
+        try:
+            return state['engine'].score_races([(race.race_id, race.runners) for race in request.races])
+        except (TypeError, ValueError) as e:
+            raise HTTPException(status_code=422, detail=f'Invalid runner features: {e}')
+
+    return app
+
+
+app = create_app()
+
+
+def fit_pipeline(model_path, csv_path, race_cols=('Race Time', 'Course'), test_size=0.2, random_state=42):
+    """
+    Fit and save a FeaturePipeline for a model pickled without one, using the
+    model's own feature names.
+
+    The scaler is fitted on the training races only, selected with the same
+    grouped_split as DataCleaning.split_data in the notebooks (race key, test
+    size and seed), so the test races never leak into the scaling ranges.
+    csv_path must hold the frame the notebook split, after the same cleaning,
+    or different races end up in training; when the model is trained in code,
+    save its pipeline with FeaturePipeline.save_with_model instead.
+
+    Args:
+        model_path (str): model pickle
+        csv_path (str): frame the model's notebook passed to split_data
+        race_cols (tuple): columns identifying a race, as in split_data
+        test_size (float): proportion of races held out, as in split_data
+        random_state (int): split seed, as in split_data
+    """
+    with open(model_path, 'rb') as f:
+        model = pickle.load(f)
+    df = pd.read_csv(csv_path, low_memory=False)
+    train_idx, _ = grouped_split(df, race_cols=list(race_cols), test_size=test_size, random_state=random_state)
+    pipeline = FeaturePipeline(feature_columns=list(model.feature_names_in_))
+    pipeline.fit(df.iloc[train_idx].copy())
+    pipeline.save(FeaturePipeline.pipeline_path(model_path))
+    print(f'Saved pipeline to {FeaturePipeline.pipeline_path(model_path)}')
+
+
+if __name__ == '__main__':
+    if len(sys.argv) == 4 and sys.argv[1] == 'fit-pipeline':
+        fit_pipeline(sys.argv[2], sys.argv[3])
+    else:
+        print(__doc__)
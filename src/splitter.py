@@ -0,0 +1,210 @@
+"""
+Leak-free train/test splits that keep every race on one side.
+
+Races are identified by integer codes from groupby().ngroup rather than
+concatenated strings, the input frame is never modified and every splitter
+returns positional index arrays, so folds cost an argsort and a few
+searchsorted calls however long the history is.
+
+The iterators follow the sklearn splitter protocol (split / get_n_splits)
+and can be passed as cv= to cross_val_score, GridSearchCV and friends.
+
+Example usage:
+    train_idx, test_idx = grouped_split(df)
+    train_data, test_data = df.iloc[train_idx], df.iloc[test_idx]
+
+    cv = WalkForward(min_train_periods=12)
+    scores = cross_val_score(model, X, y, cv=cv.split(df))
+"""
+import numpy as np
+import pandas as pd
+from sklearn.model_selection import train_test_split
+
+# turf.csv 'Race Time' is HH:MM only, so the date is part of the race key
+RACE_KEY = ['Race Date', 'Race Time', 'Course']
+
+
+def race_codes(df, race_cols=RACE_KEY):
+    """
+    Integer race code per row, numbered in order of first appearance.
+
+    Args:
+        df (pd.DataFrame): runners, one row per horse
+        race_cols (list): columns identifying a race
+
+    Returns:
+        np.ndarray: int64 code per row, 0..n_races-1
+    """
+    return df.groupby(list(race_cols), sort=False, dropna=False).ngroup().to_numpy(dtype=np.int64)
+
+
+def month_codes(dates):
+    """
+    Months since year 0 for each date, so consecutive months differ by one.
+
+    Strings are read day first, as the dd/mm/yyyy 'Race Date' of turf.csv,
+    unless they are ISO 8601 (yyyy-mm-dd).
+
+    Args:
+        dates (pd.Series): datetimes or strings pandas can parse
+
+    Returns:
+        np.ndarray: int64 month number per row
+    """
+    if not pd.api.types.is_datetime64_any_dtype(dates):
+        first = dates.dropna().astype(str).head(1)
+        if first.str.match(r'\d{4}-').all():
+            dates = pd.to_datetime(dates, format='ISO8601')
+        else:
+            dates = pd.to_datetime(dates, dayfirst=True)
+    return (dates.dt.year.to_numpy(dtype=np.int64) * 12 + dates.dt.month.to_numpy(dtype=np.int64) - 1)
+
+
+def _groups(X, groups, race_cols):
+    if groups is not None:
+        return np.asarray(groups)
+    if isinstance(X, pd.DataFrame):
+        return race_codes(X, race_cols)
+    raise ValueError('Pass groups= (e.g. race_codes(df)) when X is not the race DataFrame')
+
+
+def grouped_split(df, race_cols=RACE_KEY, test_size=0.2, random_state=42, groups=None):
+    """
+    Random train/test split by race.
+
+    Races are numbered in the same first-appearance order as unique(), so with
+    the same race_cols and random_state this selects the same test races as
+    DataCleaning.split_data, which keys races on ['Race Time', 'Course'].
+
+    Args:
+        df (pd.DataFrame): runners, one row per horse
+        race_cols (list): columns identifying a race
+        test_size (float): proportion of races in the test set
+        random_state (int): seed for the shuffle
+        groups (np.ndarray): precomputed race codes, skips the groupby
+
+    Returns:
+        tuple: (train_idx, test_idx) positional index arrays into df
+    """
+    codes = _groups(df, groups, race_cols)
+    n_races = int(codes.max()) + 1 if len(codes) else 0
+    _, test_races = train_test_split(np.arange(n_races), test_size=test_size, shuffle=True,
+                                     random_state=random_state)
+    is_test = np.zeros(n_races, dtype=bool)
+    is_test[test_races] = True
+    in_test = is_test[codes]
+    return np.flatnonzero(~in_test), np.flatnonzero(in_test)
+
+
+class GroupKFoldRaces:
+    """
+    K-fold cross-validation where each race falls wholly inside one fold.
+
+    Races are shuffled once and dealt round-robin into folds; rows are then
+    bucketed by fold with a single stable argsort.
+
+    Args:
+        n_splits (int): number of folds
+        race_cols (list): columns identifying a race when X is a DataFrame
+        shuffle (bool): shuffle races before assigning folds
+        random_state (int): seed for the shuffle
+    """
+    def __init__(self, n_splits=5, race_cols=RACE_KEY, shuffle=True, random_state=42):
+        if n_splits < 2:
+            raise ValueError('n_splits must be at least 2')
+        self.n_splits = n_splits
+        self.race_cols = list(race_cols)
+        self.shuffle = shuffle
+        self.random_state = random_state
+
+    def get_n_splits(self, X=None, y=None, groups=None):
+        return self.n_splits
+
+    def split(self, X, y=None, groups=None):
+        """
+        Yield (train_idx, test_idx) for each fold.
+
+        Args:
+            X (pd.DataFrame): race frame, or any array when groups is given
+            y: ignored, present for sklearn compatibility
+            groups (np.ndarray): integer race code per row
+        """
+        codes = _groups(X, groups, self.race_cols)
+        n_races = int(codes.max()) + 1 if len(codes) else 0
+        if n_races < self.n_splits:
+            raise ValueError(f'Cannot make {self.n_splits} folds from {n_races} races')
+
+        races = np.arange(n_races)
+        if self.shuffle:
+            races = np.random.default_rng(self.random_state).permutation(n_races)
+        race_fold = np.empty(n_races, dtype=np.int64)
+        race_fold[races] = np.arange(n_races) % self.n_splits
+
+        row_fold = race_fold[codes]
+        order = np.argsort(row_fold, kind='stable')
+        bounds = np.searchsorted(row_fold[order], np.arange(self.n_splits + 1))
+        for k in range(self.n_splits):
+            test_idx = order[bounds[k]:bounds[k + 1]]
+            train_idx = np.concatenate((order[:bounds[k]], order[bounds[k + 1]:]))
+            yield np.sort(train_idx), test_idx
+
+
+class WalkForward:
+    """
+    Time-ordered validation: train on every earlier month, test on the next.
+
+    A race has a single start time, so splitting on calendar month never puts
+    runners of the same race on both sides.
+
+    Args:
+        date_col (str): column holding the race date when X is a DataFrame
+        min_train_periods (int): months of history required before the first test month
+        max_train_periods (int): cap the training window to this many months
+            (rolling window), None for an expanding window
+        test_periods (int): months in each test block
+        gap (int): months skipped between training and test data
+    """
+    def __init__(self, date_col='Race Date', min_train_periods=1, max_train_periods=None, test_periods=1, gap=0):
+        self.date_col = date_col
+        self.min_train_periods = min_train_periods
+        self.max_train_periods = max_train_periods
+        self.test_periods = test_periods
+        self.gap = gap
+
+    def _months(self, X, groups):
+        if groups is not None:
+            return np.asarray(groups, dtype=np.int64)
+        if isinstance(X, pd.DataFrame):
+            return month_codes(X[self.date_col])
+        raise ValueError('Pass groups= (e.g. month_codes(df["Race Date"])) when X is not the race DataFrame')
+
+    def _test_starts(self, months):
+        first, last = int(months.min()), int(months.max())
+        return range(first + self.min_train_periods + self.gap, last + 1, self.test_periods)
+
+    def get_n_splits(self, X=None, y=None, groups=None):
+        if X is None and groups is None:
+            raise ValueError('WalkForward needs the data to count its splits')
+        return sum(1 for _ in self.split(X, groups=groups))
+
+    def split(self, X, y=None, groups=None):
+        """
+        Yield (train_idx, test_idx) for each test month block.
+
+        Args:
+            X (pd.DataFrame): race frame, or any array when groups is given
+            y: ignored, present for sklearn compatibility
+            groups (np.ndarray): month number per row, as from month_codes
+        """
+        months = self._months(X, groups)
+        order = np.argsort(months, kind='stable')
+        sorted_months = months[order]
+
+        for test_start in self._test_starts(months):
+            train_end = test_start - self.gap
+            train_start = sorted_months[0] if self.max_train_periods is None else train_end - self.max_train_periods
+            lo, hi, test_lo, test_hi = np.searchsorted(
+                sorted_months, [train_start, train_end, test_start, test_start + self.test_periods])
+            if test_lo == test_hi or lo == hi:
+                continue
+            yield order[lo:hi], order[test_lo:test_hi]
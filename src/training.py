@@ -0,0 +1,329 @@
+"""
+Parallel model training and hyperparameter sweeps with MLflow tracking.
+
+Replaces the notebook pattern of running GridSearchCV for one model after
+another:
+    - every (model, parameters, fold) combination is one job, and all jobs of
+      all models share a single process pool
+    - each worker gets a share of the cores (threads_per_job) and BLAS/OpenMP
+      pools and the models' own n_jobs are capped to it, so the pool never
+      oversubscribes the machine
+    - the feature matrix, target and fold assignment are written once as .npy
+      files and opened memory-mapped in every worker, so the frame is never
+      pickled per job or copied per process
+    - folds keep every race on one side (splitter.GroupKFoldRaces)
+    - each (model, parameters) combination is logged as a nested MLflow run
+      with per-fold and mean metrics; the winner is picked with
+      functions.get_best_model, refit on all rows and logged to its run
+
+Example usage:
+    runner = SweepRunner(
+        {'logistic_regression': {'C': [0.1, 1, 10]},
+         'random_forest': {'n_estimators': [100, 200], 'max_depth': [None, 10]}},
+        feature_cols, n_jobs=8)
+    runner.fit(df)
+    runner.cv_results_
+    model = mlflow.sklearn.load_model(runner.best_model_uri_)
+"""
+import hashlib
+import importlib
+import json
+import logging
+import os
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import numpy as np
+import pandas as pd
+from sklearn.metrics import accuracy_score, f1_score, log_loss, precision_score, recall_score, roc_auc_score
+from sklearn.model_selection import ParameterGrid
+from threadpoolctl import threadpool_limits
+
+from .functions import best_run, get_best_model
+from .lazy import lazy_import
+from .splitter import RACE_KEY, GroupKFoldRaces
+
+# only the parent process logs to MLflow, so sweep workers never load it
+mlflow = lazy_import('mlflow')
+
+# model name -> (module, class); imported when first used, so xgboost is only
+# needed for sweeps that include it
+MODELS = {
+    'random_forest': ('sklearn.ensemble', 'RandomForestClassifier'),
+    'gradient_boosting': ('sklearn.ensemble', 'GradientBoostingClassifier'),
+    'logistic_regression': ('sklearn.linear_model', 'LogisticRegression'),
+    'xgboost': ('xgboost', 'XGBClassifier'),
+}
+
+DEFAULT_PARAMS = {
+    'random_forest': {'random_state': 42},
+    'gradient_boosting': {'random_state': 42},
+    'logistic_regression': {'max_iter': 1000},
+    'xgboost': {'random_state': 42, 'eval_metric': 'logloss'},
+}
+
+METRICS = ['accuracy', 'precision', 'recall', 'f1_score', 'roc_auc', 'log_loss']
+
+# per-process state set by _init_worker
+_DATA = {}
+
+
+def make_model(name, params=None, n_threads=1):
+    """
+    Unfitted estimator for a model name in MODELS.
+
+    Args:
+        name (str): key of MODELS
+        params (dict): hyperparameters, on top of DEFAULT_PARAMS
+        n_threads (int): value for the estimator's n_jobs, if it has one
+    """
+    module, cls = MODELS[name]
+    estimator = getattr(importlib.import_module(module), cls)(**{**DEFAULT_PARAMS.get(name, {}), **(params or {})})
+    if 'n_jobs' in estimator.get_params():
+        estimator.set_params(n_jobs=n_threads)
+    return estimator
+
+
+def score(y_true, y_pred, y_prob=None):
+    """Classification metrics for one fold; ranking metrics use probabilities when available."""
+    ranking = y_pred if y_prob is None else y_prob
+    metrics = {
+        'accuracy': accuracy_score(y_true, y_pred),
+        'precision': precision_score(y_true, y_pred, zero_division=0),
+        'recall': recall_score(y_true, y_pred, zero_division=0),
+        'f1_score': f1_score(y_true, y_pred, zero_division=0),
+        'roc_auc': roc_auc_score(y_true, ranking) if len(np.unique(y_true)) > 1 else np.nan,
+    }
+    metrics['log_loss'] = log_loss(y_true, y_prob, labels=[0, 1]) if y_prob is not None else np.nan
+    return metrics
+
+
+class FeatureCache:
+    """
+    Feature matrices stored as .npy files and opened memory-mapped.
+
+    Each entry is a directory named by a hash of the feature values, target
+    and fold assignment, so an unchanged frame is written once and reused by
+    later sweeps.
+
+    Args:
+        root (str): cache directory, defaults to a temporary directory
+    """
+    def __init__(self, root=None):
+        self.root = root or os.path.join(tempfile.gettempdir(), 'horse_feature_cache')
+
+    def store(self, X, y, folds):
+        """
+        Write X, y and folds unless an identical entry exists.
+
+        Returns:
+            str: entry directory
+        """
+        digest = hashlib.sha1()
+        for array in (X, y, folds):
+            digest.update(str(array.shape).encode())
+            digest.update(np.ascontiguousarray(array).view(np.uint8))
+        path = os.path.join(self.root, digest.hexdigest()[:16])
+        if not os.path.exists(os.path.join(path, 'folds.npy')):
+            os.makedirs(path, exist_ok=True)
+            # folds.npy is written last and marks a complete entry
+            for name, array in (('X', X), ('y', y), ('folds', folds)):
+                np.save(os.path.join(path, f'{name}.tmp.npy'), array)
+                os.replace(os.path.join(path, f'{name}.tmp.npy'), os.path.join(path, f'{name}.npy'))
+        return path
+
+    @staticmethod
+    def load(path):
+        """Memory-mapped (X, y, folds) of an entry."""
+        return tuple(np.load(os.path.join(path, f'{name}.npy'), mmap_mode='r') for name in ('X', 'y', 'folds'))
+
+
+def _init_worker(path, n_threads):
+    _DATA['X'], _DATA['y'], _DATA['folds'] = FeatureCache.load(path)
+    _DATA['n_threads'] = n_threads
+    # cap BLAS/OpenMP pools for the life of the worker
+    _DATA['limits'] = threadpool_limits(limits=n_threads)
+
+
+def _run_job(job):
+    """Fit one (model, params) on all folds but one and score it on the held-out fold."""
+    name, params, fold = job
+    X, y, folds = _DATA['X'], _DATA['y'], _DATA['folds']
+    test = folds == fold
+    model = make_model(name, params, _DATA['n_threads'])
+
+    start = time.perf_counter()
+    model.fit(X[~test], y[~test])
+    fit_s = time.perf_counter() - start
+
+    X_test = X[test]
+    y_prob = model.predict_proba(X_test)[:, 1] if hasattr(model, 'predict_proba') else None
+    metrics = score(y[test], model.predict(X_test), y_prob)
+    return {'model': name, 'params': params, 'fold': fold, 'fit_s': fit_s, **metrics}
+
+
+def _params_key(params):
+    return json.dumps(params, sort_keys=True, default=str)
+
+
+class SweepRunner:
+    """
+    Cross-validated sweep over several models and parameter grids.
+
+    Args:
+        param_grids (dict): model name -> parameter grid (dict of lists, or a
+            list of such dicts) as accepted by sklearn's ParameterGrid
+        feature_cols (list): feature columns
+        target_col (str): label column
+        n_splits (int): race-grouped folds
+        race_cols (list): columns identifying a race
+        n_jobs (int): worker processes, None for all cores, 1 to run in process
+        threads_per_job (int): BLAS/OpenMP and model threads per worker,
+            defaults to cores // n_jobs
+        metric (str): metric the winner is chosen by, any of METRICS except log_loss
+        refit (bool): refit the winner on all rows and log it to its run
+        experiment_name (str): MLflow experiment, defaults to the active one
+        cache (FeatureCache): where the memory-mapped arrays live
+        random_state (int): seed for the fold assignment
+    """
+    def __init__(self, param_grids, feature_cols, target_col='Won (1=Won, 0=Lost)', n_splits=5, race_cols=RACE_KEY,
+                 n_jobs=None, threads_per_job=None, metric='roc_auc', refit=True, experiment_name=None,
+                 cache=None, random_state=42):
+        unknown = set(param_grids) - set(MODELS)
+        if unknown:
+            raise ValueError(f'Unknown models {sorted(unknown)}, expected some of {sorted(MODELS)}')
+        if metric not in METRICS or metric == 'log_loss':
+            raise ValueError(f"metric must be one of {[m for m in METRICS if m != 'log_loss']} (higher is better)")
+        self.param_grids = param_grids
+        self.feature_cols = list(feature_cols)
+        self.target_col = target_col
+        self.n_splits = n_splits
+        self.race_cols = list(race_cols)
+        self.n_jobs = n_jobs or os.cpu_count()
+        self.threads_per_job = threads_per_job or max(1, (os.cpu_count() or 1) // self.n_jobs)
+        self.metric = metric
+        self.refit = refit
+        self.experiment_name = experiment_name
+        self.cache = cache or FeatureCache()
+        self.random_state = random_state
+
+    def jobs(self):
+        """Every (model, params, fold) combination."""
+        return [(name, params, fold)
+                for name, grid in self.param_grids.items()
+                for params in ParameterGrid(grid)
+                for fold in range(self.n_splits)]
+
+    def _arrays(self, df):
+        X = np.ascontiguousarray(df[self.feature_cols].to_numpy(dtype=np.float64, na_value=np.nan))
+        np.nan_to_num(X, copy=False)
+        y = df[self.target_col].to_numpy(dtype=np.int64)
+        folds = np.empty(len(df), dtype=np.int8)
+        splitter = GroupKFoldRaces(self.n_splits, self.race_cols, random_state=self.random_state)
+        for fold, (_, test_idx) in enumerate(splitter.split(df)):
+            folds[test_idx] = fold
+        return X, y, folds
+
+    def _execute(self, jobs, path):
+        """Run jobs in the pool (or in process for n_jobs=1), yielding results as they finish."""
+        if self.n_jobs == 1:
+            saved = dict(_DATA)
+            _init_worker(path, self.threads_per_job)
+            try:
+                for job in jobs:
+                    yield _run_job(job)
+            finally:
+                _DATA['limits'].unregister()
+                _DATA.clear()
+                _DATA.update(saved)
+            return
+        with ProcessPoolExecutor(self.n_jobs, initializer=_init_worker,
+                                 initargs=(path, self.threads_per_job)) as executor:
+            futures = [executor.submit(_run_job, job) for job in jobs]
+            for future in as_completed(futures):
+                yield future.result()
+
+    def _summarise(self, fold_results):
+        folds = pd.DataFrame(fold_results)
+        folds['params_key'] = [_params_key(params) for params in folds['params']]
+        summary = folds.groupby(['model', 'params_key'], sort=False).agg(
+            **{f'mean_{m}': (m, 'mean') for m in METRICS},
+            **{f'std_{m}': (m, 'std') for m in METRICS},
+            fit_s=('fit_s', 'sum'),
+            params=('params', 'first'),
+        ).reset_index()
+        return folds.sort_values(['model', 'params_key', 'fold']).reset_index(drop=True), summary
+
+    def _log(self, folds, summary):
+        """One nested run per (model, params) with mean metrics and per-fold metrics as steps."""
+        run_ids = []
+        for row in summary.itertuples(index=False):
+            with mlflow.start_run(run_name=f'{row.model}', nested=True) as run:
+                mlflow.set_tag('model', row.model)
+                mlflow.log_params({'model': row.model, **{k: str(v) for k, v in row.params.items()}})
+                mlflow.log_metrics({m: float(getattr(row, f'mean_{m}')) for m in METRICS
+                                    if np.isfinite(getattr(row, f'mean_{m}'))})
+                mlflow.log_metric('fit_s', float(row.fit_s))
+                for fold in folds[(folds['model'] == row.model) & (folds['params_key'] == row.params_key)].itertuples():
+                    mlflow.log_metrics({f'fold_{m}': float(getattr(fold, m)) for m in METRICS
+                                        if np.isfinite(getattr(fold, m))}, step=int(fold.fold))
+                run_ids.append(run.info.run_id)
+        summary['run_id'] = run_ids
+        return summary
+
+    def fit(self, df, run_name='sweep'):
+        """
+        Run the sweep on df and log it to MLflow.
+
+        Args:
+            df (pd.DataFrame): race frame with feature, target and race columns
+            run_name (str): name of the parent MLflow run
+
+        Returns:
+            SweepRunner: self, with cv_results_ (one row per model and
+                parameter set, sorted best first), fold_results_,
+                best_run_id_, best_model_uri_, best_estimator_ (if refit)
+                and elapsed_s_ set
+        """
+        if self.experiment_name:
+            mlflow.set_experiment(self.experiment_name)
+        X, y, folds = self._arrays(df)
+        path = self.cache.store(X, y, folds)
+        del X, y, folds
+        jobs = self.jobs()
+        logging.info(f'Sweep: {len(jobs)} jobs on {self.n_jobs} workers x {self.threads_per_job} threads')
+
+        start = time.perf_counter()
+        with mlflow.start_run(run_name=run_name) as parent:
+            mlflow.log_params({'n_splits': self.n_splits, 'n_jobs': self.n_jobs,
+                               'threads_per_job': self.threads_per_job, 'n_rows': len(df),
+                               'n_features': len(self.feature_cols), 'metric': self.metric})
+            fold_results = list(self._execute(jobs, path))
+            self.fold_results_, summary = self._summarise(fold_results)
+            summary = self._log(self.fold_results_, summary)
+            self.elapsed_s_ = time.perf_counter() - start
+            mlflow.log_metric('sweep_s', self.elapsed_s_)
+
+            # the winner among this sweep's runs
+            experiment = [mlflow.get_experiment(parent.info.experiment_id).name]
+            child_filter = f"tags.mlflow.parentRunId = '{parent.info.run_id}'"
+            self.best_run_id_ = best_run(self.metric, experiment, child_filter).run_id
+            self.best_model_uri_ = get_best_model(self.metric, 'model', experiment, child_filter)
+            mlflow.set_tag('best_run_id', self.best_run_id_)
+
+            if self.refit:
+                best = summary[summary['run_id'] == self.best_run_id_].iloc[0]
+                X, y, _ = FeatureCache.load(path)
+                with threadpool_limits(limits=os.cpu_count()):
+                    self.best_estimator_ = make_model(best['model'], best['params'], os.cpu_count())
+                    self.best_estimator_.fit(X, y)
+                with mlflow.start_run(run_id=self.best_run_id_, nested=True):
+                    # pickled like the models in ../models; newer MLflow defaults to skops,
+                    # which refuses tree ensembles without an explicit trust list
+                    mlflow.sklearn.log_model(self.best_estimator_, 'model',
+                                             serialization_format=mlflow.sklearn.SERIALIZATION_FORMAT_CLOUDPICKLE)
+
+        self.cv_results_ = (summary.drop(columns='params_key')
+                            .sort_values(f'mean_{self.metric}', ascending=False).reset_index(drop=True))
+        return self
@@ -0,0 +1,32 @@
+"""
+Shared fixtures. Like the benchmarks, the tests put the repository root on
+sys.path and import through the src package; synthetic data comes from
+benchmarks/synthetic.py so nothing touches the network or ../data.
+"""
+import os
+import sys
+
+import pandas as pd
+import pytest
+
+ROOT = os.path.join(os.path.dirname(__file__), '..')
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.join(ROOT, 'benchmarks'))
+
+from synthetic import turf_frame  # noqa: E402
+
+
+@pytest.fixture(scope='session')
+def turf():
+    """A few hundred races shaped like turf.csv; copy before modifying."""
+    return turf_frame(n_races=300, seed=7)
+
+
+@pytest.fixture(scope='session')
+def turf_csv(turf):
+    """turf with the column formats of turf.csv: dd/mm/yyyy dates and HH:MM race times."""
+    starts = pd.to_datetime(turf['Race Time'])
+    df = turf.copy()
+    df['Race Date'] = starts.dt.strftime('%d/%m/%Y')
+    df['Race Time'] = starts.dt.strftime('%H:%M')
+    return df
@@ -0,0 +1,83 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from src.backtest import backtest
+
+WON = 'Won (1=Won, 0=Lost)'
+
+
+@pytest.fixture
+def races():
+    # race 1: a 3.0 winner and a 4.0 loser; race 2: a single 5.0 loser
+    return pd.DataFrame({
+        'Race Date': ['2024-01-01'] * 3,
+        'Race Time': ['13:00', '13:00', '14:00'],
+        'Course': ['Ascot'] * 3,
+        'pred_prob': [0.5, 0.3, 0.15],
+        # the notebooks min-max normalise SP and keep the price in SP1
+        'BF Decimal SP': [0.0, 0.5, 1.0],
+        'BF Decimal SP1': [3.0, 4.0, 5.0],
+        WON: [1, 0, 0],
+    })
+
+
+def test_level_stakes_pay_commission_on_net_race_winnings(races):
+    summary = backtest(races, [0.0], commission=0.05)
+    row = summary.iloc[0]
+    # race 1 nets +2 - 1 = 1 before commission, race 2 loses 1
+    assert row['bets'] == 3 and row['winners'] == 1 and row['staked'] == 3
+    assert row['pnl'] == pytest.approx(0.95 - 1)
+    assert row['max_drawdown'] == pytest.approx(1.0)
+    assert row['roi'] == pytest.approx(-0.05 / 3)
+
+
+def test_back_kelly_stakes(races):
+    bank, fraction = 200, 0.5
+    summary, equity = backtest(races, [0.0], staking=('kelly',), bank=bank, kelly_fraction=fraction,
+                               commission=0.0, return_equity=True)
+    price, prob = races['BF Decimal SP1'], races['pred_prob']
+    stakes = bank * fraction * (prob * price - 1) / (price - 1)
+    # the third runner has a negative edge, so kelly stakes nothing on it
+    assert stakes[2] < 0
+    assert summary['bets'].item() == 2
+    assert summary['staked'].item() == pytest.approx(stakes[0] + stakes[1])
+    np.testing.assert_allclose(equity[0], [stakes[0] * 2 - stakes[1]] * 2)
+    assert summary['max_drawdown'].item() == 0
+
+
+def test_lay_kelly_stakes_and_liability(races):
+    bank, fraction = 100, 0.25
+    summary = backtest(races, [1.0], sides=('lay',), staking=('kelly',), bank=bank, kelly_fraction=fraction,
+                       commission=0.05)
+    price, prob = races['BF Decimal SP1'].to_numpy(), races['pred_prob'].to_numpy()
+    liability = bank * fraction * (1 - prob * price)
+    liability[liability < 0] = 0
+    stakes = liability / (price - 1)
+    # laying the 3.0 winner costs its liability; the two losers keep the backers' stakes
+    race1 = -liability[0] + stakes[1]
+    race2 = stakes[2] * 0.95
+    row = summary.iloc[0]
+    assert row['bets'] == (liability > 0).sum()
+    assert row['staked'] == pytest.approx(liability.sum())
+    assert row['pnl'] == pytest.approx((race1 * 0.95 if race1 > 0 else race1) + race2)
+
+
+def test_value_rule_thresholds(races):
+    summary = backtest(races, [0.0, 0.3], rules=('value',), commission=0.0)
+    # back edges are 0.5, 0.2 and -0.25
+    assert summary['bets'].tolist() == [2, 1]
+    assert summary['pnl'].tolist() == pytest.approx([1.0, 2.0])
+
+
+@pytest.mark.parametrize('sides', [('Back',), ('back', 'lays')])
+def test_unknown_side_is_rejected(races, sides):
+    with pytest.raises(ValueError, match='Unknown side'):
+        backtest(races, [0.0], sides=sides)
+
+
+def test_unknown_rules_are_rejected(races):
+    with pytest.raises(ValueError, match='Unknown selection rule'):
+        backtest(races, [0.0], rules=('edge',))
+    with pytest.raises(ValueError, match='Unknown staking rule'):
+        backtest(races, [0.0], staking=('martingale',))
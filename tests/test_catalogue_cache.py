@@ -0,0 +1,74 @@
+from datetime import timedelta
+
+import pandas as pd
+import pytest
+
+from synthetic import FakeBetting, FakeTrading, market_books, market_catalogues
+from src.catalogue_cache import MARKET_RUNNER_COLUMNS, CatalogueCache
+
+
+@pytest.fixture
+def card():
+    # a card starting within the hour, so nothing is stale yet
+    start = (pd.Timestamp.now(tz='UTC').tz_localize(None) + pd.Timedelta(hours=1)).floor('min')
+    catalogues = market_catalogues(n_markets=12, start=str(start), seed=5)
+    betting = FakeBetting(catalogues, market_books(catalogues, removed_rate=0.1, seed=5))
+    return FakeTrading(betting=betting), start, start + pd.Timedelta(hours=2)
+
+
+def test_first_refresh_downloads_once_then_probes(card, tmp_path):
+    trading, start, end = card
+    path = str(tmp_path / 'catalogue.parquet')
+    cache = CatalogueCache(path)
+    stats = cache.refresh(trading, start, end)
+    n_runners = sum(len(m.runners) for m in trading.betting.catalogues.values())
+    n_removed = sum(r.status == 'REMOVED' for b in trading.betting.books.values() for r in b.runners)
+    assert stats['new'] == 12 and stats['removed_runners'] == n_removed > 0
+    assert len(cache.runners(include_removed=True)) == n_runners
+    assert len(cache.runners()) == n_runners - n_removed
+    assert list(cache.runners().columns) == MARKET_RUNNER_COLUMNS
+
+    # a new process picks the cache up from disk and only probes
+    cache = CatalogueCache(path)
+    stats = cache.refresh(trading, start, end)
+    assert stats['new'] == stats['refetched'] == stats['removed_runners'] == 0
+    assert trading.betting.full_markets == 12
+    assert cache.changed_markets.empty and cache.evicted_markets.empty
+
+
+def test_refresh_moves_delayed_markets_and_evicts_withdrawn_ones(card):
+    trading, start, end = card
+    cache = CatalogueCache(None)
+    cache.refresh(trading, start, end, check_removals=False)
+    catalogues = trading.betting.catalogues
+    delayed, withdrawn = list(catalogues)[:2]
+    catalogues[delayed].market_start_time += timedelta(minutes=10)
+    del catalogues[withdrawn]
+
+    stats = cache.refresh(trading, start, end, check_removals=False)
+    assert stats['moved'] == 1 and stats['evicted'] == 1 and stats['new'] == 0
+    assert list(cache.changed_markets) == [delayed] and list(cache.evicted_markets) == [withdrawn]
+    rows = cache.select(market_ids=[delayed])
+    assert (rows['market_start_time'] == pd.Timestamp(catalogues[delayed].market_start_time, tz='UTC')).all()
+    assert cache.select(market_ids=[withdrawn]).empty
+
+
+def test_expired_markets_are_refetched(card):
+    trading, start, end = card
+    cache = CatalogueCache(None, ttl=timedelta(0))
+    cache.refresh(trading, start, end, check_removals=False)
+    stats = cache.refresh(trading, start, end, check_removals=False)
+    assert stats['refetched'] == 12 and stats['new'] == 0
+    assert trading.betting.full_markets == 24
+    assert len(cache.select()) == sum(len(m.runners) for m in trading.betting.catalogues.values())
+
+
+def test_markets_that_started_long_ago_are_evicted(card):
+    trading, start, end = card
+    cache = CatalogueCache(None, evict_after=timedelta(hours=1))
+    cache.refresh(trading, start, end, check_removals=False)
+    # the next window is tomorrow and the cached card started two hours ago
+    cache.frame['market_start_time'] -= pd.Timedelta(hours=3)
+    stats = cache.refresh(trading, end + pd.Timedelta(days=1), end + pd.Timedelta(days=2), check_removals=False)
+    assert stats['evicted'] == 12 and stats['probed'] == 0
+    assert cache.frame.empty
@@ -0,0 +1,73 @@
+import asyncio
+from datetime import datetime, timedelta
+
+import pytest
+
+from synthetic import FakeBetting, FakeTrading, RecordedRaceCard, market_books, market_catalogues, race_results_for
+from src.daily_pipeline import DailyPipeline, SimulatedClock
+from src.price_store import PriceStore
+from src.race_results import ResultsStore
+
+DAY = datetime(2024, 6, 1)
+
+
+@pytest.fixture
+def card():
+    catalogues = market_catalogues(n_markets=12, start=f'{DAY:%Y-%m-%d} 12:00', seed=9)
+    # no non-runners, so every runner is priced in every snapshot
+    return catalogues, market_books(catalogues, removed_rate=0, seed=9), race_results_for(catalogues, seed=9)
+
+
+def pipeline_for(trading, **kwargs):
+    return DailyPipeline(trading, requests_per_second=1000, backoff=0, save_csv=False,
+                         clock=SimulatedClock(DAY + timedelta(hours=7)), **kwargs)
+
+
+def test_race_day_on_a_simulated_clock(card, tmp_path):
+    catalogues, books, races = card
+    trading = FakeTrading(RecordedRaceCard(races), FakeBetting(catalogues, books))
+    pipeline = pipeline_for(trading, store=PriceStore(str(tmp_path / 'prices')),
+                            results_store=ResultsStore(str(tmp_path / 'results')))
+    counts = asyncio.run(pipeline.run_day(DAY.date()))
+
+    n_runners = sum(len(m.runners) for m in catalogues)
+    n_snapshots = len(pipeline.snapshot_minutes)
+    assert counts['markets'] == 12 and counts['runners'] == n_runners
+    assert counts['snapshots'] == 12 * n_snapshots and counts['failed_batches'] == 0
+    assert counts['rows_written'] == n_runners * (1 + n_snapshots)
+    assert counts['results_markets'] == 12 and counts['results_rows'] == n_runners
+
+    stored = pipeline.store.read(columns=['market_id', 'selection_id', 'snapshot_time'])
+    assert stored.groupby(['market_id', 'selection_id']).size().eq(1 + n_snapshots).all()
+    # the simulated clock stamps each snapshot at its due time
+    starts = {m.market_id: m.market_start_time for m in catalogues}
+    first = catalogues[0].market_id
+    times = sorted(stored.loc[stored['market_id'] == first, 'snapshot_time'].dt.tz_localize(None).unique())
+    due = [starts[first] - timedelta(minutes=m) for m in sorted(pipeline.snapshot_minutes, reverse=True)]
+    assert times[1:] == due
+    # the clock ends at the last results fetch
+    assert pipeline.clock.now() == max(starts.values()) + pipeline.results_delay
+
+
+def test_failed_book_batches_are_dropped_not_fatal(card):
+    catalogues, books, races = card
+    betting = FakeBetting(catalogues, books, failure_rate=0.3, seed=4)
+    pipeline = pipeline_for(FakeTrading(RecordedRaceCard(races), betting), retries={'books': 0})
+    counts = asyncio.run(pipeline.run_day(DAY.date()))
+
+    assert counts['failed_batches'] > 0
+    assert counts['results_markets'] == 12 and len(pipeline.results) > 0
+    report = pipeline.stage_report().set_index('stage')
+    assert report.loc['books', 'failures'] == counts['failed_batches']
+
+
+def test_snapshots_already_due_are_skipped(card):
+    catalogues, books, races = card
+    pipeline = pipeline_for(FakeTrading(RecordedRaceCard(races), FakeBetting(catalogues, books)))
+    pipeline.clock = SimulatedClock(catalogues[0].market_start_time - timedelta(minutes=20))
+    runners = pipeline.mp.market_runner(catalogues[:1])
+    pipeline.schedule_events(runners)
+    kinds = [(kind, due) for due, _, kind, _ in sorted(pipeline.queue)]
+    start = catalogues[0].market_start_time
+    assert kinds == [('snapshot', start - timedelta(minutes=10)), ('snapshot', start - timedelta(minutes=5)),
+                     ('snapshot', start - timedelta(minutes=1)), ('results', start + timedelta(minutes=30))]
@@ -0,0 +1,181 @@
+import sqlite3
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from src.db_connection import (DatabaseConnector, _rows, bulk_insert, create_table_sql, fill_frame, frame_from_rows,
+                               has_unique_key, insert_sql, iter_frames, quote)
+
+KEY = ['market_id', 'selection_id']
+
+
+def prices(last_price=(2.5, 4.0, np.nan)):
+    return pd.DataFrame({
+        'market_id': ['1.1', '1.1', '1.2'],
+        'selection_id': [11, 12, 21],
+        'last_price_traded': list(last_price),
+        'snapshot_time': pd.to_datetime(['2024-06-01 09:00'] * 3, utc=True),
+    })
+
+
+def test_quote():
+    assert quote('Won (1=Won, 0=Lost)') == '`Won (1=Won, 0=Lost)`'
+    assert quote('a`b') == '`a``b`'
+    assert quote('a"b', 'sqlite') == '"a""b"'
+
+
+def test_insert_sql_mysql():
+    assert insert_sql(['a', 'b'], 't') == 'INSERT INTO `t` (`a`, `b`) VALUES (%s, %s)'
+    assert insert_sql(['a', 'b', 'c'], 't', ['a']) == \
+        'INSERT INTO `t` (`a`, `b`, `c`) VALUES (%s, %s, %s) ON DUPLICATE KEY UPDATE `b`=VALUES(`b`), `c`=VALUES(`c`)'
+    # every column is part of the key: nothing to update, but still valid SQL
+    assert insert_sql(['a', 'b'], 't', ['a', 'b']) == \
+        'INSERT INTO `t` (`a`, `b`) VALUES (%s, %s) ON DUPLICATE KEY UPDATE `a`=`a`'
+
+
+def test_insert_sql_sqlite():
+    assert insert_sql(['a', 'b'], 't', ['a'], dialect='sqlite') == \
+        'INSERT INTO "t" ("a", "b") VALUES (?, ?) ON CONFLICT ("a") DO UPDATE SET "b"=excluded."b"'
+    assert insert_sql(['a'], 't', ['a'], dialect='sqlite').endswith(' ON CONFLICT DO NOTHING')
+
+
+def test_create_table_sql():
+    assert create_table_sql(prices(), 'p', KEY) == (
+        'CREATE TABLE IF NOT EXISTS `p` (`market_id` VARCHAR(64), `selection_id` BIGINT, '
+        '`last_price_traded` DOUBLE, `snapshot_time` DATETIME(6), PRIMARY KEY (`market_id`, `selection_id`))')
+
+
+def test_rows_convert_to_plain_values():
+    rows = _rows(prices())
+    assert rows[0] == ('1.1', 11, 2.5, pd.Timestamp('2024-06-01 09:00').to_pydatetime())
+    assert type(rows[0][1]) is int and rows[2][2] is None
+    assert _rows(prices(), 'sqlite')[0][3] == '2024-06-01 09:00:00.000000'
+
+
+@pytest.fixture
+def connection():
+    connection = sqlite3.connect(':memory:')
+    yield connection
+    connection.close()
+
+
+def read(connection, table):
+    return pd.read_sql(f'SELECT * FROM {table} ORDER BY market_id, selection_id', connection)
+
+
+def test_bulk_upsert(connection):
+    connection.execute(create_table_sql(prices(), 'p', KEY, dialect='sqlite'))
+    assert bulk_insert(connection, prices(), 'p', KEY, batch_size=2, dialect='sqlite') == 3
+    assert bulk_insert(connection, prices((3.0, 5.0, 9.0)).iloc[1:], 'p', KEY, dialect='sqlite') == 2
+
+    out = read(connection, 'p')
+    assert out['last_price_traded'].tolist() == [2.5, 5.0, 9.0]
+    assert out['snapshot_time'].iloc[0] == '2024-06-01 09:00:00.000000'
+
+
+def test_bulk_upsert_key_only_rows(connection):
+    keys = prices()[KEY]
+    connection.execute(create_table_sql(keys, 'k', KEY, dialect='sqlite'))
+    bulk_insert(connection, keys, 'k', KEY, dialect='sqlite')
+    bulk_insert(connection, keys, 'k', KEY, dialect='sqlite')
+    assert len(read(connection, 'k')) == 3
+
+
+def test_bulk_insert_rolls_back_a_failed_batch(connection):
+    connection.execute(create_table_sql(prices(), 'p', KEY, dialect='sqlite'))
+    df = pd.concat([prices(), prices()], ignore_index=True)
+    with pytest.raises(sqlite3.IntegrityError):
+        bulk_insert(connection, df, 'p', batch_size=3, dialect='sqlite')
+    # the first batch was committed, the duplicate batch rolled back
+    assert len(read(connection, 'p')) == 3
+
+
+class FakeCursor:
+    def __init__(self, results):
+        self.results = list(results)
+
+    def execute(self, sql, params=None):
+        self.result = self.results.pop(0)
+
+    def fetchall(self):
+        return self.result
+
+    def close(self):
+        pass
+
+
+class FakeConnection:
+    def __init__(self, *results):
+        self.results = results
+
+    def cursor(self):
+        return FakeCursor(self.results)
+
+
+def test_has_unique_key():
+    statistics = [('PRIMARY', 'id'), ('snapshot', 'market_id'), ('snapshot', 'Selection_Id')]
+    assert has_unique_key(FakeConnection([(1,)], statistics), 'p', KEY)
+    assert not has_unique_key(FakeConnection([(1,)], statistics), 'p', ['market_id'])
+    assert not has_unique_key(FakeConnection([(1,)], []), 'p', KEY)
+    # a table that does not exist yet is created with the key
+    assert has_unique_key(FakeConnection([(0,)]), 'p', KEY)
+
+
+def test_fill_frame_grows_past_a_stale_count(connection):
+    connection.execute('CREATE TABLE r (id INTEGER, price REAL, name TEXT)')
+    connection.executemany('INSERT INTO r VALUES (?, ?, ?)', [(i, i / 2, f'h{i}') for i in range(10)])
+    cursor = connection.execute('SELECT * FROM r ORDER BY id')
+    df = fill_frame(cursor, n_rows=3, chunk_size=4, dtypes={'price': np.float32})
+    assert len(df) == 10 and df['id'].tolist() == list(range(10))
+    assert df['price'].dtype == np.float32 and df['id'].dtype == np.int64
+    assert df['name'].iloc[-1] == 'h9'
+
+    cursor = connection.execute('SELECT * FROM r WHERE id > 100')
+    assert list(fill_frame(cursor, 0).columns) == ['id', 'price', 'name']
+
+
+def test_iter_frames_and_frame_from_rows(connection):
+    connection.execute('CREATE TABLE r (id INTEGER, price REAL)')
+    connection.executemany('INSERT INTO r VALUES (?, ?)', [(i, None if i % 3 else i) for i in range(7)])
+    chunks = list(iter_frames(connection.execute('SELECT * FROM r ORDER BY id'), chunk_size=3))
+    assert [len(chunk) for chunk in chunks] == [3, 3, 1]
+    assert pd.concat(chunks)['price'].isna().sum() == 4
+    assert frame_from_rows([], ['id', 'price']).columns.tolist() == ['id', 'price']
+
+
+class InfileCursor:
+    def __init__(self, rowcount):
+        self.rowcount = rowcount
+        self.sql = None
+
+    def execute(self, sql, params=None):
+        self.sql = sql
+
+    def close(self):
+        pass
+
+
+class InfileConnection:
+    def __init__(self, rowcount):
+        self.cursor_ = InfileCursor(rowcount)
+
+    def cursor(self):
+        return self.cursor_
+
+    def commit(self):
+        pass
+
+
+def test_infile_append_reports_skipped_rows(capsys):
+    db = DatabaseConnector('test', password=None)
+    connection = InfileConnection(rowcount=2)
+    assert db._load_data_infile(connection, prices(), 'p') == 2
+    assert ' IGNORE INTO ' in connection.cursor_.sql
+    assert 'skipped 1 of 3 rows' in capsys.readouterr().out
+
+    # REPLACE counts a replaced row twice; every row ends up stored
+    connection = InfileConnection(rowcount=5)
+    assert db._load_data_infile(connection, prices(), 'p', replace=True) == 3
+    assert ' REPLACE INTO ' in connection.cursor_.sql
+    assert capsys.readouterr().out == ''
@@ -0,0 +1,66 @@
+import numpy as np
+import pandas as pd
+import pytest
+from sklearn.preprocessing import MinMaxScaler
+
+from src.feature_pipeline import (DEFAULT_FEATURES, DISTANCE_BINS, DISTANCE_LABELS, FeaturePipeline, add_features,
+                                  distance_bucket)
+
+
+def test_distance_bucket_matches_pd_cut():
+    distance = pd.Series([700, 800, 801, 1000, 1001, 2390, 4000, 4001, np.nan, 1750])
+    expected = pd.cut(distance, bins=DISTANCE_BINS, labels=DISTANCE_LABELS)
+    assert list(distance_bucket(distance)) == list(expected)
+
+
+def test_add_features_derives_columns_in_place(turf):
+    df = turf.head(200).copy()
+    assert add_features(df) is df
+    assert 'weight' in df.columns and 'Weight (pounds)' not in df.columns
+    assert df['Won P/L Before'].dtype == np.float64
+    assert np.allclose(df['evening_morning_price'], df['Morning Price'] / df['Evening Price'], equal_nan=True)
+    ranks = df.groupby(['Race Date', 'Race Time', 'Course'])['sp_rank']
+    assert (ranks.min() == 1).all() and (ranks.max() == ranks.size()).all()
+
+
+def test_transform_matches_minmax_scaler(turf):
+    train = turf.iloc[:2000].copy()
+    live = turf.iloc[2000:2500].copy()
+    pipeline = FeaturePipeline()
+    X_train = pipeline.fit_transform(train)
+
+    scaler = MinMaxScaler().fit(train[DEFAULT_FEATURES])
+    assert np.allclose(X_train, np.nan_to_num(scaler.transform(train[DEFAULT_FEATURES])))
+    # live data uses the training ranges, never refits
+    X_live = pipeline.transform(live)
+    assert np.allclose(X_live, np.nan_to_num(scaler.transform(live[DEFAULT_FEATURES])))
+    assert X_live.flags['C_CONTIGUOUS'] and X_live.dtype == np.float64
+
+
+def test_transform_records_matches_transform(turf):
+    df = turf.head(500).copy()
+    pipeline = FeaturePipeline(scale_columns=['BF Decimal SP']).fit(df)
+    race = df.head(8)
+    records = race[DEFAULT_FEATURES].astype(object).where(race[DEFAULT_FEATURES].notna(), None).to_dict('records')
+    records[0].pop('PFR Rank')
+    expected = pipeline.transform(race, add=False)
+    expected[0, DEFAULT_FEATURES.index('PFR Rank')] = 0
+    assert np.allclose(pipeline.transform_records(records), expected)
+    assert pipeline.transform_records([]).shape == (0, len(DEFAULT_FEATURES))
+
+
+def test_unfitted_pipeline_raises(turf):
+    with pytest.raises(ValueError):
+        FeaturePipeline().transform(turf.head(5).copy())
+
+
+def test_save_with_model_round_trip(turf, tmp_path):
+    pipeline = FeaturePipeline().fit(turf.head(300).copy())
+    model_path = str(tmp_path / 'rf_model.pkl')
+    pipeline.save_with_model({'name': 'model'}, model_path)
+    assert (tmp_path / 'rf_model_pipeline.pkl').exists()
+
+    model, loaded = FeaturePipeline.load_with_model(model_path)
+    live = turf.iloc[300:400].copy()
+    assert model == {'name': 'model'}
+    assert np.array_equal(loaded.transform(live), pipeline.transform(live, add=False))
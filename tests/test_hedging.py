@@ -0,0 +1,70 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from src.hedging import hedge_book, selection_pnl
+
+
+def book(n_markets=5, runners=6, bets_per_market=4, seed=0):
+    rng = np.random.default_rng(seed)
+    market_ids = np.array(['1.%09d' % m for m in range(n_markets)])
+    back = np.round(rng.uniform(1.5, 20, (n_markets, runners)), 2)
+    prices = pd.DataFrame({
+        'marketId': market_ids.repeat(runners),
+        'selectionId': np.tile(np.arange(runners), n_markets) + 1000,
+        'backPrice': back.ravel(),
+        'layPrice': np.round(back.ravel() * 1.03, 2),
+    })
+    n_bets = n_markets * bets_per_market
+    positions = pd.DataFrame({
+        'market_id': market_ids.repeat(bets_per_market),
+        'selection_id': rng.integers(0, runners, n_bets) + 1000,
+        'side': rng.choice(['BACK', 'LAY'], n_bets),
+        'stake': np.round(rng.uniform(2, 50, n_bets), 2),
+        'price': np.round(rng.uniform(1.5, 20, n_bets), 2),
+    })
+    return positions, prices
+
+
+@pytest.mark.parametrize('commission', [0.0, 0.05])
+def test_green_up_equalises_pnl(commission):
+    positions, prices = book()
+    runners, markets = hedge_book(positions, prices, commission=commission, round_stakes=False)
+    spread = runners.groupby('market_id')['hedged_win_pnl'].agg(np.ptp)
+    np.testing.assert_allclose(spread, 0.0, atol=1e-9)
+    assert markets['fully_hedged'].all()
+    np.testing.assert_allclose(markets['green_pnl'], runners.groupby('market_id')['hedged_win_pnl'].first())
+
+
+def test_rounded_stakes_stay_within_pennies():
+    positions, prices = book()
+    runners, _ = hedge_book(positions, prices, commission=0.05)
+    assert (runners['hedge_stake'] == runners['hedge_stake'].round(2)).all()
+    # a penny of stake moves an outcome by at most a penny times the price
+    tolerance = 0.005 * runners['lay_price'].max() * 2
+    assert runners.groupby('market_id')['hedged_win_pnl'].agg(np.ptp).max() <= tolerance
+
+
+def test_win_pnl_of_a_single_back_bet():
+    positions = pd.DataFrame({'market_id': ['1.1'], 'selection_id': [7], 'side': ['BACK'],
+                              'stake': [10.0], 'price': [4.0]})
+    prices = pd.DataFrame({'marketId': ['1.1', '1.1'], 'selectionId': [7, 8],
+                           'backPrice': [3.0, 1.5], 'layPrice': [3.1, 1.52]})
+    runners, markets = selection_pnl(positions, prices, commission=0.05)
+    pnl = dict(zip(runners['selection_id'], runners['win_pnl']))
+    assert pnl == {7: pytest.approx(30 * 0.95), 8: -10.0}
+    assert markets['liability'].item() == 10.0
+
+    runners, _ = hedge_book(positions, prices, commission=0.0, round_stakes=False)
+    row = runners.set_index('selection_id').loc[7]
+    # laying 40 / 3.1 at 3.1 locks in the same profit whoever wins
+    assert row['hedge_side'] == 'LAY' and row['hedge_stake'] == pytest.approx(40 / 3.1)
+    np.testing.assert_allclose(runners['hedged_win_pnl'], 40 / 3.1 - 10)
+
+
+def test_duplicate_price_rows_keep_best_prices():
+    positions, prices = book(n_markets=2)
+    worse = prices.assign(backPrice=prices['backPrice'] - 0.1, layPrice=prices['layPrice'] + 0.1)
+    expected, _ = hedge_book(positions, prices)
+    runners, _ = hedge_book(positions, pd.concat([worse, prices], ignore_index=True))
+    pd.testing.assert_frame_equal(runners, expected)
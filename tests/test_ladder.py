@@ -0,0 +1,70 @@
+from types import SimpleNamespace
+
+import numpy as np
+import pytest
+from betfairlightweight.resources.bettingresources import PriceSize
+
+from synthetic import market_books, market_catalogues
+from src.ladder import TICKS, Ladders, price_to_tick, tick_to_price
+
+
+def book(market_id, runners):
+    return SimpleNamespace(market_id=market_id, runners=[
+        SimpleNamespace(selection_id=selection_id,
+                        ex=SimpleNamespace(available_to_back=[PriceSize(p, s) for p, s in back],
+                                           available_to_lay=[PriceSize(p, s) for p, s in lay]))
+        for selection_id, back, lay in runners])
+
+
+@pytest.fixture
+def ladders():
+    return Ladders.from_books([
+        book('1.1', [(11, [(3.0, 20), (2.98, 30), (2.96, 100)], [(3.05, 10), (3.1, 40)]),
+                     (12, [(5.0, 5)], [])]),
+        [book('1.2', [(21, [], [])])],
+    ], depth=3)
+
+
+def test_tick_grid():
+    assert len(TICKS) == 350 and TICKS[0] == 1.01 and TICKS[-1] == 1000
+    # 3.04 is off the grid and maps up to 3.05
+    assert price_to_tick([1.01, 2.0, 2.02, 3.04, np.nan]).tolist() == [0, 99, 100, 150, -1]
+    assert np.array_equal(tick_to_price(price_to_tick(TICKS)), TICKS)
+    assert np.isnan(tick_to_price([-1])[0])
+
+
+def test_from_books_pads_to_depth(ladders):
+    assert len(ladders) == 3 and ladders.selection_id.tolist() == [11, 12, 21]
+    assert ladders.back_price[0].tolist() == [3.0, 2.98, 2.96]
+    assert np.isnan(ladders.back_price[1, 1:]).all() and np.isnan(ladders.lay_price[2]).all()
+    assert ladders.market_ids.tolist() == ['1.1', '1.2']
+
+
+def test_vwap_walks_the_ladder(ladders):
+    vwap, filled, slippage = ladders.vwap('back', 40)
+    assert vwap[0] == pytest.approx((3.0 * 20 + 2.98 * 20) / 40)
+    assert slippage[0] == pytest.approx(0.5)
+    # runner 12 only shows 5 and runner 21 nothing
+    assert filled.tolist() == [40, 5, 0] and np.isnan(vwap[1:]).all()
+    with pytest.raises(ValueError):
+        ladders.vwap('middle', 10)
+
+
+def test_spread_overround_and_wom(ladders):
+    spread = ladders.spread_ticks()
+    assert spread[0] == 1 and np.isnan(spread[1:]).all()
+    overround = ladders.overround('back')
+    assert overround[:2] == pytest.approx([1 / 3 + 1 / 5] * 2) and np.isnan(overround[2])
+    wom = ladders.wom_imbalance(levels=2)
+    assert wom[0] == pytest.approx((50 - 50) / 100) and wom[1] == 1 and np.isnan(wom[2])
+
+
+def test_features_on_synthetic_books():
+    books = market_books(market_catalogues(n_markets=5, seed=2), depth=4, seed=2)
+    ladders = Ladders.from_books(books, depth=4)
+    df = ladders.features(stakes=(10, 100))
+    assert len(df) == sum(len(b.runners) for b in books)
+    assert {'back_vwap_10', 'lay_slippage_100', 'back_overround'} <= set(df.columns)
+    priced = df['best_back'].notna() & df['best_lay'].notna()
+    assert (df.loc[priced, 'best_back'] < df.loc[priced, 'best_lay']).all()
+    assert (df.loc[priced, 'spread_ticks'] >= 1).all()
@@ -0,0 +1,79 @@
+import time
+
+import pytest
+
+from src.market_fetcher import (MAX_REQUEST_WEIGHT, TokenBucket, batch_size_for, call_with_retry, chunked,
+                                fetch_market_books, projection_weight)
+from synthetic import FakeBetting, FakeTrading, market_catalogues
+
+
+def test_batch_size_respects_the_request_weight():
+    assert batch_size_for(['EX_ALL_OFFERS']) == 11
+    assert batch_size_for(['EX_BEST_OFFERS']) == 40
+    assert batch_size_for(['EX_BEST_OFFERS', 'EX_TRADED']) == 9
+    assert batch_size_for([]) == 100
+    assert batch_size_for(['EX_ALL_OFFERS'] * 20) == 1
+    for price_data in (['SP_AVAILABLE'], ['EX_BEST_OFFERS', 'SP_TRADED'], ['UNKNOWN']):
+        assert batch_size_for(price_data) * projection_weight(price_data) <= MAX_REQUEST_WEIGHT
+
+
+def test_chunked():
+    assert chunked(list(range(7)), 3) == [[0, 1, 2], [3, 4, 5], [6]]
+    assert chunked([], 3) == []
+
+
+def test_token_bucket_caps_the_rate():
+    bucket = TokenBucket(rate=50, capacity=5)
+    start = time.monotonic()
+    for _ in range(15):
+        bucket.acquire()
+    # the burst of 5 is free, the other 10 tokens take 10 / 50 s
+    assert time.monotonic() - start >= 0.18
+
+
+class Flaky:
+    def __init__(self, failures):
+        self.failures = failures
+        self.calls = 0
+
+    def __call__(self):
+        self.calls += 1
+        if self.calls <= self.failures:
+            raise ConnectionError('down')
+        return 'books'
+
+
+def test_call_with_retry_recovers():
+    request = Flaky(failures=2)
+    result, seconds = call_with_retry(request, TokenBucket(1000), max_retries=3, backoff=0)
+    assert result == 'books' and seconds >= 0
+    assert request.calls == 3
+
+
+def test_call_with_retry_gives_up():
+    request = Flaky(failures=5)
+    assert call_with_retry(request, TokenBucket(1000), max_retries=3, backoff=0) == (None, None)
+    assert request.calls == 3
+
+
+@pytest.mark.parametrize('max_workers', [1, 4])
+def test_fetch_market_books_keeps_market_order(max_workers):
+    catalogues = market_catalogues(25)
+    betting = FakeBetting(catalogues)
+    market_ids = [m.market_id for m in catalogues]
+    batches, stats = fetch_market_books(FakeTrading(betting=betting), market_ids, max_workers=max_workers,
+                                        requests_per_second=1000)
+    assert [len(batch) for batch in batches] == [11, 11, 3]
+    assert [book.market_id for batch in batches for book in batch] == market_ids
+    assert stats['batches'] == 3 and stats['failed_batches'] == 0 and stats['markets'] == 25
+    assert betting.calls['list_market_book'] == 3
+
+
+def test_fetch_market_books_reports_failed_batches():
+    catalogues = market_catalogues(30)
+    betting = FakeBetting(catalogues, failure_rate=1.0)
+    batches, stats = fetch_market_books(FakeTrading(betting=betting), [m.market_id for m in catalogues],
+                                        max_retries=2, backoff=0, requests_per_second=1000, batch_size=10)
+    assert batches == []
+    assert stats['failed_batches'] == stats['batches'] == 3
+    assert betting.calls['list_market_book'] == 6
@@ -0,0 +1,86 @@
+import gzip
+import json
+
+import numpy as np
+import pytest
+
+from src.market_stream import LadderCache, replay
+
+
+def mcm(pt, *market_changes):
+    return {'op': 'mcm', 'pt': pt, 'mc': list(market_changes)}
+
+
+def definition(*runners, status='OPEN'):
+    return {'status': status, 'runners': [{'id': sid, 'status': st} for sid, st in runners]}
+
+
+MESSAGES = [
+    mcm(1, {'id': '1.1', 'img': True, 'marketDefinition': definition((11, 'ACTIVE'), (12, 'ACTIVE'), (13, 'ACTIVE')),
+            'rc': [{'id': 11, 'batb': [[0, 3.0, 10], [1, 2.9, 20]], 'batl': [[0, 3.1, 5]], 'ltp': 3.05, 'tv': 100},
+                   {'id': 12, 'batb': [[0, 5.0, 4]], 'batl': [[0, 5.2, 8]]},
+                   {'id': 13, 'atb': [[8.0, 2], [7.8, 6]], 'atl': [[8.4, 3]]}]}),
+    mcm(2, {'id': '1.2', 'img': True, 'marketDefinition': definition((21, 'ACTIVE')),
+            'rc': [{'id': 21, 'batb': [[0, 1.5, 50]]}]}),
+    # level 0 of runner 11 is taken, runner 13's best back is pulled
+    mcm(3, {'id': '1.1', 'rc': [{'id': 11, 'batb': [[0, 3.05, 2]], 'ltp': 3.1},
+                                {'id': 13, 'atb': [[8.0, 0]]}]}),
+    # runner 11 is withdrawn; the last row (runner 21) moves into its place
+    mcm(4, {'id': '1.1', 'marketDefinition': definition((11, 'REMOVED'), (12, 'ACTIVE'), (13, 'ACTIVE')),
+            'rc': [{'id': 11, 'batb': [[0, 99.0, 1]]}, {'id': 12, 'batl': [[0, 0, 0]]}]}),
+]
+
+
+def write_recording(path, messages, opener=open):
+    with opener(path, 'wt') as f:
+        for message in messages:
+            f.write(json.dumps(message) + '\n')
+
+
+@pytest.mark.parametrize('suffix, opener', [('.jsonl', open), ('.jsonl.gz', gzip.open)])
+def test_replay_builds_the_ladder(tmp_path, suffix, opener):
+    path = str(tmp_path / f'stream{suffix}')
+    write_recording(path, MESSAGES, opener)
+    cache = LadderCache(depth=2, capacity=2)
+    stats = replay(path, cache)
+    assert stats['messages'] == 4 and cache.updates_processed == 4
+
+    assert cache.best_offer('1.1', 11) is None
+    assert cache.runner_status[('1.1', 11)] == 'REMOVED'
+    assert cache.best_offer('1.1', 12) == (5.0, 4.0, None, None)
+    assert cache.best_offer('1.1', 13) == (7.8, 6.0, 8.4, 3.0)
+    assert cache.best_offer('1.2', 21) == (1.5, 50.0, None, None)
+    assert cache.publish_time == {'1.1': 4, '1.2': 2}
+
+    snapshot = cache.snapshot()
+    assert len(snapshot) == 3 and list(snapshot['selectionId']) == [21, 12, 13]
+    assert sorted(row['selectionId'] for row in cache.best_offer_rows('1.1')) == [12, 13]
+    # the evicted row is cleared, so a later runner starts from an empty ladder
+    assert np.isnan(cache.back_price[3:]).all()
+
+
+def test_image_clears_the_market():
+    cache = LadderCache(depth=2)
+    for message in MESSAGES[:3]:
+        cache.on_message(message)
+    assert cache.best_offer('1.1', 11) == (3.05, 2.0, 3.1, 5.0)
+    cache.on_message(mcm(5, {'id': '1.1', 'img': True, 'rc': [{'id': 12, 'batb': [[0, 4.5, 1]]}]}))
+    assert cache.best_offer('1.1', 11) == (None, None, None, None)
+    assert cache.best_offer('1.1', 12) == (4.5, 1.0, None, None)
+    assert cache.best_offer('1.2', 21) == (1.5, 50.0, None, None)
+
+
+def test_listener_recording_replays_to_the_same_cache(tmp_path):
+    from src.market_stream import LadderListener
+
+    path = str(tmp_path / 'recorded.jsonl')
+    live = LadderCache()
+    with LadderListener(live, record_path=path) as listener:
+        listener.on_data(json.dumps({'op': 'connection', 'connectionId': 'abc'}))
+        for message in MESSAGES:
+            listener.on_data(json.dumps(message))
+    assert listener.connection_id == 'abc' and listener.record_file is None
+
+    replayed = LadderCache()
+    replay(path, replayed)
+    assert replayed.snapshot().equals(live.snapshot())
@@ -0,0 +1,107 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from src.monte_carlo import monte_carlo_batch, simulate_finishing_order
+
+
+def card(sizes, seed=0):
+    rng = np.random.default_rng(seed)
+    race_id = np.repeat(np.arange(len(sizes)), sizes)
+    return pd.DataFrame({
+        'race_id': race_id,
+        'pred_prob': rng.uniform(0.05, 0.6, len(race_id)),
+        'BF Decimal SP1': np.round(rng.uniform(1.5, 20, len(race_id)), 2),
+    })
+
+
+def test_batch_converges_to_closed_form():
+    df = card([2, 5, 8, 12, 16])
+    closed = monte_carlo_batch(df, closed_form=True)
+    simulated = monte_carlo_batch(df, n_sims=200000, chunk_size=50000)
+    np.testing.assert_allclose(closed.groupby('race_id')['mc_win_prob'].sum(), 1.0)
+    np.testing.assert_allclose(simulated['mc_win_prob'], closed['mc_win_prob'], atol=0.005)
+    np.testing.assert_allclose(closed['ev'], closed['BF Decimal SP1'] * closed['mc_win_prob'] - 1)
+
+
+def test_batch_is_reproducible_and_keeps_row_order():
+    df = card([6, 4, 9]).sample(frac=1, random_state=1)
+    first = monte_carlo_batch(df, n_sims=5000, seed=3)
+    second = monte_carlo_batch(df, n_sims=5000, seed=3)
+    pd.testing.assert_frame_equal(first, second)
+    assert first.index.equals(df.index)
+
+
+def test_batch_rejects_missing_race_id():
+    df = card([3, 3])
+    df['race_id'] = df['race_id'].astype(float)
+    df.loc[0, 'race_id'] = np.nan
+    with pytest.raises(ValueError, match='missing race_id'):
+        monte_carlo_batch(df)
+
+
+def test_batch_with_a_multi_column_race_key():
+    df = card([3, 4, 5])
+    df['Race Date'] = '01/06/2024'
+    df['Race Time'] = np.where(df['race_id'] == 1, '14:00', '13:00')
+    df['Course'] = np.where(df['race_id'] == 2, 'York', 'Ascot')
+    out = monte_carlo_batch(df, race_col=['Race Date', 'Race Time', 'Course'], closed_form=True)
+    np.testing.assert_allclose(out['mc_win_prob'], monte_carlo_batch(df, closed_form=True)['mc_win_prob'])
+
+    df.loc[4, 'Course'] = None
+    with pytest.raises(ValueError, match='1 rows have a missing'):
+        monte_carlo_batch(df, race_col=['Race Date', 'Race Time', 'Course'])
+
+
+def test_finishing_order_on_short_fields():
+    df = card([1, 2, 3])
+    out, forecasts, tricasts = simulate_finishing_order(df, n_sims=50000)
+    closed = monte_carlo_batch(df, closed_form=True)['mc_win_prob']
+
+    # a walkover always wins; under five runners only the winner is placed
+    assert out.loc[out['race_id'] == 0, 'mc_win_prob'].item() == 1.0
+    assert (out['places'] == 1).all()
+    np.testing.assert_array_equal(out['place_prob'], out['mc_win_prob'])
+    np.testing.assert_allclose(out['mc_win_prob'], closed, atol=0.01)
+
+    # no forecast for a walkover, no tricast for a two-runner race
+    assert set(forecasts) == {1, 2} and set(tricasts) == {2}
+    two = forecasts[1]
+    assert np.all(np.diag(two) == 0)
+    np.testing.assert_allclose(two.sum(axis=1), out.loc[out['race_id'] == 1, 'mc_win_prob'])
+    np.testing.assert_allclose(tricasts[2].sum(axis=2), forecasts[2])
+    assert tricasts[2].sum() == pytest.approx(1.0)
+
+
+def test_finishing_order_places_with_fixed_terms():
+    df = card([3, 6])
+    out, _, _ = simulate_finishing_order(df, n_sims=20000, places=4, forecast=False, tricast=False)
+    # places are capped at the field size, so every runner in the three-runner race is placed
+    assert out.groupby('race_id')['places'].first().tolist() == [3, 4]
+    assert (out.loc[out['race_id'] == 0, 'place_prob'] == 1.0).all()
+    np.testing.assert_allclose(out.groupby('race_id')['place_prob'].sum(), [3, 4])
+
+
+def test_finishing_order_with_a_multi_column_race_key():
+    df = card([3, 4])
+    df['Race Time'] = '13:00'
+    df['Course'] = np.where(df['race_id'] == 0, 'Ascot', 'York')
+    out, forecasts, tricasts = simulate_finishing_order(df, n_sims=2000, race_col=['Race Time', 'Course'])
+    assert set(forecasts) == set(tricasts) == {('13:00', 'Ascot'), ('13:00', 'York')}
+    assert forecasts[('13:00', 'York')].shape == (4, 4)
+    np.testing.assert_allclose(out.groupby('race_id')['mc_win_prob'].sum(), 1.0)
+
+
+def test_finishing_order_in_race_blocks_matches_one_block():
+    df = card([2, 5, 9, 12, 7, 16])
+    whole, whole_fc, whole_tc = simulate_finishing_order(df, n_sims=40000, chunk_size=40000, max_cells=10 ** 9)
+    # two races of 16 runners per block, 100 simulations per chunk
+    blocked, blocked_fc, blocked_tc = simulate_finishing_order(df, n_sims=40000, chunk_size=100, max_cells=3200)
+    for col in ['mc_win_prob', 'place_prob']:
+        np.testing.assert_allclose(blocked[col], whole[col], atol=0.01)
+    for race_id in whole_fc:
+        np.testing.assert_allclose(blocked_fc[race_id], whole_fc[race_id], atol=0.01)
+        assert blocked_tc.get(race_id, np.zeros(0)).sum() == pytest.approx(whole_tc.get(race_id, np.zeros(0)).sum())
+
+    tiny, _, _ = simulate_finishing_order(df, n_sims=300, max_cells=1)
+    np.testing.assert_allclose(tiny.groupby('race_id')['mc_win_prob'].sum(), 1.0)
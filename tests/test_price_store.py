@@ -0,0 +1,68 @@
+import pandas as pd
+import pyarrow.dataset as ds
+
+from src.price_store import SCHEMA, PriceStore
+
+
+def snapshot(venues=('Ascot', 'York'), runners=3, start='2024-06-01 13:00'):
+    rows = []
+    for m, venue in enumerate(venues):
+        for r in range(runners):
+            rows.append({
+                'market_id': f'1.{200000000 + m}', 'venue': venue, 'market_type': 'WIN',
+                'market_start_time': pd.Timestamp(start) + pd.Timedelta(minutes=30 * m),
+                'selection_id': 1000 * m + r, 'horse_name': f'Horse {m}-{r}', 'status': 'ACTIVE',
+                'market_status': 'OPEN', 'runner_status': 'ACTIVE', 'last_price_traded': 2.0 + r,
+                'total_matched': 100.0 * r,
+            })
+    return pd.DataFrame(rows)
+
+
+def test_round_trip(tmp_path):
+    store = PriceStore(str(tmp_path / 'prices'))
+    df = snapshot()
+    snapshot_time = pd.Timestamp('2024-06-01 09:00', tz='UTC')
+    assert store.append(df, snapshot_time=snapshot_time) == len(df)
+
+    out = store.read().sort_values('selection_id').reset_index(drop=True)
+    assert list(out.columns) == SCHEMA.names
+    for col in ['market_id', 'selection_id', 'horse_name', 'last_price_traded', 'total_matched']:
+        assert out[col].astype(object).tolist() == df[col].tolist()
+    assert out['venue'].astype(str).tolist() == df['venue'].tolist()
+    assert (out['market_start_time'] == df['market_start_time'].dt.tz_localize('UTC')).all()
+    assert (out['snapshot_time'] == snapshot_time).all()
+    assert (out['date'] == '2024-06-01').all()
+    assert isinstance(out['horse_name'].dtype, pd.CategoricalDtype)
+
+
+def test_partition_pruning_and_filters(tmp_path):
+    store = PriceStore(str(tmp_path / 'prices'))
+    store.append(snapshot(), snapshot_time='2024-06-01 09:00')
+    store.append(snapshot(venues=('Kempton',), start='2024-06-02 18:00'), snapshot_time='2024-06-02 09:00')
+
+    assert len(store.read()) == 9
+    assert set(store.read(venues=['York'])['venue']) == {'York'}
+    assert set(store.read(start_date='2024-06-02')['venue']) == {'Kempton'}
+    cheap = store.read(columns=['selection_id', 'last_price_traded'], filter=ds.field('last_price_traded') < 3)
+    assert list(cheap.columns) == ['selection_id', 'last_price_traded'] and len(cheap) == 3
+
+
+def test_missing_columns_read_back_as_nulls(tmp_path):
+    store = PriceStore(str(tmp_path / 'prices'))
+    store.append(snapshot(), snapshot_time='2024-06-01 09:00')
+    # an older snapshot without the traded volume or runner status
+    old = snapshot(venues=('Ayr',)).drop(columns=['total_matched', 'runner_status'])
+    store.append(old, snapshot_time='2024-06-01 08:00')
+
+    out = store.read()
+    assert len(out) == 9
+    ayr = out[out['venue'] == 'Ayr']
+    assert ayr['total_matched'].isna().all()
+    # runner_status falls back to status for files that only have the latter
+    assert (ayr['runner_status'] == 'ACTIVE').all()
+
+
+def test_empty_store(tmp_path):
+    store = PriceStore(str(tmp_path / 'missing'))
+    assert store.read(columns=['selection_id']).empty
+    assert store.append(snapshot().iloc[:0]) == 0
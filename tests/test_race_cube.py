@@ -0,0 +1,67 @@
+import numpy as np
+import pandas as pd
+
+from src.race_cube import FEATURES, RaceCube, sp_ranks
+
+
+def cube_frame(turf):
+    rng = np.random.default_rng(0)
+    df = turf.copy()
+    for feature in FEATURES:
+        if feature not in df.columns:
+            df[feature] = rng.uniform(0, 100, len(df))
+    df.loc[df.index[::5], FEATURES[0]] = np.nan
+    return df
+
+
+def sorted_rollup(cube, by, where=None):
+    return cube.rollup(by, where=where).sort_index()
+
+
+def test_incremental_update_matches_full_build(turf, tmp_path):
+    df = cube_frame(turf)
+    full = RaceCube()
+    full.update(df)
+
+    incremental = RaceCube()
+    days = df['Race Date'].unique()
+    for chunk in np.array_split(days, 4):
+        incremental.update(df[df['Race Date'].isin(chunk)])
+    # passing a day again adds nothing
+    assert incremental.update(df[df['Race Date'] == days[0]]) == 0
+
+    assert len(incremental) == len(full)
+    for by, where in [(['Class', 'Course'], None), ('Going', {'sp_rank': 1}),
+                      (['odds_band', 'won'], {'Race Type': ['Flat', 'Hurdle']}), ((), None)]:
+        pd.testing.assert_frame_equal(sorted_rollup(incremental, by, where), sorted_rollup(full, by, where))
+
+    incremental.save(tmp_path / 'cube')
+    loaded = RaceCube.load(tmp_path / 'cube')
+    pd.testing.assert_frame_equal(sorted_rollup(loaded, ['Class', 'Course']), sorted_rollup(full, ['Class', 'Course']))
+
+
+def test_totals_match_the_runners(turf):
+    df = cube_frame(turf)
+    cube = RaceCube()
+    assert cube.update(df) == len(df)
+    total = cube.total()
+    assert total['runners'] == len(df)
+    assert total['wins'] == df['Won (1=Won, 0=Lost)'].sum()
+    returns = (df['Won (1=Won, 0=Lost)'] * df['BF Decimal SP']).sum()
+    assert np.isclose(total['returns'], returns)
+    assert np.isclose(total[f'{FEATURES[0]} mean'], df[FEATURES[0]].mean())
+
+
+def test_races_are_keyed_on_the_date_as_well(turf_csv):
+    # turf.csv times are HH:MM, so the same time and course recur on other days
+    df = cube_frame(turf_csv)
+    n_races = df.groupby(['Race Date', 'Race Time', 'Course']).ngroups
+    assert df.groupby(['Race Time', 'Course']).ngroups < n_races
+    assert (sp_ranks(df) == 1).sum() == n_races
+
+    cube = RaceCube()
+    for day in df['Race Date'].unique():
+        cube.update(df[df['Race Date'] == day])
+    total = cube.total()
+    assert total['runners'] == len(df)
+    assert cube.total(where={'sp_rank': 1})['runners'] == n_races
@@ -0,0 +1,75 @@
+import numpy as np
+import pytest
+
+from src.race_probs import RaceProbabilities
+from src.splitter import RACE_KEY
+
+WON = 'Won (1=Won, 0=Lost)'
+
+
+def scored(df):
+    # a model score and the notebooks' columns: normalised SP and the raw price in SP1
+    df = df.copy()
+    rng = np.random.default_rng(0)
+    strength = np.log(1 / df['BF Decimal SP'].to_numpy())
+    df['pred_prob'] = 1 / (1 + np.exp(-(0.6 * strength + 1.0 + rng.normal(0, 0.3, len(df)))))
+    df['BF Decimal SP1'] = df['BF Decimal SP']
+    sp = df['BF Decimal SP']
+    df['BF Decimal SP'] = (sp - sp.min()) / (sp.max() - sp.min())
+    return df
+
+
+@pytest.fixture
+def history(turf):
+    return scored(turf)
+
+
+@pytest.mark.parametrize('transform', ['log', 'logit', 'none'])
+@pytest.mark.parametrize('blend_sp', [False, True])
+def test_probabilities_sum_to_one_per_race(history, transform, blend_sp):
+    rp = RaceProbabilities(score_transform=transform, blend_sp=blend_sp).fit(history)
+    out = rp.transform(history)
+    np.testing.assert_allclose(out.groupby(RACE_KEY)['win_prob'].sum(), 1.0)
+    assert out['win_prob'].between(0, 1).all()
+
+
+def test_ev_uses_the_raw_price(history):
+    out = RaceProbabilities(score_transform='log').transform(history)
+    np.testing.assert_allclose(out['ev'], history['BF Decimal SP1'] * out['win_prob'] - 1)
+
+
+def test_races_sharing_a_time_on_different_days_stay_apart(turf_csv):
+    df = scored(turf_csv)
+    assert df.groupby(['Race Time', 'Course']).ngroups < df.groupby(RACE_KEY).ngroups
+    out = RaceProbabilities(score_transform='logit', blend_sp=True).fit(df).transform(df)
+    np.testing.assert_allclose(out.groupby(RACE_KEY)['win_prob'].sum(), 1.0)
+
+
+def test_log_transform_without_fit_is_plain_renormalisation(history):
+    probs = RaceProbabilities(score_transform='log').predict(history)
+    expected = history['pred_prob'] / history.groupby(RACE_KEY)['pred_prob'].transform('sum')
+    np.testing.assert_allclose(probs, expected)
+
+
+def test_missing_scores_still_sum_to_one(history):
+    df = history.copy()
+    df.loc[df.index[::7], 'pred_prob'] = np.nan
+    probs = RaceProbabilities().predict(df)
+    assert np.isfinite(probs).all()
+    np.testing.assert_allclose(df.assign(p=probs).groupby(RACE_KEY)['p'].sum(), 1.0)
+
+
+def test_fit_improves_the_winners_log_loss(history):
+    plain = RaceProbabilities(score_transform='logit')
+    fitted = RaceProbabilities(score_transform='logit', blend_sp=True).fit(history)
+    assert fitted.score(history)['log_loss'] < plain.score(history)['log_loss']
+    assert fitted.log_loss_ == pytest.approx(fitted.score(history)['log_loss'])
+
+
+def test_fit_and_score_need_a_winner(history):
+    no_winners = history.assign(**{WON: 0})
+    rp = RaceProbabilities()
+    with pytest.raises(ValueError, match='No winners'):
+        rp.fit(no_winners)
+    with pytest.raises(ValueError, match='No winners'):
+        rp.score(no_winners)
@@ -0,0 +1,70 @@
+import pyarrow.dataset as ds
+import pytest
+
+from synthetic import FakeTrading, RecordedRaceCard, race_result_json
+from src.functions import fetch_race_results
+from src.race_results import RESULT_COLUMNS, ResultsStore, flatten_results, ingest_race_results
+
+
+@pytest.fixture(scope='module')
+def races():
+    return race_result_json(n_races=40, seed=3)
+
+
+def win_market_ids(races):
+    return [race['runners'][0]['selections'][0]['marketId'] for race in races]
+
+
+def test_flatten_keeps_win_selections_with_a_bsp(races):
+    df = flatten_results(races)
+    expected = [(race['raceId'], selection['selectionId'], selection['bsp'])
+                for race in races for runner in race['runners'] for selection in runner['selections']
+                if selection['marketType'] == 'WIN' and 'bsp' in selection]
+    assert list(df.columns) == RESULT_COLUMNS
+    assert list(zip(df['race_id'], df['selection_id'], df['bsp'])) == expected
+    assert str(df['selection_id'].dtype) == 'Int64' and str(df['market_id'].dtype) == 'string'
+    assert df['country_code'].eq('GB').all() and df['position'].notna().all()
+
+
+def test_flatten_empty_response():
+    df = flatten_results(None)
+    assert df.empty and list(df.columns) == RESULT_COLUMNS
+
+
+def test_store_round_trip_with_filter(races, tmp_path):
+    store = ResultsStore(str(tmp_path / 'results'))
+    assert store.read(columns=['bsp']).empty
+    df = flatten_results(races)
+    assert store.write(df.iloc[:100]) + store.write(df.iloc[100:]) == len(df)
+    assert store.write(df.iloc[:0]) == 0
+
+    cheap = store.read(columns=['selection_id', 'bsp'], filter=ds.field('bsp') < 5)
+    assert list(cheap.columns) == ['selection_id', 'bsp']
+    assert sorted(cheap['bsp']) == sorted(df.loc[df['bsp'] < 5, 'bsp'])
+
+
+def test_ingest_resumes_after_failed_chunks(races, tmp_path):
+    market_ids = win_market_ids(races)
+    store = ResultsStore(str(tmp_path / 'results'))
+    flaky = FakeTrading(race_card=RecordedRaceCard(races, failure_rate=0.5, seed=1))
+    first = ingest_race_results(flaky, market_ids, store, chunk_size=5, requests_per_second=1000,
+                                max_retries=1, backoff=0)
+    assert first['failed'] > 0 and first['ingested'] + first['failed'] == len(market_ids)
+
+    # a fresh store reads the checkpoint back and only fetches what is missing
+    store = ResultsStore(store.root)
+    trading = FakeTrading(race_card=RecordedRaceCard(races))
+    second = ingest_race_results(trading, market_ids, store, chunk_size=5, requests_per_second=1000, backoff=0)
+    assert second['skipped'] == first['ingested'] and second['failed'] == 0
+    assert store.completed() == set(market_ids)
+
+    stored = store.read().sort_values(['market_id', 'selection_id']).reset_index(drop=True)
+    expected = flatten_results(races).sort_values(['market_id', 'selection_id']).reset_index(drop=True)
+    assert stored[['market_id', 'selection_id', 'bsp']].equals(expected[['market_id', 'selection_id', 'bsp']])
+
+
+def test_fetch_race_results_keeps_market_order(races):
+    market_ids = win_market_ids(races)[::-1]
+    trading = FakeTrading(race_card=RecordedRaceCard(races))
+    df = fetch_race_results(market_ids, trading, chunk_size=8)
+    assert list(df['market_id'].unique()) == market_ids
@@ -0,0 +1,118 @@
+import pickle
+
+import numpy as np
+import pytest
+from fastapi.testclient import TestClient
+from sklearn.linear_model import LogisticRegression
+
+from src.feature_pipeline import DEFAULT_FEATURES, FeaturePipeline
+from src.scoring_service import LatencyTracker, ScoringEngine, create_app, fit_pipeline
+from src.splitter import grouped_split
+
+WON = 'Won (1=Won, 0=Lost)'
+
+
+@pytest.fixture(scope='module')
+def fitted(turf):
+    train = turf.iloc[:3000].copy()
+    pipeline = FeaturePipeline()
+    model = LogisticRegression(max_iter=500).fit(pipeline.fit_transform(train), train[WON])
+    return model, pipeline
+
+
+@pytest.fixture
+def model_path(fitted, tmp_path):
+    model, pipeline = fitted
+    path = str(tmp_path / 'model.pkl')
+    pipeline.save_with_model(model, path)
+    return path
+
+
+def race_requests(turf, n_races=5):
+    races = []
+    for race_id, race in list(turf.iloc[3000:].groupby(['Race Date', 'Race Time', 'Course'], sort=False))[:n_races]:
+        runners = race[DEFAULT_FEATURES].astype(object).where(race[DEFAULT_FEATURES].notna(), None).to_dict('records')
+        for i, runner in enumerate(runners):
+            runner['selection_id'] = i + 1
+            runner['price'] = float(race['BF Decimal SP'].iloc[i])
+        races.append(('|'.join(race_id), runners))
+    return races
+
+
+def test_score_races_normalises_each_race(fitted, turf):
+    engine = ScoringEngine(*fitted, n_sims=0)
+    races = race_requests(turf) + [('empty', [])]
+    results = engine.score_races(races)
+    assert len(results) == sum(len(runners) for _, runners in races)
+
+    win_prob = {}
+    for result in results:
+        win_prob[result['race_id']] = win_prob.get(result['race_id'], 0) + result['win_prob']
+        assert result['mc_win_prob'] == result['win_prob']
+    assert np.allclose(list(win_prob.values()), 1)
+
+    first = results[0]
+    price = races[0][1][0]['price']
+    assert first['selection_id'] == 1 and first['ev'] == pytest.approx(price * first['win_prob'] - 1)
+    assert engine.latency.summary()['requests'] == 1
+
+
+def test_score_races_matches_model(fitted, turf):
+    model, pipeline = fitted
+    engine = ScoringEngine(model, pipeline, n_sims=2000)
+    race_id, runners = race_requests(turf, n_races=1)[0]
+    results = engine.score_races([(race_id, runners)])
+    frame = turf.iloc[3000:3000 + len(runners)].copy()
+    expected = model.predict_proba(pipeline.transform(frame, add=False))[:, 1]
+    assert np.allclose([r['model_prob'] for r in results], expected)
+    assert sum(r['mc_win_prob'] for r in results) == pytest.approx(1)
+
+
+def test_from_path_without_pipeline_explains_fix(fitted, tmp_path):
+    path = str(tmp_path / 'bare.pkl')
+    with open(path, 'wb') as f:
+        pickle.dump(fitted[0], f)
+    with pytest.raises(FileNotFoundError, match='python -m src.scoring_service fit-pipeline'):
+        ScoringEngine.from_path(path)
+
+
+def test_app_scores_and_reports_metrics(model_path, turf):
+    races = race_requests(turf, n_races=2)
+    with TestClient(create_app(model_path, n_sims=0)) as client:
+        assert client.get('/health').json()['status'] == 'ok'
+        body = {'races': [{'race_id': race_id, 'runners': runners} for race_id, runners in races]}
+        response = client.post('/score', json=body)
+        assert response.status_code == 200
+        assert len(response.json()) == sum(len(runners) for _, runners in races)
+
+        races[0][1][0]['PFR Rank'] = 'not a number'
+        response = client.post('/score', json={'races': [{'race_id': 'bad', 'runners': races[0][1]}]})
+        assert response.status_code == 422
+        assert client.get('/metrics').json()['requests'] == 1
+
+
+def test_fit_pipeline_scales_on_training_races_only(fitted, turf, tmp_path):
+    df = turf.iloc[:3000].copy()
+    csv_path = tmp_path / 'turf.csv'
+    df.to_csv(csv_path, index=False)
+    path = str(tmp_path / 'model.pkl')
+    model = LogisticRegression(max_iter=500).fit(df[DEFAULT_FEATURES].fillna(0), df[WON])
+    with open(path, 'wb') as f:
+        pickle.dump(model, f)
+
+    fit_pipeline(path, str(csv_path))
+    engine = ScoringEngine.from_path(path)
+    assert engine.pipeline.feature_columns == DEFAULT_FEATURES
+    train_idx, _ = grouped_split(df, race_cols=['Race Time', 'Course'], test_size=0.2, random_state=42)
+    train = df.iloc[train_idx]
+    assert np.allclose(engine.pipeline.scaler.data_max_, train[DEFAULT_FEATURES].max())
+
+
+def test_latency_tracker_percentiles():
+    tracker = LatencyTracker(window=3)
+    assert tracker.summary() == {'requests': 0}
+    for seconds in [0.001, 0.002, 0.003, 0.004]:
+        tracker.record(seconds)
+    summary = tracker.summary()
+    assert summary['requests'] == 4 and summary['window'] == 3
+    assert summary['max_ms'] == pytest.approx(4) and summary['p50_ms'] == pytest.approx(3)
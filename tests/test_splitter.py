@@ -0,0 +1,56 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from bench_splits import string_id_split
+from src.data_cleaning import DataCleaning
+from src.splitter import GroupKFoldRaces, WalkForward, grouped_split, month_codes, race_codes
+
+
+@pytest.mark.parametrize('test_size', [0.2, 0.35])
+def test_grouped_split_matches_the_original_split(turf, test_size):
+    df = turf.sample(frac=1, random_state=0)
+    train_idx, test_idx = grouped_split(df, race_cols=['Race Time', 'Course'], test_size=test_size)
+    old_train, old_test = string_id_split(df.copy(), test_size=test_size)
+    pd.testing.assert_frame_equal(df.iloc[train_idx], old_train)
+    pd.testing.assert_frame_equal(df.iloc[test_idx], old_test)
+
+    train, test = DataCleaning.split_data(df, test_size=test_size)
+    pd.testing.assert_frame_equal(train, old_train)
+    pd.testing.assert_frame_equal(test, old_test)
+    assert 'race_id' not in df.columns
+
+
+def test_race_key_separates_days_with_the_same_race_time(turf_csv):
+    codes = race_codes(turf_csv)
+    assert codes.max() + 1 == 300
+    # HH:MM and course alone merge races run at the same time on different days
+    assert race_codes(turf_csv, ['Race Time', 'Course']).max() + 1 < 300
+
+    train_idx, test_idx = grouped_split(turf_csv)
+    assert not set(codes[train_idx]) & set(codes[test_idx])
+
+
+def test_folds_keep_races_together(turf):
+    codes = race_codes(turf)
+    seen = np.zeros(len(turf), dtype=int)
+    for train_idx, test_idx in GroupKFoldRaces(5).split(turf):
+        assert not set(codes[train_idx]) & set(codes[test_idx])
+        seen[test_idx] += 1
+    assert (seen == 1).all()
+
+
+def test_month_codes_read_turf_dates_day_first():
+    dates = pd.Series(['05/10/2024', '13/10/2024', '01/11/2024'])
+    assert month_codes(dates).tolist() == [2024 * 12 + 9] * 2 + [2024 * 12 + 10]
+    assert month_codes(pd.Series(['2024-10-05', '2024-11-01 13:50'])).tolist() == [2024 * 12 + 9, 2024 * 12 + 10]
+
+
+@pytest.mark.parametrize('frame', ['turf', 'turf_csv'])
+def test_walk_forward_trains_on_the_past(frame, request):
+    df = request.getfixturevalue(frame)
+    dates = pd.to_datetime(request.getfixturevalue('turf')['Race Time'])
+    folds = list(WalkForward(min_train_periods=12).split(df))
+    assert len(folds) > 12
+    for train_idx, test_idx in folds:
+        assert dates.iloc[train_idx].max() < dates.iloc[test_idx].min()
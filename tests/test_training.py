@@ -0,0 +1,58 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from src.splitter import race_codes
+from src.training import FeatureCache, SweepRunner, make_model, score
+
+FEATURES = ['BF Decimal SP', 'PFR Rank', 'Main Rank', "Today's Class Wins"]
+
+
+def test_make_model_caps_threads():
+    model = make_model('random_forest', {'n_estimators': 5}, n_threads=3)
+    assert model.get_params()['n_jobs'] == 3 and model.get_params()['random_state'] == 42
+    assert make_model('logistic_regression').get_params()['max_iter'] == 1000
+    with pytest.raises(ValueError):
+        SweepRunner({'svm': {}}, FEATURES)
+
+
+def test_score_without_probabilities():
+    metrics = score(np.array([0, 1, 1, 0]), np.array([0, 1, 0, 0]))
+    assert metrics['accuracy'] == 0.75 and metrics['precision'] == 1 and metrics['recall'] == 0.5
+    assert np.isnan(metrics['log_loss'])
+
+
+def test_feature_cache_reuses_identical_entries(tmp_path):
+    cache = FeatureCache(str(tmp_path))
+    X, y, folds = np.arange(12.0).reshape(6, 2), np.array([0, 1] * 3), np.arange(6, dtype=np.int8) % 3
+    path = cache.store(X, y, folds)
+    assert cache.store(X.copy(), y, folds) == path
+    assert cache.store(X + 1, y, folds) != path
+    loaded = FeatureCache.load(path)
+    assert isinstance(loaded[0], np.memmap) and np.array_equal(loaded[0], X)
+
+
+def test_folds_keep_races_together(turf_csv):
+    runner = SweepRunner({'logistic_regression': {}}, FEATURES, n_splits=4)
+    _, _, folds = runner._arrays(turf_csv)
+    codes = race_codes(turf_csv)
+    assert set(np.unique(folds)) == {0, 1, 2, 3}
+    # every race, including ones sharing an HH:MM time with another day, sits in one fold
+    assert (pd.Series(folds).groupby(codes).nunique() == 1).all()
+
+
+def test_sweep_logs_runs_and_refits_the_winner(turf, tmp_path):
+    mlflow = pytest.importorskip('mlflow')
+    mlflow.set_tracking_uri(f'sqlite:///{tmp_path}/mlflow.db')
+    try:
+        runner = SweepRunner({'logistic_regression': {'C': [0.01, 1.0]}}, FEATURES, n_splits=3, n_jobs=1,
+                             experiment_name='sweep-test', cache=FeatureCache(str(tmp_path / 'cache')))
+        runner.fit(turf)
+    finally:
+        mlflow.set_tracking_uri(None)
+    assert len(runner.fold_results_) == 6 and len(runner.cv_results_) == 2
+    best = runner.cv_results_.iloc[0]
+    assert best['mean_roc_auc'] == runner.cv_results_['mean_roc_auc'].max()
+    assert best['run_id'] == runner.best_run_id_
+    assert runner.best_model_uri_ == f'runs:/{runner.best_run_id_}/model'
+    assert runner.best_estimator_.get_params()['C'] == best['params']['C']